@@ -12,8 +12,13 @@ class ExecutorMindHandler( RequestHandler ):
   MSG_DEFINITIONS = { 'ProcessTask' : { 'taskId' : ( types.IntType, types.LongType ),
                                         'taskStub' : types.StringType,
                                         'eType' : types.StringType },
+                      'ProcessTasks' : { 'taskIds' : ( types.ListType, types.TupleType ),
+                                         'taskStubs' : ( types.ListType, types.TupleType ),
+                                         'eTypes' : ( types.ListType, types.TupleType ) },
                       'TaskDone' : { 'taskId' : ( types.IntType, types.LongType ),
                                      'taskStub' : types.StringType },
+                      'TasksDone' : { 'taskIds' : ( types.ListType, types.TupleType ),
+                                      'taskStubs' : ( types.ListType, types.TupleType ) },
                       'TaskFreeze' : { 'taskId' : ( types.IntType, types.LongType ),
                                        'taskStub' : types.StringType,
                                        'freezeTime' : ( types.IntType, types.LongType ) },
@@ -27,8 +32,10 @@ class ExecutorMindHandler( RequestHandler ):
 
   class MindCallbacks( ExecutorDispatcherCallbacks ):
 
-    def __init__( self, sendTaskCB, dispatchCB, disconnectCB, taskProcCB, taskFreezeCB, taskErrCB ):
+    def __init__( self, sendTaskCB, dispatchCB, disconnectCB, taskProcCB, taskFreezeCB, taskErrCB,
+                  sendTasksCB = None ):
       self.__sendTaskCB = sendTaskCB
+      self.__sendTasksCB = sendTasksCB
       self.__dispatchCB = dispatchCB
       self.__disconnectCB = disconnectCB
       self.__taskProcDB = taskProcCB
@@ -39,6 +46,11 @@ class ExecutorMindHandler( RequestHandler ):
     def cbSendTask( self, taskId, taskObj, eId, eType ):
       return self.__sendTaskCB( taskId, taskObj, eId, eType )
 
+    def cbSendTasks( self, eId, taskList ):
+      if self.__sendTasksCB:
+        return self.__sendTasksCB( eId, taskList )
+      return ExecutorDispatcherCallbacks.cbSendTasks( self, eId, taskList )
+
     def cbDispatch( self, taskId, taskObj, pathExecuted ):
       return self.__dispatchCB( taskId, taskObj, pathExecuted )
 
@@ -67,9 +79,12 @@ class ExecutorMindHandler( RequestHandler ):
                                                          cls.__execDisconnected,
                                                          cls.exec_taskProcessed,
                                                          cls.exec_taskFreeze,
-                                                         cls.exec_taskError )
+                                                         cls.exec_taskError,
+                                                         cls.__sendTasks )
     cls.__eDispatch.setCallbacks( cls.__callbacks )
     cls.__allowedClients = []
+    #Executors that can receive several tasks in one ProcessTasks message
+    cls.__batchExecutors = set()
     if cls.log.shown( "VERBOSE" ):
       gThreadScheduler.setMinValidPeriod( 1 )
       gThreadScheduler.addPeriodicTask( 10, lambda: cls.log.verbose( "== Internal state ==\n%s\n===========" % pprint.pformat( cls.__eDispatch._internals() ) ) )
@@ -82,7 +97,7 @@ class ExecutorMindHandler( RequestHandler ):
     cls.__allowedClients = aClients
 
   @classmethod
-  def __sendTask( self, taskId, taskObj, eId, eType ):
+  def __getTaskStub( self, taskId, taskObj, eId ):
     try:
       result = self.exec_prepareToSend( taskId, taskObj, eId )
       if not result[ 'OK' ]:
@@ -97,6 +112,41 @@ class ExecutorMindHandler( RequestHandler ):
       return S_ERROR( "Cannot serialize task %s: %s" % ( taskId, str( excp ) ) )
     if not isReturnStructure( result ):
       raise Exception( "exec_serializeTask does not return a return structure" )
+    return result
+
+  @classmethod
+  def __sendTasks( self, eId, taskList ):
+    if eId not in self.__batchExecutors:
+      return ExecutorDispatcherCallbacks.cbSendTasks( self.__callbacks, eId, taskList )
+    failed = {}
+    taskIds = []
+    taskStubs = []
+    eTypes = []
+    for taskId, taskObj, eType in taskList:
+      result = self.__getTaskStub( taskId, taskObj, eId )
+      if not result[ 'OK' ]:
+        failed[ taskId ] = result[ 'Message' ]
+        continue
+      taskIds.append( taskId )
+      taskStubs.append( result[ 'Value' ] )
+      eTypes.append( eType )
+    if not taskIds:
+      return S_OK( failed )
+    result = self.srv_msgCreate( "ProcessTasks" )
+    if result[ 'OK' ]:
+      msgObj = result[ 'Value' ]
+      msgObj.taskIds = taskIds
+      msgObj.taskStubs = taskStubs
+      msgObj.eTypes = eTypes
+      result = self.srv_msgSend( eId, msgObj )
+    if not result[ 'OK' ]:
+      for taskId in taskIds:
+        failed[ taskId ] = result[ 'Message' ]
+    return S_OK( failed )
+
+  @classmethod
+  def __sendTask( self, taskId, taskObj, eId, eType ):
+    result = self.__getTaskStub( taskId, taskObj, eId )
     if not result[ 'OK' ]:
       return result
     taskStub = result[ 'Value' ]
@@ -134,12 +184,15 @@ class ExecutorMindHandler( RequestHandler ):
       numTasks = max( 1, int( kwargs[ 'maxTasks' ] ) )
     except:
       numTasks = 1
-    self.__eDispatch.addExecutor( trid, kwargs[ 'executorTypes' ] )
+    if kwargs.get( 'batchTasks' ):
+      self.__batchExecutors.add( trid )
+    self.__eDispatch.addExecutor( trid, kwargs[ 'executorTypes' ], numTasks )
     return self.exec_executorConnected( trid, kwargs[ 'executorTypes' ] )
 
   auth_conn_drop = [ 'all' ]
   def conn_drop( self, trid ):
     self.__eDispatch.removeExecutor( trid )
+    self.__batchExecutors.discard( trid )
     return S_OK()
 
   auth_msg_TaskDone = [ 'all' ]
@@ -160,6 +213,28 @@ class ExecutorMindHandler( RequestHandler ):
       gLogger.error( "There was a problem freezing task %s: %s" % ( taskId, result[ 'Message' ] ) )
     return S_OK()
 
+  auth_msg_TasksDone = [ 'all' ]
+  def msg_TasksDone( self, msgObj ):
+    trid = self.srv_getTransportID()
+    for iP in range( len( msgObj.taskIds ) ):
+      taskId = msgObj.taskIds[ iP ]
+      try:
+        result = self.exec_deserializeTask( msgObj.taskStubs[ iP ] )
+      except Exception, excp:
+        gLogger.exception( "Exception while deserializing task %s" % taskId, lException = excp )
+        continue
+      if not isReturnStructure( result ):
+        raise Exception( "exec_deserializeTask does not return a return structure" )
+      if not result[ 'OK' ]:
+        gLogger.error( "Cannot deserialize task %s: %s" % ( taskId, result[ 'Message' ] ) )
+        continue
+      #Refill the executor once the whole batch is processed
+      result = self.__eDispatch.taskProcessed( trid, taskId, result[ 'Value' ], refill = False )
+      if not result[ 'OK' ]:
+        gLogger.error( "There was a problem processing task %s: %s" % ( taskId, result[ 'Message' ] ) )
+    self.__eDispatch.fillExecutor( trid )
+    return S_OK()
+
   auth_msg_TaskFreeze = [ 'all' ]
   def msg_TaskFreeze( self, msgObj ):
     taskId = msgObj.taskId
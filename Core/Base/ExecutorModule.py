@@ -120,19 +120,48 @@ class ExecutorModule( object ):
     return result
 
   def _ex_processTask( self, taskId, taskStub ):
-    self.__freezeTime = 0
-    self.log.verbose( "Task %s: Received" % str( taskId ) )
-    result = self.__deserialize( taskId, taskStub )
-    if not result[ 'OK' ]:
-      self.log.error( "Task %s: Cannot deserialize: %s" % ( str( taskId ), result[ 'Message' ] ) )
-      return result
-    taskObj = result[ 'Value' ]
+    return self._ex_processTasks( [ ( taskId, taskStub ) ] )[ taskId ]
+
+  def _ex_processTasks( self, tasks ):
+    """ Process a batch of ( taskId, taskStub ) received in the same message.
+        Returns a dict with S_OK( ( taskStub, freezeTime, fastTrackType ) ) or
+        S_ERROR for each taskId
+    """
+    self.__freezeTimes = {}
+    self.__currentTaskId = None
+    results = {}
+    taskList = []
+    for taskId, taskStub in tasks:
+      self.log.verbose( "Task %s: Received" % str( taskId ) )
+      result = self.__deserialize( taskId, taskStub )
+      if not result[ 'OK' ]:
+        self.log.error( "Task %s: Cannot deserialize: %s" % ( str( taskId ), result[ 'Message' ] ) )
+        results[ taskId ] = result
+        continue
+      taskList.append( ( taskId, result[ 'Value' ] ) )
+    if not taskList:
+      return results
     #Shifter proxy?
     result = self.__installShifterProxy()
     if not result[ 'OK' ]:
-      return result
+      for taskId, taskObj in taskList:
+        results[ taskId ] = result
+      return results
     #Execute!
-    result = self.processTask( taskId, taskObj )
+    result = self.processTasks( taskList )
+    if not isReturnStructure( result ):
+      raise Exception( "processTasks does not return a return structure" )
+    if not result[ 'OK' ]:
+      for taskId, taskObj in taskList:
+        results[ taskId ] = result
+      return results
+    taskResults = result[ 'Value' ]
+    for taskId, taskObj in taskList:
+      results[ taskId ] = self.__finishTask( taskId, taskObj,
+                                            taskResults.get( taskId, S_ERROR( "Task was not processed" ) ) )
+    return results
+
+  def __finishTask( self, taskId, taskObj, result ):
     if not isReturnStructure( result ):
       raise Exception( "processTask does not return a return structure" )
     if not result[ 'OK' ]:
@@ -148,7 +177,8 @@ class ExecutorModule( object ):
     taskStub = result[ 'Value' ]
     #Try fast track
     fastTrackType = False
-    if not self.__freezeTime:
+    freezeTime = self.isTaskFrozen( taskId )
+    if not freezeTime:
       result = self.fastTrackDispatch( taskId, taskObj )
       if not result[ 'OK' ]:
         self.log.error( "FastTrackDispatch failed for job", "%s: %s" % ( taskId, result[ 'Message' ] ) )
@@ -156,17 +186,26 @@ class ExecutorModule( object ):
         fastTrackType = result[ 'Value' ]
 
     #EOP
-    return S_OK( ( taskStub, self.__freezeTime, fastTrackType ) )
+    return S_OK( ( taskStub, freezeTime, fastTrackType ) )
 
   ####
   # Callable functions
   ####
 
-  def freezeTask( self, freezeTime ):
-    self.__freezeTime = freezeTime
+  def freezeTask( self, freezeTime, taskId = None ):
+    if taskId == None:
+      taskId = self.__currentTaskId
+    self.__freezeTimes[ taskId ] = freezeTime
 
-  def isTaskFrozen( self ):
-    return self.__freezeTime
+  def isTaskFrozen( self, taskId = None ):
+    if taskId == None:
+      taskId = self.__currentTaskId
+    return self.__freezeTimes.get( taskId, 0 )
+
+  def setCurrentTask( self, taskId ):
+    """ Task that freezeTask and isTaskFrozen refer to when processing a batch
+    """
+    self.__currentTaskId = taskId
 
 
   ###
@@ -189,3 +228,20 @@ class ExecutorModule( object ):
   def processTask( self, taskId, taskObj ):
     raise Exception( "Method processTask has to be coded!" )
 
+  ####
+  # Overwrite this function to process a whole batch of tasks at once
+  ####
+
+  def processTasks( self, taskList ):
+    """ Process a list of ( taskId, taskObj ), returns S_OK( { taskId : result } )
+        where each result is what processTask would return for the task
+    """
+    results = {}
+    try:
+      for taskId, taskObj in taskList:
+        self.setCurrentTask( taskId )
+        results[ taskId ] = self.processTask( taskId, taskObj )
+    finally:
+      self.setCurrentTask( None )
+    return S_OK( results )
+
@@ -9,6 +9,7 @@ import time
 import threading
 from DIRAC import S_OK, S_ERROR, gLogger, rootPath, gConfig
 from DIRAC.Core.DISET.MessageClient import MessageClient
+from DIRAC.Core.Utilities.ThreadPool import getGlobalThreadPool
 from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.Core.Base.private.ModuleLoader import ModuleLoader
 from DIRAC.Core.Base.ExecutorModule import ExecutorModule
@@ -66,10 +67,12 @@ class ExecutorReactor( object ):
     def connect( self ):
       self.__msgClient = MessageClient( self.__mindName )
       self.__msgClient.subscribeToMessage( 'ProcessTask', self.__processTask )
+      self.__msgClient.subscribeToMessage( 'ProcessTasks', self.__processTasks )
       self.__msgClient.subscribeToDisconnect( self.__disconnected )
       result = self.__msgClient.connect( executorTypes = list( self.__modules.keys() ),
                                          maxTasks = self.__maxTasks,
-                                         extraArgs = self.__extraArgs )
+                                         extraArgs = self.__extraArgs,
+                                         batchTasks = True )
       if result[ 'OK' ]:
         self.__aliveLock.alive()
         gLogger.info( "Connected to %s" % self.__mindName )
@@ -81,7 +84,8 @@ class ExecutorReactor( object ):
         gLogger.notice( "Trying to reconnect to %s" % self.__mindName )
         result = self.__msgClient.connect( executorTypes = list( self.__modules.keys() ),
                                            maxTasks = self.__maxTasks,
-                                           extraArgs = self.__extraArgs )
+                                           extraArgs = self.__extraArgs,
+                                           batchTasks = True )
 
         if result[ 'OK' ]:
           if retryCount >= self.__reconnectRetries:
@@ -131,15 +135,66 @@ class ExecutorReactor( object ):
       return self.__msgClient.sendMessage( msgObj )
 
     def __processTask( self, msgObj ):
-      eType = msgObj.eType
-      taskId = msgObj.taskId
-      taskStub = msgObj.taskStub
+      return self.__executeTask( msgObj.eType, msgObj.taskId, msgObj.taskStub )
 
+    def __processTasks( self, msgObj ):
+      #Modules that process batches get all their tasks at once, the rest get a thread per task
+      tasksByType = {}
+      for iP in range( len( msgObj.taskIds ) ):
+        tasksByType.setdefault( msgObj.eTypes[ iP ], [] ).append( ( msgObj.taskIds[ iP ], msgObj.taskStubs[ iP ] ) )
+      threadPool = getGlobalThreadPool()
+      for eType in tasksByType:
+        if self.__processesBatches( eType ):
+          threadPool.generateJobAndQueueIt( self.__executeTasks, args = ( eType, tasksByType[ eType ] ) )
+          continue
+        for taskId, taskStub in tasksByType[ eType ]:
+          threadPool.generateJobAndQueueIt( self.__executeTask, args = ( eType, taskId, taskStub ) )
+      return S_OK()
+
+    def __processesBatches( self, eType ):
+      try:
+        exeClass = self.__modules[ eType ]
+      except KeyError:
+        return False
+      return exeClass.processTasks.im_func is not ExecutorModule.processTasks.im_func
+
+    def __executeTasks( self, eType, tasks ):
+      results = self.__moduleProcessTasks( eType, tasks )
+      tasksDone = []
+      for taskId, taskStub in tasks:
+        result = results[ taskId ]
+        if not result[ 'OK' ]:
+          self.__sendExecutorError( eType, taskId, result[ 'Message' ] )
+          continue
+        msgName, taskStub, extra = result[ 'Value' ]
+        if msgName == "TaskDone":
+          tasksDone.append( ( taskId, taskStub ) )
+        else:
+          self.__sendTaskResult( eType, taskId, msgName, taskStub, extra )
+      if tasksDone:
+        self.__sendTasksDone( eType, tasksDone )
+
+    def __sendTasksDone( self, eType, tasksDone ):
+      result = self.__msgClient.createMessage( "TasksDone" )
+      if not result[ 'OK' ]:
+        #Mind does not know about batches
+        for taskId, taskStub in tasksDone:
+          self.__sendTaskResult( eType, taskId, "TaskDone", taskStub, True )
+        return S_OK()
+      gLogger.verbose( "Sending TasksDone for %d tasks" % len( tasksDone ) )
+      msgObj = result[ 'Value' ]
+      msgObj.taskIds = [ taskId for taskId, taskStub in tasksDone ]
+      msgObj.taskStubs = [ taskStub for taskId, taskStub in tasksDone ]
+      return self.__msgClient.sendMessage( msgObj )
+
+    def __executeTask( self, eType, taskId, taskStub ):
       result = self.__moduleProcess( eType, taskId, taskStub )
       if not result[ 'OK' ]:
         return self.__sendExecutorError( eType, taskId, result[ 'Message' ] )
       msgName, taskStub, extra = result[ 'Value' ]
+      return self.__sendTaskResult( eType, taskId, msgName, taskStub, extra )
 
+    def __sendTaskResult( self, eType, taskId, msgName, taskStub, extra ):
       result = self.__msgClient.createMessage( msgName )
       if not result[ 'OK' ]:
         return self.__sendExecutorError( eType, taskId, "Can't generate %s message: %s" % ( msgName, result[ 'Message' ] ) )
@@ -182,6 +237,48 @@ class ExecutorReactor( object ):
       
       return S_OK( ( "TaskDone", taskStub, True ) )
 
+    def __moduleProcessTasks( self, eType, tasks, fastTrackLevel = 0 ):
+      result = self.__getInstance( eType )
+      if not result[ 'OK' ]:
+        return dict( ( taskId, result ) for taskId, taskStub in tasks )
+      modInstance = result[ 'Value' ]
+      try:
+        results = modInstance._ex_processTasks( tasks )
+      except Exception, excp:
+        gLogger.exception( "Error while processing %d tasks" % len( tasks ) )
+        result = S_ERROR( "Error processing tasks: %s" % excp )
+        return dict( ( taskId, result ) for taskId, taskStub in tasks )
+
+      self.__storeInstance( eType, modInstance )
+
+      finalResults = {}
+      fastTrack = {}
+      for taskId, taskStub in tasks:
+        result = results[ taskId ]
+        if not result[ 'OK' ]:
+          finalResults[ taskId ] = S_OK( ( 'TaskError', taskStub, "Error: %s" % result[ 'Message' ] ) )
+          continue
+        newStub, freezeTime, fastTrackType = result[ 'Value' ]
+        if freezeTime:
+          finalResults[ taskId ] = S_OK( ( "TaskFreeze", newStub, freezeTime ) )
+          continue
+        if fastTrackType:
+          if fastTrackLevel < 10 and fastTrackType in self.__modules:
+            gLogger.notice( "Fast tracking task %s to %s" % ( taskId, fastTrackType ) )
+            fastTrack.setdefault( fastTrackType, [] ).append( ( taskId, newStub ) )
+            continue
+          else:
+            gLogger.notice( "Stopping %s fast track. Sending back to the mind" % ( taskId ) )
+        finalResults[ taskId ] = S_OK( ( "TaskDone", newStub, True ) )
+
+      for fastTrackType in fastTrack:
+        if self.__processesBatches( fastTrackType ):
+          finalResults.update( self.__moduleProcessTasks( fastTrackType, fastTrack[ fastTrackType ], fastTrackLevel + 1 ) )
+          continue
+        for taskId, taskStub in fastTrack[ fastTrackType ]:
+          finalResults[ taskId ] = self.__moduleProcess( fastTrackType, taskId, taskStub, fastTrackLevel + 1 )
+      return finalResults
+
 
   #####
   # Start of ExecutorReactor
@@ -8,96 +8,183 @@
 
 __RCSID__ = "$Id$"
 
+import re
+import marshal
+
+# Runs of text up to the next bracket, brace or separator, quoted strings included
+_chunkRE = { ';' : re.compile( r'[^"\[\]{};]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{};]*)*' ),
+             ',' : re.compile( r'[^"\[\]{},]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{},]*)*' ) }
+_stringRE = re.compile( r'"([^"\\]*(?:\\.[^"\\]*)*)"$' )
+_blanksRE = re.compile( r'\s+' )
+
+def _scanExpression( text, pos, separator ):
+  """ Index of the first separator at nesting level 0 from pos on, or len( text )
+  """
+  chunkRE = _chunkRE[ separator ]
+  length = len( text )
+  depth = 0
+  while True:
+    pos = chunkRE.match( text, pos ).end()
+    if pos >= length:
+      return length
+    char = text[ pos ]
+    if char in '[{':
+      depth += 1
+    elif char in ']}':
+      depth = max( 0, depth - 1 )
+    elif char == separator and not depth:
+      return pos
+    pos += 1
+
+def _splitList( expression ):
+  """ Elements of a { } list expression as stripped strings
+  """
+  body = expression.strip()[1:-1]
+  items = []
+  pos = 0
+  while pos < len( body ):
+    end = _scanExpression( body, pos, ',' )
+    item = body[pos:end].strip()
+    if item:
+      items.append( item )
+    pos = end + 1
+  return items
+
+def parseExpression( expression ):
+  """ Typed value of a ClassAd expression: strings, ints, floats, bools, lists
+      of typed values and nested ClassAds. Other expressions are returned as text
+  """
+  expression = expression.strip()
+  if not expression:
+    return ''
+  first = expression[0]
+  if first == '{' and expression[-1] == '}':
+    return [ parseExpression( item ) for item in _splitList( expression ) ]
+  if first == '[':
+    return ClassAd( expression )
+  if first == '"':
+    match = _stringRE.match( expression )
+    if match:
+      return match.group( 1 ).replace( '\\"', '"' )
+    return expression
+  lowered = expression.lower()
+  if lowered == 'true':
+    return True
+  if lowered == 'false':
+    return False
+  try:
+    return int( expression )
+  except ValueError:
+    pass
+  try:
+    return float( expression )
+  except ValueError:
+    pass
+  return expression
+
+def _toString( expression ):
+  """ String value of an expression, quotes removed
+  """
+  return expression.replace( '"', '' )
+
+def _toInt( expression ):
+  """ Integer value of an expression, 0 if not an integer
+  """
+  try:
+    return int( _toString( expression ) )
+  except Exception:
+    return 0
+
+def _toFloat( expression ):
+  """ Float value of an expression, 0.0 if not a number
+  """
+  try:
+    return float( _toString( expression ) )
+  except Exception:
+    return 0.0
+
+def _toBool( expression ):
+  """ Boolean value of an expression, only true (any case) is True
+  """
+  return _toString( expression ).lower() == "true"
+
 class ClassAd:
 
   def __init__( self, jdl ):
     """ClassAd constructor from a JDL string
     """
     self.contents = {}
+    # Parsed values by attribute name as ( expression, value )
+    self.__parsed = {}
     result = self.__analyse_jdl( jdl )
     if result:
       self.contents = result
 
-  def __analyse_jdl( self, jdl, index = 0 ):
-    """Analyse one [] jdl enclosure
+  @classmethod
+  def fromSerialized( cls, data ):
+    """ ClassAd from the output of serialize() without parsing the JDL again
+    """
+    classAd = cls( '[]' )
+    try:
+      contents, lists = marshal.loads( data )
+    except ( EOFError, ValueError, TypeError ):
+      return None
+    classAd.contents = contents
+    for name in lists:
+      if name in contents:
+        classAd.__parsed[ ( name, 'list' ) ] = ( contents[ name ], lists[ name ] )
+    return classAd
+
+  def serialize( self ):
+    """ Attributes and list values as a string to rebuild the ClassAd with
+        fromSerialized(). It uses marshal, much faster to load than DEncode for
+        big lists, so it is only meant to be stored and read by DIRAC itself
+    """
+    lists = {}
+    for name in self.contents:
+      if self.isAttributeList( name ):
+        lists[ name ] = self.getListFromExpression( name )
+    return marshal.dumps( ( self.contents, lists ) )
+
+  def __analyse_jdl( self, jdl ):
+    """Analyse one [] jdl enclosure in a single pass
     """
 
     jdl = jdl.strip()
 
-    # Strip all the blanks first
-    #temp = jdl.replace(' ','').replace('\n','')
-    temp = jdl
-
     result = {}
 
-    if temp[0] != '[' or temp[-1] != ']':
+    if jdl[:1] != '[' or jdl[-1:] != ']':
       print "Invalid JDL: it should start with [ and end with ]"
       return result
 
-    # Parse the jdl string now
-    body = temp[1:-1]
+    body = jdl[1:-1]
     index = 0
-    namemode = 1
-    valuemode = 0
     while index < len( body ):
-      if namemode:
-        ind = body.find( "=", index )
-        if ind != -1:
-          name = body[index:ind]
-          index = ind + 1
-          valuemode = 1
-          namemode = 0
-        else:
-          break
-      elif valuemode:
-        ind1 = body.find( "[", index )
-        ind2 = body.find( ";", index )
-        if ind1 != -1 and ind1 < ind2:
-          value, newind = self.__find_subjdl( body, ind1 )
-        elif ind1 == -1 and ind2 == -1:
-          value = body[index:]
-          newind = len( body )
-        else:
-          if index == ind2:
-            return {}
-          else:
-            value = body[index:ind2]
-            newind = ind2 + 1
-
-        result[name.strip()] = value.strip().replace( '\n', '' )
-        index = newind
-        valuemode = 0
-        namemode = 1
+      ind = body.find( "=", index )
+      if ind == -1:
+        break
+      name = body[index:ind]
+      end = _scanExpression( body, ind + 1, ';' )
+      if end == ind + 1 and end < len( body ):
+        # Empty value
+        return {}
+      result[name.strip()] = body[ind + 1:end].strip().replace( '\n', '' )
+      index = end + 1
 
     return result
 
-  def __find_subjdl( self, body, index ):
-    """ Find a full [] enclosure starting from index
+  def __cached( self, name, kind, functor ):
+    """ Value of functor( expression ) for the attribute, computed once per expression
     """
-    result = ''
-    if body[index] != '[':
-      return ( result, 0 )
-
-    depth = 0
-    ind = index
-    while ( depth < 10 ):
-      ind1 = body.find( ']', ind + 1 )
-      ind2 = body.find( '[', ind + 1 )
-      if ind2 != -1 and ind2 < ind1:
-        depth += 1
-        ind = ind2
-      else:
-        if depth > 0:
-          depth -= 1
-          ind = ind1
-        else:
-          result = body[index:ind1 + 1]
-          if body[ind1 + 1] == ";":
-            return ( result, ind1 + 2 )
-          else:
-            return result, 0
-
-    return result, 0
+    expression = self.get_expression( name )
+    key = ( name, kind )
+    cached = self.__parsed.get( key )
+    if cached and cached[0] == expression:
+      return cached[1]
+    value = functor( expression )
+    self.__parsed[ key ] = ( expression, value )
+    return value
 
   def insertAttributeInt( self, name, attribute ):
     """Insert a named integer attribute
@@ -173,43 +260,35 @@ class ClassAd:
     """ Get a list of strings from a given expression
     """
 
-    tempString = self.get_expression( name ).strip()
-    listMode = False
-    if tempString.startswith('{'):
-      tempString = tempString[1:-1]
-      listMode = True
-      
-    tempString = tempString.replace( " ", "" ).replace( '\n','' )  
-    if tempString.find('{') < 0:
-      if not listMode:
-        tempString = tempString.replace( "\"", "" )
-        return tempString.split( ',' ) 
-    
-    resultList = []    
-    while tempString:      
-      if tempString.find( '{' ) == 0 :
-        end = tempString.find( '}' )
-        resultList.append(tempString[:end+1])
-        tempString = tempString[end+1:]
-        if tempString.startswith(','):
-          tempString = tempString[1:]
-      elif tempString.find( '"' ) == 0 :
-        end = tempString[1:].find( '"' )
-        resultList.append( tempString[1:end+1] )
-        tempString = tempString[end+2:]    
-        if tempString.startswith(','):
-          tempString = tempString[1:]          
-      else:
-        end = tempString.find( ',' )
-        if end < 0:
-          resultList.append( tempString.replace( "\"", "" ).replace( " ", "" ) )
-          break
-        else:  
-          resultList.append( tempString[:end-1].replace( "\"", "" ).replace( " ", "" ) )
-          tempString = tempString[end+1:]
+    return list( self.__cached( name, 'list', self.__listFromExpression ) )
 
+  def __listFromExpression( self, expression ):
+    """ Strings of a list expression, a single value is split on commas
+    """
+    expression = expression.strip()
+    if not expression.startswith( '{' ):
+      return expression.replace( " ", "" ).replace( '\n', '' ).replace( "\"", "" ).split( ',' )
+
+    resultList = []
+    for item in _splitList( expression ):
+      if item[0] == '"':
+        match = _stringRE.match( item )
+        if match:
+          resultList.append( match.group( 1 ) )
+          continue
+      if item[0] == '{':
+        resultList.append( _blanksRE.sub( '', item ) )
+      else:
+        resultList.append( item.replace( "\"", "" ).replace( " ", "" ) )
     return resultList
 
+  def getAttributeValue( self, name ):
+    """ Typed value of the attribute as given by parseExpression, None if not defined
+    """
+    if not self.lookupAttribute( name ):
+      return None
+    return self.__cached( name, 'value', parseExpression )
+
   def getDictionaryFromSubJDL( self, name ):
     """ Get a dictionary of the JDL attributes from a subsection
     """
@@ -274,7 +353,7 @@ class ClassAd:
     """
     value = ''
     if self.lookupAttribute( name ):
-      value = self.get_expression( name ).replace( '"', '' )
+      value = self.__cached( name, 'string', _toString )
     return value
 
   def getAttributeInt( self, name ):
@@ -282,33 +361,20 @@ class ClassAd:
     """
     value = 0
     if self.lookupAttribute( name ):
-      try:
-        value = int( self.get_expression( name ).replace( '"', '' ) )
-      except Exception:
-        value = 0
+      value = self.__cached( name, 'int', _toInt )
     return value
 
   def getAttributeBool( self, name ):
     """ Get Boolean type attribute value
     """
     if self.lookupAttribute( name ):
-      value = self.get_expression( name ).replace( '"', '' )
-    else:
-      return False
-    if value.lower() == "true":
-      return True
-    elif value.lower() == "false":
-      return False
-    else:
-      return False
+      return self.__cached( name, 'bool', _toBool )
+    return False
 
   def getAttributeFloat( self, name ):
     """ Get Float type attribute value
     """
     value = 0.0
     if self.lookupAttribute( name ):
-      try:
-        value = float( self.get_expression( name ).replace( '"', '' ) )
-      except Exception:
-        value = 0.0
+      value = self.__cached( name, 'float', _toFloat )
     return value
@@ -1,5 +1,6 @@
 
 import threading, time, types
+from collections import deque
 from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities.ReturnValues import isReturnStructure
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
@@ -134,6 +135,12 @@ class ExecutorState:
       self.__lock.release()
 
 class ExecutorQueues:
+  """ Waiting queues of tasks per executor type. Each queue is a deque of
+      ( entryId, taskId ) and __taskInQueue indexes the live entry of each task,
+      so that pushing, popping and deleting tasks are O(1). Deleted entries are
+      left in the deque and skipped when popping, the deque is compacted when
+      they outnumber the waiting tasks.
+  """
 
   def __init__( self, log = False ):
     if log:
@@ -142,13 +149,15 @@ class ExecutorQueues:
       self.__log = gLogger
     self.__lock = threading.Lock()
     self.__queues = {}
+    self.__queueSize = {}
     self.__lastUse = {}
     self.__taskInQueue = {}
+    self.__lastEntryId = 0
 
   def _internals( self ):
-    return { 'queues' : dict( self.__queues ),
+    return { 'queues' : self.getState(),
              'lastUse' : dict( self.__lastUse ),
-             'taskInQueue' : dict( self.__taskInQueue ),
+             'taskInQueue' : dict( [ ( taskId, self.__taskInQueue[ taskId ][0] ) for taskId in self.__taskInQueue ] ),
              'locked' : self.__lock.locked() }
 
   def getExecutorList( self ):
@@ -159,52 +168,76 @@ class ExecutorQueues:
     self.__lock.acquire()
     try:
       if taskId in self.__taskInQueue:
-        if self.__taskInQueue[ taskId ] != eType:
+        if self.__taskInQueue[ taskId ][0] != eType:
           errMsg = "Task %s cannot be queued because it's already queued for %s" % ( taskId,
-                                                                                    self.__taskInQueue[ taskId ] )
+                                                                                    self.__taskInQueue[ taskId ][0] )
           self.__log.fatal( errMsg )
           return 0
         else:
-          return len( self.__queues[ eType ] )
+          return self.__queueSize[ eType ]
       if eType not in self.__queues:
-        self.__queues[ eType ] = []
+        self.__queues[ eType ] = deque()
+        self.__queueSize[ eType ] = 0
       self.__lastUse[ eType ] = time.time()
+      self.__lastEntryId += 1
       if ahead:
-        self.__queues[ eType ].insert( 0, taskId )
+        self.__queues[ eType ].appendleft( ( self.__lastEntryId, taskId ) )
       else:
-        self.__queues[ eType ].append( taskId )
-      self.__taskInQueue[ taskId ] = eType
-      return len( self.__queues[ eType ] )
+        self.__queues[ eType ].append( ( self.__lastEntryId, taskId ) )
+      self.__taskInQueue[ taskId ] = ( eType, self.__lastEntryId )
+      self.__queueSize[ eType ] += 1
+      return self.__queueSize[ eType ]
     finally:
       self.__lock.release()
 
   def popTask( self, eTypes ):
+    tasks = self.popTasks( eTypes, 1 )
+    if not tasks:
+      return None
+    return tasks[0]
+
+  def popTasks( self, eTypes, maxTasks ):
+    """ Pops up to maxTasks ( taskId, eType ) from the queues of eTypes, looking
+        at the queues in order
+    """
     if type( eTypes ) not in ( types.ListType, types.TupleType ):
       eTypes = [ eTypes ]
+    tasks = []
     self.__lock.acquire()
-    for eType in eTypes:
-      try:
-        taskId = self.__queues[ eType ].pop( 0 )
-        del( self.__taskInQueue[ taskId ] )
-        #Found! release and return!
-        self.__lock.release()
-        self.__lastUse[ eType ] = time.time()
-        self.__log.verbose( "Popped task %s from executor %s waiting queue" % ( taskId, eType ) )
-        return ( taskId, eType )
-      except IndexError:
-        continue
-      except KeyError:
-        continue
-    self.__lock.release()
-    #Not found. release and return None
-    return None
+    try:
+      for eType in eTypes:
+        try:
+          queue = self.__queues[ eType ]
+        except KeyError:
+          continue
+        while queue and len( tasks ) < maxTasks:
+          entryId, taskId = queue.popleft()
+          #Skip entries of deleted or requeued tasks
+          if self.__taskInQueue.get( taskId ) != ( eType, entryId ):
+            continue
+          del( self.__taskInQueue[ taskId ] )
+          self.__queueSize[ eType ] -= 1
+          tasks.append( ( taskId, eType ) )
+        if tasks:
+          self.__lastUse[ eType ] = time.time()
+        if len( tasks ) >= maxTasks:
+          break
+    finally:
+      self.__lock.release()
+    for taskId, eType in tasks:
+      self.__log.verbose( "Popped task %s from executor %s waiting queue" % ( taskId, eType ) )
+    return tasks
+
+  def __getQueueTasks( self, eType ):
+    return [ taskId for entryId, taskId in self.__queues[ eType ]
+             if self.__taskInQueue.get( taskId ) == ( eType, entryId ) ]
 
   def getState( self ):
     self.__lock.acquire()
     try:
       qInfo = {}
       for qName in self.__queues:
-        qInfo[ qName ] = list( self.__queues[ qName ] )
+        qInfo[ qName ] = self.__getQueueTasks( qName )
     finally:
       self.__lock.release()
     return qInfo
@@ -214,16 +247,16 @@ class ExecutorQueues:
     self.__lock.acquire()
     try:
       try:
-        eType = self.__taskInQueue[ taskId ]
-        del( self.__taskInQueue[ taskId ] )
-        self.__lastUse[ eType ] = time.time()
+        eType = self.__taskInQueue.pop( taskId )[0]
       except KeyError:
         return False
-      try:
-        iPos = self.__queues[ eType ].index( taskId )
-      except ValueError:
-        return False
-      del( self.__queues[ eType ][ iPos ] )
+      self.__lastUse[ eType ] = time.time()
+      self.__queueSize[ eType ] -= 1
+      #Compact the queue if deleted entries dominate it
+      queue = self.__queues[ eType ]
+      if len( queue ) > 1024 and len( queue ) > 2 * self.__queueSize[ eType ]:
+        self.__queues[ eType ] = deque( [ entry for entry in queue
+                                          if self.__taskInQueue.get( entry[1] ) == ( eType, entry[0] ) ] )
       return True
     finally:
       self.__lock.release()
@@ -232,7 +265,7 @@ class ExecutorQueues:
     self.__lock.acquire()
     try:
       try:
-        return len( self.__queues[ eType ] )
+        return self.__queueSize[ eType ]
       except KeyError:
         return 0
     finally:
@@ -246,6 +279,23 @@ class ExecutorDispatcherCallbacks:
   def cbSendTask( self, taskId, taskObj, eId, eType ):
     return S_ERROR( "No send task callback defined" )
 
+  def cbSendTasks( self, eId, taskList ):
+    """ Sends a list of ( taskId, taskObj, eType ) to an executor, returns the
+        { taskId : errorMessage } of the tasks that could not be sent. Sends each
+        task with cbSendTask unless overwritten to send them in one message
+    """
+    failed = {}
+    for taskId, taskObj, eType in taskList:
+      try:
+        result = self.cbSendTask( taskId, taskObj, eId, eType )
+      except Exception, excp:
+        result = S_ERROR( "Exception while sending task: %s" % str( excp ) )
+      if not isReturnStructure( result ):
+        result = S_ERROR( "Send task callback did not send back an S_OK/S_ERROR structure" )
+      if not result[ 'OK' ]:
+        failed[ taskId ] = result[ 'Message' ]
+    return S_OK( failed )
+
   def cbDisconectExecutor( self, eId ):
     return S_ERROR( "No disconnect callback defined" )
 
@@ -685,7 +735,7 @@ class ExecutorDispatcher:
     self.__sendTaskToExecutor( eId, eType )
     return S_OK()
 
-  def taskProcessed( self, eId, taskId, taskObj = False ):
+  def taskProcessed( self, eId, taskId, taskObj = False, refill = True ):
     result = self.__taskReceived( taskId, eId )
     if not result[ 'OK' ]:
       return result
@@ -693,7 +743,8 @@ class ExecutorDispatcher:
     #Executor didn't have the task.
     if not eType:
       #Fill the executor
-      self.__sendTaskToExecutor( eId )
+      if refill:
+        self.__sendTaskToExecutor( eId )
       return S_OK()
     #Call the done callback
     if not taskObj:
@@ -701,7 +752,8 @@ class ExecutorDispatcher:
     result = self.__taskProcessedCallback( taskId, taskObj, eType )
     if not result[ 'OK' ]:
       #Fill the executor
-      self.__sendTaskToExecutor( eId )
+      if refill:
+        self.__sendTaskToExecutor( eId )
       #Remove the task
       self.removeTask( taskId )
       return result
@@ -711,13 +763,21 @@ class ExecutorDispatcher:
       self.__tasks[ taskId ].pathExecuted.append( eType )
     except KeyError:
       self.__log.error( "Task %s seems to have been removed while being processed!" % taskId )
-      self.__sendTaskToExecutor( eId, eType )
+      if refill:
+        self.__sendTaskToExecutor( eId, eType )
       return S_OK()
     self.__log.verbose( "Executor %s processed task %s" % ( eId, taskId ) )
     result = self.__dispatchTask( taskId )
-    self.__sendTaskToExecutor( eId, eType )
+    if refill:
+      self.__sendTaskToExecutor( eId, eType )
     return result
 
+  def fillExecutor( self, eId ):
+    """ Sends tasks to all the free slots of an executor, for when a batch of tasks
+        has been processed with refill = False
+    """
+    return self.__sendTaskToExecutor( eId, checkIdle = True )
+
   def retryTask( self, eId, taskId ):
     if taskId not in self.__tasks:
       errMsg = "Task %s is not known" % taskId
@@ -750,12 +810,13 @@ class ExecutorDispatcher:
         if not result[ 'Value' ]:
           #No more tasks for eType
           break
-        self.__log.verbose( "Task %s was sent to %s" % ( result[ 'Value'], eId ) )
+        self.__log.verbose( "Tasks %s were sent to %s" % ( result[ 'Value'], eId ) )
       eId = self.__states.getIdleExecutor( eType )
     self.__log.verbose( "No more idle executors for %s" % eType )
 
   def __sendTaskToExecutor( self, eId, eTypes = False, checkIdle = False ):
-    if checkIdle and self.__states.freeSlots( eId ) == 0:
+    freeSlots = self.__states.freeSlots( eId )
+    if checkIdle and freeSlots == 0:
       return S_OK()
     try:
       searchTypes = list( reversed( self.__idMap[ eId ] ) )
@@ -771,40 +832,57 @@ class ExecutorDispatcher:
         except ValueError:
           pass
         searchTypes.append( eType )
-    pData = self.__queues.popTask( searchTypes ) 
-    if pData == None:
+    #Fill all the free slots of the executor at once
+    tasks = self.__queues.popTasks( searchTypes, max( 1, freeSlots ) )
+    if not tasks:
       self.__log.verbose( "No more tasks for %s" % eTypes )
       return S_OK()
-    taskId, eType = pData
-    self.__log.verbose( "Sending task %s to %s=%s" % ( taskId, eType, eId ) )
-    self.__states.addTask( eId, taskId )
-    result = self.__msgTaskToExecutor( taskId, eId, eType )
-    if not result[ 'OK' ]:
-      self.__queues.pushTask( eType, taskId, ahead = True )
-      self.__states.removeTask( taskId )
-      return result
-    return S_OK( taskId )
-
-  def __msgTaskToExecutor( self, taskId, eId, eType ):
-    try:
-      self.__tasks[ taskId ].sendTime = time.time()
-    except KeyError:
-      return S_ERROR( "Task %s has been deleted" % taskId )
+    for taskId, eType in tasks:
+      self.__log.verbose( "Sending task %s to %s=%s" % ( taskId, eType, eId ) )
+      self.__states.addTask( eId, taskId )
+    failed = self.__msgTasksToExecutor( tasks, eId )
+    if not failed:
+      return S_OK( [ taskId for taskId, eType in tasks ] )
+    #Put back the tasks that were not sent keeping their order
+    for taskId, eType in reversed( tasks ):
+      if taskId in failed:
+        self.__states.removeTask( taskId )
+        if taskId in self.__tasks:
+          self.__queues.pushTask( eType, taskId, ahead = True )
+    sentTasks = [ taskId for taskId, eType in tasks if taskId not in failed ]
+    if not sentTasks:
+      return S_ERROR( failed.values()[0] )
+    return S_OK( sentTasks )
+
+  def __msgTasksToExecutor( self, tasks, eId ):
+    failed = {}
+    taskList = []
+    sendTime = time.time()
+    for taskId, eType in tasks:
+      try:
+        eTask = self.__tasks[ taskId ]
+      except KeyError:
+        failed[ taskId ] = "Task %s has been deleted" % taskId
+        continue
+      eTask.sendTime = sendTime
+      taskList.append( ( taskId, eTask.taskObj, eType ) )
+    if not taskList:
+      return failed
     try:
-      result = self.__cbHolder.cbSendTask( taskId, self.__tasks[ taskId ].taskObj, eId, eType )
+      result = self.__cbHolder.cbSendTasks( eId, taskList )
     except:
-      self.__log.exception( "Exception while sending task to executor" )
-      return S_ERROR( "Exception while sending task to executor" )
-    if isReturnStructure( result ):
-      return result
-    else:
-      errMsg = "Send task callback did not send back an S_OK/S_ERROR structure"
+      self.__log.exception( "Exception while sending tasks to executor" )
+      result = S_ERROR( "Exception while sending tasks to executor" )
+    if not isReturnStructure( result ):
+      errMsg = "Send tasks callback did not send back an S_OK/S_ERROR structure"
       self.__log.fatal( errMsg )
-      return S_ERROR( "Send task callback did not send back an S_OK/S_ERROR structure" )
-    #Seems an executor problem
-    self.__log.verbose( "Disconnecting executor" )
-    self.removeExecutor( eId )
-    return S_ERROR( "Exception while sending task to executor" )
+      result = S_ERROR( errMsg )
+    if not result[ 'OK' ]:
+      for taskId, taskObj, eType in taskList:
+        failed[ taskId ] = result[ 'Message' ]
+    else:
+      failed.update( result[ 'Value' ] )
+    return failed
 
 if __name__ == "__main__":
   def testExecState():
@@ -7,15 +7,25 @@
 """ The Process Monitor utility allows to calculate cumulative CPU time for a given PID
     and it's process group.  This is only implemented for linux / proc file systems
     but could feasibly be extended in the future.
+
+    The /proc file system is read directly, without forking any command, and the
+    process tree is built from a single scan of /proc per call.
 """
 
 from DIRAC import gLogger, S_OK, S_ERROR
-from DIRAC.Core.Utilities.Subprocess import shellCall
 
 __RCSID__ = "$Id$"
 
 import os, re, platform
 
+# Clock ticks per second and memory page size used in /proc/<pid>/stat
+try:
+  CLOCK_TICKS = os.sysconf( 'SC_CLK_TCK' )
+  PAGE_SIZE = os.sysconf( 'SC_PAGE_SIZE' )
+except ( AttributeError, ValueError, OSError ):
+  CLOCK_TICKS = 100
+  PAGE_SIZE = 4096
+
 class ProcessMonitor:
 
   #############################################################################
@@ -40,94 +50,100 @@ class ProcessMonitor:
   #############################################################################
   def getCPUConsumedLinux( self, pid ):
     """Returns the CPU consumed given a PID assuming a proc file system exists.
+       The CPU of the process, of its descendants and of the orphan processes
+       in the same process group is added, including the CPU of their already
+       terminated children.
     """
-    masterProcPath = '/proc/%s/stat' % ( pid )
-    if not os.path.exists( masterProcPath ):
-      return S_ERROR( 'Process %s does not exist' % ( pid ) )
+    result = self.getJobProcessesLinux( pid )
+    if not result['OK']:
+      return result
 
-    #Get the current process list
-    pidListResult = self.__getProcListLinux()
-    if not pidListResult['OK']:
-      return pidListResult
-
-    pidList = pidListResult['Value']
-    currentCPU = 0
-    #Now recursively add all child process CPU contributions
-    childCPUResult = self.__getChildCPUConsumedLinux( pid, pidList )
-    currentCPU += childCPUResult
-
-    procGroup = self.__getProcGroupLinux( pid )
-    if not procGroup['OK']:
-      return procGroup
-
-    procGroup = procGroup['Value'].strip()
-
-    #Next add any contributions from orphan processes in same process group
-    for pidCheck in pidList:
-      info = self.__getProcInfoLinux( pidCheck )
-      if info['OK']:
-        info = info['Value']
-        if info[4] == procGroup:
-          contribution = float( info[13] ) / 100 + float( info[14] ) / 100 + float( info[15] ) / 100 + float( info[16] ) / 100
-          currentCPU += contribution
-          self.log.debug( 'Added %s to CPU total (now %s) from orphan PID %s %s' % ( contribution, currentCPU, info[0], info[1] ) )
+    currentCPU = 0.
+    for procDict in result['Value'].values():
+      currentCPU += procDict['CPU']
 
     self.log.verbose( 'Final CPU estimate is %s' % currentCPU )
     return S_OK( currentCPU )
 
   #############################################################################
-  def __getProcListLinux( self ):
-    """Gets list of process IDs from /proc/*.
+  def getJobProcessesLinux( self, pid, snapshot = None ):
+    """Returns the processes belonging to the job started by PID as { pid : procDict },
+       see getProcessSnapshotLinux. These are the process, its descendants and the
+       processes in the same process group (e.g. orphans re-parented to init).
+       The process tree is built from a single scan of /proc unless a snapshot
+       is given.
     """
-    result = shellCall( 10, 'ls -d /proc/[0-9]*' )
+    pid = int( pid )
+    if snapshot is None:
+      snapshot = self.getProcessSnapshotLinux()
+    if not snapshot.has_key( pid ):
+      return S_ERROR( 'Process %s does not exist' % ( pid ) )
 
-    if not result['OK']:
-      if not 'Value' in result:
-        return result
-    procList = result['Value'][1].replace( '/proc', '' ).split( '\n' )
+    children = {}
+    for childPID, procDict in snapshot.items():
+      children.setdefault( procDict['PPID'], [] ).append( childPID )
+
+    jobPIDs = set()
+    toCheck = [ pid ]
+    while toCheck:
+      checkPID = toCheck.pop()
+      if checkPID not in jobPIDs:
+        jobPIDs.add( checkPID )
+        toCheck += children.get( checkPID, [] )
+
+    procGroup = snapshot[pid]['PGRP']
+    for checkPID, procDict in snapshot.items():
+      if procDict['PGRP'] == procGroup:
+        jobPIDs.add( checkPID )
 
-    return S_OK( procList )
+    return S_OK( dict( [ ( jobPID, snapshot[jobPID] ) for jobPID in jobPIDs ] ) )
 
   #############################################################################
-  def __getChildCPUConsumedLinux( self, pid, pidList ):
-    """Adds contributions to CPU total from child processes recursively.
+  def getProcessSnapshotLinux( self ):
+    """Reads /proc/<pid>/stat of all the processes without forking any command.
+       Returns { pid : { 'PPID', 'PGRP', 'Name', 'CPU', 'RSS' } }, CPU being the user and
+       system time of the process and of its terminated children in seconds and
+       RSS the resident memory in kB. Processes ending during the scan are skipped.
     """
-    childCPU = 0
-    for pidCheck in pidList:
-      info = self.__getProcInfoLinux( pidCheck )
-      if info['OK']:
-        info = info['Value']
-        if info[3] == pid:
-          contribution = float( info[13] ) / 100 + float( info[14] ) / 100 + float( info[15] ) / 100 + float( info[16] ) / 100
-          childCPU += contribution
-          self.log.debug( 'Added %s to CPU total (now %s) from child PID %s %s' % ( contribution, childCPU, info[0], info[1] ) )
-          childCPU += self.__getChildCPUConsumedLinux( pidCheck, pidList )
-
-    return childCPU
+    snapshot = {}
+    try:
+      procList = os.listdir( '/proc' )
+    except OSError, x:
+      self.log.warn( 'Not able to list /proc', str( x ) )
+      return snapshot
+
+    for procName in procList:
+      if not procName.isdigit():
+        continue
+      procDict = self.__getProcInfoLinux( procName )
+      if procDict:
+        snapshot[int( procName )] = procDict
+
+    return snapshot
 
   #############################################################################
   def __getProcInfoLinux( self, pid ):
-    """Attempts to read /proc/PID/stat and returns list of items if ok.
+    """Reads /proc/PID/stat and returns the process information, None if not possible.
     """
-    procPath = '/proc/%s/stat' % ( pid )
     try:
-      fopen = open( procPath, 'r' )
-      procStat = fopen.readline()
+      fopen = open( '/proc/%s/stat' % ( pid ), 'r' )
+      procStat = fopen.read()
       fopen.close()
-    except Exception:
-      return S_ERROR( 'Not able to check %s' % pid )
-    return S_OK( procStat.split( ' ' ) )
-
-  #############################################################################
-  def __getProcGroupLinux( self, pid ):
-    """Returns UID for given PID.
-    """
-    result = shellCall( 10, 'ps --no-headers -o pgrp -p %s' % ( pid ) )
-    if not result['OK']:
-      if  not 'Value' in result:
-        return result
+    except IOError:
+      return None
 
-    return S_OK( result['Value'][1] )
+    # The command name is in parentheses and may contain blanks and parentheses itself
+    nameEnd = procStat.rfind( ')' )
+    fields = procStat[nameEnd + 2:].split()
+    try:
+      cpuTicks = int( fields[11] ) + int( fields[12] ) + int( fields[13] ) + int( fields[14] )
+      return { 'PPID' : int( fields[1] ),
+               'PGRP' : int( fields[2] ),
+               'Name' : procStat[procStat.find( '(' ) + 1:nameEnd],
+               'CPU'  : float( cpuTicks ) / CLOCK_TICKS,
+               'RSS'  : int( fields[21] ) * PAGE_SIZE / 1024 }
+    except ( IndexError, ValueError ):
+      return None
 
   #############################################################################
   def __checkCurrentOS( self ):
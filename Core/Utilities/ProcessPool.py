@@ -71,6 +71,39 @@ has to call::
 
   pool.daemonize()
 
+Worker initialisation
+---------------------
+
+Expensive set up (loading plugins, creating clients, getting proxies...) could be done only once per worker
+subprocess, instead of once per task, by giving the :ProcessPool: a worker initializer::
+
+  pool = ProcessPool( minSize, maxSize, maxQueuedRequests,
+                      workerInitializer = initDef,
+                      workerInitializerArgs = ( arg1, arg2, ... ),
+                      keepProcessesRunning = True )
+
+:initDef: is executed in each newly started worker subprocess before the first task is read, all the tasks
+executed later on in that subprocess could reuse whatever it has set up (i.e. module or class level caches).
+With :keepProcessesRunning: flag set idle workers are not destroyed after 10 idle loops, so the set up
+is not lost between agent cycles.
+
+Pipe based pool
+---------------
+
+For many short tasks the overhead of pickling whole :ProcessTask: objects through queues could be
+significant. :PipeProcessPool: forks its workers only once and feeds them through pipes with compact task
+descriptors (module and name of the callable plus arguments), keeping callbacks in the parent process. Big
+results are handed back through memory backed files instead of the pipe::
+
+  pool = PipeProcessPool( size = 4, queueDepth = 4, poolCallback = cb, shmThreshold = 65536 )
+  for i in range( 1000 ):
+    pool.createAndQueueTask( funcDef, args = ( i, ), usePoolCallbacks = True )
+  pool.processAllResults()
+  pool.finalize()
+
+It has no background thread: results are read when :processResults: is called or while
+:createAndQueueTask: is waiting for a free slot. Task time outs are not supported.
+
 Callback functions
 ------------------
 
@@ -106,6 +139,12 @@ import threading
 import os
 import signal
 import Queue
+import select
+import mmap
+import tempfile
+import glob
+import traceback
+import cPickle
 from types import FunctionType, TypeType, ClassType
 
 try:
@@ -146,13 +185,17 @@ class WorkingProcess( multiprocessing.Process ):
   * when parent process PID is set to 1 (init process, parent process with ProcessPool is dead).
   """
 
-  def __init__( self, pendingQueue, resultsQueue, stopEvent ):
+  def __init__( self, pendingQueue, resultsQueue, stopEvent, initializer = None, initializerArgs = None,
+                keepRunning = False ):
     """ c'tor
 
     :param self: self refernce
     :param multiprocessing.Queue pendingQueue: queue storing ProcessTask before exection
     :param multiprocessing.Queue resultsQueue: queue storing callbacks and exceptionCallbacks
     :param multiprocessing.Event stopEvent: event to stop processing
+    :param callable initializer: function executed once at worker start
+    :param tuple initializerArgs: arguments for :initializer:
+    :param bool keepRunning: flag to keep worker alive when idle
     """
     multiprocessing.Process.__init__( self )
     ## daemonize
@@ -171,6 +214,14 @@ class WorkingProcess( multiprocessing.Process ):
     self.__watchdogThread = None
     ## placeholder for process thread
     self.__processThread = None
+    ## process thread input queue and task done event
+    self.__threadQueue = None
+    self.__threadTaskDone = None
+    ## worker initializer and its args
+    self.__initializer = initializer
+    self.__initializerArgs = initializerArgs or ()
+    ## flag to keep idle worker alive
+    self.__keepRunning = keepRunning
     ## placeholder for current task
     self.task = None
     ## start yourself at least    
@@ -208,13 +259,34 @@ class WorkingProcess( multiprocessing.Process ):
     """
     return self.__taskCounter
     
-  def __processTask( self ):
-    """ processThread target
+  def __processTasks( self, threadQueue, taskDone ):
+    """ processThread target, executing tasks one after another
+
+    queue and event are passed as arguments, so a thread abandoned after timeout
+    is never reading tasks dedicated to its successor
+
+    :param self: self reference
+    :param Queue.Queue threadQueue: tasks to execute
+    :param threading.Event taskDone: event set when task is processed
+    """
+    while True:
+      task = threadQueue.get()
+      try:
+        task.process()
+      finally:
+        taskDone.set()
+
+  def __startProcessThread( self ):
+    """ (re)start the long living processThread
 
     :param self: self reference
     """
-    if self.task:
-      self.task.process()
+    self.__threadQueue = Queue.Queue()
+    self.__threadTaskDone = threading.Event()
+    self.__processThread = threading.Thread( target = self.__processTasks,
+                                             args = ( self.__threadQueue, self.__threadTaskDone ) )
+    self.__processThread.daemon = True
+    self.__processThread.start()
 
   def run( self ):
     """ task execution
@@ -236,6 +308,14 @@ class WorkingProcess( multiprocessing.Process ):
       lr._openAll()
       lr._setAllEvents()
 
+    ## one time set up of this worker
+    if self.__initializer:
+      try:
+        self.__initializer( *self.__initializerArgs )
+      except Exception:
+        if gLogger:
+          gLogger.exception( "Exception in worker initializer" )
+
     ## zero processed task counter
     taskCounter = 0
     ## zero idle loop counter
@@ -258,7 +338,7 @@ class WorkingProcess( multiprocessing.Process ):
         ## idle loop?
         idleLoopCount += 1
         ## 10th idle loop - exit, nothing to do 
-        if idleLoopCount == 10:
+        if idleLoopCount == 10 and not self.__keepRunning:
           return 
         continue
 
@@ -269,19 +349,23 @@ class WorkingProcess( multiprocessing.Process ):
       ## reset idle loop counter
       idleLoopCount = 0
 
-      ## process task in a separate thread
-      self.__processThread = threading.Thread( target = self.__processTask )
-      self.__processThread.start()
+      ## process task in a separate, long living thread
+      if not self.__processThread or not self.__processThread.is_alive():
+        self.__startProcessThread()
+      self.__threadTaskDone.clear()
+      self.__threadQueue.put( task )
 
-      ## join processThread with or without timeout
+      ## wait for processThread with or without timeout
       if self.task.getTimeOut():
-        self.__processThread.join( self.task.getTimeOut()+10 )
+        self.__threadTaskDone.wait( self.task.getTimeOut()+10 )
       else:
-        self.__processThread.join()
+        while not self.__threadTaskDone.is_set():
+          self.__threadTaskDone.wait( 60 )
 
-      ## processThread is still alive? stop it!
-      if self.__processThread.is_alive():
+      ## processThread is still busy? stop it, a new one will be started for next task
+      if not self.__threadTaskDone.is_set():
         self.__processThread._Thread__stop()
+        self.__processThread = None
       
       ## check results and callbacks presence, put task to results queue
       if self.task.hasCallback() or self.task.hasPoolCallback():
@@ -539,7 +623,8 @@ class ProcessPool( object ):
   
   """
   def __init__( self, minSize = 2, maxSize = 0, maxQueuedRequests = 10,
-                strictLimits = True, poolCallback=None, poolExceptionCallback=None ):
+                strictLimits = True, poolCallback=None, poolExceptionCallback=None,
+                workerInitializer = None, workerInitializerArgs = None, keepProcessesRunning = False ):
     """ c'tor
 
     :param self: self reference
@@ -549,6 +634,9 @@ class ProcessPool( object ):
     :param bool strictLimits: flag to workers overcommitment
     :param callable poolCallbak: results callback
     :param callable poolExceptionCallback: exception callback
+    :param callable workerInitializer: function executed once in every new worker
+    :param tuple workerInitializerArgs: arguments for workerInitializer
+    :param bool keepProcessesRunning: flag to keep idle workers alive
     """
     ## min workers
     self.__minSize = max( 1, minSize )
@@ -563,6 +651,11 @@ class ProcessPool( object ):
     self.__poolCallback = poolCallback
     ## pool exception callback
     self.__poolExceptionCallback = poolExceptionCallback
+    ## worker initializer and its args
+    self.__workerInitializer = workerInitializer
+    self.__workerInitializerArgs = workerInitializerArgs
+    ## flag to keep idle workers alive
+    self.__keepProcessesRunning = keepProcessesRunning
 
     ## pending queue
     self.__pendingQueue = multiprocessing.Queue( self.__maxQueuedRequests )
@@ -618,6 +711,17 @@ class ProcessPool( object ):
     if callable( exceptionCallback ):
       self.__poolExceptionCallback = exceptionCallback
 
+  def setWorkerInitializer( self, workerInitializer, workerInitializerArgs = None ):
+    """ set worker initializer, it will be executed in workers spawned from now on
+
+    :param self: self reference
+    :param callable workerInitializer: function executed once in every new worker
+    :param tuple workerInitializerArgs: arguments for workerInitializer
+    """
+    if callable( workerInitializer ):
+      self.__workerInitializer = workerInitializer
+      self.__workerInitializerArgs = workerInitializerArgs
+
   def getMaxSize( self ):
     """ maxSize getter
 
@@ -672,7 +776,9 @@ class ProcessPool( object ):
     """
     self.__prListLock.acquire()
     try:
-      worker = WorkingProcess( self.__pendingQueue, self.__resultsQueue, self.__stopEvent )
+      worker = WorkingProcess( self.__pendingQueue, self.__resultsQueue, self.__stopEvent,
+                               self.__workerInitializer, self.__workerInitializerArgs,
+                               self.__keepProcessesRunning )
       while worker.pid == None:
         time.sleep(0.1)
       self.__workersDict[ worker.pid ] = worker
@@ -906,3 +1012,378 @@ class ProcessPool( object ):
     """
     self.finalize( timeout = 10 )
 
+
+class PipeWorker( multiprocessing.Process ):
+  """
+  .. class:: PipeWorker
+
+  Pre-forked worker subprocess used by :PipeProcessPool:.
+
+  Reads compact task descriptors ( taskID, module, name, args, kwargs ) from its end of the pipe,
+  executes them and sends back ( taskID, kind, payload ), where kind is:
+
+  * "R" - payload is pickled result
+  * "M" - pickled result has been written to a memory backed file, payload is ( path, size )
+  * "E" - task raised, payload is ( exception string, formatted traceback )
+
+  None read from the pipe or parent process death stops the worker.
+  """
+
+  def __init__( self, connection, shmThreshold, shmDir, initializer = None, initializerArgs = None,
+                shmPrefix = "ProcessPool_" ):
+    """ c'tor
+
+    :param self: self reference
+    :param Connection connection: worker's end of the pipe
+    :param int shmThreshold: size in bytes above which results are sent through shared memory
+    :param str shmDir: directory for shared memory files
+    :param callable initializer: function executed once at worker start
+    :param tuple initializerArgs: arguments for :initializer:
+    :param str shmPrefix: shared memory file name prefix, worker pid is appended to it
+    """
+    multiprocessing.Process.__init__( self )
+    self.daemon = True
+    self.__connection = connection
+    self.__shmThreshold = shmThreshold
+    self.__shmDir = shmDir
+    self.__shmPrefix = shmPrefix
+    self.__initializer = initializer
+    self.__initializerArgs = initializerArgs or ()
+    ## resolved callables cache
+    self.__callables = {}
+
+  def __resolve( self, module, name ):
+    """ get callable object :name: from :module: """
+    key = ( module, name )
+    if key not in self.__callables:
+      mod = sys.modules.get( module )
+      if not mod:
+        mod = __import__( module, globals(), locals(), [ name ] )
+      self.__callables[key] = getattr( mod, name )
+    return self.__callables[key]
+
+  def __sendResult( self, taskID, result ):
+    """ pickle and send :result:, using shared memory file for big ones """
+    payload = cPickle.dumps( result, cPickle.HIGHEST_PROTOCOL )
+    if len( payload ) < self.__shmThreshold:
+      self.__connection.send( ( taskID, "R", payload ) )
+      return
+    fd, path = tempfile.mkstemp( prefix = "%s%s_" % ( self.__shmPrefix, os.getpid() ), dir = self.__shmDir )
+    try:
+      written = 0
+      while written < len( payload ):
+        written += os.write( fd, buffer( payload, written ) )
+    finally:
+      os.close( fd )
+    self.__connection.send( ( taskID, "M", ( path, len( payload ) ) ) )
+
+  def run( self ):
+    """ task execution loop
+
+    :param self: self reference
+    """
+    if LockRing:
+      lr = LockRing()
+      lr._openAll()
+      lr._setAllEvents()
+    if self.__initializer:
+      try:
+        self.__initializer( *self.__initializerArgs )
+      except Exception:
+        if gLogger:
+          gLogger.exception( "Exception in worker initializer" )
+    ppid = os.getppid()
+    while True:
+      ## parent is dead?
+      if os.getppid() != ppid:
+        return
+      if not self.__connection.poll( 10 ):
+        continue
+      try:
+        descriptor = self.__connection.recv()
+      except ( EOFError, IOError ):
+        return
+      if descriptor is None:
+        return
+      taskID, module, name, args, kwargs = descriptor
+      try:
+        taskFunction = self.__resolve( module, name )
+        result = taskFunction( *args, **kwargs )
+        if type( taskFunction ) in ( TypeType, ClassType ):
+          if not callable( result ):
+            raise TypeError( "__call__ operator not defined not in %s class" % taskFunction.__name__ )
+          result = result()
+      except Exception, error:
+        self.__connection.send( ( taskID, "E", ( str( error ), traceback.format_exc() ) ) )
+        continue
+      try:
+        self.__sendResult( taskID, result )
+      except Exception, error:
+        self.__connection.send( ( taskID, "E", ( str( error ), traceback.format_exc() ) ) )
+
+class PipeProcessPool( object ):
+  """
+  .. class:: PipeProcessPool
+
+  Higher throughput variant of :ProcessPool: for short tasks.
+
+  * a fixed number of :PipeWorker: subprocesses is forked once, at construction time
+  * each worker is fed through its own pipe with compact task descriptors: module and name of the
+    callable plus its arguments, callbacks and task objects never leave the parent process
+  * results bigger than :shmThreshold: bytes are handed back through files in memory backed
+    :shmDir: (/dev/shm if available), read with mmap and removed by the parent, files named
+    ProcessPool_<parent pid>_<worker pid>_* left by dropped workers are removed as well
+  * there is no daemon thread and no polling of queues, results are read with select() when
+    :processResults: is called or while waiting for a free slot in :createAndQueueTask:
+
+  Tasks are module level functions or callable classes, exactly as for :ProcessPool:. Per task callbacks
+  are called with ( taskID, taskResult ) and ( taskID, taskException ), the same signature as pool callbacks.
+  Task time outs are not supported.
+  """
+  def __init__( self, size = 2, queueDepth = 2, poolCallback = None, poolExceptionCallback = None,
+                shmThreshold = 65536, shmDir = None, workerInitializer = None, workerInitializerArgs = None ):
+    """ c'tor
+
+    :param self: self reference
+    :param int size: number of worker subprocesses
+    :param int queueDepth: max number of tasks sent to a single worker and not yet done
+    :param callable poolCallback: results callback
+    :param callable poolExceptionCallback: exception callback
+    :param int shmThreshold: pickled results of at least that many bytes are sent through shared memory
+    :param str shmDir: directory for shared memory files, /dev/shm or system tmp dir if not set
+    :param callable workerInitializer: function executed once in every worker
+    :param tuple workerInitializerArgs: arguments for workerInitializer
+    """
+    self.__size = max( 1, int( size ) )
+    self.__queueDepth = max( 1, int( queueDepth ) )
+    self.__poolCallback = poolCallback
+    self.__poolExceptionCallback = poolExceptionCallback
+    self.__shmThreshold = shmThreshold
+    if not shmDir:
+      shmDir = "/dev/shm" if os.access( "/dev/shm", os.W_OK ) else tempfile.gettempdir()
+    self.__shmDir = shmDir
+    self.__shmPrefix = "ProcessPool_%s_" % os.getpid()
+    self.__workerInitializer = workerInitializer
+    self.__workerInitializerArgs = workerInitializerArgs
+    ## { fileno : ( worker, connection ) }
+    self.__workers = {}
+    ## { fileno : { taskID : ( callback, exceptionCallback, usePoolCallbacks ) } }
+    self.__inFlight = {}
+    ## task counter for automatic taskIDs
+    self.__taskCounter = 0
+    for i in range( self.__size ):
+      self.__spawnWorker()
+
+  def __spawnWorker( self ):
+    """ fork a new worker """
+    parentEnd, childEnd = multiprocessing.Pipe()
+    worker = PipeWorker( childEnd, self.__shmThreshold, self.__shmDir,
+                         self.__workerInitializer, self.__workerInitializerArgs, self.__shmPrefix )
+    worker.start()
+    childEnd.close()
+    self.__workers[parentEnd.fileno()] = ( worker, parentEnd )
+    self.__inFlight[parentEnd.fileno()] = {}
+
+  def __dropWorker( self, fileno ):
+    """ remove dead worker, fail its tasks and fork a replacement """
+    worker, connection = self.__workers.pop( fileno )
+    lost = self.__inFlight.pop( fileno )
+    if worker.is_alive():
+      worker.terminate()
+    worker.join( 1 )
+    self.__discardMessages( connection )
+    connection.close()
+    self.__removeShmFiles( "%s%s_" % ( self.__shmPrefix, worker.pid ) )
+    for taskID, callbacks in lost.items():
+      self.__doCallbacks( taskID, callbacks, None, "worker process %s died" % worker.pid )
+    self.__spawnWorker()
+
+  def getSize( self ):
+    """ number of worker subprocesses """
+    return self.__size
+
+  def getFreeSlots( self ):
+    """ number of tasks that could be sent now without blocking """
+    return sum( [ self.__queueDepth - len( tasks ) for tasks in self.__inFlight.values() ] )
+
+  def getNumPendingTasks( self ):
+    """ number of tasks sent and not processed yet """
+    return sum( [ len( tasks ) for tasks in self.__inFlight.values() ] )
+
+  def isWorking( self ):
+    """ check if there are any tasks in flight """
+    return self.getNumPendingTasks() > 0
+
+  def createAndQueueTask( self, taskFunction, args = None, kwargs = None, taskID = None,
+                          callback = None, exceptionCallback = None, blocking = True, usePoolCallbacks = False ):
+    """ send task to the least loaded worker
+
+    :param self: self reference
+    :param mixed taskFunction: module level function or callable class
+    :param tuple args: non-keyword arguments passed to taskFunction
+    :param dict kwargs: keyword arguments passed to taskFunction
+    :param mixed taskID: task Id, generated if not set
+    :param callable callback: callback( taskID, taskResult )
+    :param callable exceptionCallback: callback( taskID, taskException )
+    :param bool blocking: wait for free slot if all workers are busy
+    :param bool usePoolCallbacks: fire execution of pool defined callbacks after task callbacks
+    """
+    if type( taskFunction ) not in ( FunctionType, TypeType, ClassType ):
+      return S_ERROR( "taskFunction should be a function or a class" )
+    if taskID is None:
+      taskID = self.__taskCounter
+    self.__taskCounter += 1
+    while True:
+      fileno = min( self.__inFlight, key = lambda fd: len( self.__inFlight[fd] ) )
+      if len( self.__inFlight[fileno] ) < self.__queueDepth:
+        break
+      if not blocking:
+        return S_ERROR( "Queue is full" )
+      self.processResults( timeout = 1 )
+    descriptor = ( taskID, taskFunction.__module__, taskFunction.__name__,
+                   tuple( args or () ), dict( kwargs or {} ) )
+    try:
+      self.__workers[fileno][1].send( descriptor )
+    except Exception, error:
+      return S_ERROR( "Unable to send task %s: %s" % ( taskID, str( error ) ) )
+    self.__inFlight[fileno][taskID] = ( callback, exceptionCallback, usePoolCallbacks )
+    return S_OK( taskID )
+
+  def __readPayload( self, kind, payload ):
+    """ unpickle result sent inline or through shared memory file """
+    if kind == "R":
+      return cPickle.loads( payload )
+    path, size = payload
+    fd = os.open( path, os.O_RDONLY )
+    try:
+      os.unlink( path )
+      shm = mmap.mmap( fd, size, access = mmap.ACCESS_READ )
+      try:
+        return cPickle.loads( shm[:] )
+      finally:
+        shm.close()
+    finally:
+      os.close( fd )
+
+  def __discardMessages( self, connection ):
+    """ read and drop results left in the pipe, removing their shared memory files """
+    try:
+      while connection.poll():
+        taskID, kind, payload = connection.recv()
+        if kind == "M":
+          try:
+            os.unlink( payload[0] )
+          except OSError:
+            pass
+    except ( EOFError, IOError ):
+      pass
+
+  def __removeShmFiles( self, prefix ):
+    """ remove shared memory files starting with :prefix: nobody is going to read """
+    for path in glob.glob( os.path.join( self.__shmDir, "%s*" % prefix ) ):
+      try:
+        os.unlink( path )
+      except OSError:
+        pass
+
+  def __doCallbacks( self, taskID, callbacks, result, error = None ):
+    """ execute task and pool callbacks """
+    callback, exceptionCallback, usePoolCallbacks = callbacks
+    if error is not None:
+      taskException = S_ERROR( "Exception" )
+      if type( error ) is tuple:
+        taskException["Value"], taskException["Exc_info"] = error
+      else:
+        taskException["Value"] = error
+      callbacks = [ exceptionCallback ]
+      if usePoolCallbacks:
+        callbacks.append( self.__poolExceptionCallback )
+      argument = taskException
+    else:
+      callbacks = [ callback ]
+      if usePoolCallbacks:
+        callbacks.append( self.__poolCallback )
+      argument = result
+    for func in callbacks:
+      if not func:
+        continue
+      try:
+        func( taskID, argument )
+      except Exception:
+        if gLogger:
+          gLogger.exception( "Exception in callback for task %s" % taskID )
+
+  def processResults( self, timeout = 0 ):
+    """ read results ready in the pipes and execute callbacks
+
+    :param self: self reference
+    :param float timeout: max time in seconds to wait for the first result
+    :return: number of processed results
+    """
+    processed = 0
+    busy = [ self.__workers[fileno][1] for fileno, tasks in self.__inFlight.items() if tasks ]
+    if not busy:
+      return processed
+    try:
+      ready = select.select( busy, [], [], timeout )[0]
+    except select.error:
+      return processed
+    for connection in ready:
+      fileno = connection.fileno()
+      while fileno in self.__workers and connection.poll():
+        try:
+          taskID, kind, payload = connection.recv()
+        except ( EOFError, IOError ):
+          self.__dropWorker( fileno )
+          break
+        callbacks = self.__inFlight[fileno].pop( taskID, ( None, None, False ) )
+        if kind == "E":
+          self.__doCallbacks( taskID, callbacks, None, payload )
+        else:
+          try:
+            result = self.__readPayload( kind, payload )
+          except Exception, error:
+            self.__doCallbacks( taskID, callbacks, None, str( error ) )
+          else:
+            self.__doCallbacks( taskID, callbacks, result )
+        processed += 1
+    ## check for workers killed without closing pipe
+    for fileno in [ fileno for fileno, ( worker, connection ) in self.__workers.items() if not worker.is_alive() ]:
+      self.__dropWorker( fileno )
+    return processed
+
+  def processAllResults( self, timeout = 10 ):
+    """ process results of all tasks in flight
+
+    :param self: self reference
+    :param int timeout: max time to wait in seconds
+    """
+    start = time.time()
+    while self.isWorking():
+      left = timeout - ( time.time() - start )
+      if left <= 0:
+        break
+      self.processResults( timeout = min( left, 1 ) )
+
+  def finalize( self, timeout = 60 ):
+    """ process results of tasks in flight and stop workers
+
+    :param self: self reference
+    :param timeout: seconds to wait before killing
+    """
+    self.processAllResults( timeout )
+    for worker, connection in self.__workers.values():
+      try:
+        connection.send( None )
+      except Exception:
+        pass
+    for worker, connection in self.__workers.values():
+      worker.join( 5 )
+      if worker.is_alive():
+        worker.terminate()
+        worker.join( 1 )
+      self.__discardMessages( connection )
+      connection.close()
+    self.__workers = {}
+    self.__inFlight = {}
+    self.__removeShmFiles( self.__shmPrefix )
@@ -10,16 +10,55 @@
 
 __RCSID__ = "$Id$"
 
+import threading
+
 from DIRAC import S_OK, S_ERROR
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.ConfigurationSystem.Client.Helpers.Resources import Resources, getSiteFullNames
 
+# The mappings only depend on the CS, they are built once per CS version
+__cacheLock = threading.Lock()
+__cacheVersion = None
+__siteSEMapping = {}
+__seSiteMapping = {}
+
+def __getMappings():
+  """ Get the site -> SEs and SE -> sites mappings for the current CS version
+  """
+  global __cacheVersion, __siteSEMapping, __seSiteMapping
+  __cacheLock.acquire()
+  try:
+    currentVersion = gConfigurationData.getVersion()
+    if currentVersion != __cacheVersion:
+      result = __buildSiteSEMapping()
+      if not result['OK']:
+        return result
+      __siteSEMapping = result['Value']
+      __seSiteMapping = {}
+      for site, seList in __siteSEMapping.items():
+        for se in seList:
+          __seSiteMapping.setdefault( se, [] ).append( site )
+      __cacheVersion = currentVersion
+    return S_OK( ( __siteSEMapping, __seSiteMapping ) )
+  finally:
+    __cacheLock.release()
+
 #############################################################################
 def getSiteSEMapping():
   """ Returns a dictionary of all sites and their localSEs as a list, e.g.
       {'LCG.CERN.ch':['CERN-RAW','CERN-RDST',...]}
       If gridName is specified, result is restricted to that Grid type.
   """
+  result = __getMappings()
+  if not result['OK']:
+    return result
+  siteSEMapping = result['Value'][0]
+  return S_OK( dict( [ ( site, list( seList ) ) for site, seList in siteSEMapping.items() ] ) )
+
+def __buildSiteSEMapping():
+  """ Build the site -> SEs mapping from the CS
+  """
   siteSEMapping = {}
   resourceHelper = Resources()
   result = resourceHelper.getEligibleSites()
@@ -46,7 +85,7 @@ def getSiteSEMapping():
     mapping = result['Value']
     for site in mapping:
       if site not in siteSEMapping:
-        siteSEMapping[site] = mapping[site]
+        siteSEMapping[site] = list( mapping[site] )
       else:  
         for se in mapping[site]:
           if se not in siteSEMapping[site]:
@@ -83,33 +122,22 @@ def getSitesForSE( storageElement, gridName = '' ):
       Optionally restrict to Grid specified by name.
   """
 
-  result = getSiteSEMapping( gridName )
+  result = __getMappings()
   if not result['OK']:
     return result
-
-  mapping = result['Value']
-
-  finalSites = []
-
-  for site in mapping:
-    if storageElement in mapping[site]:
-      finalSites.append( site )
-  return S_OK( finalSites )
+  seSiteMapping = result['Value'][1]
+  return S_OK( list( seSiteMapping.get( storageElement, [] ) ) )
 
 
 #############################################################################
 def getSEsForSite( siteName ):
   """ Given a DIRAC site name this method returns a list of corresponding SEs.
   """
-  result = getSiteSEMapping()
+  result = __getMappings()
   if not result['OK']:
     return result
-
-  mapping = result['Value']
-  if siteName in mapping:
-    return S_OK( mapping[siteName] )
-
-  return S_OK( [] )
+  siteSEMapping = result['Value'][0]
+  return S_OK( list( siteSEMapping.get( siteName, [] ) ) )
 
 #############################################################################
 def isSameSiteSE( se1, se2 ):
@@ -0,0 +1,83 @@
+########################################################################
+# $HeadURL $
+# File: ClassAdBenchmark.py
+########################################################################
+""" :mod: ClassAdBenchmark
+    ======================
+
+    .. module: ClassAdBenchmark
+    :synopsis: timing of the ClassAd parsing of large JDLs
+
+    Builds the JDL of a job with nFiles input LFNs and of a parametric job with
+    nFiles parameters and times for both the parsing of the JDL, the first and the
+    repeated access to the list, the serialization of the parsed ClassAd and its
+    loading from the serialized form, as done by the JobDB for the stored parsed JDLs::
+
+      python ClassAdBenchmark.py [nFiles [nLoops]]
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import sys
+import time
+## SUT
+from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
+
+JDL_TEMPLATE = """[
+  Executable = "dirac-jobexec";
+  Arguments = "jobDescription.xml -o LogLevel=info";
+  JobName = "ClassAdBenchmark";
+  JobGroup = "00020000";
+  Priority = 1;
+  CPUTime = 86400;
+  Site = "ANY";
+  BannedSites = { "LCG.Bad1.org", "LCG.Bad2.org" };
+  InputSandbox = { "jobDescription.xml", "LFN:/lhcb/user/s/someone/prodConf.py" };
+  OutputSandbox = { "std.out", "std.err", "*.log" };
+  %s =
+       {
+%s
+       };
+  Parameters.Step = 1;
+  SubmitPools = "Default";
+]"""
+
+def makeJDL( attribute, nFiles ):
+  """ JDL with a list of nFiles items of the kind of :attribute: """
+  if attribute == "InputData":
+    items = [ '         "LFN:/lhcb/MC/2012/ALLSTREAMS.DST/00020000/0000/00020000_%08d_1.allstreams.dst"' % i
+              for i in xrange( nFiles ) ]
+  else:
+    items = [ '         "%08d"' % i for i in xrange( nFiles ) ]
+  return JDL_TEMPLATE % ( attribute, ",\n".join( items ) )
+
+def timeIt( name, nLoops, method, *args ):
+  """ print wall time per call of :method: """
+  start = time.time()
+  for _i in xrange( nLoops ):
+    result = method( *args )
+  print "  %-28s %10.5f s" % ( name, ( time.time() - start ) / nLoops )
+  return result
+
+def benchmark( attribute, jdl, nLoops ):
+  """ time all the steps for one JDL """
+  print "%s JDL of %d bytes" % ( attribute, len( jdl ) )
+  classAd = timeIt( "parse", nLoops, ClassAd, jdl )
+  timeIt( "parse + list access", nLoops, lambda: ClassAd( jdl ).getListFromExpression( attribute ) )
+  classAd.getListFromExpression( attribute )
+  timeIt( "cached list access", nLoops, classAd.getListFromExpression, attribute )
+  data = timeIt( "serialize", nLoops, classAd.serialize )
+  print "  %-28s %10d bytes" % ( "serialized size", len( data ) )
+  loaded = timeIt( "load serialized + list", nLoops,
+                   lambda: ClassAd.fromSerialized( data ).getListFromExpression( attribute ) )
+  if loaded != classAd.getListFromExpression( attribute ):
+    print "  ERROR: serialized ClassAd differs from the parsed one"
+
+if __name__ == "__main__":
+  nFiles = int( sys.argv[1] ) if len( sys.argv ) > 1 else 10000
+  nLoops = int( sys.argv[2] ) if len( sys.argv ) > 2 else 10
+
+  print "%d list items, %d loops" % ( nFiles, nLoops )
+  for attribute in ( "InputData", "Parameters" ):
+    benchmark( attribute, makeJDL( attribute, nFiles ), nLoops )
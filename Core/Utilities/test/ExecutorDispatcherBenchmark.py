@@ -0,0 +1,115 @@
+########################################################################
+# $HeadURL $
+# File: ExecutorDispatcherBenchmark.py
+########################################################################
+""" :mod: ExecutorDispatcherBenchmark
+    =================================
+
+    .. module: ExecutorDispatcherBenchmark
+    :synopsis: stress test of the ExecutorDispatcher queues and dispatch
+
+    Connects nExecutors executors of two types with maxTasks slots each and drives
+    nTasks synthetic tasks through both types, as the OptimizationMind does with the
+    optimizers. All the tasks are queued first and a tenth of them is removed while
+    waiting. The executors then reconnect, getting their tasks back in one message
+    each, and process the rest reporting each batch at once. Prints the time per phase and the number of send
+    messages used to fill the executors::
+
+      python ExecutorDispatcherBenchmark.py [nTasks [nExecutors [maxTasks]]]
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import sys
+import time
+## SUT
+from DIRAC import S_OK, gLogger
+from DIRAC.Core.Utilities.ExecutorDispatcher import ExecutorDispatcher, ExecutorDispatcherCallbacks
+
+EXECUTOR_TYPES = ( "Optimizer1", "Optimizer2" )
+
+class BenchmarkCallbacks( ExecutorDispatcherCallbacks ):
+  """ executors that keep the tasks sent to them until processTasks is called """
+
+  def __init__( self ):
+    self.inExecutor = {}
+    self.messages = 0
+    self.tasksSent = 0
+
+  def cbDispatch( self, taskId, taskObj, pathExecuted ):
+    if len( pathExecuted ) < len( EXECUTOR_TYPES ):
+      return S_OK( EXECUTOR_TYPES[ len( pathExecuted ) ] )
+    return S_OK()
+
+  def cbSendTasks( self, eId, taskList ):
+    self.messages += 1
+    self.tasksSent += len( taskList )
+    self.inExecutor.setdefault( eId, [] ).extend( [ taskId for taskId, _taskObj, _eType in taskList ] )
+    return S_OK( {} )
+
+  def cbDisconectExecutor( self, eId ):
+    return S_OK()
+
+  def cbTaskProcessed( self, taskId, taskObj, eType ):
+    return S_OK()
+
+def processTasks( dispatcher, callbacks ):
+  """ let the executors process the tasks they have until all are done, reporting
+      each batch in one TasksDone message before being refilled """
+  processed = 0
+  while callbacks.inExecutor:
+    eId, taskIds = callbacks.inExecutor.popitem()
+    for taskId in taskIds:
+      dispatcher.taskProcessed( eId, taskId, refill = False )
+      processed += 1
+    dispatcher.fillExecutor( eId )
+  return processed
+
+def timeIt( name, method, *args ):
+  """ print wall time of :method: """
+  start = time.time()
+  result = method( *args )
+  print "%-32s %8.2f s" % ( name, time.time() - start )
+  return result
+
+if __name__ == "__main__":
+  nTasks = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000000
+  nExecutors = int( sys.argv[2] ) if len( sys.argv ) > 2 else 10
+  maxTasks = int( sys.argv[3] ) if len( sys.argv ) > 3 else 10
+  gLogger.setLevel( "ERROR" )
+
+  dispatcher = ExecutorDispatcher()
+  callbacks = BenchmarkCallbacks()
+  dispatcher.setCallbacks( callbacks )
+  executors = [ ( "%s%s" % ( EXECUTOR_TYPES[ eId % 2 ], eId ), [ EXECUTOR_TYPES[ eId % 2 ] ] )
+                for eId in range( nExecutors ) ]
+
+  def connectExecutors():
+    for eId, eTypes in executors:
+      dispatcher.addExecutor( eId, eTypes, maxTasks )
+
+  def reconnectExecutors():
+    for eId, eTypes in executors:
+      dispatcher.removeExecutor( eId )
+      callbacks.inExecutor.pop( eId, None )
+    messages = callbacks.messages
+    connectExecutors()
+    return callbacks.messages - messages
+
+  def addTasks():
+    for taskId in xrange( nTasks ):
+      dispatcher.addTask( taskId, taskId )
+
+  def removeTasks():
+    for taskId in xrange( 0, nTasks, 10 ):
+      dispatcher.removeTask( taskId )
+
+  print "%d tasks, %d executors with %d slots" % ( nTasks, nExecutors, maxTasks )
+  connectExecutors()
+  timeIt( "queue tasks", addTasks )
+  timeIt( "remove 10% of waiting tasks", removeTasks )
+  messages = timeIt( "reconnect executors", reconnectExecutors )
+  print "%d executors refilled with %d messages" % ( nExecutors, messages )
+  processed = timeIt( "process tasks", processTasks, dispatcher, callbacks )
+  print "%d tasks processed, %d tasks sent in %d messages" % ( processed, callbacks.tasksSent, callbacks.messages )
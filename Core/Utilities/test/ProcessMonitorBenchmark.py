@@ -0,0 +1,81 @@
+########################################################################
+# $HeadURL $
+# File: ProcessMonitorBenchmark.py
+########################################################################
+""" :mod: ProcessMonitorBenchmark
+    =============================
+
+    .. module: ProcessMonitorBenchmark
+    :synopsis: per sample cost of the Watchdog resource sampling
+
+    Starts a process tree of nChildren sleeping processes and measures the wall and
+    CPU time of a Watchdog sample (CPU consumed by the tree, load average, memory
+    used and disk space) done with the fork free /proc sampler of ProcessMonitor and
+    WatchdogLinux, and with the shell commands used before (ls, ps, cat, free, df)::
+
+      python ProcessMonitorBenchmark.py [nSamples [nChildren]]
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import os
+import sys
+import time
+import subprocess
+## SUT
+from DIRAC.Core.Utilities.ProcessMonitor import ProcessMonitor
+from DIRAC.Core.Utilities.Subprocess import shellCall
+
+def forkSample( pid ):
+  """ one sample with the shell commands: process list, process group and stat of each process """
+  procList = shellCall( 10, 'ls -d /proc/[0-9]*' )['Value'][1].replace( '/proc/', '' ).split( '\n' )
+  shellCall( 10, 'ps --no-headers -o pgrp -p %s' % pid )
+  for procPID in procList:
+    try:
+      fopen = open( '/proc/%s/stat' % procPID )
+      fopen.readline()
+      fopen.close()
+    except IOError:
+      pass
+  shellCall( 5, '/bin/cat /proc/loadavg' )
+  shellCall( 5, '/usr/bin/free' )
+  shellCall( 10, 'df -P -m . | tail -1' )
+
+def procSample( monitor, pid ):
+  """ one sample with the /proc sampler """
+  monitor.getCPUConsumedLinux( pid )
+  fopen = open( '/proc/loadavg' )
+  fopen.read()
+  fopen.close()
+  fopen = open( '/proc/meminfo' )
+  fopen.readlines()
+  fopen.close()
+  os.statvfs( '.' )
+
+def timeIt( name, nSamples, method, *args ):
+  """ print wall and CPU time per sample of :method: """
+  startWall = time.time()
+  startCPU = os.times()
+  for _i in range( nSamples ):
+    method( *args )
+  endCPU = os.times()
+  wallTime = time.time() - startWall
+  # CPU of this process and of the forked commands
+  cpuTime = sum( endCPU[:4] ) - sum( startCPU[:4] )
+  print "%-12s %6d samples: wall %8.2f ms/sample CPU %8.2f ms/sample" % \
+      ( name, nSamples, 1000. * wallTime / nSamples, 1000. * cpuTime / nSamples )
+
+if __name__ == "__main__":
+  nSamples = int( sys.argv[1] ) if len( sys.argv ) > 1 else 100
+  nChildren = int( sys.argv[2] ) if len( sys.argv ) > 2 else 50
+  children = [ subprocess.Popen( [ 'sleep', '3600' ] ) for _i in range( nChildren ) ]
+  try:
+    print "%d processes in /proc, %d in the monitored tree" % \
+        ( len( [ proc for proc in os.listdir( '/proc' ) if proc.isdigit() ] ), nChildren + 1 )
+    timeIt( "fork", nSamples, forkSample, os.getpid() )
+    timeIt( "/proc", nSamples, procSample, ProcessMonitor(), os.getpid() )
+  finally:
+    for child in children:
+      child.kill()
+      child.wait()
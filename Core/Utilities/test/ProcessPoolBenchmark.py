@@ -0,0 +1,92 @@
+########################################################################
+# $HeadURL $
+# File: ProcessPoolBenchmark.py
+########################################################################
+""" :mod: ProcessPoolBenchmark
+    ==========================
+
+    .. module: ProcessPoolBenchmark
+    :synopsis: throughput and latency of ProcessPool and PipeProcessPool
+
+    Executes a number of tasks returning small (100 B) and large (4 MB) results
+    in ProcessPool and PipeProcessPool, prints tasks per second together with
+    mean and 95th percentile latency measured from enqueueing to callback::
+
+      python ProcessPoolBenchmark.py [nTasks [nWorkers]]
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import sys
+import time
+## SUT
+from DIRAC.Core.Utilities.ProcessPool import ProcessPool, PipeProcessPool
+
+## enqueue time per taskID
+gStart = {}
+## latency per taskID
+gLatency = {}
+
+def PayloadFunc( size ):
+  """ task returning :size: bytes """
+  return "x" * size
+
+def poolCallback( taskID, taskResult ):
+  """ record latency """
+  gLatency[taskID] = time.time() - gStart[taskID]
+
+def processTaskCallback( task, taskResult ):
+  """ ProcessPool task callback """
+  poolCallback( task.getTaskID(), taskResult )
+
+def report( name, size, nTasks, wallTime ):
+  """ print results of a single run """
+  latency = sorted( gLatency.values() )
+  if not latency:
+    print "%-16s %8d B: no results" % ( name, size )
+    return
+  print "%-16s %8d B: %5d/%5d tasks %8.1f tasks/s latency mean %8.2f ms p95 %8.2f ms" % \
+      ( name, size, len( latency ), nTasks, len( latency ) / wallTime,
+        1000. * sum( latency ) / len( latency ), 1000. * latency[ int( 0.95 * ( len( latency ) - 1 ) ) ] )
+
+def runProcessPool( size, nTasks, nWorkers ):
+  """ benchmark ProcessPool """
+  gStart.clear()
+  gLatency.clear()
+  pool = ProcessPool( nWorkers, nWorkers, 2 * nWorkers )
+  pool.daemonize()
+  start = time.time()
+  for taskID in range( nTasks ):
+    gStart[taskID] = time.time()
+    pool.createAndQueueTask( PayloadFunc, args = ( size, ), taskID = taskID,
+                             callback = processTaskCallback, blocking = True )
+  while len( gLatency ) < nTasks and time.time() - start < 600:
+    pool.processResults()
+  wallTime = time.time() - start
+  pool.finalize( 10 )
+  report( "ProcessPool", size, nTasks, wallTime )
+
+def runPipeProcessPool( size, nTasks, nWorkers ):
+  """ benchmark PipeProcessPool """
+  gStart.clear()
+  gLatency.clear()
+  pool = PipeProcessPool( nWorkers, 2, poolCallback = poolCallback )
+  start = time.time()
+  for taskID in range( nTasks ):
+    gStart[taskID] = time.time()
+    pool.createAndQueueTask( PayloadFunc, args = ( size, ), taskID = taskID,
+                             usePoolCallbacks = True, blocking = True )
+    pool.processResults()
+  pool.processAllResults( 600 )
+  wallTime = time.time() - start
+  pool.finalize( 10 )
+  report( "PipeProcessPool", size, nTasks, wallTime )
+
+if __name__ == "__main__":
+  nTasks = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1000
+  nWorkers = int( sys.argv[2] ) if len( sys.argv ) > 2 else 4
+  for payloadSize in ( 100, 4 * 1024 * 1024 ):
+    tasks = nTasks if payloadSize < 1024 * 1024 else max( 1, nTasks / 10 )
+    runProcessPool( payloadSize, tasks, nWorkers )
+    runPipeProcessPool( payloadSize, tasks, nWorkers )
@@ -36,7 +36,7 @@ Script.parseCommandLine()
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 ## SUT
-from DIRAC.Core.Utilities.ProcessPool import ProcessPool
+from DIRAC.Core.Utilities.ProcessPool import ProcessPool, PipeProcessPool
 import threading
 
 def ResultCallback( task, taskResult ):
@@ -362,6 +362,126 @@ class TaskTimeOutTests( unittest.TestCase ):
     ## unlock
     gLock.release()
 
+## per process state set up by WorkerInitializer
+gWorkerState = {}
+
+def WorkerInitializer( token ):
+  """ worker initializer, executed once in every worker process """
+  gWorkerState["token"] = token
+  gWorkerState["pid"] = os.getpid()
+
+def InitializedFunc( taskID ):
+  """ global function reading state set up by WorkerInitializer """
+  return ( gWorkerState.get( "token" ), gWorkerState.get( "pid" ), os.getpid() )
+
+class WorkerInitializerTests( unittest.TestCase ):
+  """
+  .. class:: WorkerInitializerTests
+
+  test case for ProcessPool worker initializer
+  """
+
+  def setUp( self ):
+    """c'tor
+
+    :param self: self reference
+    """
+    from DIRAC.Core.Base import Script
+    Script.parseCommandLine()
+    from DIRAC.FrameworkSystem.Client.Logger import gLogger
+    gLogger.showHeaders( True )
+    self.log = gLogger.getSubLogger( self.__class__.__name__ )
+    self.results = []
+    self.processPool = ProcessPool( 2, 2, 8,
+                                    poolCallback = self.poolCallback,
+                                    workerInitializer = WorkerInitializer,
+                                    workerInitializerArgs = ( "initialized", ),
+                                    keepProcessesRunning = True )
+    self.processPool.daemonize()
+
+  def poolCallback( self, taskID, taskResult ):
+    self.results.append( taskResult )
+
+  def testInitializer( self ):
+    """ initializer executed once per worker, state kept across tasks """
+    i = 0
+    while i < 10:
+      result = self.processPool.createAndQueueTask( InitializedFunc,
+                                                    taskID = i,
+                                                    args = ( i, ),
+                                                    usePoolCallbacks = True,
+                                                    blocking = True )
+      if result["OK"]:
+        i += 1
+    self.processPool.finalize( 10 )
+    self.assertEqual( len( self.results ), 10 )
+    for token, initPid, pid in self.results:
+      self.assertEqual( token, "initialized" )
+      self.assertEqual( initPid, pid )
+
+def PayloadFunc( size, raiseException = False ):
+  """ global function returning :size: bytes """
+  if raiseException:
+    raise Exception( "testException" )
+  return "x" * size
+
+class PipeProcessPoolTests( unittest.TestCase ):
+  """
+  .. class:: PipeProcessPoolTests
+
+  test case for PipeProcessPool
+  """
+
+  def setUp( self ):
+    """c'tor
+
+    :param self: self reference
+    """
+    self.results = {}
+    self.exceptions = {}
+    self.processPool = PipeProcessPool( 2, 2,
+                                        poolCallback = self.poolCallback,
+                                        poolExceptionCallback = self.poolExceptionCallback,
+                                        shmThreshold = 1024 )
+
+  def tearDown( self ):
+    """ stop workers """
+    self.processPool.finalize( 10 )
+
+  def poolCallback( self, taskID, taskResult ):
+    self.results[taskID] = taskResult
+
+  def poolExceptionCallback( self, taskID, taskException ):
+    self.exceptions[taskID] = taskException
+
+  def testPayloads( self ):
+    """ small results through pipe, big through shared memory, exceptions """
+    sizes = [ 10, 100000, 10, 5000000 ]
+    for taskID, size in enumerate( sizes ):
+      result = self.processPool.createAndQueueTask( PayloadFunc, args = ( size, ), taskID = taskID,
+                                                    usePoolCallbacks = True )
+      self.assertEqual( result["OK"], True )
+    self.processPool.createAndQueueTask( PayloadFunc, args = ( 10, True ), taskID = "exc",
+                                         usePoolCallbacks = True )
+    self.processPool.createAndQueueTask( CallableClass, args = ( "cls", 0 ), taskID = "cls",
+                                         usePoolCallbacks = True )
+    self.processPool.processAllResults( 30 )
+    self.assertEqual( self.processPool.isWorking(), False )
+    for taskID, size in enumerate( sizes ):
+      self.assertEqual( len( self.results[taskID] ), size )
+    self.assertEqual( self.exceptions["exc"]["OK"], False )
+    self.assertEqual( self.exceptions["exc"]["Value"], "testException" )
+    self.assertEqual( self.results["cls"], 0 )
+
+  def testShmCleanup( self ):
+    """ shared memory files of unread results are removed by finalize """
+    for taskID in range( 4 ):
+      result = self.processPool.createAndQueueTask( PayloadFunc, args = ( 100000, ), taskID = taskID )
+      self.assertEqual( result["OK"], True )
+    self.processPool.finalize( 0 )
+    shmFiles = [ fileName for fileName in os.listdir( "/dev/shm" if os.access( "/dev/shm", os.W_OK ) else "/tmp" )
+                 if fileName.startswith( "ProcessPool_%s_" % os.getpid() ) ]
+    self.assertEqual( shmFiles, [] )
 
 ## SUT suite execution
 if __name__ == "__main__":
@@ -370,6 +490,8 @@ if __name__ == "__main__":
   suitePPCT = testLoader.loadTestsFromTestCase( ProcessPoolCallbacksTests )  
   suiteTCT = testLoader.loadTestsFromTestCase( TaskCallbacksTests )
   suiteTTOT = testLoader.loadTestsFromTestCase( TaskTimeOutTests )
-  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT ] )
+  suiteWIT = testLoader.loadTestsFromTestCase( WorkerInitializerTests )
+  suitePPPT = testLoader.loadTestsFromTestCase( PipeProcessPoolTests )
+  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT, suiteWIT, suitePPPT ] )
   unittest.TextTestRunner(verbosity=3).run(suite)
 
@@ -5,6 +5,7 @@
 
     The failover transfer client exposes the following methods:
     - transferAndRegisterFile()
+    - transferAndRegisterFiles()
     - transferAndRegisterFileFailover()
     - getRequestObject()
 
@@ -14,6 +15,10 @@
     The transferAndRegisterFile() method will correctly set registration
     requests in case of failure.
 
+    The transferAndRegisterFiles() method uploads a list of files with a pool
+    of parallel workers and registers all of them in a single bulk catalog
+    call, registration requests being set only for the failed registrations.
+
     The transferAndRegisterFileFailover() method will attempt to upload
     a file to a list of alternative SEs and set appropriate replication
     to the original target SE as well as the removal request for the
@@ -26,11 +31,18 @@ __RCSID__ = "$Id: $"
 
 from DIRAC.DataManagementSystem.Client.ReplicaManager import ReplicaManager
 from DIRAC.Resources.Storage.StorageElement import StorageElement
+from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
+from DIRAC.AccountingSystem.Client.DataStoreClient import gDataStoreClient
+from DIRAC.AccountingSystem.Client.Types.DataOperation import DataOperation
+from DIRAC.Core.Utilities.File import makeGuid
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.Client.File import File
 
 from DIRAC import S_OK, S_ERROR, gLogger
+import DIRAC
+
+import os, time, threading, Queue
 
 class FailoverTransfer( object ):
   """ .. class:: FailoverTransfer
@@ -110,6 +122,197 @@ class FailoverTransfer( object ):
     self.log.error( 'Encountered %s errors during attempts to upload output data' % len( errorList ) )
     return S_ERROR( 'Failed to upload output data file' )
 
+  #############################################################################
+  def transferAndRegisterFiles( self, fileList, fileCatalog = None, nThreads = 4 ):
+    """ Uploads the files in parallel and registers them in one bulk catalog call.
+
+        fileList is a list of dictionaries with the keys 'FileName', 'LocalPath', 'LFN',
+        'SEList' and 'FileMetaDict' (as for transferAndRegisterFile). Each file is uploaded
+        to the first SE of its list that accepts it, registration requests are set for
+        the uploaded files that could not be registered.
+
+        Returns S_OK( { 'Successful' : { lfn : metadata }, 'Failed' : { lfn : error } } ),
+        the metadata containing 'uploadedSE', 'PutTime' and 'RegistrationTime' or
+        'registration' : 'request'.
+    """
+    successful = {}
+    failed = {}
+    catalogs = fileCatalog
+    if catalogs and type( catalogs ) in ( str, unicode ):
+      catalogs = [ catalogs ]
+
+    for fileDict in fileList:
+      if not fileDict['FileMetaDict'].get( 'GUID' ):
+        fileDict['FileMetaDict']['GUID'] = makeGuid( fileDict['LocalPath'] )
+
+    # Same checks as putAndRegister, done in bulk before any upload
+    result = self.__checkDestinations( fileList, catalogs )
+    if not result['OK']:
+      return result
+    failed.update( result['Value'] )
+    toUpload = [ fileDict for fileDict in fileList if fileDict['LFN'] not in failed ]
+
+    # Parallel upload, the results are collected by LFN
+    uploadQueue = Queue.Queue()
+    for fileDict in toUpload:
+      uploadQueue.put( fileDict )
+    uploadResults = {}
+    threads = []
+    for _i in range( max( 1, min( nThreads, len( toUpload ) ) ) ):
+      thread = threading.Thread( target = self.__uploadWorker, args = ( uploadQueue, uploadResults ) )
+      thread.setDaemon( True )
+      thread.start()
+      threads.append( thread )
+    for thread in threads:
+      thread.join()
+
+    fileTuples = []
+    uploaded = {}
+    for fileDict in toUpload:
+      lfn = fileDict['LFN']
+      result = uploadResults.get( lfn, S_ERROR( 'File not uploaded' ) )
+      if not result['OK']:
+        failed[lfn] = result['Message']
+        continue
+      uploaded[lfn] = ( fileDict, result['Value'] )
+      metaDict = fileDict['FileMetaDict']
+      fileTuples.append( ( lfn, result['Value']['PFN'], metaDict['Size'], result['Value']['uploadedSE'],
+                           metaDict['GUID'], metaDict.get( 'Checksum' ) ) )
+    if not fileTuples:
+      return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
+    # One bulk registration for all the uploaded files
+    startTime = time.time()
+    result = self.replicaMgr.registerFile( fileTuples, catalog = fileCatalog )
+    registrationTime = time.time() - startTime
+    registered = []
+    if not result['OK']:
+      self.log.error( 'Bulk registration of the uploaded files failed', result['Message'] )
+    else:
+      registered = result['Value']['Successful'].keys()
+      for lfn, error in result['Value']['Failed'].items():
+        self.log.error( 'Failed to register file', '%s: %s' % ( lfn, error ) )
+    self.log.info( 'Registered %s / %s files in %.1f seconds' % ( len( registered ), len( fileTuples ),
+                                                                   registrationTime ) )
+
+    for lfn, ( fileDict, metadata ) in uploaded.items():
+      if lfn in registered:
+        metadata['RegistrationTime'] = registrationTime
+        successful[lfn] = metadata
+        continue
+      result = self.__setRegistrationRequest( lfn, metadata['uploadedSE'], fileDict['FileMetaDict'], catalogs or [''] )
+      if not result['OK']:
+        self.log.error( 'Failed to set registration request for', lfn )
+        failed[lfn] = 'Failed to set registration request'
+        continue
+      metadata['registration'] = 'request'
+      successful[lfn] = metadata
+
+    self.__sendAccounting( uploaded, registered, registrationTime )
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
+  #############################################################################
+  def __checkDestinations( self, fileList, catalogs ):
+    """ Checks the write permission on the LFN directories and that neither the LFNs
+        nor the GUIDs already exist, returns S_OK( { lfn : error } ) for the files
+        that can not be uploaded
+    """
+    failed = {}
+    fc = FileCatalog( catalogs ) if catalogs else FileCatalog()
+    directories = list( set( [ os.path.dirname( fileDict['LFN'] ) for fileDict in fileList ] ) )
+    result = fc.getPathPermissions( directories )
+    if not result['OK']:
+      return result
+    permissions = result['Value']['Successful']
+    for fileDict in fileList:
+      perm = permissions.get( os.path.dirname( fileDict['LFN'] ), {} )
+      if not perm.get( 'Write' ):
+        failed[fileDict['LFN']] = 'Write access not permitted for this credential'
+
+    result = fc.exists( dict( [ ( fileDict['LFN'], fileDict['FileMetaDict']['GUID'] )
+                                for fileDict in fileList if fileDict['LFN'] not in failed ] ) )
+    if not result['OK']:
+      return result
+    for fileDict in fileList:
+      lfn = fileDict['LFN']
+      if lfn in failed:
+        continue
+      if lfn not in result['Value']['Successful']:
+        failed[lfn] = 'Failed to determine existence of destination LFN'
+      elif result['Value']['Successful'][lfn] == lfn:
+        failed[lfn] = 'The supplied LFN already exists in the File Catalog'
+      elif result['Value']['Successful'][lfn]:
+        failed[lfn] = 'This file GUID already exists for another file %s' % result['Value']['Successful'][lfn]
+    for lfn, error in failed.items():
+      self.log.error( error, lfn )
+    return S_OK( failed )
+
+  #############################################################################
+  def __uploadWorker( self, uploadQueue, uploadResults ):
+    """ Uploads the files from the queue until it is empty, each of the parallel
+        workers uses its own ReplicaManager
+    """
+    replicaMgr = ReplicaManager()
+    while True:
+      try:
+        fileDict = uploadQueue.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        uploadResults[fileDict['LFN']] = self.__uploadFile( replicaMgr, fileDict )
+      except Exception, x:
+        self.log.exception( 'Exception while uploading', fileDict['LFN'] )
+        uploadResults[fileDict['LFN']] = S_ERROR( str( x ) )
+
+  #############################################################################
+  def __uploadFile( self, replicaMgr, fileDict ):
+    """ Puts the file to the first SE of its list that accepts it
+    """
+    lfn = fileDict['LFN']
+    for se in fileDict['SEList']:
+      self.log.info( 'Attempting rm.put("%s","%s","%s")' % ( lfn, fileDict['LocalPath'], se ) )
+      startTime = time.time()
+      result = replicaMgr.put( lfn, fileDict['LocalPath'], se )
+      putTime = time.time() - startTime
+      if not result['OK']:
+        self.log.error( 'rm.put failed with message', result['Message'] )
+        continue
+      if lfn not in result['Value']['Successful']:
+        self.log.error( 'rm.put failed with message', result['Value']['Failed'].get( lfn ) )
+        continue
+      self.log.info( 'rm.put successfully uploaded %s to %s in %.1f seconds' % ( fileDict['FileName'], se, putTime ) )
+      return S_OK( { 'uploadedSE' : se, 'lfn' : lfn, 'PFN' : result['Value']['Successful'][lfn], 'PutTime' : putTime } )
+    return S_ERROR( 'Failed to upload output data file' )
+
+  #############################################################################
+  def __sendAccounting( self, uploaded, registered, registrationTime ):
+    """ Sends one putAndRegister DataOperation record per destination SE
+    """
+    seDict = {}
+    for lfn, ( fileDict, metadata ) in uploaded.items():
+      seDict.setdefault( metadata['uploadedSE'], [] ).append( ( lfn, fileDict, metadata ) )
+    for se, files in seDict.items():
+      oDataOperation = DataOperation()
+      oDataOperation.setValuesFromDict( { 'OperationType' : 'putAndRegister',
+                                          'User' : 'acsmith',
+                                          'Protocol' : 'ReplicaManager',
+                                          'RegistrationTime' : registrationTime,
+                                          'RegistrationOK' : len( [ lfn for lfn, _f, _m in files if lfn in registered ] ),
+                                          'RegistrationTotal' : len( files ),
+                                          'Destination' : se,
+                                          'TransferTotal' : len( files ),
+                                          'TransferOK' : len( files ),
+                                          'TransferSize' : sum( [ fileDict['FileMetaDict']['Size'] for _l, fileDict, _m in files ] ),
+                                          'TransferTime' : sum( [ metadata['PutTime'] for _l, _f, metadata in files ] ),
+                                          'FinalStatus' : 'Successful',
+                                          'Source' : DIRAC.siteName() } )
+      oDataOperation.setStartTime()
+      oDataOperation.setEndTime()
+      gDataStoreClient.addRegister( oDataOperation )
+    result = gDataStoreClient.commit()
+    if not result['OK']:
+      self.log.error( 'Failed to send the accounting', result['Message'] )
+
   #############################################################################
   def transferAndRegisterFileFailover( self,
                                        fileName,
@@ -103,6 +103,17 @@ class DirectoryTreeBase:
        is the dictionary containing all the parameters of the newly created
        directory
     """
+    if self.db.directoryCache and path in self.db.directories:
+      return S_OK( self.db.directories[path] )
+
+    result = self.__makeDirectories( path, credDict )
+    if result['OK'] and self.db.directoryCache:
+      self.db.directories[path] = result['Value']
+    return result
+
+  def __makeDirectories( self, path, credDict ):
+    """ Create the directory and its missing parents
+    """
     result = self.existsDir( path )
     if not result['OK']:
       return result
@@ -233,6 +244,7 @@ class DirectoryTreeBase:
       if not result['OK']:
         failed[dir_] = result['Message']
       else: 
+        self.db.directories.pop( dir_, None )
         successful[dir_] = result
     return S_OK({'Successful':successful,'Failed':failed}) 
 
@@ -53,6 +53,8 @@ class FileCatalogDB(DB):
     self.resolvePfn = databaseConfig['ResolvePFN']
     self.umask = databaseConfig['DefaultUmask']
     self.visibleStatus = databaseConfig['VisibleStatus']
+    # Optional in-memory cache of the directory IDs, useful for bulk insertion clients
+    self.directoryCache = databaseConfig.get( 'DirectoryCache', False )
 
     try:
       # Obtain the plugins to be used for DB interaction
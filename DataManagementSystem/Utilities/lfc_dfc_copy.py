@@ -4,30 +4,85 @@
 # FileCatalog using multiple LFC sources
 #
 # Author: A.Tsaregorodtsev
-# Last Modified: 9.01.2012 
+# Last Modified: 9.01.2012
 #
 #########################################################################################
+"""
+  Migrate the LFC namespace into the DIRAC FileCatalog database
+
+  The namespace below the given root paths is partitioned into directory subtrees, each
+  subtree is migrated by a worker of a process pool reading the LFC directory by directory
+  and writing to the FileCatalogDB with batched addFile/addReplica calls. Completed subtrees
+  are checkpointed into a local state file, so that an interrupted migration can be resumed.
+"""
 
 from DIRAC.Core.Base import Script
+
+Script.registerSwitch( "H:", "LFCHosts=", "   Comma separated list of LFC hosts to read from" )
+Script.registerSwitch( "W:", "Workers=", "   Number of parallel worker processes [30]" )
+Script.registerSwitch( "D:", "Depth=", "   Depth below the root paths where the namespace is partitioned [2]" )
+Script.registerSwitch( "B:", "BatchSize=", "   Number of files per addFile/addReplica call [1000]" )
+Script.registerSwitch( "S:", "StateFile=", "   Local file where the migration progress is checkpointed [lfc_dfc.state]" )
+Script.registerSwitch( "C:", "Catalog=", "   FileCatalog service to take the database configuration from [DataManagement/FileCatalog]" )
+Script.registerSwitch( "R", "Restart", "   Ignore the state file and restart the migration from scratch" )
+Script.setUsageMessage( '\n'.join( [ __doc__.split( '\n' )[1],
+                                     'Usage:',
+                                     '  %s [option|cfgfile] ... Path ...' % Script.scriptName,
+                                     'Arguments:',
+                                     '  Path:     Root path of the namespace to migrate' ] ) )
 Script.parseCommandLine()
 
 import DIRAC.Resources.Catalog.LcgFileCatalogClient as LcgFileCatalogClient
-from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
+from DIRAC.DataManagementSystem.DB.FileCatalogDB import FileCatalogDB
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getUsernameForDN, getGroupsWithVOMSAttribute
-from DIRAC.Core.Utilities.ThreadPool import ThreadPool, ThreadedJob
+from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceSection
 from DIRAC.Core.Utilities.ProcessPool import ProcessPool
-from DIRAC import gConfig, S_OK, S_ERROR
+import DIRAC
+from DIRAC import gConfig, gLogger, S_OK, S_ERROR
 
-import time, sys, random
+import os, time, random
 
-dirCount = 0
-fileCount = 0
-globalStart = time.time()
+MAX_RETRIES = 5
 
+lfcHosts = ['lfc-lhcb-ro.cern.ch',
+            'lfc-lhcb-ro.cr.cnaf.infn.it',
+            'lhcb-lfc-fzk.gridka.de',
+            'lfc-lhcb-ro.in2p3.fr',
+            'lfc-lhcb.grid.sara.nl',
+            'lfclhcb.pic.es',
+            'lhcb-lfc.gridpp.rl.ac.uk']
+nWorkers = 30
+partitionDepth = 2
+batchSize = 1000
+stateFileName = 'lfc_dfc.state'
+catalogService = 'DataManagement/FileCatalog'
+restart = False
+
+for switch, value in Script.getUnprocessedSwitches():
+  if switch in ( "H", "LFCHosts" ):
+    lfcHosts = [ host.strip() for host in value.split( ',' ) if host.strip() ]
+  elif switch in ( "W", "Workers" ):
+    nWorkers = int( value )
+  elif switch in ( "D", "Depth" ):
+    partitionDepth = int( value )
+  elif switch in ( "B", "BatchSize" ):
+    batchSize = int( value )
+  elif switch in ( "S", "StateFile" ):
+    stateFileName = value
+  elif switch in ( "C", "Catalog" ):
+    catalogService = value
+  elif switch in ( "R", "Restart" ):
+    restart = True
+
+rootPaths = Script.getPositionalArgs() or [ "/lhcb/LHCb" ]
+
+# Per process caches
 dnCache = {}
 roleCache = {}
+lfcClients = {}
+dfcDB = None
 
-def getUserNameAndGroup(info):
+def getUserNameAndGroup( info ):
   """ Get the user name and group from the DN and VOMS role
   """
 
@@ -36,10 +91,10 @@ def getUserNameAndGroup(info):
   owner = {}
   if not "OwnerDN" in info:
     return owner
- 
-  username = dnCache.get(info.get('OwnerDN'))
+
+  username = dnCache.get( info.get( 'OwnerDN' ) )
   if not username:
-    result = getUsernameForDN(info.get('OwnerDN','Unknown'))
+    result = getUsernameForDN( info.get( 'OwnerDN', 'Unknown' ) )
     if result['OK']:
       username = result['Value']
       dnCache[info['OwnerDN']] = username
@@ -48,212 +103,328 @@ def getUserNameAndGroup(info):
       dnCache[info['OwnerDN']] = username
 
   if username and username != 'Unknown':
-    groups = roleCache.get('/'+info.get('OwnerRole'))
+    groups = roleCache.get( '/' + info.get( 'OwnerRole' ) )
     if not groups:
-      groups = getGroupsWithVOMSAttribute('/'+info['OwnerRole'])
-      roleCache['/'+info['OwnerRole']] = groups
+      groups = getGroupsWithVOMSAttribute( '/' + info['OwnerRole'] )
+      roleCache['/' + info['OwnerRole']] = groups
     if groups:
       owner['username'] = username
       owner['group'] = groups[0]
 
   return owner
 
-def processDir(initPath,recursive=False,host=None,fcInit=None,dfcInit=None):
-  """ Process one directory,  possibly recursively 
+def getLFC( host ):
+  """ Get the LFC client for the given host, one per host and process
   """
+  if host not in lfcClients:
+    lfcClients[host] = LcgFileCatalogClient.LcgFileCatalogClient( host = host )
+  return lfcClients[host]
 
-  global  globalStart, dnCache, roleCache
-
-  #print "AT >>> processDir initPath", initPath
-
-  fc = fcInit
-  if not fc:
-    fc = LcgFileCatalogClient.LcgFileCatalogClient( host=host )
-  dfc = dfcInit
-  if not dfc:
-    dfc = FileCatalogClient()
-
-  start = time.time()
-
-  resultList = fc.listDirectory(initPath,True)
-  if not resultList['OK']:
-    result = S_ERROR("Failed LFC lookup for %s" % initPath)
-    result['Path'] = initPath
+def getFileCatalogDB( serviceName ):
+  """ Get the FileCatalogDB instance of this process configured as the given catalog service,
+      with the directory ID cache enabled
+  """
+  global dfcDB
+
+  if dfcDB:
+    return S_OK( dfcDB )
+
+  section = getServiceSection( serviceName )
+  databaseConfig = { 'UserGroupManager'  : 'UserAndGroupManagerDB',
+                     'SEManager'         : 'SEManagerDB',
+                     'SecurityManager'   : 'NoSecurityManager',
+                     'DirectoryManager'  : 'DirectoryLevelTree',
+                     'FileManager'       : 'FileManager',
+                     'DirectoryMetadata' : 'DirectoryMetadata',
+                     'FileMetadata'      : 'FileMetadata',
+                     'UniqueGUID'        : False,
+                     'GlobalReadAccess'  : True,
+                     'LFNPFNConvention'  : True,
+                     'ResolvePFN'        : True,
+                     'DefaultUmask'      : 0775,
+                     'VisibleStatus'     : ['AprioriGood'] }
+  for key, defaultValue in databaseConfig.items():
+    databaseConfig[key] = gConfig.getValue( '%s/%s' % ( section, key ), defaultValue )
+  databaseConfig['DirectoryCache'] = True
+
+  db = FileCatalogDB( gConfig.getValue( '%s/Database' % section, 'DataManagement/FileCatalogDB' ) )
+  result = db.setConfig( databaseConfig )
+  if not result['OK']:
     return result
+  dfcDB = db
+  return S_OK( dfcDB )
 
-  lfc_time = (time.time() - start)
-
-  s = time.time()
-
-  if resultList['OK']:
-  # Add directories
-
-    if resultList['Value']['Failed']:
-      return S_ERROR("Path %s failed: %s" % (initPath,resultList['Value']['Failed'][initPath]))
-
-    dirDict = resultList['Value']['Successful'][initPath]['SubDirs']
-    paths = {}
-    for path,info in dirDict.items():
-      paths[path] = {}
-      paths[path]['Mode'] = info['Mode']
-      owner = getUserNameAndGroup( info )
-      if owner:
-        paths[path]['Owner'] = owner
+class CatalogWriter( object ):
+  """ Accumulates the files read from the LFC and writes them to the FileCatalogDB
+      in batches: one addFile call with the master replicas and one addReplica call
+      per extra replica rank, per owner
+  """
 
-    p_dirs = time.time() - s
-    s = time.time()
-    nDir = len(paths)
-    if nDir:
-      #print "Adding %d directories in %s" % (nDir,initPath)
-      result = dfc.createDirectory(paths)
+  def __init__( self, db, batchSize ):
+    self.db = db
+    self.batchSize = batchSize
+    self.pending = {}
+    self.owners = {}
+    self.nFiles = 0
+    self.nReplicas = 0
+    self.failed = {}
+
+  def __credDict( self, owner ):
+    return { 'username' : owner.get( 'username', 'anon' ),
+             'group' : owner.get( 'group', 'anon' ) }
+
+  def addDirectories( self, dirDict ):
+    """ Create the directories with their LFC mode, the directory IDs are cached by the DB
+    """
+    for path, info in dirDict.items():
+      result = self.db.dtree.makeDirectories( path, self.__credDict( getUserNameAndGroup( info ) ) )
       if not result['OK']:
-        print "Error adding directories:",result['Message']
-
-
-    e_dirs = time.time() - s
-
-    # Add files
-
-    s = time.time()
-
-    fileDict = resultList['Value']['Successful'][initPath]['Files']
-    lfns = {}
-    for lfn,info in fileDict.items():
-
-      #print info['MetaData']
-
-      lfns[lfn] = {}
-      lfns[lfn]['Size'] = info['MetaData']['Size']
-      lfns[lfn]['Checksum'] = info['MetaData'].get('Checksum','')
-      lfns[lfn]['GUID'] = info['MetaData']['GUID']
-      lfns[lfn]['Mode'] = info['MetaData']['Mode']
-      lfns[lfn]['PFN'] = ''
-      owner = getUserNameAndGroup( info['MetaData'] )
-      if owner:
-        lfns[lfn]['Owner'] = owner
-
-      if info['Replicas']:
-        seList = info['Replicas'].keys()
-        lfns[lfn]['SE'] = seList
-
-    p_files = time.time() - s
-    s = time.time()
-
-    nFile = len(lfns)
-    nRep = 0
-    if nFile:
-
-      for lfn in lfns:
-        if 'SE' in lfns[lfn]:
-          nRep += len(lfns[lfn]['SE'])
-
-      #print "Adding %d files in %s" % (nFile,initPath)
-      
-      done = False
-      count = 0
-      error = False
-      while not done:
-        count += 1
-        result = dfc.addFile(lfns)
+        self.failed[path] = result['Message']
+        continue
+      if 'Mode' in info:
+        result = self.db.dtree.setDirectoryMode( path, info['Mode'] )
         if not result['OK']:
-          print "Error adding files %d:" % count,result['Message']
-          if count > 10:
-            print "Completely failed path", initPath
-            break
-          error = True
-          time.sleep(2)
-        elif error:
-          print "Successfully added files on retry %d" % count
-          done = True
-        else:
-          done = True
-
-
-    e_files = time.time() - s
-
-    dfc_time = time.time() - start - lfc_time
-    total_time = time.time() - globalStart
-
-    format = "== %s: time lfc/dfc %.2f/%.2f, files %d, dirs %d, reps %d, time: %.2f/%.2f/%.2f/%.2f %.2f \n"
-    outputFile = open('lfc_dfc.out','a')
-    outputFile.write( format % (initPath,lfc_time,dfc_time,nFile,nDir,nRep,p_dirs,e_dirs,p_files,e_files,total_time) )
-    outputFile.close()
-
-#    print format % (initPath,lfc_time,dfc_time,nFile,fileCount,nDir,dirCount,p_dirs,e_dirs,p_files,e_files,total_time)
+          self.failed[path] = result['Message']
+
+  def addFiles( self, fileDict ):
+    """ Queue the files of one LFC directory listing, flushing full batches
+    """
+    for lfn, info in fileDict.items():
+      metadata = info['MetaData']
+      replicas = info['Replicas'].items()
+      if not replicas:
+        # FileCatalogDB.addFile requires an SE, the file is reported and its partition not checkpointed
+        self.failed[lfn] = 'No replica in the LFC'
+        continue
+      owner = self.__credDict( getUserNameAndGroup( metadata ) )
+      ownerKey = ( owner['username'], owner['group'] )
+      self.owners[ownerKey] = owner
+      self.pending.setdefault( ownerKey, {} )[lfn] = { 'Size' : metadata['Size'],
+                                                       'Checksum' : metadata.get( 'Checksum', '' ),
+                                                       'GUID' : metadata['GUID'],
+                                                       'Mode' : metadata['Mode'],
+                                                       'Replicas' : replicas }
+    if sum( [ len( lfns ) for lfns in self.pending.values() ] ) >= self.batchSize:
+      return self.flush()
+    return S_OK()
+
+  def __retry( self, method, lfns, credDict ):
+    """ Call the DB method retrying on global failures
+    """
+    for count in range( MAX_RETRIES ):
+      result = method( lfns, credDict )
+      if result['OK']:
+        return result
+      gLogger.warn( "Error in %s, attempt %d" % ( method.__name__, count + 1 ), result['Message'] )
+      time.sleep( 2 )
+    return result
 
-    # Go into directories
+  def flush( self ):
+    """ Write the pending files to the catalog
+    """
+    pending = self.pending
+    self.pending = {}
+    for ownerKey, files in pending.items():
+      credDict = self.owners[ownerKey]
+      masters = {}
+      extras = {}
+      for lfn, info in files.items():
+        se, replica = info['Replicas'][0]
+        masters[lfn] = { 'PFN' : replica['PFN'], 'SE' : se, 'Size' : info['Size'],
+                         'Checksum' : info['Checksum'], 'GUID' : info['GUID'], 'Mode' : info['Mode'] }
+        for rank, ( se, replica ) in enumerate( info['Replicas'][1:] ):
+          extras.setdefault( rank, {} )[lfn] = { 'PFN' : replica['PFN'], 'SE' : se }
+
+      result = self.__retry( self.db.addFile, masters, credDict )
+      if not result['OK']:
+        return result
+      self.failed.update( result['Value']['Failed'] )
+      self.nFiles += len( result['Value']['Successful'] )
+      self.nReplicas += len( result['Value']['Successful'] )
+
+      for rank in sorted( extras ):
+        replicas = dict( [ ( lfn, info ) for lfn, info in extras[rank].items() if lfn in result['Value']['Successful'] ] )
+        if not replicas:
+          continue
+        repResult = self.__retry( self.db.addReplica, replicas, credDict )
+        if not repResult['OK']:
+          return repResult
+        self.failed.update( repResult['Value']['Failed'] )
+        self.nReplicas += len( repResult['Value']['Successful'] )
+    return S_OK()
+
+def migratePartition( initPath, recursive, host, serviceName, batchSize ):
+  """ Worker task: migrate one directory, or the whole subtree below it if recursive
+  """
+  start = time.time()
+  result = getFileCatalogDB( serviceName )
+  if not result['OK']:
+    result['Path'] = initPath
+    return result
+  writer = CatalogWriter( result['Value'], batchSize )
+  lfc = getLFC( host )
+
+  nDir = 0
+  toProcess = [ initPath ]
+  while toProcess:
+    path = toProcess.pop()
+    result = lfc.listDirectory( path, True )
+    if not result['OK'] or path in result['Value']['Failed']:
+      result = S_ERROR( "Failed LFC lookup for %s" % path )
+      result['Path'] = initPath
+      return result
+    contents = result['Value']['Successful'][path]
+    writer.addDirectories( contents['SubDirs'] )
+    nDir += len( contents['SubDirs'] )
+    result = writer.addFiles( contents['Files'] )
+    if not result['OK']:
+      result['Path'] = initPath
+      return result
     if recursive:
-      for path in paths:
-        result = processDir(path,True,host=host,fcInit=fc,dfcInit=dfc)
-        if result['OK']:
-          nFile += result['Value'].get('NumberOfFiles',0)
-          nDir += result['Value'].get('NumberOfDirectories',0)
-          nRep += result['Value'].get('NumberOfReplicas',0)
-
-    resultDict = {}
-    resultDict['NumberOfFiles'] = nFile
-    resultDict['NumberOfDirectories'] = nDir
-    resultDict['NumberOfReplicas'] = nRep
-    resultDict['Path'] = initPath
-    resultDict['Directories'] = dirDict.keys()
-
-    #print "AT >>> processDir",initPath,"done %.2f" % (time.time()-start)
-
-    return S_OK(resultDict)
-
-def finalizeDirectory(task,result):
+      toProcess.extend( contents['SubDirs'].keys() )
 
-  global lfcHosts, pPool
+  result = writer.flush()
+  if not result['OK']:
+    result['Path'] = initPath
+    return result
 
-  if result['OK']:
-    print "Finished directory %(Path)s, dirs: %(NumberOfDirectories)s, files: %(NumberOfFiles)s, replicas: %(NumberOfReplicas)s" % result['Value']
-    print "%d active tasks remaining" % pPool.getNumWorkingProcesses()
+  return S_OK( { 'Path' : initPath,
+                 'NumberOfFiles' : writer.nFiles,
+                 'NumberOfReplicas' : writer.nReplicas,
+                 'NumberOfDirectories' : nDir,
+                 'Failed' : writer.failed,
+                 'Time' : time.time() - start } )
 
+class MigrationState( object ):
+  """ Append-only checkpoint of the completed partitions, one line per partition:
+      <path> <files> <replicas> <directories>
+  """
 
-    if "Directories" in result['Value']:
-      for path in result['Value']['Directories']:
-        random.shuffle(lfcHosts)
-        #print pPool.getNumWorkingProcesses(), pPool.hasPendingTasks()
-        print "Queueing task for directory %s, lfc %s" % (path,lfcHosts[0])
-        result = pPool.createAndQueueTask( processDir,[path,False,lfcHosts[0]],callback=finalizeDirectory ) 
-        if not result['OK']:
-          print "Failed queueing", path
-  else:
-    print "Task failed: %s" % result['Message']
-    if 'Path' in result:
-      random.shuffle(lfcHosts)
-      print "Requeueing task for directory %s, lfc %s" % (result['Path'],lfcHosts[0]) 
+  def __init__( self, fileName, restart = False ):
+    self.fileName = fileName
+    self.done = {}
+    if restart and os.path.exists( fileName ):
+      os.rename( fileName, '%s.%d' % ( fileName, int( time.time() ) ) )
+    if os.path.exists( fileName ):
+      for line in open( fileName ):
+        fields = line.split()
+        if len( fields ) == 4:
+          self.done[fields[0]] = [ int( field ) for field in fields[1:] ]
+    self.stateFile = open( fileName, 'a' )
+
+  def isDone( self, path ):
+    return path in self.done
+
+  def markDone( self, path, nFiles, nReplicas, nDirs ):
+    self.done[path] = [ nFiles, nReplicas, nDirs ]
+    self.stateFile.write( "%s %d %d %d\n" % ( path, nFiles, nReplicas, nDirs ) )
+    self.stateFile.flush()
+    os.fsync( self.stateFile.fileno() )
+
+  def getTotals( self ):
+    return [ sum( counters ) for counters in zip( *self.done.values() ) ] or [ 0, 0, 0 ]
+
+def partitionNamespace( roots, depth ):
+  """ Split the namespace into tasks: ( path, recursive ). Directories above the partition
+      depth are migrated on their own, the subtrees at the partition depth as a whole
+  """
+  lfc = getLFC( random.choice( lfcHosts ) )
+  partitions = []
+  level = [ ( root.rstrip( '/' ) or '/', 0 ) for root in roots ]
+  while level:
+    path, pathDepth = level.pop( 0 )
+    if pathDepth >= depth:
+      partitions.append( ( path, True ) )
+      continue
+    partitions.append( ( path, False ) )
+    result = lfc.listDirectory( path, False )
+    if not result['OK'] or path in result['Value']['Failed']:
+      return S_ERROR( "Failed to partition %s" % path )
+    for subDir in result['Value']['Successful'][path]['SubDirs']:
+      level.append( ( subDir, pathDepth + 1 ) )
+  return S_OK( partitions )
 
 #########################################################################
 
-pPool = ProcessPool(30,40,0)
-#pPool.daemonize()
-
-lfcHosts = ['lfc-lhcb-ro.cern.ch',
-            'lfc-lhcb-ro.cr.cnaf.infn.it',
-            'lhcb-lfc-fzk.gridka.de',
-            'lfc-lhcb-ro.in2p3.fr',
-            'lfc-lhcb.grid.sara.nl',
-            'lfclhcb.pic.es',
-            'lhcb-lfc.gridpp.rl.ac.uk']
-
-#for user in users:
-#  path = "/lhcb/user/%s/%s" % (user[0],user)
-#  random.shuffle(lfcHosts)
-#  print "Queueing user", user, pPool.getFreeSlots(),pPool.getNumWorkingProcesses(),pPool.hasPendingTasks(),pPool.getNumIdleProcesses(), lfcHosts[0]
-#  result = pPool.createAndQueueTask( processDir,[path,True,lfcHosts[0]],callback=finalizeDirectory ) 
-#  if not result['OK']:
-#    print "Failed queueing", path
-
-
-path = "/lhcb/LHCb"
-print "Queueing task for directory", path, lfcHosts[0]
-result = pPool.createAndQueueTask( processDir,[path,False,lfcHosts[0]],callback=finalizeDirectory ) 
+globalStart = time.time()
+state = MigrationState( stateFileName, restart )
+sessionFiles = 0
+outstanding = 0
+retries = {}
+failedPartitions = {}
+
+def queuePartition( path, recursive ):
+  """ Queue the migration of one partition on a random LFC host
+  """
+  global outstanding
+  result = pPool.createAndQueueTask( migratePartition,
+                                     [ path, recursive, random.choice( lfcHosts ), catalogService, batchSize ],
+                                     callback = finalizePartition )
+  if not result['OK']:
+    gLogger.error( "Failed queueing %s" % path, result['Message'] )
+    return
+  outstanding += 1
+
+def finalizePartition( task, result ):
+  """ Checkpoint the completed partition, requeue the failed one
+  """
+  global outstanding, sessionFiles
+  outstanding -= 1
+  if not result:
+    gLogger.error( "Task returned no result" )
+    return
+  if not result['OK']:
+    path = result.get( 'Path' )
+    gLogger.error( "Task failed", result['Message'] )
+    if path and retries.get( path, 0 ) < MAX_RETRIES:
+      retries[path] = retries.get( path, 0 ) + 1
+      gLogger.notice( "Requeueing %s, attempt %d" % ( path, retries[path] ) )
+      queuePartition( path, partitions[path] )
+    elif path:
+      failedPartitions[path] = 0
+    return
+
+  value = result['Value']
+  if value['Failed']:
+    # Not checkpointed, the partition is migrated again by the next run
+    for lfn, reason in value['Failed'].items():
+      gLogger.error( "Failed to migrate %s" % lfn, reason )
+    failedPartitions[value['Path']] = len( value['Failed'] )
+    return
+  state.markDone( value['Path'], value['NumberOfFiles'], value['NumberOfReplicas'], value['NumberOfDirectories'] )
+  sessionFiles += value['NumberOfFiles']
+  elapsed = time.time() - globalStart
+  totalFiles, totalReplicas, totalDirs = state.getTotals()
+  gLogger.notice( "Done %s: %d files in %.1f s (%.1f files/s); total %d files, %d replicas, %d dirs; session %.1f files/s; %d partitions left" % \
+                  ( value['Path'], value['NumberOfFiles'], value['Time'], value['NumberOfFiles'] / max( value['Time'], 0.001 ),
+                    totalFiles, totalReplicas, totalDirs, sessionFiles / max( elapsed, 0.001 ), outstanding ) )
+
+result = partitionNamespace( rootPaths, partitionDepth )
 if not result['OK']:
-  print "Failed queueing", path
-
-for i in range(20):
+  gLogger.error( result['Message'] )
+  DIRAC.exit( -1 )
+partitions = dict( result['Value'] )
+todo = [ path for path in partitions if not state.isDone( path ) ]
+gLogger.notice( "%d partitions, %d already migrated, %d to go" % ( len( partitions ), len( partitions ) - len( todo ), len( todo ) ) )
+
+pPool = ProcessPool( nWorkers, nWorkers, 2 * nWorkers )
+for path in todo:
+  queuePartition( path, partitions[path] )
   pPool.processResults()
-  time.sleep(1)
 
-pPool.processAllResults()
+while outstanding > 0:
+  pPool.processResults()
+  time.sleep( 1 )
+
+pPool.finalize()
+totalFiles, totalReplicas, totalDirs = state.getTotals()
+gLogger.notice( "Migration finished: %d files, %d replicas, %d directories, session rate %.1f files/s" % \
+                ( totalFiles, totalReplicas, totalDirs, sessionFiles / max( time.time() - globalStart, 0.001 ) ) )
+if failedPartitions:
+  for path in sorted( failedPartitions ):
+    if failedPartitions[path]:
+      gLogger.error( "Partition %s not completed: %d entries failed" % ( path, failedPartitions[path] ) )
+    else:
+      gLogger.error( "Partition %s not completed: task failed" % path )
+  gLogger.error( "%d partitions not completed, run again to migrate them" % len( failedPartitions ) )
+  DIRAC.exit( 1 )
@@ -58,6 +58,8 @@ class RequestExecutingAgent( AgentModule ):
   __requestCache = {}
   # # requests/cycle
   __requestsPerCycle = 100
+  # # requests read in a single getBulkRequests call
+  __bulkRequest = 0
   # # minimal nb of subprocess running
   __minProcess = 2
   # # maximal nb of subprocess executed same time
@@ -90,6 +92,9 @@ class RequestExecutingAgent( AgentModule ):
     self.log.info( "ProcessPool min process = %d" % self.__minProcess )
     self.__maxProcess = self.am_getOption( "MaxProcess", 4 )
     self.log.info( "ProcessPool max process = %d" % self.__maxProcess )
+    # # by default read as many requests as can be executed at once
+    self.__bulkRequest = self.am_getOption( "BulkRequest", max( 1, self.__maxProcess ) )
+    self.log.info( "Requests/bulk read = %d" % self.__bulkRequest )
     self.__queueSize = self.am_getOption( "ProcessPoolQueueSize", self.__queueSize )
     self.log.info( "ProcessPool queue size = %d" % self.__queueSize )
     self.__poolTimeout = int( self.am_getOption( "ProcessPoolTimeout", self.__poolTimeout ) )
@@ -161,7 +166,12 @@ class RequestExecutingAgent( AgentModule ):
                                         maxProcess,
                                         queueSize,
                                         poolCallback = self.resultCallback,
-                                        poolExceptionCallback = self.exceptionCallback )
+                                        poolExceptionCallback = self.exceptionCallback,
+                                        workerInitializer = RequestTask.initializeWorker,
+                                        workerInitializerArgs = ( self.handlersDict,
+                                                                  self.__configPath,
+                                                                  self.agentName ),
+                                        keepProcessesRunning = True )
       self.__processPool.daemonize()
     return self.__processPool
 
@@ -234,56 +244,68 @@ class RequestExecutingAgent( AgentModule ):
     taskCounter = 0
     while taskCounter < self.__requestsPerCycle:
       self.log.debug( "execute: executing %d request in this cycle" % taskCounter )
-      getRequest = self.requestClient().getRequest()
-      if not getRequest["OK"]:
-        self.log.error( "execute: %s" % getRequest["Message"] )
+      bulkSize = min( self.__bulkRequest, self.__requestsPerCycle - taskCounter )
+      getRequests = self.requestClient().getBulkRequests( bulkSize )
+      if not getRequests["OK"]:
+        self.log.error( "execute: %s" % getRequests["Message"] )
         break
-      if not getRequest["Value"]:
+      for requestName, error in getRequests["Value"]["Failed"].items():
+        self.log.error( "execute: unable to read request '%s': %s" % ( requestName, error ) )
+      requests = getRequests["Value"]["Successful"].values()
+      if not requests:
         self.log.info( "execute: not more 'Waiting' requests to process" )
         break
-      # # OK, we've got you
-      request = getRequest["Value"]
-      # # set task id
-      taskID = request.RequestName
-      # # save current request in cache
-      self.cacheRequest( request )
-      # # serialize to JSON
-      requestJSON = request.toJSON()
-      if not requestJSON["OK"]:
-        self.log.error( "JSON serialization error: %s" % requestJSON["Message"] )
-        break
-      requestJSON = requestJSON["Value"]
-
-      self.log.info( "processPool tasks idle = %s working = %s" % ( self.processPool().getNumIdleProcesses(),
-                                                                    self.processPool().getNumWorkingProcesses() ) )
-
-      while True:
-        if not self.processPool().getFreeSlots():
-          self.log.info( "No free slots available in processPool, will wait %d seconds to proceed" % self.__poolSleep )
-          time.sleep( self.__poolSleep )
-        else:
-          self.log.info( "spawning task for request '%s'" % ( request.RequestName ) )
-          timeOut = self.getTimeout( request )
-          enqueue = self.processPool().createAndQueueTask( RequestTask,
-                                                           kwargs = { "requestJSON" : requestJSON,
-                                                                      "handlersDict" : self.handlersDict,
-                                                                      "csPath" : self.__configPath,
-                                                                      "agentName": self.agentName },
-                                                           taskID = taskID,
-                                                           blocking = True,
-                                                           usePoolCallbacks = True,
-                                                           timeOut = timeOut )
-          if not enqueue["OK"]:
-            self.log.error( enqueue["Message"] )
+      self.log.info( "execute: got %d requests to process" % len( requests ) )
+      # # save all requests in cache first, so they will be put back if anything goes wrong
+      for request in requests:
+        self.cacheRequest( request )
+
+      for request in requests:
+        # # set task id
+        taskID = request.RequestName
+        # # serialize to JSON
+        requestJSON = request.toJSON()
+        if not requestJSON["OK"]:
+          self.log.error( "JSON serialization error: %s" % requestJSON["Message"] )
+          self.resetRequest( taskID )
+          self.cleanCache( taskID )
+          continue
+        requestJSON = requestJSON["Value"]
+
+        self.log.info( "processPool tasks idle = %s working = %s" % ( self.processPool().getNumIdleProcesses(),
+                                                                      self.processPool().getNumWorkingProcesses() ) )
+
+        while True:
+          if not self.processPool().getFreeSlots():
+            self.log.info( "No free slots available in processPool, will wait %d seconds to proceed" % self.__poolSleep )
+            time.sleep( self.__poolSleep )
           else:
-            self.log.debug( "successfully enqueued task '%s'" % taskID )
-            # # update monitor
-            gMonitor.addMark( "Processed", 1 )
-            # # update request counter
-            taskCounter += 1
-            # # task created, a little time kick to proceed
-            time.sleep( 0.1 )
-            break
+            self.log.info( "spawning task for request '%s'" % ( request.RequestName ) )
+            timeOut = self.getTimeout( request )
+            enqueue = self.processPool().createAndQueueTask( RequestTask,
+                                                             kwargs = { "requestJSON" : requestJSON,
+                                                                        "handlersDict" : self.handlersDict,
+                                                                        "csPath" : self.__configPath,
+                                                                        "agentName": self.agentName },
+                                                             taskID = taskID,
+                                                             blocking = True,
+                                                             usePoolCallbacks = True,
+                                                             timeOut = timeOut )
+            if not enqueue["OK"]:
+              self.log.error( enqueue["Message"] )
+            else:
+              self.log.debug( "successfully enqueued task '%s'" % taskID )
+              # # update monitor
+              gMonitor.addMark( "Processed", 1 )
+              # # update request counter
+              taskCounter += 1
+              # # task created, a little time kick to proceed
+              time.sleep( 0.1 )
+              break
+
+      # # less requests than asked for, nothing more waiting
+      if len( requests ) < bulkSize:
+        break
 
     # # clean return
     return S_OK()
@@ -42,6 +42,7 @@ class File( Record ):
   :param Operation _parent: reference to parent Operation
   :param dict __data__: attrs dict
   """
+  __slots__ = ( "_parent", )
 
   def __init__( self, fromDict = None ):
     """c'tor
@@ -80,7 +81,7 @@ class File( Record ):
                "Attempt": "INTEGER",
                "Error" : "VARCHAR(255)" },
              "PrimaryKey" : "FileID",
-             "Indexes" : { "LFN" : [ "LFN" ] } }
+             "Indexes" : { "LFN" : [ "LFN" ], "OperationID" : [ "OperationID" ] } }
 
   # # properties
 
@@ -219,9 +220,10 @@ class File( Record ):
     """ status setter """
     if value not in ( "Waiting", "Failed", "Done", "Scheduled" ):
       raise ValueError( "Unknown Status: %s!" % str( value ) )
+    oldStatus = self.Status
     self.__data__["Status"] = value
     if self._parent:
-      self._parent._notify()
+      self._parent._fileStatusChanged( oldStatus, value )
 
   def __str__( self ):
     """ str operator """
@@ -46,6 +46,8 @@ class Operation( Record ):
   :param str Error: error string if any
   :param Request parent: parent Request instance
   """
+  __slots__ = ( "_parent", "__files__", "__dirty", "__fileStatusCount" )
+
   # # max files in a single operation
   MAX_FILES = 100
 
@@ -74,6 +76,8 @@ class Operation( Record ):
 
     # # operation files
     self.__files__ = TypedList( allowedTypes = File )
+    # # number of files per status
+    self.__fileStatusCount = dict.fromkeys( ( "Waiting", "Done", "Failed", "Scheduled" ), 0 )
     # # dirty fileIDs
     self.__dirty = []
 
@@ -113,38 +117,36 @@ class Operation( Record ):
                "CreationTime" : "DATETIME",
                "SubmitTime" : "DATETIME",
                "LastUpdate" : "DATETIME" },
-             "PrimaryKey" : "OperationID" }
+             "PrimaryKey" : "OperationID",
+             "Indexes" : { "RequestID" : [ "RequestID" ] } }
 
   # # protected methods for parent only
   def _notify( self ):
-    """ notify self about file status change """
-    fStatus = list( set( self.fileStatusList() ) )
-
-    newStatus = "Done"
-    while sorted( fStatus ):
-
-      status = fStatus.pop( 0 )
+    """ notify self about file status change
 
+    new status is derived from per status files counters, parent is notified only
+    when status has changed
+    """
+    if self.__fileStatusCount["Failed"]:
       # # one file Failed -> Failed
-      if status == "Failed":
-        newStatus = "Failed"
-        break
-
-      elif status == "Scheduled":
-        if newStatus == "Done":
-          newStatus = "Scheduled"
-        continue
-
-      elif status == "Waiting":
-        newStatus = "Queued"
-        continue
+      newStatus = "Failed"
+    elif self.__fileStatusCount["Waiting"]:
+      newStatus = "Queued"
+    elif self.__fileStatusCount["Scheduled"]:
+      newStatus = "Scheduled"
+    else:
+      newStatus = "Done"
 
-      elif status == "Done":
-        continue
+    if newStatus != self.__data__["Status"]:
+      self.__data__["Status"] = newStatus
+      if self._parent:
+        self._parent._notify()
 
-    self.__data__["Status"] = newStatus
-    if self._parent:
-      self._parent._notify()
+  def _fileStatusChanged( self, oldStatus, newStatus ):
+    """ update files counters after status change of a single file """
+    self.__fileStatusCount[oldStatus] -= 1
+    self.__fileStatusCount[newStatus] += 1
+    self._notify()
 
   def _setQueued( self, caller ):
     """ don't touch """
@@ -175,6 +177,7 @@ class Operation( Record ):
     if opFile not in self:
       self.__files__.append( opFile )
       opFile._parent = self
+      self.__fileStatusCount[opFile.Status] += 1
     self._notify()
 
   # # helpers for looping
@@ -188,12 +191,12 @@ class Operation( Record ):
 
   def __delitem__( self, i ):
     """ remove file from op, only if OperationID is NOT set """
-    if not self.OperationID:
-      self.__files__.__delitem__( i )
-    else:
-      if self[i].FileID:
-        self.__dirty.append( self[i].FileID )
-      self.__files__.__delitem__( i )
+    toDelete = self[i] if type( i ) == slice else [ self[i] ]
+    if self.OperationID:
+      self.__dirty += [ opFile.FileID for opFile in toDelete if opFile.FileID ]
+    self.__files__.__delitem__( i )
+    for opFile in toDelete:
+      self.__fileStatusCount[opFile.Status] -= 1
     self._notify()
 
   def __setitem__( self, i, opFile ):
@@ -203,12 +206,18 @@ class Operation( Record ):
       self.__dirty.append( toDelete.FileID )
     self.__files__.__setitem__( i, opFile )
     opFile._parent = self
+    self.__fileStatusCount[toDelete.Status] -= 1
+    self.__fileStatusCount[opFile.Status] += 1
     self._notify()
 
   def fileStatusList( self ):
     """ get list of files statuses """
     return [ subFile.Status for subFile in self ]
 
+  def fileStatusCount( self, status ):
+    """ get number of files in :status: """
+    return self.__fileStatusCount.get( status, 0 )
+
   def __len__( self ):
     """ nb of subFiles """
     return len( self.__files__ )
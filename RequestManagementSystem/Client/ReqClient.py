@@ -129,6 +129,23 @@ class ReqClient( Client ):
       return getRequest
     return S_OK( Request( getRequest["Value"] ) )
 
+  def getBulkRequests( self, numberOfRequest = 10 ):
+    """ get at most :numberOfRequest: requests from RequestDB, all of them set to 'Assigned' at once
+
+    :param int numberOfRequest: max number of requests to get
+
+    :return: S_OK( { "Successful" : { requestName : Request, ... }, "Failed" : { requestName : error, ... } } )
+    """
+    self.log.debug( "getBulkRequests: attempting to get %d requests." % numberOfRequest )
+    getRequests = self.requestManager().getBulkRequests( numberOfRequest )
+    if not getRequests["OK"]:
+      self.log.error( "getBulkRequests: unable to get requests: %s" % getRequests["Message"] )
+      return getRequests
+    requests = getRequests["Value"]
+    for requestName, requestJSON in requests["Successful"].items():
+      requests["Successful"][requestName] = Request( requestJSON )
+    return S_OK( requests )
+
   def peekRequest( self, requestName ):
     """ peek request """
     self.log.debug( "peekRequest: attempting to get request." )
@@ -49,6 +49,7 @@ class Request( Record ):
   :param str Status: request's status
   :param TypedList operations: list of operations
   """
+  __slots__ = ( "__waiting", "__dirty", "__operations__" )
 
   ALL_STATES = ( "Waiting", "Failed", "Done", "Scheduled", "Assigned", "Canceled" )
 
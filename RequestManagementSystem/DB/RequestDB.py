@@ -22,6 +22,7 @@ __RCSID__ = "$Id $"
 
 # # imports
 import random
+import datetime
 import threading
 # Get rid of the annoying Deprecation warning of the current MySQLdb
 # FIXME: compile a newer MySQLdb version
@@ -45,6 +46,8 @@ class RequestDB( DB ):
 
   db holding requests
   """
+  # # max number of rows in a single multi-row INSERT
+  BULK_SIZE = 1000
 
   def __init__( self, systemInstance = 'Default', maxQueueSize = 10 ):
     """c'tor
@@ -133,9 +136,87 @@ class RequestDB( DB ):
       cursor.close()
       return S_ERROR( str( error ) )
 
+  def _sqlValues( self, values ):
+    """ format :values: for SQL, None is stored as NULL, strings and dates are escaped
+
+    :param list values: attribute values
+    :return: S_OK( list of SQL literals )
+    """
+    sqlValues = []
+    for value in values:
+      if value is None:
+        sqlValues.append( "NULL" )
+      elif type( value ) in ( str, unicode, datetime.datetime ):
+        escaped = self._escapeString( value )
+        if not escaped["OK"]:
+          return escaped
+        sqlValues.append( escaped["Value"] )
+      else:
+        sqlValues.append( str( value ) )
+    return S_OK( sqlValues )
+
+  def _operationsSQL( self, request ):
+    """ build queries storing all operations and files of :request:
+
+    existing operations are written with a single multi-row upsert, new ones are inserted one by one
+    saving their OperationIDs in @OperationID<Order> SQL variables, files of all operations are written
+    with multi-row upserts of at most BULK_SIZE rows
+
+    :param Request request: Request instance, RequestID is held in @RequestID SQL variable
+    :return: S_OK( ( list of queries, list of new operations ) )
+    """
+    opColumns = [ column for column in Operation.tableDesc()["Fields"]
+                  if column not in ( "OperationID", "RequestID", "LastUpdate", "Order" ) ]
+    fileColumns = [ column for column in File.tableDesc()["Fields"] if column not in ( "FileID", "OperationID" ) ]
+
+    queries = []
+    newOperations = []
+    opRows = []
+    fileRows = []
+    for operation in request:
+      cleanUp = operation.cleanUpSQL()
+      if cleanUp:
+        queries.append( cleanUp )
+      row = self._sqlValues( [ getattr( operation, column ) for column in opColumns ] )
+      if not row["OK"]:
+        return row
+      row = row["Value"] + [ "@RequestID", "UTC_TIMESTAMP()", str( operation.Order ) ]
+      if operation.OperationID:
+        opRows.append( "(%s)" % ",".join( [ str( operation.OperationID ) ] + row ) )
+        operationID = str( operation.OperationID )
+      else:
+        newOperations.append( operation )
+        operationID = "@OperationID%s" % operation.Order
+        queries.append( "INSERT INTO `Operation` (%s) VALUES (%s);" % \
+                          ( ",".join( [ "`%s`" % column for column in opColumns + [ "RequestID", "LastUpdate", "Order" ] ] ),
+                            ",".join( row ) ) )
+        queries.append( "SET %s = LAST_INSERT_ID();" % operationID )
+      for opFile in operation:
+        fileRow = self._sqlValues( [ opFile.FileID or None ] + [ getattr( opFile, column ) for column in fileColumns ] )
+        if not fileRow["OK"]:
+          return fileRow
+        fileRow = fileRow["Value"]
+        fileRows.append( "(%s)" % ",".join( fileRow[:1] + [ operationID ] + fileRow[1:] ) )
+
+    if opRows:
+      columns = [ "OperationID" ] + opColumns + [ "RequestID", "LastUpdate", "Order" ]
+      queries.insert( 0, "INSERT INTO `Operation` (%s) VALUES %s ON DUPLICATE KEY UPDATE %s;" % \
+                        ( ",".join( [ "`%s`" % column for column in columns ] ), ",".join( opRows ),
+                          ",".join( [ "`%s`=VALUES(`%s`)" % ( column, column ) for column in columns[1:] ] ) ) )
+
+    columns = [ "FileID", "OperationID" ] + fileColumns
+    for i in range( 0, len( fileRows ), self.BULK_SIZE ):
+      queries.append( "INSERT INTO `File` (%s) VALUES %s ON DUPLICATE KEY UPDATE %s;" % \
+                        ( ",".join( [ "`%s`" % column for column in columns ] ),
+                          ",".join( fileRows[i:i + self.BULK_SIZE] ),
+                          ",".join( [ "`%s`=VALUES(`%s`)" % ( column, column ) for column in columns[1:] ] ) ) )
+    return S_OK( ( queries, newOperations ) )
+
   def putRequest( self, request ):
     """ update or insert request into db
 
+    the whole request (Request, Operations and Files) is written in a single transaction
+
     :param Request request: Request instance
     """
     query = "SELECT `RequestID` from `Request` WHERE `RequestName` = '%s'" % request.RequestName
@@ -151,66 +232,34 @@ class RequestDB( DB ):
     reqSQL = request.toSQL()
     if not reqSQL["OK"]:
       return reqSQL
-    reqSQL = reqSQL["Value"]
-    putRequest = self._transaction( reqSQL )
+    queries = request.cleanUpSQL() or []
+    queries.append( reqSQL["Value"] )
+    if request.RequestID:
+      queries.append( "SET @RequestID = %d;" % request.RequestID )
+    else:
+      queries.append( "SET @RequestID = LAST_INSERT_ID();" )
+    opQueries = self._operationsSQL( request )
+    if not opQueries["OK"]:
+      self.log.error( "putRequest: unable to build queries for request '%s': %s" % ( request.RequestName,
+                                                                                     opQueries["Message"] ) )
+      return opQueries
+    opQueries, newOperations = opQueries["Value"]
+    queries += opQueries
+    idsQuery = "SELECT @RequestID AS `RequestID`%s;" % "".join( [ ", @OperationID%s AS `%s`" % ( op.Order, op.Order )
+                                                                 for op in newOperations ] )
+    queries.append( idsQuery )
+
+    putRequest = self._transaction( queries )
     if not putRequest["OK"]:
-      self.log.error( "putRequest: %s" % putRequest["Message"] )
+      self.log.error( "putRequest: unable to put request '%s': %s" % ( request.RequestName, putRequest["Message"] ) )
       return putRequest
-    lastrowid = putRequest["lastrowid"]
-    putRequest = putRequest["Value"]
-
-    cleanUp = request.cleanUpSQL()
-    if cleanUp:
-      dirty = self._transaction( cleanUp )
-      if not dirty["OK"]:
-        self.log.error( "putRequest: unable to delete dirty Operation records: %s" % dirty["Message"] )
-        return dirty
-
-    # # flag for a new request
-    isNew = False
-    # # set RequestID when necessary
-    if request.RequestID == 0:
-      isNew = True
-      request.RequestID = lastrowid
+    newIDs = putRequest["Value"][idsQuery][0]
 
-    for operation in request:
-
-      cleanUp = operation.cleanUpSQL()
-      if cleanUp:
-        dirty = self._transaction( [ cleanUp ] )
-        if not dirty["OK"]:
-          self.log.error( "putRequest: unable to delete dirty File records: %s" % dirty["Message"] )
-          return dirty
-
-      opSQL = operation.toSQL()["Value"]
-      putOperation = self._transaction( opSQL )
-      if not putOperation["OK"]:
-        self.log.error( "putRequest: unable to put operation %d: %s" % ( request.indexOf( operation ),
-                                                                         putOperation["Message"] ) )
-        if isNew:
-          deleteRequest = self.deleteRequest( request.RequestName )
-          if not deleteRequest["OK"]:
-            self.log.error( "putRequest: unable to delete request '%s': %s"\
-                             % ( request.RequestName, deleteRequest["Message"] ) )
-            return deleteRequest
-        return putOperation
-      lastrowid = putOperation["lastrowid"]
-      putOperation = putOperation["Value"]
-      if operation.OperationID == 0:
-        operation.OperationID = lastrowid
-      filesToSQL = [ opFile.toSQL()["Value"] for opFile in operation ]
-      if filesToSQL:
-        putFiles = self._transaction( filesToSQL )
-        if not putFiles["OK"]:
-          self.log.error( "putRequest: unable to put files for operation %d: %s" % ( request.indexOf( operation ),
-                                                                                    putFiles["Message"] ) )
-          if isNew:
-            deleteRequest = self.deleteRequest( request.requestName )
-            if not deleteRequest["OK"]:
-              self.log.error( "putRequest: unable to delete request '%s': %s"\
-                              % ( request.RequestName, deleteRequest["Message"] ) )
-              return deleteRequest
-          return putFiles
+    # # set RequestID and OperationIDs when necessary
+    if request.RequestID == 0:
+      request.RequestID = newIDs["RequestID"]
+    for operation in newOperations:
+      operation.OperationID = newIDs[str( operation.Order )]
 
     return S_OK()
 
@@ -271,37 +320,99 @@ class RequestDB( DB ):
       random.shuffle( reqIDs )
       requestID = reqIDs[0]
 
-    selectQuery = [ "SELECT * FROM `Request` WHERE `RequestID` = %s;" % requestID,
-                    "SELECT * FROM `Operation` WHERE `RequestID` = %s;" % requestID ]
+    requests = self._loadRequests( [ requestID ], assigned )
+    if not requests["OK"]:
+      self.log.error( "getRequest: %s" % requests["Message"] )
+      return requests
+    if requestID not in requests["Value"]:
+      return S_ERROR( "getRequest: request '%s' not exists" % requestID )
+    return S_OK( requests["Value"][requestID] )
+
+  def getBulkRequests( self, numberOfRequest = 10, assigned = True ):
+    """ read at most :numberOfRequest: 'Waiting' requests for execution
+
+    requests are claimed with a single UPDATE, which sets their status to 'Assigned' collecting the claimed
+    RequestIDs in the @claimed SQL variable, so parallel callers never get the same request
+
+    :param int numberOfRequest: max number of requests to read
+    :param bool assigned: flag to claim read requests, if False they are only peeked
+    :return: S_OK( { requestName : Request, ... } )
+    """
+    if assigned:
+      # # SET expressions are evaluated only for updated rows
+      claimQuery = "SELECT @claimed AS `Claimed`;"
+      claim = self._transaction( [ "SET @claimed = NULL;",
+                                   "UPDATE `Request` SET `Status` = "\
+                                     "IF( ( @claimed := CONCAT_WS( ',', @claimed, `RequestID` ) ) IS NOT NULL, 'Assigned', `Status` ), "\
+                                     "`LastUpdate` = UTC_TIMESTAMP() WHERE `Status` = 'Waiting' "\
+                                     "ORDER BY `LastUpdate` ASC LIMIT %d;" % int( numberOfRequest ),
+                                   claimQuery ] )
+      if not claim["OK"]:
+        self.log.error( "getBulkRequests: %s" % claim["Message"] )
+        return claim
+      claimed = claim["Value"][claimQuery][0]["Claimed"]
+      requestIDs = [ int( requestID ) for requestID in claimed.split( "," ) ] if claimed else []
+    else:
+      reqIDsQuery = "SELECT `RequestID` FROM `Request` WHERE `Status` = 'Waiting' ORDER BY `LastUpdate` ASC LIMIT %d;" % \
+        int( numberOfRequest )
+      reqIDs = self._query( reqIDsQuery )
+      if not reqIDs["OK"]:
+        self.log.error( "getBulkRequests: %s" % reqIDs["Message"] )
+        return reqIDs
+      requestIDs = [ reqID[0] for reqID in reqIDs["Value"] ]
+
+    requests = self._loadRequests( requestIDs )
+    if not requests["OK"]:
+      self.log.error( "getBulkRequests: %s" % requests["Message"] )
+      if assigned and requestIDs:
+        self._query( "UPDATE `Request` SET `Status` = 'Waiting' WHERE `RequestID` IN (%s);" % \
+                       ",".join( [ str( requestID ) for requestID in requestIDs ] ) )
+      return requests
+    return S_OK( dict( [ ( request.RequestName, request ) for request in requests["Value"].values() ] ) )
+
+  def _loadRequests( self, requestIDs, assigned = False ):
+    """ read requests together with their operations and files in a single transaction
+
+    :param list requestIDs: list of Request.RequestID
+    :param bool assigned: flag to set status of read requests to 'Assigned'
+    :return: S_OK( { requestID : Request, ... } )
+    """
+    if not requestIDs:
+      return S_OK( {} )
+    requestIDs = ",".join( [ str( int( requestID ) ) for requestID in requestIDs ] )
+    selectQuery = [ "SELECT * FROM `Request` WHERE `RequestID` IN (%s);" % requestIDs,
+                    "SELECT * FROM `Operation` WHERE `RequestID` IN (%s);" % requestIDs,
+                    "SELECT `File`.* FROM `File` JOIN `Operation` USING (`OperationID`) "\
+                      "WHERE `Operation`.`RequestID` IN (%s) ORDER BY `File`.`FileID`;" % requestIDs ]
+    if assigned:
+      selectQuery.append( "UPDATE `Request` SET `Status` = 'Assigned' WHERE `RequestID` IN (%s);" % requestIDs )
     selectReq = self._transaction( selectQuery )
     if not selectReq["OK"]:
-      self.log.error( "getRequest: %s" % selectReq["Message"] )
+      self.log.error( "_loadRequests: %s" % selectReq["Message"] )
       return S_ERROR( selectReq["Message"] )
     selectReq = selectReq["Value"]
 
-    request = Request( selectReq[selectQuery[0]][0] )
+    # # group files by OperationID and operations by RequestID
+    opFiles = {}
+    for getFile in selectReq[selectQuery[2]]:
+      getFileDict = dict( [ ( key, value ) for key, value in getFile.items() if value != None ] )
+      opFiles.setdefault( getFile["OperationID"], [] ).append( getFileDict )
+    reqOperations = {}
     for records in sorted( selectReq[selectQuery[1]], key = lambda k: k["Order"] ):
-      # # order is ro, remove
-      del records["Order"]
-      operation = Operation( records )
-      getFilesQuery = "SELECT * FROM `File` WHERE `OperationID` = %s;" % operation.OperationID
-      getFiles = self._transaction( getFilesQuery )
-      if not getFiles["OK"]:
-        self.log.error( "getRequest: %s" % getFiles["Message"] )
-        return getFiles
-      getFiles = getFiles["Value"][getFilesQuery]
-      for getFile in getFiles:
-        getFileDict = dict( [ ( key, value ) for key, value in getFile.items() if value != None ] )
-        operation.addFile( File( getFileDict ) )
-      request.addOperation( operation )
-
-    if assigned:
-      setAssigned = self._transaction( "UPDATE `Request` SET `Status` = 'Assigned' WHERE RequestID = %s;" % requestID )
-      if not setAssigned["OK"]:
-        self.log.error( "getRequest: %s" % setAssigned["Message"] )
-        return setAssigned
-
-    return S_OK( request )
+      reqOperations.setdefault( records["RequestID"], [] ).append( records )
+
+    requests = {}
+    for reqRecord in selectReq[selectQuery[0]]:
+      request = Request( reqRecord )
+      for records in reqOperations.get( reqRecord["RequestID"], [] ):
+        # # order is ro, remove
+        del records["Order"]
+        operation = Operation( records )
+        for getFileDict in opFiles.get( operation.OperationID, [] ):
+          operation.addFile( File( getFileDict ) )
+        request.addOperation( operation )
+      requests[request.RequestID] = request
+    return S_OK( requests )
 
   def peekRequest( self, requestName ):
     """ get request (ro), no update on states
@@ -537,21 +648,33 @@ class RequestDB( DB ):
                    "Failed" : { jobID3: "error message", ... } )
     """
     self.log.debug( "readRequestForJobs: got %s jobIDs to check" % str( jobIDs ) )
-    requestNames = self.getRequestNamesForJobs( jobIDs )
-    if not requestNames["OK"]:
-      self.log.error( "readRequestForJobs: %s" % requestNames["Message"] )
-      return requestNames
-    requestNames = requestNames["Value"]
+    if not jobIDs:
+      return S_ERROR( "Must provide jobID list as argument." )
+    if type( jobIDs ) in ( long, int ):
+      jobIDs = [ jobIDs ]
+    jobIDs = list( set( [ int( jobID ) for jobID in jobIDs if int( jobID ) ] ) )
+    if not jobIDs:
+      return S_OK( { "Successful" : {}, "Failed" : {} } )
+    query = "SELECT `RequestID`, `JobID` FROM `Request` WHERE `JobID` IN (%s);" % \
+      ",".join( [ str( jobID ) for jobID in jobIDs ] )
+    requestIDs = self._query( query )
+    if not requestIDs["OK"]:
+      self.log.error( "readRequestForJobs: %s" % requestIDs["Message"] )
+      return requestIDs
+    requestIDs = dict( requestIDs["Value"] )
+    requests = self._loadRequests( requestIDs.keys() )
+    if not requests["OK"]:
+      self.log.error( "readRequestForJobs: %s" % requests["Message"] )
+      return requests
+    requests = requests["Value"]
+    self.log.debug( "readRequestForJobs: got %d requests" % len( requests ) )
     # # this will be returned
-    retDict = { "Failed": requestNames["Failed"], "Successful": {} }
-
-    self.log.debug( "readRequestForJobs: got %d request names" % len( requestNames["Successful"] ) )
-    for jobID in requestNames:
-      request = self.peekRequest( requestNames[jobID] )
-      if not request["OK"]:
-        retDict["Failed"][jobID] = request["Message"]
-        continue
-      retDict["Successful"][jobID] = request["Value"]
+    retDict = { "Failed": {}, "Successful": {} }
+    for requestID, request in requests.items():
+      retDict["Successful"][requestIDs[requestID]] = request
+    for jobID in jobIDs:
+      if jobID not in retDict["Successful"]:
+        retDict["Failed"][jobID] = "Request not found"
     return S_OK( retDict )
 
   def getRequestStatus( self, requestName ):
@@ -141,6 +141,32 @@ class ReqManagerHandler( RequestHandler ):
       gLogger.exception( errStr, lException = error )
       return S_ERROR( errStr )
 
+  types_getBulkRequests = [ ( IntType, LongType ) ]
+  @classmethod
+  def export_getBulkRequests( cls, numberOfRequest = 10 ):
+    """ claim at most :numberOfRequest: waiting requests at once
+
+    :return: S_OK( { "Successful" : { requestName : requestJSON, ... }, "Failed" : { requestName : error, ... } } )
+    """
+    try:
+      getRequests = cls.__requestDB.getBulkRequests( numberOfRequest )
+      if not getRequests["OK"]:
+        gLogger.error( "getBulkRequests: %s" % getRequests["Message"] )
+        return getRequests
+      retDict = { "Successful" : {}, "Failed" : {} }
+      for requestName, request in getRequests["Value"].items():
+        toJSON = request.toJSON()
+        if not toJSON["OK"]:
+          gLogger.error( "getBulkRequests: %s" % toJSON["Message"] )
+          retDict["Failed"][requestName] = toJSON["Message"]
+          continue
+        retDict["Successful"][requestName] = toJSON["Value"]
+      return S_OK( retDict )
+    except Exception, error:
+      errStr = "getBulkRequests: Exception while getting requests."
+      gLogger.exception( errStr, lException = error )
+      return S_ERROR( errStr )
+
   types_peekRequest = [ StringTypes ]
   @classmethod
   def export_peekRequest( cls, requestName = "" ):
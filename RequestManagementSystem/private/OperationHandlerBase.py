@@ -71,6 +71,8 @@ class OperationHandlerBase( object ):
   __dataLoggingClient = None
   # # private ResourceStatusClient
   __rssClient = None
+  # # private FileCatalog client
+  __fileCatalog = None
   # # shifter list
   __shifterList = []
 
@@ -137,6 +139,14 @@ class OperationHandlerBase( object ):
       cls.__replicaManager = ReplicaManager()
     return cls.__replicaManager
 
+  @classmethod
+  def fileCatalog( cls ):
+    """ FileCatalog getter """
+    if not cls.__fileCatalog:
+      from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
+      cls.__fileCatalog = FileCatalog()
+    return cls.__fileCatalog
+
   @classmethod
   def dataLoggingClient( cls ):
     """ DataLoggingClient getter """
@@ -34,7 +34,14 @@ class Record( object ):
   a single record in the db
 
   all columns should be exported as properties in the inherited classes
+
+  records are slotted, inherited classes could define their own __slots__ to get rid of
+  per instance __dict__
   """
+  __slots__ = ( "__data__", "__dirty" )
+
+  # # public attributes names per class, cached for __setattr__
+  __classAttrs = {}
 
   def __init__( self ):
     """c'tor
@@ -46,8 +53,12 @@ class Record( object ):
 
   def __setattr__( self, name, value ):
     """ bweare of tpyos!!! """
-    if not name.startswith( "_" ) and name not in dir( self ):
-      raise AttributeError( "'%s' has no attribute '%s'" % ( self.__class__.__name__, name ) )
+    if not name.startswith( "_" ):
+      classAttrs = Record.__classAttrs.get( self.__class__ )
+      if classAttrs is None:
+        classAttrs = Record.__classAttrs.setdefault( self.__class__, frozenset( dir( self.__class__ ) ) )
+      if name not in classAttrs:
+        raise AttributeError( "'%s' has no attribute '%s'" % ( self.__class__.__name__, name ) )
     try:
       object.__setattr__( self, name, value )
     except AttributeError, error:
@@ -41,6 +41,16 @@ class RequestTask( object ):
   """
   # # request client
   __requestClient = None
+  # # per process caches, kept between tasks executed in the same ProcessPool worker
+  # # operation handlers classes, the instances are made per task as a thread
+  # # abandoned by ProcessPool after a timeout may still be using its own ones
+  __handlerClasses = {}
+  # # shifter proxies
+  __managersDict = {}
+  # # flag set when gMonitor has been set up in this process
+  __monitorReady = False
+  # # min lifetime in seconds of cached shifter proxies
+  __proxyTimeLeft = 1800
 
   def __init__( self, requestJSON, handlersDict, csPath, agentName ):
     """c'tor
@@ -56,21 +66,21 @@ class RequestTask( object ):
     self.agentName = agentName
     # # handlers dict
     self.handlersDict = handlersDict
-    # # handlers class def
+    # # handlers instances of this task
     self.handlers = {}
     # # own sublogger
     self.log = gLogger.getSubLogger( self.request.RequestName )
-    # # get shifters info
-    self.__managersDict = {}
-    shifterProxies = self.__setupManagerProxies()
-    if not shifterProxies["OK"]:
-      self.log.error( shifterProxies["Message"] )
-
     # # initialize gMonitor
+    self.setupMonitor( self.agentName )
+
+  @classmethod
+  def setupMonitor( cls, agentName ):
+    """ initialize gMonitor and register own activities, once per process """
+    if cls.__monitorReady:
+      return
     gMonitor.setComponentType( gMonitor.COMPONENT_AGENT )
-    gMonitor.setComponentName( self.agentName )
+    gMonitor.setComponentName( agentName )
     gMonitor.initialize()
-
     # # own gMonitor activities
     gMonitor.registerActivity( "RequestAtt", "Requests processed",
                                "RequestExecutingAgent", "Requests/min", gMonitor.OP_SUM )
@@ -78,51 +88,98 @@ class RequestTask( object ):
                                "RequestExecutingAgent", "Requests/min", gMonitor.OP_SUM )
     gMonitor.registerActivity( "RequestOK", "Requests done",
                                "RequestExecutingAgent", "Requests/min", gMonitor.OP_SUM )
+    cls.__monitorReady = True
+
+  @classmethod
+  def initializeWorker( cls, handlersDict, csPath, agentName ):
+    """ ProcessPool worker initializer
+
+    sets up gMonitor, operation handlers classes, request client and shifter proxies once per
+    worker process, so that tasks executed later on in this process could reuse them
 
-  def __setupManagerProxies( self ):
-    """ setup grid proxy for all defined managers """
+    :param dict handlersDict: operation handlers
+    :param str csPath: agent CS path
+    :param str agentName: agent name
+    """
+    log = gLogger.getSubLogger( "RequestTask/%s" % os.getpid() )
+    cls.setupMonitor( agentName )
+    cls.requestClient()
+    OperationHandlerBase.replicaManager()
+    OperationHandlerBase.fileCatalog()
+    for opType, handlerPath in handlersDict.items():
+      if opType in cls.__handlerClasses:
+        continue
+      try:
+        cls.__handlerClasses[opType] = cls.loadHandler( handlerPath )
+      except ( ImportError, TypeError ), error:
+        log.exception( "initializeWorker: %s" % str( error ), lException = error )
+    shifterProxies = cls.__setupManagerProxies( log )
+    if not shifterProxies["OK"]:
+      log.error( shifterProxies["Message"] )
+
+  @classmethod
+  def __proxiesValid( cls ):
+    """ check if all cached shifter proxies are still valid for at least __proxyTimeLeft seconds """
+    if not cls.__managersDict:
+      return False
+    for creds in cls.__managersDict.values():
+      if not os.path.exists( creds["ProxyFile"] ):
+        return False
+      timeLeft = creds["Chain"].getRemainingSecs()
+      if not timeLeft["OK"] or timeLeft["Value"] < cls.__proxyTimeLeft:
+        return False
+    return True
+
+  @classmethod
+  def __setupManagerProxies( cls, log ):
+    """ setup grid proxy for all defined managers, cached proxies are refreshed only before expiry """
+    if cls.__proxiesValid():
+      return S_OK()
     oHelper = Operations()
     shifters = oHelper.getSections( "Shifter" )
     if not shifters["OK"]:
-      self.log.error( shifters["Message"] )
+      log.error( shifters["Message"] )
       return shifters
     shifters = shifters["Value"]
+    managersDict = {}
     for shifter in shifters:
       shifterDict = oHelper.getOptionsDict( "Shifter/%s" % shifter )
       if not shifterDict["OK"]:
-        self.log.error( shifterDict["Message"] )
+        log.error( shifterDict["Message"] )
         continue
       userName = shifterDict["Value"].get( "User", "" )
       userGroup = shifterDict["Value"].get( "Group", "" )
 
       userDN = CS.getDNForUsername( userName )
       if not userDN["OK"]:
-        self.log.error( userDN["Message"] )
+        log.error( userDN["Message"] )
         continue
       userDN = userDN["Value"][0]
       vomsAttr = CS.getVOMSAttributeForGroup( userGroup )
       if vomsAttr:
-        self.log.debug( "getting VOMS [%s] proxy for shifter %s@%s (%s)" % ( vomsAttr, userName,
-                                                                             userGroup, userDN ) )
+        log.debug( "getting VOMS [%s] proxy for shifter %s@%s (%s)" % ( vomsAttr, userName,
+                                                                        userGroup, userDN ) )
         getProxy = gProxyManager.downloadVOMSProxyToFile( userDN, userGroup,
-                                                          requiredTimeLeft = 1200,
+                                                          requiredTimeLeft = cls.__proxyTimeLeft,
                                                           cacheTime = 4 * 43200 )
       else:
-        self.log.debug( "getting proxy for shifter %s@%s (%s)" % ( userName, userGroup, userDN ) )
+        log.debug( "getting proxy for shifter %s@%s (%s)" % ( userName, userGroup, userDN ) )
         getProxy = gProxyManager.downloadProxyToFile( userDN, userGroup,
-                                                      requiredTimeLeft = 1200,
+                                                      requiredTimeLeft = cls.__proxyTimeLeft,
                                                       cacheTime = 4 * 43200 )
       if not getProxy["OK"]:
-        self.log.error( getProxy["Message" ] )
+        log.error( getProxy["Message" ] )
         return S_ERROR( "unable to setup shifter proxy for %s: %s" % ( shifter, getProxy["Message"] ) )
       chain = getProxy["chain"]
       fileName = getProxy["Value" ]
-      self.log.debug( "got %s: %s %s" % ( shifter, userName, userGroup ) )
-      self.__managersDict[shifter] = { "ShifterDN" : userDN,
-                                       "ShifterName" : userName,
-                                       "ShifterGroup" : userGroup,
-                                       "Chain" : chain,
-                                       "ProxyFile" : fileName }
+      log.debug( "got %s: %s %s" % ( shifter, userName, userGroup ) )
+      managersDict[shifter] = { "ShifterDN" : userDN,
+                                "ShifterName" : userName,
+                                "ShifterGroup" : userGroup,
+                                "Chain" : chain,
+                                "ProxyFile" : fileName }
+    cls.__managersDict.clear()
+    cls.__managersDict.update( managersDict )
     return S_OK()
 
   def setupProxy( self ):
@@ -130,8 +187,7 @@ class RequestTask( object ):
 
     :return: S_OK with name of newly created owner proxy file and shifter name if any
     """
-    self.__managersDict = {}
-    shifterProxies = self.__setupManagerProxies()
+    shifterProxies = self.__setupManagerProxies( self.log )
     if not shifterProxies["OK"]:
       self.log.error( shifterProxies["Message"] )
 
@@ -197,7 +253,8 @@ class RequestTask( object ):
 
   def getHandler( self, operation ):
     """ return instance of a handler for a given operation type on demand
-        all created handlers are kept in self.handlers dict for further use
+        handlers are created once per task and kept in self.handlers dict, their classes
+        are loaded once per process, the costly clients being shared by OperationHandlerBase
 
     :param Operation operation: Operation instance
     """
@@ -206,7 +263,10 @@ class RequestTask( object ):
     handler = self.handlers.get( operation.Type, None )
     if not handler:
       try:
-        handlerCls = self.loadHandler( self.handlersDict[operation.Type] )
+        handlerCls = self.__handlerClasses.get( operation.Type )
+        if not handlerCls:
+          handlerCls = self.loadHandler( self.handlersDict[operation.Type] )
+          self.__handlerClasses[operation.Type] = handlerCls
         self.handlers[operation.Type] = handlerCls( csPath = "%s/OperationHandlers/%s" % ( self.csPath,
                                                                                            operation.Type ) )
         handler = self.handlers[ operation.Type ]
@@ -253,6 +253,29 @@ class OperationTests( unittest.TestCase ):
                       "DELETE FROM `File` WHERE `OperationID` = 1 AND `FileID` IN (1,2);\n",
                       "cleanUp failed after JSON" )
 
+  def test06StatusCounters( self ):
+    """ per status files counters """
+    op = Operation()
+    files = [ File( { "LFN" : "/%s" % i, "Status" : status } )
+              for i, status in enumerate( ( "Waiting", "Waiting", "Done", "Scheduled" ) ) ]
+    for opFile in files:
+      op.addFile( opFile )
+    self.assertEqual( [ op.fileStatusCount( status ) for status in ( "Waiting", "Done", "Scheduled", "Failed" ) ],
+                      [ 2, 1, 1, 0 ] )
+    files[0].Status = "Done"
+    files[1].Status = "Scheduled"
+    self.assertEqual( [ op.fileStatusCount( status ) for status in ( "Waiting", "Done", "Scheduled", "Failed" ) ],
+                      [ 0, 2, 2, 0 ] )
+    self.assertEqual( op.Status, "Scheduled" )
+    op[3] = File( { "LFN" : "/3", "Status" : "Failed" } )
+    self.assertEqual( op.fileStatusCount( "Scheduled" ), 1 )
+    self.assertEqual( op.fileStatusCount( "Failed" ), 1 )
+    self.assertEqual( op.Status, "Failed" )
+    del op[3]
+    del op[1]
+    self.assertEqual( op.fileStatusCount( "Failed" ), 0 )
+    self.assertEqual( op.fileStatusCount( "Done" ), 2 )
+    self.assertEqual( op.Status, "Done" )
 
 
 
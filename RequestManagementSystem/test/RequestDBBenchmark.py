@@ -0,0 +1,85 @@
+########################################################################
+# $HeadURL $
+# File: RequestDBBenchmark.py
+########################################################################
+""" :mod: RequestDBBenchmark
+    ========================
+
+    .. module: RequestDBBenchmark
+    :synopsis: round trip benchmark for RequestDB
+
+    Times putRequest (insert), getRequest, putRequest (update) and deleteRequest
+    for ReplicateAndRegister requests holding 10, 1k and 10k files.
+
+    Needs a ReqDB set up as in RequestDBTests, usage::
+
+      python RequestDBBenchmark.py [nFiles ...]
+"""
+
+__RCSID__ = "$Id $"
+
+# # imports
+import sys
+import time
+# # from DIRAC
+from DIRAC.Core.Base.Script import parseCommandLine
+parseCommandLine()
+from DIRAC import gConfig
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.File import File
+from DIRAC.RequestManagementSystem.DB.RequestDB import RequestDB
+
+def buildRequest( requestName, nFiles ):
+  """ ReplicateAndRegister request with :nFiles: files split into operations of Operation.MAX_FILES files """
+  request = Request( { "RequestName" : requestName } )
+  operation = None
+  for i in range( nFiles ):
+    if not operation or len( operation ) == Operation.MAX_FILES:
+      operation = Operation( { "Type" : "ReplicateAndRegister", "TargetSE" : "CERN-USER" } )
+      request.addOperation( operation )
+    operation.addFile( File( { "LFN" : "/benchmark/%s/%08d" % ( requestName, i ), "Size" : 1024,
+                               "Checksum" : "123456", "ChecksumType" : "ADLER32" } ) )
+  return request
+
+def timeIt( method, *args ):
+  """ execute :method: returning its result and wall time """
+  start = time.time()
+  ret = method( *args )
+  if not ret["OK"]:
+    raise RuntimeError( ret["Message"] )
+  return ret, time.time() - start
+
+def benchmark( db, nFiles, repeat = 3 ):
+  """ round trip requests with :nFiles: files, print best timings """
+  timings = { "put" : [], "get" : [], "update" : [], "delete" : [] }
+  for i in range( repeat ):
+    requestName = "benchmark-%d-%d" % ( nFiles, i )
+    request = buildRequest( requestName, nFiles )
+    timings["put"].append( timeIt( db.putRequest, request )[1] )
+    ret, getTime = timeIt( db.getRequest, requestName )
+    timings["get"].append( getTime )
+    request = ret["Value"]
+    for operation in request:
+      for opFile in operation:
+        opFile.Status = "Done"
+    timings["update"].append( timeIt( db.putRequest, request )[1] )
+    timings["delete"].append( timeIt( db.deleteRequest, requestName )[1] )
+  print "%8d files: %s" % ( nFiles, ", ".join( [ "%s %.3f s (%.0f files/s)" % ( step, min( timings[step] ),
+                                                                                 nFiles / max( min( timings[step] ), 1e-6 ) )
+                                                   for step in ( "put", "get", "update", "delete" ) ] ) )
+
+if __name__ == "__main__":
+  gConfig.setOptionValue( 'DIRAC/Setup', 'Test' )
+  gConfig.setOptionValue( '/DIRAC/Setups/Test/RequestManagement', 'Test' )
+  gConfig.setOptionValue( '/Systems/RequestManagement/Test/Databases/ReqDB/Host', 'localhost' )
+  gConfig.setOptionValue( '/Systems/RequestManagement/Test/Databases/ReqDB/DBName', 'ReqDB' )
+  gConfig.setOptionValue( '/Systems/RequestManagement/Test/Databases/ReqDB/User', 'Dirac' )
+
+  requestDB = RequestDB()
+  tables = requestDB.getTables()
+  if not tables["OK"]:
+    raise RuntimeError( tables["Message"] )
+  requestDB.createTables( [ table for table in requestDB.getTableMeta() if table not in tables["Value"] ] )
+  for files in [ int( arg ) for arg in sys.argv[1:] ] or [ 10, 1000, 10000 ]:
+    benchmark( requestDB, files )
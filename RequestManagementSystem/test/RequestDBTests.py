@@ -260,6 +260,70 @@ class RequestDBTests( unittest.TestCase ):
     self.assertEqual( len( r ), 2, "3. len wrong" )
 
 
+  def test07BulkRoundTrip( self ):
+    """ many operations and files r/w """
+    db = RequestDB()
+
+    request = Request( { "RequestName" : "bulk" } )
+    for i in range( 20 ):
+      op = Operation( { "Type": "ReplicateAndRegister", "TargetSE": "CERN-USER" } )
+      for j in range( Operation.MAX_FILES ):
+        op += File( { "LFN" : "/a/b/c/%d/%d" % ( i, j ), "Checksum": "123456", "ChecksumType": "ADLER32" } )
+      request += op
+
+    put = db.putRequest( request )
+    self.assertEqual( put["OK"], True, "1. putRequest failed: %s" % put.get( "Message", "" ) )
+    self.assertEqual( bool( request.RequestID ), True, "RequestID not set" )
+    self.assertEqual( all( [ op.OperationID for op in request ] ), True, "OperationID not set" )
+
+    get = db.getRequest( "bulk" )
+    self.assertEqual( get["OK"], True, "1. getRequest failed: %s" % get.get( "Message", "" ) )
+    request = get["Value"]
+    self.assertEqual( len( request ), 20, "wrong number of operations" )
+    self.assertEqual( [ len( op ) for op in request ], [ Operation.MAX_FILES ] * 20, "wrong number of files" )
+    self.assertEqual( request[3][5].LFN, "/a/b/c/3/5", "wrong file order" )
+
+    # # update existing records
+    request[0][0].Status = "Done"
+    put = db.putRequest( request )
+    self.assertEqual( put["OK"], True, "2. putRequest failed: %s" % put.get( "Message", "" ) )
+    get = db.peekRequest( "bulk" )
+    self.assertEqual( get["OK"], True, "2. peekRequest failed: %s" % get.get( "Message", "" ) )
+    self.assertEqual( get["Value"][0][0].Status, "Done", "file status not updated" )
+    self.assertEqual( sum( [ len( op ) for op in get["Value"] ] ), 20 * Operation.MAX_FILES, "files duplicated" )
+
+    delete = db.deleteRequest( "bulk" )
+    self.assertEqual( delete["OK"], True, "delete failed" )
+
+  def test08BulkRequests( self ):
+    """ claim many requests at once """
+    db = RequestDB()
+
+    for i in range( 10 ):
+      request = Request( { "RequestName": "bulk-%d" % i } )
+      op = Operation( { "Type": "RemoveReplica", "TargetSE": "CERN-USER" } )
+      op += File( { "LFN": "/lhcb/user/c/cibak/foo" } )
+      request += op
+      put = db.putRequest( request )
+      self.assertEqual( put["OK"], True, "put failed" )
+
+    # # peek doesn't change statuses
+    peek = db.getBulkRequests( 4, False )
+    self.assertEqual( peek["OK"], True, "peek failed" )
+    self.assertEqual( len( peek["Value"] ), 4 )
+    claim = db.getBulkRequests( 6 )
+    self.assertEqual( claim["OK"], True, "1. claim failed" )
+    self.assertEqual( len( claim["Value"] ), 6 )
+    # # claimed requests are not returned again
+    claimAgain = db.getBulkRequests( 6 )
+    self.assertEqual( claimAgain["OK"], True, "2. claim failed" )
+    self.assertEqual( len( claimAgain["Value"] ), 4 )
+    self.assertEqual( set( claim["Value"] ) & set( claimAgain["Value"] ), set() )
+    self.assertEqual( len( db.getBulkRequests( 6 )["Value"] ), 0 )
+
+    for i in range( 10 ):
+      delete = db.deleteRequest( "bulk-%d" % i )
+      self.assertEqual( delete["OK"], True, "delete failed" )
 
 # # test suite execution
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+########################################################################
+# $HeadURL $
+# File: RequestObjectsBenchmark.py
+########################################################################
+""" :mod: RequestObjectsBenchmark
+    =============================
+
+    .. module: RequestObjectsBenchmark
+    :synopsis: memory and CPU benchmark for Request, Operation and File
+
+    Builds a set of requests in memory (as FTSAgent or RequestExecutingAgent caches do),
+    then prints resident memory used, time to build them, time to flip status of every
+    single file (checking request status after each change) and JSON round trip time.
+
+    Run it on two different revisions to compare, usage::
+
+      python RequestObjectsBenchmark.py [nRequests [nOperations [nFiles]]]
+"""
+
+__RCSID__ = "$Id $"
+
+# # imports
+import os
+import sys
+import time
+# # from DIRAC
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.File import File
+
+def rss():
+  """ resident memory of this process in bytes """
+  statm = open( "/proc/self/statm" ).read().split()
+  return int( statm[1] ) * os.sysconf( "SC_PAGE_SIZE" )
+
+def buildRequests( nRequests, nOperations, nFiles ):
+  """ build :nRequests: requests with :nOperations: operations, each with :nFiles: files """
+  requests = []
+  for i in range( nRequests ):
+    request = Request()
+    request.RequestName = "benchmark-%d" % i
+    for j in range( nOperations ):
+      operation = Operation( { "Type" : "ReplicateAndRegister", "TargetSE" : "CERN-USER" } )
+      for k in range( nFiles ):
+        operation.addFile( File( { "LFN" : "/benchmark/%d/%d/%d" % ( i, j, k ), "Size" : 1024,
+                                   "Checksum" : "123456", "ChecksumType" : "ADLER32" } ) )
+      request.addOperation( operation )
+    requests.append( request )
+  return requests
+
+def flipStatus( requests ):
+  """ set all files to Done one by one, reading request status after each change """
+  for request in requests:
+    for operation in request:
+      for opFile in operation:
+        opFile.Status = "Done"
+        request.Status
+
+def jsonRoundTrip( requests ):
+  """ serialize to JSON and back """
+  return [ Request( request.toJSON()["Value"] ) for request in requests ]
+
+def timeIt( method, *args ):
+  """ execute :method:, return its result and CPU time """
+  start = time.clock()
+  ret = method( *args )
+  return ret, time.clock() - start
+
+if __name__ == "__main__":
+  args = [ int( arg ) for arg in sys.argv[1:] ]
+  nRequests, nOperations, nFiles = ( args + [ 1000, 5, 20 ][len( args ):] )[:3]
+  startRSS = rss()
+  requests, buildTime = timeIt( buildRequests, nRequests, nOperations, nFiles )
+  memory = rss() - startRSS
+  totalFiles = nRequests * nOperations * nFiles
+  print "%d requests, %d files" % ( nRequests, totalFiles )
+  print "memory: %.1f MB (%.0f B/file)" % ( memory / 1048576., float( memory ) / totalFiles )
+  print "build: %.2f s (%.0f files/s)" % ( buildTime, totalFiles / buildTime )
+  flipTime = timeIt( flipStatus, requests )[1]
+  print "status change: %.2f s (%.0f changes/s)" % ( flipTime, totalFiles / flipTime )
+  jsonTime = timeIt( jsonRoundTrip, requests )[1]
+  print "JSON round trip: %.2f s (%.0f files/s)" % ( jsonTime, totalFiles / jsonTime )
@@ -459,6 +459,13 @@ class ComputingElement(object):
     self.log.error( 'ComputingElement: %s should be implemented in a subclass' % ( name ) )
     return S_ERROR( 'ComputingElement: %s should be implemented in a subclass' % ( name ) )
 
+  #############################################################################
+  def shutdown( self ):
+    """ Method called before the pilot exits, can be overridden in sub-class to
+        wait for the payloads still running.
+    """
+    return S_OK()
+
 def getLocalCEConfigDict( ceName ):
   """ Collect all the local settings relevant to the CE configuration
   """
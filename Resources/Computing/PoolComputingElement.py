@@ -0,0 +1,200 @@
+########################################################################
+# $Id$
+# File :   PoolComputingElement.py
+########################################################################
+
+""" The Pool Computing Element runs several payloads concurrently in the same
+    multi-core slot. Each payload is executed as with the InProcess CE, in its own
+    thread, within the processor and memory budget of the slot:
+
+      NumberOfProcessors   number of processors of the slot (default 1)
+      MaxRAM               memory of the slot in MB, 0 for no memory limit
+
+    The payloads request NumberOfProcessors (default 1) and MaxRAM (MB, default
+    their share of the slot memory) in their job description. submitJob() waits
+    until the requested resources are free and returns as soon as the payload is
+    started, available() reports how many single processor payloads can still be
+    started in the slot.
+"""
+
+__RCSID__ = "$Id$"
+
+from DIRAC.Resources.Computing.InProcessComputingElement import InProcessComputingElement
+from DIRAC                                               import S_OK, S_ERROR
+
+import threading
+
+MandatoryParameters = [ ]
+
+class PoolComputingElement( InProcessComputingElement ):
+
+  mandatoryParameters = MandatoryParameters
+
+  #############################################################################
+  def __init__( self, ceUniqueID ):
+    """ Standard constructor.
+    """
+    InProcessComputingElement.__init__( self, ceUniqueID )
+    self.poolCondition = threading.Condition()
+    # Resources and threads of the running payloads by executable file
+    self.poolJobs = {}
+
+  #############################################################################
+  def _addCEConfigDefaults( self ):
+    """Method to make sure all necessary Configuration Parameters are defined
+    """
+    # First assure that any global parameters are loaded
+    InProcessComputingElement._addCEConfigDefaults( self )
+    # Now Pool specific ones
+    self.ceParameters['NumberOfProcessors'] = max( 1, int( self.ceParameters.get( 'NumberOfProcessors', 1 ) ) )
+    self.ceParameters['MaxRAM'] = int( self.ceParameters.get( 'MaxRAM', 0 ) )
+
+  #############################################################################
+  def __getJobRequirements( self, wrapperData ):
+    """ Returns the ( processors, memory ) requested by the payload
+    """
+    jobParams = {}
+    if wrapperData:
+      jobParams = wrapperData.get( 'jobArgs', {} ).get( 'Job', {} )
+    try:
+      processors = max( 1, int( jobParams.get( 'NumberOfProcessors', 1 ) ) )
+    except ValueError:
+      self.log.warn( 'Wrong NumberOfProcessors requirement, using 1', jobParams['NumberOfProcessors'] )
+      processors = 1
+    maxRAM = self.ceParameters['MaxRAM']
+    memory = maxRAM * processors / self.ceParameters['NumberOfProcessors']
+    if 'MaxRAM' in jobParams:
+      try:
+        memory = int( jobParams['MaxRAM'] )
+      except ValueError:
+        self.log.warn( 'Wrong MaxRAM requirement, using the default', jobParams['MaxRAM'] )
+    return processors, memory
+
+  #############################################################################
+  def __getFreeResources( self ):
+    """ Returns the ( processors, memory ) not used by the running payloads,
+        to be called with the pool condition acquired
+    """
+    processors = self.ceParameters['NumberOfProcessors']
+    memory = self.ceParameters['MaxRAM']
+    for jobProcessors, jobMemory, _thread in self.poolJobs.values():
+      processors -= jobProcessors
+      memory -= jobMemory
+    return processors, memory
+
+  #############################################################################
+  def __fits( self, processors, memory ):
+    """ True if the payload can be started now, to be called with the pool
+        condition acquired
+    """
+    freeProcessors, freeMemory = self.__getFreeResources()
+    if processors > freeProcessors:
+      return False
+    if self.ceParameters['MaxRAM'] and memory > freeMemory:
+      return False
+    return True
+
+  #############################################################################
+  def submitJob( self, executableFile, proxy, wrapperData = None ):
+    """ Waits until the payload fits in the slot and starts it in its own thread
+    """
+    processors, memory = self.__getJobRequirements( wrapperData )
+    if processors > self.ceParameters['NumberOfProcessors'] or \
+       ( self.ceParameters['MaxRAM'] and memory > self.ceParameters['MaxRAM'] ):
+      result = S_ERROR( 'Job requires %s processors and %s MB, more than the slot provides' % ( processors, memory ) )
+      result['ReschedulePayload'] = True
+      return result
+
+    self.poolCondition.acquire()
+    try:
+      while not self.__fits( processors, memory ):
+        self.log.verbose( 'Waiting for %s processors and %s MB to be free' % ( processors, memory ) )
+        self.poolCondition.wait( 60 )
+      thread = threading.Thread( target = self.__executeJob, args = ( executableFile, proxy ) )
+      thread.setDaemon( 1 )
+      self.poolJobs[executableFile] = ( processors, memory, thread )
+      thread.start()
+    finally:
+      self.poolCondition.release()
+
+    self.log.info( 'Started %s with %s processors and %s MB' % ( executableFile, processors, memory ) )
+    return S_OK( executableFile )
+
+  #############################################################################
+  def __executeJob( self, executableFile, proxy ):
+    """ Runs the payload as the InProcess CE does and releases its resources
+    """
+    try:
+      result = InProcessComputingElement.submitJob( self, executableFile, proxy )
+      if not result['OK']:
+        self.log.error( 'Payload %s failed' % executableFile, result['Message'] )
+      elif 'PayloadFailed' in result:
+        self.log.warn( 'Payload %s failed with exit code' % executableFile, result['PayloadFailed'] )
+    except Exception:
+      self.log.exception( 'Exception while running payload %s' % executableFile )
+    self.poolCondition.acquire()
+    try:
+      del self.poolJobs[executableFile]
+      self.poolCondition.notifyAll()
+    finally:
+      self.poolCondition.release()
+
+  #############################################################################
+  def getCEStatus( self ):
+    """ Method to return information on running and pending jobs.
+    """
+    result = S_OK()
+    result['SubmittedJobs'] = self.submittedJobs
+    result['RunningJobs'] = len( self.poolJobs )
+    result['WaitingJobs'] = 0
+    return result
+
+  #############################################################################
+  def available( self, requirements = {} ):
+    """ Returns the number of single processor payloads that can still be
+        started in the slot
+    """
+    self.poolCondition.acquire()
+    try:
+      freeProcessors, freeMemory = self.__getFreeResources()
+      runningJobs = len( self.poolJobs )
+    finally:
+      self.poolCondition.release()
+
+    additionalJobs = freeProcessors
+    maxRAM = self.ceParameters['MaxRAM']
+    if maxRAM:
+      processorMemory = maxRAM / self.ceParameters['NumberOfProcessors']
+      if processorMemory:
+        additionalJobs = min( additionalJobs, freeMemory / processorMemory )
+    additionalJobs = max( 0, additionalJobs )
+
+    ceInfoDict = { 'SubmittedJobs' : self.submittedJobs,
+                   'RunningJobs' : runningJobs,
+                   'WaitingJobs' : 0,
+                   'FreeProcessors' : freeProcessors,
+                   'FreeRAM' : freeMemory }
+    result = S_OK( additionalJobs )
+    result['Message'] = '%s CE: RunningJobs=%s, FreeProcessors=%s/%s' % ( self.ceName, runningJobs, freeProcessors,
+                                                                          self.ceParameters['NumberOfProcessors'] )
+    if maxRAM:
+      result['Message'] += ', FreeRAM=%s/%s MB' % ( freeMemory, maxRAM )
+    result['CEInfoDict'] = ceInfoDict
+    return result
+
+  #############################################################################
+  def shutdown( self ):
+    """ Waits for the running payloads to complete
+    """
+    self.poolCondition.acquire()
+    try:
+      threads = [ thread for _processors, _memory, thread in self.poolJobs.values() ]
+    finally:
+      self.poolCondition.release()
+    if threads:
+      self.log.info( 'Waiting for %s running payloads to complete' % len( threads ) )
+    for thread in threads:
+      thread.join()
+    return S_OK()
+
+#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#
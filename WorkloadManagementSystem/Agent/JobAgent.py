@@ -22,10 +22,11 @@ from DIRAC.FrameworkSystem.Client.ProxyManagerClient        import gProxyManager
 from DIRAC.Core.Security.ProxyInfo                          import getProxyInfo
 from DIRAC.Core.Security                                    import Properties
 from DIRAC.WorkloadManagementSystem.Client.JobReport        import JobReport
+from DIRAC.WorkloadManagementSystem.Client.SandboxStoreClient import SandboxStoreClient
 from DIRAC.WorkloadManagementSystem.JobWrapper.JobWrapper   import rescheduleFailedJob, AccountingJob
 
 
-import os, sys, re, time
+import os, sys, re, time, types, shutil, threading
 
 class JobAgent( AgentModule ):
   """
@@ -81,6 +82,14 @@ class JobAgent( AgentModule ):
     self.fillingMode = self.am_getOption( 'FillingModeFlag', False )
     self.stopOnApplicationFailure = self.am_getOption( 'StopOnApplicationFailure', True )
     self.stopAfterFailedMatches = self.am_getOption( 'StopAfterFailedMatches', 10 )
+    # Prefetch the next job while the outputs of the current one are uploaded
+    self.prefetchMode = self.am_getOption( 'PrefetchMode', False )
+    if self.prefetchMode and not self.fillingMode:
+      self.log.warn( 'PrefetchMode requires FillingModeFlag, disabling it' )
+      self.prefetchMode = False
+    self.prefetchedJob = None
+    self.prefetchThread = None
+    self.prefetchStop = threading.Event()
     self.jobCount = 0
     self.matchFailedCount = 0
     #Timeleft
@@ -116,6 +125,9 @@ class JobAgent( AgentModule ):
     if not available['OK'] or not available['Value']:
       self.log.info( 'Resource is not available' )
       self.log.info( available['Message'] )
+      if available['OK'] and available.get( 'CEInfoDict', {} ).get( 'RunningJobs' ):
+        # The payloads running in the slot will release resources for new ones
+        return S_OK( 'CE Not Available while payloads are running' )
       return self.__finish( 'CE Not Available' )
 
     self.log.info( available['Message'] )
@@ -141,40 +153,96 @@ class JobAgent( AgentModule ):
       ceDict.update( requirementsDict )
 
     self.log.verbose( ceDict )
-    start = time.time()
-    jobRequest = self.__requestJob( ceDict )
-    matchTime = time.time() - start
-    self.log.info( 'MatcherTime = %.2f (s)' % ( matchTime ) )
 
-    self.stopAfterFailedMatches = self.am_getOption( 'StopAfterFailedMatches', self.stopAfterFailedMatches )
+    job = None
+    if self.prefetchedJob:
+      # The job was matched and prepared while the previous payload was finishing
+      result = self.prefetchedJob
+      self.prefetchedJob = None
+      if not result['OK']:
+        if result.get( 'Stop' ):
+          # The prefetch thread can not stop the agent itself
+          self.am_stopExecution()
+        return result
+      job = result.get( 'Job' )
+      if job:
+        self.log.info( 'Using prefetched job %s' % job['JobID'] )
+
+    if not job:
+      start = time.time()
+      jobRequest = self.__requestJob( ceDict )
+      matchTime = time.time() - start
+      self.log.info( 'MatcherTime = %.2f (s)' % ( matchTime ) )
+
+      self.stopAfterFailedMatches = self.am_getOption( 'StopAfterFailedMatches', self.stopAfterFailedMatches )
+
+      if not jobRequest['OK']:
+        if re.search( 'No match found', jobRequest['Message'] ):
+          self.log.notice( 'Job request OK: %s' % ( jobRequest['Message'] ) )
+          self.matchFailedCount += 1
+          if self.matchFailedCount > self.stopAfterFailedMatches:
+            return self.__finish( 'Nothing to do for more than %d cycles' % self.stopAfterFailedMatches )
+          return S_OK( jobRequest['Message'] )
+        elif jobRequest['Message'].find( "seconds timeout" ) != -1:
+          self.log.error( jobRequest['Message'] )
+          self.matchFailedCount += 1
+          if self.matchFailedCount > self.stopAfterFailedMatches:
+            return self.__finish( 'Nothing to do for more than %d cycles' % self.stopAfterFailedMatches )
+          return S_OK( jobRequest['Message'] )
+        elif jobRequest['Message'].find( "Pilot version does not match" ) != -1 :
+          self.log.error( jobRequest['Message'] )
+          return S_ERROR( jobRequest['Message'] )
+        else:
+          self.log.notice( 'Failed to get jobs: %s' % ( jobRequest['Message'] ) )
+          self.matchFailedCount += 1
+          if self.matchFailedCount > self.stopAfterFailedMatches:
+            return self.__finish( 'Nothing to do for more than %d cycles' % self.stopAfterFailedMatches )
+          return S_OK( jobRequest['Message'] )
+
+      # Reset the Counter
+      self.matchFailedCount = 0
+
+      result = self.__prepareJob( jobRequest['Value'], matchTime, ceDict )
+      if not result['OK'] or not 'Job' in result:
+        return result
+      job = result['Job']
+
+    jobID = job['JobID']
+    params = job['Params']
+    try:
+      self.__startPrefetch( ceDict, job['WrapperData'] )
+      self.log.verbose( 'Before %sCE submitJob()' % ( self.ceName ) )
+      submission = self.__submitJob( jobID, job['WrapperData'], job['ProxyChain'] )
+      self.__stopPrefetch()
+      if not submission['OK']:
+        self.__report( jobID, 'Failed', submission['Message'] )
+        return self.__finish( submission['Message'] )
+      elif 'PayloadFailed' in submission:
+        # Do not keep running and do not overwrite the Payload error
+        return self.__finish( 'Payload execution failed with error code %s' % submission['PayloadFailed'],
+                              self.stopOnApplicationFailure )
 
-    if not jobRequest['OK']:
-      if re.search( 'No match found', jobRequest['Message'] ):
-        self.log.notice( 'Job request OK: %s' % ( jobRequest['Message'] ) )
-        self.matchFailedCount += 1
-        if self.matchFailedCount > self.stopAfterFailedMatches:
-          return self.__finish( 'Nothing to do for more than %d cycles' % self.stopAfterFailedMatches )
-        return S_OK( jobRequest['Message'] )
-      elif jobRequest['Message'].find( "seconds timeout" ) != -1:
-        self.log.error( jobRequest['Message'] )
-        self.matchFailedCount += 1
-        if self.matchFailedCount > self.stopAfterFailedMatches:
-          return self.__finish( 'Nothing to do for more than %d cycles' % self.stopAfterFailedMatches )
-        return S_OK( jobRequest['Message'] )
-      elif jobRequest['Message'].find( "Pilot version does not match" ) != -1 :
-        self.log.error( jobRequest['Message'] )
-        return S_ERROR( jobRequest['Message'] )
-      else:
-        self.log.notice( 'Failed to get jobs: %s' % ( jobRequest['Message'] ) )
-        self.matchFailedCount += 1
-        if self.matchFailedCount > self.stopAfterFailedMatches:
-          return self.__finish( 'Nothing to do for more than %d cycles' % self.stopAfterFailedMatches )
-        return S_OK( jobRequest['Message'] )
+      self.log.verbose( 'After %sCE submitJob()' % ( self.ceName ) )
+    except Exception:
+      self.log.exception()
+      self.__stopPrefetch()
+      return self.__rescheduleFailedJob( jobID , 'Job processing failed with exception',
+                                         params, self.stopOnApplicationFailure )
 
-    # Reset the Counter
-    self.matchFailedCount = 0
+    self.__updateTimeLeft()
+    scaledCPUTime = self.timeLeftUtil.getScaledCPU()['Value']
+
+    self.__setJobParam( jobID, 'ScaledCPUTime', str( scaledCPUTime - self.scaledCPUTime ) )
+    self.scaledCPUTime = scaledCPUTime
 
-    matcherInfo = jobRequest['Value']
+    return S_OK( 'Job Agent cycle complete' )
+
+  #############################################################################
+  def __prepareJob( self, matcherInfo, matchTime, ceDict, prefetch = False ):
+    """ Checks the job received from the Matcher, sets up its proxy and software and
+        creates its Job Wrapper. In prefetch mode the input sandbox is downloaded too.
+        If the job is ready the returned dictionary contains it as 'Job'.
+    """
     jobID = matcherInfo['JobID']
     self.pilotInfoReportedFlag = matcherInfo.get( 'PilotInfoReportedFlag', False )
     matcherParams = ['JDL', 'DN', 'Group']
@@ -239,7 +307,7 @@ class JobAgent( AgentModule ):
     if not params.has_key( 'CPUTime' ):
       self.log.warn( 'Job has no CPU requirement defined in JDL parameters' )
 
-    self.log.verbose( 'Job request successful: \n %s' % ( jobRequest['Value'] ) )
+    self.log.verbose( 'Job request successful: \n %s' % ( matcherInfo ) )
     self.log.info( 'Received JobID=%s, JobType=%s, SystemConfig=%s' % ( jobID, jobType, systemConfig ) )
     self.log.info( 'OwnerDN: %s JobGroup: %s' % ( ownerDN, jobGroup ) )
     self.jobCount += 1
@@ -272,22 +340,119 @@ class JobAgent( AgentModule ):
           errorMsg = 'Failed software installation'
         return self.__rescheduleFailedJob( jobID, errorMsg, params, self.stopOnApplicationFailure )
 
-      self.log.verbose( 'Before %sCE submitJob()' % ( self.ceName ) )
-      submission = self.__submitJob( jobID, params, ceDict, optimizerParams, jobJDL, proxyChain )
-      if not submission['OK']:
-        self.__report( jobID, 'Failed', submission['Message'] )
-        return self.__finish( submission['Message'] )
-      elif 'PayloadFailed' in submission:
-        # Do not keep running and do not overwrite the Payload error
-        return self.__finish( 'Payload execution failed with error code %s' % submission['PayloadFailed'],
-                              self.stopOnApplicationFailure )
+      prefetchedSandbox = ''
+      if prefetch:
+        prefetchedSandbox = self.__prefetchInputSandbox( jobID, params, proxyChain )
 
-      self.log.verbose( 'After %sCE submitJob()' % ( self.ceName ) )
+      result = self.__createJobWrapper( jobID, params, ceDict, optimizerParams, prefetchedSandbox )
+      if not result['OK']:
+        self.__report( jobID, 'Failed', result['Message'] )
+        return self.__finish( result['Message'] )
     except Exception:
       self.log.exception()
       return self.__rescheduleFailedJob( jobID , 'Job processing failed with exception',
                                          params, self.stopOnApplicationFailure )
 
+    ret = S_OK( 'Job %s prepared' % jobID )
+    ret['Job'] = { 'JobID' : jobID,
+                   'Params' : params,
+                   'WrapperData' : result['Value'],
+                   'ProxyChain' : proxyChain }
+    return ret
+
+  #############################################################################
+  def __startPrefetch( self, ceDict, wrapperData ):
+    """ Starts the thread requesting and preparing the next job while the payload
+        of the current one is running
+    """
+    signalFile = wrapperData['jobArgs'].get( 'PrefetchSignal' )
+    if not signalFile:
+      return
+    self.prefetchStop.clear()
+    self.prefetchThread = threading.Thread( target = self.__prefetchJob, args = ( dict( ceDict ), signalFile ) )
+    self.prefetchThread.setDaemon( 1 )
+    self.prefetchThread.start()
+
+  #############################################################################
+  def __stopPrefetch( self ):
+    """ Stops the prefetch thread, waiting for the preparation of a job already matched
+    """
+    if not self.prefetchThread:
+      return
+    self.prefetchStop.set()
+    self.prefetchThread.join()
+    self.prefetchThread = None
+
+  #############################################################################
+  def __prefetchJob( self, ceDict, signalFile ):
+    """ Waits for the JobWrapper to signal the end of the payload and prepares the
+        next job during the upload of the outputs of the current one
+    """
+    while not self.prefetchStop.isSet():
+      if os.path.exists( signalFile ):
+        break
+      self.prefetchStop.wait( 1 )
+    else:
+      return
+    try:
+      os.remove( signalFile )
+    except OSError:
+      pass
+
+    self.log.info( 'Payload completed, prefetching the next job' )
+    self.__updateTimeLeft()
+    if self.timeLeftError:
+      return
+    ceDict['CPUTime'] = int( self.timeLeft )
+
+    start = time.time()
+    jobRequest = self.__requestJob( ceDict )
+    matchTime = time.time() - start
+    self.log.info( 'Prefetch MatcherTime = %.2f (s)' % ( matchTime ) )
+    if not jobRequest['OK']:
+      # The next cycle requests a job as usual
+      self.log.info( 'No job prefetched: %s' % jobRequest['Message'] )
+      return
+    self.matchFailedCount = 0
+    self.prefetchedJob = self.__prepareJob( jobRequest['Value'], matchTime, ceDict, prefetch = True )
+
+  #############################################################################
+  def __prefetchInputSandbox( self, jobID, jobParams, proxyChain ):
+    """ Downloads the registered input sandboxes of a prefetched job with its
+        owner proxy, returns the directory where they are unpacked or '' if
+        the JobWrapper has to download them
+    """
+    inputSandbox = jobParams.get( 'InputSandbox', [] )
+    if type( inputSandbox ) not in ( types.TupleType, types.ListType ):
+      inputSandbox = [ inputSandbox ]
+    registeredISB = [ isb for isb in inputSandbox if isb.find( "SB:" ) == 0 ]
+    if not registeredISB:
+      return ''
+
+    workingDir = gConfig.getValue( '/LocalSite/WorkingDirectory', self.siteRoot )
+    sandboxDir = '%s/job/InputSandbox/%s' % ( workingDir, jobID )
+    try:
+      if os.path.exists( sandboxDir ):
+        shutil.rmtree( sandboxDir )
+      os.makedirs( sandboxDir )
+    except OSError, x:
+      self.log.warn( 'Can not create the prefetched input sandbox directory', str( x ) )
+      return ''
+
+    sandboxClient = SandboxStoreClient( proxyChain = proxyChain )
+    for isb in registeredISB:
+      result = sandboxClient.downloadSandbox( isb, sandboxDir )
+      if not result['OK']:
+        self.log.warn( 'Failed to prefetch input sandbox %s' % isb, result['Message'] )
+        shutil.rmtree( sandboxDir, True )
+        return ''
+    self.log.info( 'Prefetched input sandbox of job %s' % jobID )
+    return sandboxDir
+
+  #############################################################################
+  def __updateTimeLeft( self ):
+    """ Updates the CPU time left in the slot
+    """
     currentTimes = list( os.times() )
     for i in range( len( currentTimes ) ):
       currentTimes[i] -= self.initTimes[i]
@@ -306,12 +471,6 @@ class JobAgent( AgentModule ):
           # if the batch system is not defined used the CPUNormalizationFactor
           # defined locally
           self.timeLeft = self.__getCPUTimeLeft()
-    scaledCPUTime = self.timeLeftUtil.getScaledCPU()['Value']
-
-    self.__setJobParam( jobID, 'ScaledCPUTime', str( scaledCPUTime - self.scaledCPUTime ) )
-    self.scaledCPUTime = scaledCPUTime
-
-    return S_OK( 'Job Agent cycle complete' )
 
   #############################################################################
   def __getCPUTimeLeft( self ):
@@ -412,16 +571,10 @@ class JobAgent( AgentModule ):
     return result
 
   #############################################################################
-  def __submitJob( self, jobID, jobParams, resourceParams, optimizerParams, jobJDL, proxyChain ):
-    """Submit job to the Computing Element instance after creating a custom
-       Job Wrapper with the available job parameters.
+  def __submitJob( self, jobID, wrapperData, proxyChain ):
+    """Submit job to the Computing Element instance with the custom Job Wrapper
+       created by __createJobWrapper.
     """
-    result = self.__createJobWrapper( jobID, jobParams, resourceParams, optimizerParams )
-
-    if not result['OK']:
-      return result
-
-    wrapperData = result[ 'Value' ]
     wrapperFile = wrapperData[ 'execFile' ]
     self.__report( jobID, 'Matched', 'Submitted To CE' )
 
@@ -465,16 +618,22 @@ class JobAgent( AgentModule ):
     return ret
 
   #############################################################################
-  def __createJobWrapper( self, jobID, jobParams, resourceParams, optimizerParams ):
+  def __createJobWrapper( self, jobID, jobParams, resourceParams, optimizerParams, prefetchedSandbox = '' ):
     """This method creates a job wrapper filled with the CE and Job parameters
        to executed the job.
     """
     arguments = {'Job':jobParams,
                  'CE':resourceParams,
                  'Optimizer':optimizerParams}
-    self.log.verbose( 'Job arguments are: \n %s' % ( arguments ) )
 
     workingDir = gConfig.getValue( '/LocalSite/WorkingDirectory', self.siteRoot )
+    if self.prefetchMode:
+      # Created by the JobWrapper when the payload is over
+      arguments['PrefetchSignal'] = '%s/job/Wrapper/Prefetch_%s' % ( workingDir, jobID )
+    if prefetchedSandbox:
+      arguments['PrefetchedSandbox'] = prefetchedSandbox
+    self.log.verbose( 'Job arguments are: \n %s' % ( arguments ) )
+
     if not os.path.exists( '%s/job/Wrapper' % ( workingDir ) ):
       try:
         os.makedirs( '%s/job/Wrapper' % ( workingDir ) )
@@ -486,6 +645,8 @@ class JobAgent( AgentModule ):
     if os.path.exists( jobWrapperFile ):
       self.log.verbose( 'Removing existing Job Wrapper for %s' % ( jobID ) )
       os.remove( jobWrapperFile )
+    if 'PrefetchSignal' in arguments and os.path.exists( arguments['PrefetchSignal'] ):
+      os.remove( arguments['PrefetchSignal'] )
     fd = open( self.jobWrapperTemplate, 'r' )
     wrapperTemplate = fd.read()
     fd.close()
@@ -670,6 +831,11 @@ class JobAgent( AgentModule ):
     """
     self.log.info( 'JobAgent will stop with message "%s", execution complete.' % message )
     if stop:
+      if self.prefetchThread and threading.currentThread() is self.prefetchThread:
+        # Called while preparing a prefetched job, the next cycle stops the agent
+        result = S_ERROR( message )
+        result['Stop'] = True
+        return result
       self.am_stopExecution()
       return S_ERROR( message )
     else:
@@ -731,8 +897,20 @@ class JobAgent( AgentModule ):
 
   #############################################################################
   def finalize( self ):
-    """ Job Agent finalization method
+    """ Job Agent finalization method: reschedules the prefetched job that was not
+        started, waits for the payloads still running in the CE and reports the pilot
+        as Done
     """
+    if hasattr( self, 'computingElement' ):
+      # The prefetch thread must be over before its job is rescheduled
+      self.__stopPrefetch()
+      if self.prefetchedJob and self.prefetchedJob.get( 'Job' ):
+        job = self.prefetchedJob['Job']
+        self.prefetchedJob = None
+        self.__rescheduleFailedJob( job['JobID'], 'Prefetched job not started', job['Params'], stop = False )
+      result = self.computingElement.shutdown()
+      if not result['OK']:
+        self.log.warn( 'Failed to shut down the CE', result['Message'] )
 
     gridCE = gConfig.getValue( '/LocalSite/GridCE', '' )
     queue = gConfig.getValue( '/LocalSite/CEQueue', '' )
@@ -23,6 +23,7 @@ import DIRAC.Core.Utilities.Time as Time
 import string
 import time
 import os
+import threading
 
 REMOVE_STATUS_DELAY = { 'Done':7,
                         'Killed':1,
@@ -119,22 +120,20 @@ class JobCleaningAgent( AgentModule ):
 
     count = 0
     error_count = 0
-    result = SandboxStoreClient( useCertificates = True ).unassignJobs( jobList )
-    if not result[ 'OK' ]:
-      gLogger.warn( "Cannot unassign jobs to sandboxes", result[ 'Message' ] )
-
-      
     result = self.deleteJobOversizedSandbox( jobList ) 
     if not result[ 'OK' ]:
       gLogger.warn( "Cannot schedle removal of oversized sandboxes", result[ 'Message' ] )
       return result 
     
     failedJobs = result['Value']['Failed']
-    for job in failedJobs:
-      jobList.pop( jobList.index( job ) ) 
+    removeList = [ job for job in jobList if job not in failedJobs ]
 
     if self.jobByJob:
-      for jobID in jobList:
+      result = SandboxStoreClient( useCertificates = True ).unassignJobs( jobList )
+      if not result[ 'OK' ]:
+        gLogger.warn( "Cannot unassign jobs to sandboxes", result[ 'Message' ] )
+
+      for jobID in removeList:
         resultJobDB = self.jobDB.removeJobFromDB( jobID )
         resultTQ = self.taskQueueDB.deleteJob( jobID )
         resultLogDB = self.jobLoggingDB.deleteJob( jobID )
@@ -154,31 +153,83 @@ class JobCleaningAgent( AgentModule ):
           count += 1
         if self.throttlingPeriod:
           time.sleep(self.throttlingPeriod)  
-    else:    
-      result = self.jobDB.removeJobFromDB( jobList )
-      if not result['OK']:
-        gLogger.error('Failed to delete %d jobs from JobDB' % len(jobList) )
-      else:
-        gLogger.info('Deleted %d jobs from JobDB' % len(jobList) )
-  
-      for jobID in jobList:
-        resultTQ = self.taskQueueDB.deleteJob( jobID )
-        if not resultTQ['OK']:
-          gLogger.warn( 'Failed to remove job %d from TaskQueueDB' % jobID, resultTQ['Message'] )
-          error_count += 1
-        else:
-          count += 1    
-
-      result = self.jobLoggingDB.deleteJob( jobList )
-      if not result['OK']:
-        gLogger.error('Failed to delete %d jobs from JobLoggingDB' % len(jobList) )
-      else:
-        gLogger.info('Deleted %d jobs from JobLoggingDB' % len(jobList) )
+    else:
+      count, error_count = self.__removeJobsBulk( jobList, removeList )
 
     if count > 0 or error_count > 0 :
       gLogger.info( 'Deleted %d jobs from JobDB, %d errors' % ( count, error_count ) )
     return S_OK()
 
+  def __removeJobsBulk( self, jobList, removeList ):
+    """ Remove the jobs in removeList from JobDB, TaskQueueDB and JobLoggingDB and unassign
+        the sandboxes of the jobs in jobList. The four cleanups are executed concurrently,
+        JobDB deletes are done in chunks and their rate is reported per table. The row lock
+        wait can only be measured server wide, it is reported for the whole removal
+    """
+    start = time.time()
+    lockTime = self.jobDB.getRowLockTime()
+    results = self.__executeConcurrently( { 'Sandboxes' : ( SandboxStoreClient( useCertificates = True ).unassignJobs,
+                                                            jobList ),
+                                            'JobDB' : ( self.jobDB.removeJobFromDB, removeList ),
+                                            'TaskQueueDB' : ( self.taskQueueDB.deleteJobs, removeList ),
+                                            'JobLoggingDB' : ( self.jobLoggingDB.deleteJob, removeList ) } )
+    elapsed = time.time() - start
+    lockWaitTime = max( self.jobDB.getRowLockTime() - lockTime, 0. )
+
+    if not results['Sandboxes']['OK']:
+      gLogger.warn( "Cannot unassign jobs to sandboxes", results['Sandboxes']['Message'] )
+
+    result = results['JobDB']
+    if not result['OK']:
+      gLogger.error( 'Failed to delete %d jobs from JobDB' % len( removeList ), result['Message'] )
+    else:
+      gLogger.info( 'Deleted %d jobs from JobDB' % len( removeList ) )
+      for table, stats in sorted( result['Value'].items() ):
+        gLogger.info( 'JobDB.%s: %d rows deleted in %.2f s (%.0f rows/s)' %
+                      ( table, stats['Rows'], stats['Time'], stats['Rows'] / max( stats['Time'], 1e-6 ) ) )
+
+    count = 0
+    error_count = 0
+    result = results['TaskQueueDB']
+    if not result['OK']:
+      gLogger.warn( 'Failed to remove %d jobs from TaskQueueDB' % len( removeList ), result['Message'] )
+      error_count = len( removeList )
+    else:
+      count = len( removeList )
+
+    result = results['JobLoggingDB']
+    if not result['OK']:
+      gLogger.error( 'Failed to delete %d jobs from JobLoggingDB' % len( removeList ) )
+    else:
+      gLogger.info( 'Deleted %d jobs from JobLoggingDB (%d rows)' % ( len( removeList ), result['Value'] ) )
+
+    gLogger.info( 'Removal of %d jobs took %.2f s, server wide row lock wait %.3f s' % ( len( removeList ), elapsed,
+                                                                                          lockWaitTime ) )
+    return count, error_count
+
+  def __executeConcurrently( self, taskDict ):
+    """ Execute the tasks of taskDict { name : ( function, argument ) } in parallel threads,
+        return { name : result }
+    """
+    results = {}
+
+    def execute( name, function, argument ):
+      try:
+        results[name] = function( argument )
+      except Exception, x:
+        gLogger.exception( 'Exception in %s cleanup' % name )
+        results[name] = S_ERROR( str( x ) )
+
+    threads = []
+    for name, ( function, argument ) in taskDict.items():
+      thread = threading.Thread( target = execute, args = ( name, function, argument ) )
+      thread.setDaemon( True )
+      thread.start()
+      threads.append( thread )
+    for thread in threads:
+      thread.join()
+    return results
+
   def deleteJobOversizedSandbox( self, jobIDList ):
     """ Delete the job oversized sandbox files from storage elements
     """ 
@@ -187,32 +238,35 @@ class JobCleaningAgent( AgentModule ):
     successful = {}
 
     lfnDict = {}
+    result = self.jobDB.getJobParametersBulk( jobIDList, ['OutputSandboxLFN'] )
+    if not result['OK']:
+      gLogger.warn( 'Error interrogting JobDB: %s' % result['Message'] )
+      return S_OK( {'Successful':successful, 'Failed':failed} )
     for jobID in jobIDList:
-      result = self.jobDB.getJobParameter( jobID, 'OutputSandboxLFN' )
-      if result['OK']:
-        lfn = result['Value']
-        if lfn:
-          lfnDict[lfn] = jobID
-        else:
-          successful[jobID] = 'No oversized sandbox found'
+      lfn = result['Value'].get( int( jobID ), {} ).get( 'OutputSandboxLFN' )
+      if lfn:
+        lfnDict[lfn] = jobID
       else:
-        gLogger.warn( 'Error interrogting JobDB: %s' % result['Message'] )
+        successful[jobID] = 'No oversized sandbox found'
     if not lfnDict:
       return S_OK( {'Successful':successful, 'Failed':failed} )   
 
     # Schedule removal of the LFNs now
 
-    for lfn,jobID in lfnDict.items():
-      result = self.jobDB.getJobAttributes( jobID, ['OwnerDN', 'OwnerGroup'] )
-      if not result['OK']:
+    result = self.jobDB.getAttributesForJobList( lfnDict.values(), ['OwnerDN', 'OwnerGroup'] )
+    if not result['OK']:
+      for lfn, jobID in lfnDict.items():
         failed[jobID] = lfn
-        continue
-      if not result['Value']:
+      return S_OK( {'Successful':successful, 'Failed':failed} )
+    ownerDict = result['Value']
+
+    for lfn,jobID in lfnDict.items():
+      if int( jobID ) not in ownerDict:
         failed[jobID] = lfn
         continue
 
-      ownerDN = result['Value']['OwnerDN']
-      ownerGroup = result['Value']['OwnerGroup']
+      ownerDN = ownerDict[int( jobID )]['OwnerDN']
+      ownerGroup = ownerDict[int( jobID )]['OwnerGroup']
       result = self.__setRemovalRequest( lfn, ownerDN, ownerGroup )
       if not result['OK']:
         failed[jobID] = lfn
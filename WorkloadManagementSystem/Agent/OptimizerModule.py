@@ -119,11 +119,13 @@ class OptimizerModule( AgentModule ):
           return S_ERROR( "No JDL for job" )
         jobDef[ 'jdl' ] = result[ 'Value' ]
       if 'jdl' == self.requiredJobInfo:
-        result = self.jobDB.getJobJDL( job )
+        # The stored parsed JDL saves parsing it again
+        result = self.jobDB.getJobClassAd( job )
         if not result[ 'OK' ]:
-          self.log.error( "No JDL for job", "%s" % job )
+          self.log.error( "No JDL for job", "%s: %s" % ( job, result[ 'Message' ] ) )
           return S_ERROR( "No JDL for job" )
-        jobDef[ 'jdl' ] = result[ 'Value' ]
+        jobDef[ 'jdl' ] = result[ 'JDL' ]
+        jobDef[ 'classad' ] = result[ 'Value' ]
     #Load the classad if needed
     if 'jdl' in jobDef and not 'classad' in jobDef:
       try:
@@ -191,9 +191,11 @@ class PilotStatusAgent( AgentModule ):
       return S_OK()
     refList = result['Value']
 
-    for pilotRef in refList:
-      self.log.info( 'Setting Waiting pilot to Aborted: %s' % pilotRef )
-      result = self.pilotDB.setPilotStatus( pilotRef, 'Stalled', statusReason = 'Exceeded max waiting time' )
+    self.log.info( 'Setting %d Waiting pilots to Stalled' % len( refList ) )
+    result = self.pilotDB.setPilotStatusBulk( dict( [ ( pilotRef, 'Stalled' ) for pilotRef in refList ] ),
+                                              statusReason = 'Exceeded max waiting time' )
+    if not result['OK']:
+      self.log.error( 'Failed to set Waiting pilots to Stalled', result['Message'] )
 
     return S_OK()
 
@@ -22,7 +22,8 @@ from DIRAC.Core.Security                                   import CS
 from DIRAC.Core.Utilities.SiteCEMapping                    import getSiteForCE
 from DIRAC.Core.Utilities.Time                             import dateTime, second
 from DIRAC.ResourceStatusSystem.Client.SiteStatus          import SiteStatus 
-import os, base64, bz2, tempfile, random, socket
+from DIRAC.WorkloadManagementSystem.private.CEStatusPoller  import CEStatusPoller
+import os, base64, bz2, tempfile, random, socket, time
 import DIRAC
 
 __RCSID__ = "$Id$"
@@ -55,6 +56,8 @@ class SiteDirector( AgentModule ):
     self.maxJobsInFillMode = MAX_JOBS_IN_FILLMODE
     self.maxPilotsToSubmit = MAX_PILOTS_TO_SUBMIT
     self.siteStatus = SiteStatus()
+    # Kept between cycles to remember the unresponsive CEs
+    self.statusPoller = CEStatusPoller()
     return S_OK()
 
   def beginExecution( self ):
@@ -111,6 +114,12 @@ class SiteDirector( AgentModule ):
     self.updateStatus = self.am_getOption( 'UpdatePilotStatus', True )
     self.getOutput = self.am_getOption( 'GetPilotOutput', True )
     self.sendAccounting = self.am_getOption( 'SendPilotAccounting', True )
+    # Concurrent pilot status polling: number of CEs polled at a time, seconds allowed
+    # per CE, and failures in a row after which a CE is left alone for CECoolDown seconds
+    self.statusPoller.maxThreads = max( 1, self.am_getOption( 'StatusThreads', 10 ) )
+    self.statusPoller.timeBudget = self.am_getOption( 'CEStatusTimeBudget', 120 )
+    self.statusPoller.failureThreshold = max( 1, self.am_getOption( 'CEFailureThreshold', 3 ) )
+    self.statusPoller.coolDown = self.am_getOption( 'CECoolDown', 600 )
 
     # Get the site description dictionary
     siteNames = None
@@ -667,167 +676,204 @@ EOF
     return name
 
   def updatePilotStatus( self ):
-    """ Update status of pilots in transient states
+    """ Update status of pilots in transient states. The CEs are polled concurrently,
+        each within its time budget, the unresponsive ones being skipped for a while
     """
+    ceQueues = {}
     for queue in self.queueDict:
-      ce = self.queueDict[queue]['CE']
-      ceName = self.queueDict[queue]['CEName']
-      queueName = self.queueDict[queue]['QueueName']
-      ceType = self.queueDict[queue]['CEType']
-      siteName = self.queueDict[queue]['Site']
+      ceQueues.setdefault( self.queueDict[queue]['CEName'], [] ).append( queue )
+
+    start = time.time()
+    ceTasks = dict( [ ( ceName, ( self.__updateCEPilotStatus, ( ceName, queues ) ) )
+                      for ceName, queues in ceQueues.items() ] )
+    results = self.statusPoller.poll( ceTasks )
+    failed = [ ceName for ceName in results if not results[ceName]['OK'] ]
+    for ceName in failed:
+      self.log.error( 'Failed to update pilot status', '%s: %s' % ( ceName, results[ceName]['Message'] ) )
+    self.log.info( 'Pilot status of %d CEs updated in %.1f seconds, %d failed' % ( len( ceQueues ) - len( failed ),
+                                                                                   time.time() - start,
+                                                                                   len( failed ) ) )
+    openCircuits = self.statusPoller.getOpenCircuits()
+    if openCircuits:
+      self.log.warn( 'CEs not polled until they recover: %s' % ', '.join( sorted( openCircuits ) ) )
+
+    # Check if the accounting is to be sent, for the pilots of all the queues at once
+    if self.sendAccounting:
+      pilotDict = {}
+      for queue in self.queueDict:
+        result = pilotAgentsDB.selectPilotsInfo( {'DestinationSite':self.queueDict[queue]['CEName'],
+                                                 'Queue':self.queueDict[queue]['QueueName'],
+                                                 'GridType':self.queueDict[queue]['CEType'],
+                                                 'GridSite':self.queueDict[queue]['Site'],
+                                                 'AccountingSent':'False',
+                                                 'Status':FINAL_PILOT_STATUS} )
+        if not result['OK']:
+          self.log.error( 'Failed to get pilots info from DB', result['Message'] )
+          continue
+        pilotDict.update( result['Value'] )
+      if pilotDict:
+        result = self.sendPilotAccounting( pilotDict )
+        if not result['OK']:
+          self.log.error( 'Failed to send pilot agent accounting' )
 
-      result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
-                                           'Queue':queueName,
-                                           'GridType':ceType,
-                                           'GridSite':siteName,
-                                           'Status':TRANSIENT_PILOT_STATUS,
-                                           'OwnerDN': self.pilotDN,
-                                           'OwnerGroup': self.pilotGroup } )
-      if not result['OK']:
-        self.log.error( 'Failed to select pilots: %s' % result['Message'] )
-        continue
-      pilotRefs = result['Value']
-      if not pilotRefs:
-        continue
+    return S_OK()
 
-      result = pilotAgentsDB.getPilotInfo( pilotRefs )
+  def __updateCEPilotStatus( self, ceName, queues ):
+    """ Update the status and retrieve the output of the pilots of all the queues of
+        one CE. Executed in the status poller threads, errors talking to the CE are
+        returned to count for its circuit breaker
+    """
+    ceError = ''
+    for queue in queues:
+      result = self.__updateQueuePilotStatus( queue )
       if not result['OK']:
-        self.log.error( 'Failed to get pilots info from DB', result['Message'] )
-        continue
-      pilotDict = result['Value']
-      stampedPilotRefs = []
-      for pRef in pilotDict:
-        if pilotDict[pRef]['PilotStamp']:
-          stampedPilotRefs.append( pRef + ":::" + pilotDict[pRef]['PilotStamp'] )
-        else:
-          stampedPilotRefs = list( pilotRefs )
-          break
-
-      result = ce.isProxyValid()
+        ceError = result['Message']
+    for queue in queues:
+      result = self.__getQueuePilotOutput( queue )
       if not result['OK']:
-        result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, 600 )
-        if not result['OK']:
-          return result
-        self.proxy = result['Value']
-        ce.setProxy( self.proxy, 500 )
+        ceError = result['Message']
+    if ceError:
+      return S_ERROR( ceError )
+    return S_OK()
 
-      result = ce.getJobStatus( stampedPilotRefs )
-      if not result['OK']:
-        self.log.error( 'Failed to get pilots status from CE', '%s: %s' % ( ceName, result['Message'] ) )
-        continue
-      pilotCEDict = result['Value']
-
-      for pRef in pilotRefs:
-        newStatus = ''
-        oldStatus = pilotDict[pRef]['Status']
-        ceStatus = pilotCEDict[pRef]
-        if oldStatus == ceStatus:
-          # Status did not change, continue
-          continue
-        elif ceStatus == "Unknown" and not oldStatus in FINAL_PILOT_STATUS:
-          # Pilot finished without reporting, consider it Aborted
-          newStatus = 'Aborted'
-        elif ceStatus != 'Unknown' :
-          # Update the pilot status to the new value
-          newStatus = ceStatus
-
-        if newStatus:
-          self.log.info( 'Updating status to %s for pilot %s' % ( newStatus, pRef ) )
-          result = pilotAgentsDB.setPilotStatus( pRef, newStatus, '', 'Updated by SiteDirector' )
-        # Retrieve the pilot output now
-        if newStatus in FINAL_PILOT_STATUS:
-          if pilotDict[pRef]['OutputReady'].lower() == 'false' and self.getOutput:
-            self.log.info( 'Retrieving output for pilot %s' % pRef )
-            pilotStamp = pilotDict[pRef]['PilotStamp']
-            pRefStamp = pRef
-            if pilotStamp:
-              pRefStamp = pRef + ':::' + pilotStamp
-            result = ce.getJobOutput( pRefStamp )
-            if not result['OK']:
-              self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
-            else:
-              output, error = result['Value']
-              if output:
-                result = pilotAgentsDB.storePilotOutput( pRef, output, error )
-                if not result['OK']:
-                  self.log.error( 'Failed to store pilot output', result['Message'] )
-              else:
-                self.log.warn( 'Empty pilot output not stored to PilotDB' )
-
-    # The pilot can be in Done state set by the job agent check if the output is retrieved
-    for queue in self.queueDict:
-      ce = self.queueDict[queue]['CE']
+  def __checkProxy( self, ce, minLifeTime, lifeTime, ceLifeTime ):
+    """ Give the CE a new pilot proxy if its own is valid for less than minLifeTime
+    """
+    result = ce.isProxyValid( minLifeTime )
+    if result['OK']:
+      return result
+    result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, lifeTime )
+    if not result['OK']:
+      return result
+    self.proxy = result['Value']
+    ce.setProxy( self.proxy, ceLifeTime )
+    return S_OK()
 
-      if not ce.isProxyValid( 120 ):
-        result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, 1000 )
-        if not result['OK']:
-          return result
-        ce.setProxy( self.proxy, 940 )
+  def __updateQueuePilotStatus( self, queue ):
+    """ Update status of the pilots of the queue in transient states
+    """
+    ce = self.queueDict[queue]['CE']
+    ceName = self.queueDict[queue]['CEName']
+    queueName = self.queueDict[queue]['QueueName']
+    ceType = self.queueDict[queue]['CEType']
+    siteName = self.queueDict[queue]['Site']
 
-      ceName = self.queueDict[queue]['CEName']
-      queueName = self.queueDict[queue]['QueueName']
-      ceType = self.queueDict[queue]['CEType']
-      siteName = self.queueDict[queue]['Site']
-      result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
-                                           'Queue':queueName,
-                                           'GridType':ceType,
-                                           'GridSite':siteName,
-                                           'OutputReady':'False',
-                                           'Status':FINAL_PILOT_STATUS} )
+    result = pilotAgentsDB.selectPilotsInfo( {'DestinationSite':ceName,
+                                             'Queue':queueName,
+                                             'GridType':ceType,
+                                             'GridSite':siteName,
+                                             'Status':TRANSIENT_PILOT_STATUS,
+                                             'OwnerDN': self.pilotDN,
+                                             'OwnerGroup': self.pilotGroup } )
+    if not result['OK']:
+      self.log.error( 'Failed to get pilots info from DB', result['Message'] )
+      return S_OK()
+    pilotDict = result['Value']
+    if not pilotDict:
+      return S_OK()
+    pilotRefs = pilotDict.keys()
+    stampedPilotRefs = []
+    for pRef in pilotDict:
+      if pilotDict[pRef]['PilotStamp']:
+        stampedPilotRefs.append( pRef + ":::" + pilotDict[pRef]['PilotStamp'] )
+      else:
+        stampedPilotRefs = list( pilotRefs )
+        break
 
-      if not result['OK']:
-        self.log.error( 'Failed to select pilots', result['Message'] )
-        continue
-      pilotRefs = result['Value']
-      if not pilotRefs:
+    result = self.__checkProxy( ce, 1000, 600, 500 )
+    if not result['OK']:
+      return result
+
+    result = ce.getJobStatus( stampedPilotRefs )
+    if not result['OK']:
+      return S_ERROR( 'Failed to get pilots status from CE %s: %s' % ( ceName, result['Message'] ) )
+    pilotCEDict = result['Value']
+
+    newStatusDict = {}
+    for pRef in pilotRefs:
+      newStatus = ''
+      oldStatus = pilotDict[pRef]['Status']
+      ceStatus = pilotCEDict[pRef]
+      if oldStatus == ceStatus:
+        # Status did not change, continue
         continue
-      result = pilotAgentsDB.getPilotInfo( pilotRefs )
+      elif ceStatus == "Unknown" and not oldStatus in FINAL_PILOT_STATUS:
+        # Pilot finished without reporting, consider it Aborted
+        newStatus = 'Aborted'
+      elif ceStatus != 'Unknown' :
+        # Update the pilot status to the new value
+        newStatus = ceStatus
+
+      if newStatus:
+        self.log.verbose( 'Updating status to %s for pilot %s' % ( newStatus, pRef ) )
+        newStatusDict[pRef] = newStatus
+
+    if newStatusDict:
+      # All the changes of the queue in a few statements
+      result = pilotAgentsDB.setPilotStatusBulk( newStatusDict, 'Updated by SiteDirector' )
       if not result['OK']:
-        self.log.error( 'Failed to get pilots info from DB', result['Message'] )
-        continue
-      pilotDict = result['Value']
-      if self.getOutput:
-        for pRef in pilotRefs:
-          self.log.info( 'Retrieving output for pilot %s' % pRef )
-          pilotStamp = pilotDict[pRef]['PilotStamp']
-          pRefStamp = pRef
-          if pilotStamp:
-            pRefStamp = pRef + ':::' + pilotStamp
-          result = ce.getJobOutput( pRefStamp )
-          if not result['OK']:
-            self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
-          else:
-            output, error = result['Value']
-            result = pilotAgentsDB.storePilotOutput( pRef, output, error )
-            if not result['OK']:
-              self.log.error( 'Failed to store pilot output', result['Message'] )
+        self.log.error( 'Failed to update pilots status', result['Message'] )
+        return S_OK()
+      self.log.info( 'Status of %d pilots of %s updated' % ( len( newStatusDict ), queue ) )
 
-      # Check if the accounting is to be sent
-      if self.sendAccounting:
-        result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
+    # Retrieve the pilot output now
+    if self.getOutput:
+      for pRef, newStatus in newStatusDict.items():
+        if newStatus in FINAL_PILOT_STATUS and pilotDict[pRef]['OutputReady'].lower() == 'false':
+          self.__retrievePilotOutput( ce, ceName, pRef, pilotDict[pRef]['PilotStamp'] )
+
+    return S_OK()
+
+  def __getQueuePilotOutput( self, queue ):
+    """ The pilot can be in Done state set by the job agent check if the output is retrieved
+    """
+    ce = self.queueDict[queue]['CE']
+    ceName = self.queueDict[queue]['CEName']
+    queueName = self.queueDict[queue]['QueueName']
+    ceType = self.queueDict[queue]['CEType']
+    siteName = self.queueDict[queue]['Site']
+
+    if not self.getOutput:
+      return S_OK()
+
+    result = self.__checkProxy( ce, 120, 1000, 940 )
+    if not result['OK']:
+      return result
+
+    result = pilotAgentsDB.selectPilotsInfo( {'DestinationSite':ceName,
                                              'Queue':queueName,
                                              'GridType':ceType,
                                              'GridSite':siteName,
-                                             'AccountingSent':'False',
+                                             'OutputReady':'False',
                                              'Status':FINAL_PILOT_STATUS} )
-
-        if not result['OK']:
-          self.log.error( 'Failed to select pilots', result['Message'] )
-          continue
-        pilotRefs = result['Value']
-        if not pilotRefs:
-          continue
-        result = pilotAgentsDB.getPilotInfo( pilotRefs )
-        if not result['OK']:
-          self.log.error( 'Failed to get pilots info from DB', result['Message'] )
-          continue
-        pilotDict = result['Value']
-        result = self.sendPilotAccounting( pilotDict )
-        if not result['OK']:
-          self.log.error( 'Failed to send pilot agent accounting' )
-
+    if not result['OK']:
+      self.log.error( 'Failed to get pilots info from DB', result['Message'] )
+      return S_OK()
+    pilotDict = result['Value']
+    for pRef in pilotDict:
+      self.__retrievePilotOutput( ce, ceName, pRef, pilotDict[pRef]['PilotStamp'], storeEmpty = True )
     return S_OK()
 
+  def __retrievePilotOutput( self, ce, ceName, pRef, pilotStamp, storeEmpty = False ):
+    """ Get the output of the pilot from the CE and store it in the PilotAgentsDB
+    """
+    self.log.info( 'Retrieving output for pilot %s' % pRef )
+    pRefStamp = pRef
+    if pilotStamp:
+      pRefStamp = pRef + ':::' + pilotStamp
+    result = ce.getJobOutput( pRefStamp )
+    if not result['OK']:
+      self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
+      return result
+    output, error = result['Value']
+    if not output and not storeEmpty:
+      self.log.warn( 'Empty pilot output not stored to PilotDB' )
+      return S_OK()
+    result = pilotAgentsDB.storePilotOutput( pRef, output, error )
+    if not result['OK']:
+      self.log.error( 'Failed to store pilot output', result['Message'] )
+    return result
+
   def sendPilotAccounting( self, pilotDict ):
     """ Send pilot accounting record
     """
@@ -861,22 +907,16 @@ EOF
       retVal = gDataStoreClient.addRegister( pA )
       if not retVal[ 'OK' ]:
         self.log.error( 'Failed to send accounting info for pilot ', pRef )
-      else:
-        # Set up AccountingSent flag
-        result = pilotAgentsDB.setAccountingFlag( pRef )
-        if not result['OK']:
-          self.log.error( 'Failed to set accounting flag for pilot ', pRef )
 
     self.log.info( 'Committing accounting records for %d pilots' % len( pilotDict ) )
     result = gDataStoreClient.commit()
-    if result['OK']:
-      for pRef in pilotDict:
-        self.log.verbose( 'Setting AccountingSent flag for pilot %s' % pRef )
-        result = pilotAgentsDB.setAccountingFlag( pRef )
-        if not result['OK']:
-          self.log.error( 'Failed to set accounting flag for pilot ', pRef )
-    else:
+    if not result['OK']:
       return result
+    # Set up AccountingSent flag of all the pilots in one go
+    self.log.verbose( 'Setting AccountingSent flag for %d pilots' % len( pilotDict ) )
+    result = pilotAgentsDB.setAccountingFlag( pilotDict.keys() )
+    if not result['OK']:
+      self.log.error( 'Failed to set accounting flag for pilots', result['Message'] )
 
     return S_OK()
 
@@ -5,6 +5,10 @@
 """ The StalledJobAgent hunts for stalled jobs in the Job database. Jobs in "running"
 state not receiving a heart beat signal for more than stalledTime
 seconds will be assigned the "Stalled" state.
+
+Stalled jobs are selected with a single query on the HeartBeatTime and LastUpdateTime
+of the jobs, their status is updated in bulk and the accounting records of the failed
+jobs are sent as one bundle.
 """
 
 __RCSID__ = "$Id$"
@@ -12,10 +16,11 @@ __RCSID__ = "$Id$"
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 from DIRAC.Core.Base.AgentModule import AgentModule
-from DIRAC.Core.Utilities.Time import fromString, toEpoch, dateTime, second
+from DIRAC.Core.Utilities.Time import fromString, dateTime, second
 from DIRAC import S_OK, S_ERROR, gConfig
 from DIRAC.Core.DISET.RPCClient import RPCClient
 from DIRAC.AccountingSystem.Client.Types.Job import Job
+from DIRAC.AccountingSystem.Client.DataStoreClient import gDataStoreClient
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
 from DIRAC.ConfigurationSystem.Client.Helpers import cfgPath
 from DIRAC.ConfigurationSystem.Client.PathFinder import getSystemInstance
@@ -103,29 +108,19 @@ for the agent restart
   def __markStalledJobs( self, stalledTime ):
     """ Identifies stalled jobs running without update longer than stalledTime.
 """
-    stalledCounter = 0
-    runningCounter = 0
-    result = self.jobDB.selectJobs( {'Status':'Running'} )
+    result = self.jobDB.getJobsWithoutUpdate( 'Running', stalledTime )
     if not result['OK']:
       return result
-    if not result['Value']:
+    stalledJobs = result['Value']
+    self.log.info( '%d Running jobs identified as stalled with last update > %d secs ago' %
+                   ( len( stalledJobs ), stalledTime ) )
+    if not stalledJobs:
       return S_OK()
-    jobs = result['Value']
-    self.log.info( '%s Running jobs will be checked for being stalled' % ( len( jobs ) ) )
-    jobs.sort()
-# jobs = jobs[:10] #for debugging
-    for job in jobs:
-      result = self.__getStalledJob( job, stalledTime )
-      if result['OK']:
-        self.log.verbose( 'Updating status to Stalled for job %s' % ( job ) )
-        self.__updateJobStatus( job, 'Stalled' )
-        stalledCounter += 1
-      else:
-        self.log.verbose( result['Message'] )
-        runningCounter += 1
 
-    self.log.info( 'Total jobs: %s, Stalled job count: %s, Running job count: %s' %
-                   ( len( jobs ), stalledCounter, runningCounter ) )
+    result = self.__updateJobsStatus( stalledJobs, 'Stalled' )
+    if not result['OK']:
+      return result
+    self.log.info( 'Stalled job count: %s' % len( stalledJobs ) )
     return S_OK()
 
   #############################################################################
@@ -140,41 +135,40 @@ for the agent restart
     failedCounter = 0
 
     if result['Value']:
-      jobs = result['Value']
+      jobs = [ int( job ) for job in result['Value'] ]
       self.log.info( '%s Stalled jobs will be checked for failure' % ( len( jobs ) ) )
 
-      for job in jobs:
+      # jobID : minor status
+      failedJobs = {}
 
-        # Check if the job pilot is lost
-        result = self.__getJobPilotStatus( job )
-        if result['OK']:
-          pilotStatus = result['Value']
+      # Check if the job pilot is lost
+      result = self.__getJobPilotStatus( jobs )
+      if not result['OK']:
+        self.log.error( result['Message'] )
+      else:
+        for job, pilotStatus in result['Value'].items():
           if pilotStatus != "Running":
-            result = self.__updateJobStatus( job, 'Failed',
-                                             "Job stalled: pilot not running" )
-            failedCounter += 1
-            result = self.__sendAccounting( job )
-            if not result['OK']:
-              self.log.error( result['Message'] )
-              break
-            continue
-
-        result = self.__getLatestUpdateTime( job )
+            failedJobs[job] = "Job stalled: pilot not running"
+
+      result = self.jobDB.getJobsWithoutUpdate( 'Stalled', failedTime )
+      if not result['OK']:
+        return result
+      for job in result['Value']:
+        if job not in failedJobs:
+          failedJobs[job] = 'Stalling for more than %d sec' % failedTime
+
+      minorDict = {}
+      for job, minor in failedJobs.items():
+        minorDict.setdefault( minor, {} )[job] = minor
+      for minor, jobDict in minorDict.items():
+        result = self.__updateJobsStatus( jobDict, 'Failed', minor )
         if not result['OK']:
-          return result
-        currentTime = toEpoch()
-        lastUpdate = result['Value']
-        elapsedTime = currentTime - lastUpdate
-        if elapsedTime > failedTime:
-          self.__updateJobStatus( job, 'Failed', 'Stalling for more than %d sec' % failedTime )
-          failedCounter += 1
-          result = self.__sendAccounting( job )
-          if not result['OK']:
-            self.log.error( result['Message'] )
-            break
+          self.log.error( result['Message'] )
+          continue
+        failedCounter += len( jobDict )
 
+    # Accounting of the jobs failed in this and in previous cycles
     recoverCounter = 0
-
     for minor in ["Job stalled: pilot not running", 'Stalling for more than %d sec' % failedTime]:
       result = self.jobDB.selectJobs( {'Status':'Failed', 'MinorStatus': minor, 'AccountedFlag': 'False' } )
       if not result['OK']:
@@ -182,15 +176,11 @@ for the agent restart
       if result['Value']:
         jobs = result['Value']
         self.log.info( '%s Stalled jobs will be Accounted' % ( len( jobs ) ) )
-        for job in jobs:
-          result = self.__sendAccounting( job )
-          if not result['OK']:
-            self.log.error( result['Message'] )
-            continue
-
-          recoverCounter += 1
-      if not result['OK']:
-        break
+        result = self.__sendAccounting( jobs )
+        if not result['OK']:
+          self.log.error( result['Message'] )
+          break
+        recoverCounter += result['Value']
 
     if failedCounter:
       self.log.info( '%d jobs set to Failed' % failedCounter )
@@ -199,150 +189,151 @@ for the agent restart
     return S_OK( failedCounter )
 
   #############################################################################
-  def __getJobPilotStatus( self, jobID ):
-    """ Get the job pilot status
+  def __getJobPilotStatus( self, jobIDs ):
+    """ Get the pilot status of the jobs as { jobID : pilotStatus },
+jobs without pilot reference are not in the result
 """
-    result = self.jobDB.getJobParameter( jobID, 'Pilot_Reference' )
+    result = self.jobDB.getJobParametersBulk( jobIDs, ['Pilot_Reference'] )
     if not result['OK']:
       return result
-    if not result['Value']:
-      return S_ERROR( 'Failed to get the pilot reference' )
+    pilotDict = dict( [ ( job, params['Pilot_Reference'] ) for job, params in result['Value'].items()
+                        if params.get( 'Pilot_Reference' ) ] )
+    if not pilotDict:
+      return S_OK( {} )
 
-    pilotReference = result['Value']
     wmsAdminClient = RPCClient( 'WorkloadManagement/WMSAdministrator' )
-    result = wmsAdminClient.getPilotInfo( pilotReference )
+    result = wmsAdminClient.getPilotInfo( list( set( pilotDict.values() ) ) )
     if not result['OK']:
       if "No pilots found" in result['Message']:
         self.log.warn( result['Message'] )
-        return S_OK( 'NoPilot' )
+        return S_OK( dict.fromkeys( pilotDict, 'NoPilot' ) )
       self.log.error( result['Message'] )
       return S_ERROR( 'Failed to get the pilot status' )
-    pilotStatus = result['Value'][pilotReference]['Status']
-
-    return S_OK( pilotStatus )
-
-
-  #############################################################################
-  def __getStalledJob( self, job, stalledTime ):
-    """ Compares the most recent of LastUpdateTime and HeartBeatTime against
-the stalledTime limit.
-"""
-    result = self.__getLatestUpdateTime( job )
-    if not result['OK']:
-      return result
-
-    currentTime = toEpoch()
-    lastUpdate = result['Value']
+    pilotInfo = result['Value']
 
-    elapsedTime = currentTime - lastUpdate
-    self.log.verbose( '(CurrentTime-LastUpdate) = %s secs' % ( elapsedTime ) )
-    if elapsedTime > stalledTime:
-      self.log.info( 'Job %s is identified as stalled with last update > %s secs ago' % ( job, elapsedTime ) )
-      return S_OK( 'Stalled' )
-
-    return S_ERROR( 'Job %s is running and will be ignored' % job )
-
-  #############################################################################
-  def __getLatestUpdateTime( self, job ):
-    """ Returns the most recent of HeartBeatTime and LastUpdateTime
-"""
-    result = self.jobDB.getJobAttributes( job, ['HeartBeatTime', 'LastUpdateTime'] )
-    if not result['OK']:
-      self.log.error( result['Message'] )
-    if not result['OK'] or not result['Value']:
-      return S_ERROR( 'Could not get attributes for job %s' % job )
-
-    self.log.verbose( result )
-    latestUpdate = 0
-    if not result['Value']['HeartBeatTime'] or result['Value']['HeartBeatTime'] == 'None':
-      self.log.verbose( 'HeartBeatTime is null for job %s' % job )
-    else:
-      latestUpdate = toEpoch( fromString( result['Value']['HeartBeatTime'] ) )
-
-    if not result['Value']['LastUpdateTime'] or result['Value']['LastUpdateTime'] == 'None':
-      self.log.verbose( 'LastUpdateTime is null for job %s' % job )
-    else:
-      lastUpdate = toEpoch( fromString( result['Value']['LastUpdateTime'] ) )
-      if latestUpdate < lastUpdate:
-        latestUpdate = lastUpdate
+    statusDict = {}
+    for job, pilotReference in pilotDict.items():
+      if pilotReference in pilotInfo:
+        statusDict[job] = pilotInfo[pilotReference]['Status']
+      else:
+        statusDict[job] = 'NoPilot'
+    return S_OK( statusDict )
 
-    if not latestUpdate:
-      return S_ERROR( 'LastUpdate and HeartBeat times are null for job %s' % job )
-    else:
-      self.log.verbose( 'Latest update time from epoch for job %s is %s' % ( job, latestUpdate ) )
-      return S_OK( latestUpdate )
 
   #############################################################################
-  def __updateJobStatus( self, job, status, minorstatus = None ):
-    """ This method updates the job status in the JobDB, this should only be
-used to fail jobs due to the optimizer chain.
+  def __updateJobsStatus( self, jobMinorDict, status, minorstatus = None ):
+    """ This method updates the status of the jobs in the JobDB with grouped statements,
+jobMinorDict is { jobID : current minor status }, the current minor status is retained
+in the logging records if minorstatus is not given (stalled jobs)
 """
-    self.log.verbose( "self.jobDB.setJobAttribute(%s,'Status','%s',update=True)" % ( job, status ) )
+    self.log.verbose( "Setting Status to %s for %d jobs" % ( status, len( jobMinorDict ) ) )
 
     if self.am_getOption( 'Enable', True ):
-      result = self.jobDB.setJobAttribute( job, 'Status', status, update = True )
-    else:
-      result = S_OK( 'DisabledMode' )
-
-    if result['OK']:
+      attrDict = { 'Status' : status }
       if minorstatus:
-        self.log.verbose( "self.jobDB.setJobAttribute(%s,'MinorStatus','%s',update=True)" % ( job, minorstatus ) )
-        result = self.jobDB.setJobAttribute( job, 'MinorStatus', minorstatus, update = True )
-
-    if not minorstatus: #Retain last minor status for stalled jobs
-      result = self.jobDB.getJobAttributes( job, ['MinorStatus'] )
-      if result['OK']:
-        minorstatus = result['Value']['MinorStatus']
+        attrDict['MinorStatus'] = minorstatus
+      result = self.jobDB.setJobAttributesBulk( dict.fromkeys( jobMinorDict, attrDict ), update = True )
+      if not result['OK']:
+        return result
 
-    logStatus = status
-    result = self.logDB.addLoggingRecord( job, status = logStatus, minor = minorstatus, source = 'StalledJobAgent' )
+    recordList = [ ( job, status, minorstatus or jobMinorDict[job], 'idem', '', 'StalledJobAgent' )
+                   for job in jobMinorDict ]
+    result = self.logDB.addLoggingRecordsBulk( recordList )
     if not result['OK']:
       self.log.warn( result )
 
     return result
 
-  def __getProcessingType( self, jobID ):
+  def __getProcessingType( self, jdl ):
     """ Get the Processing Type from the JDL, until it is promoted to a real Attribute
 """
     processingType = 'unknown'
-    result = self.jobDB.getJobJDL( jobID, original = True )
-    if not result['OK']:
+    if not jdl:
       return processingType
-    classAdJob = ClassAd( result['Value'] )
+    classAdJob = ClassAd( jdl )
     if classAdJob.lookupAttribute( 'ProcessingType' ):
       processingType = classAdJob.getAttributeString( 'ProcessingType' )
     return processingType
 
 
   #############################################################################
-  def __sendAccounting( self, jobID ):
-    """ Send WMS accounting data for the given job
+  def __sendAccounting( self, jobIDs ):
+    """ Send WMS accounting data for the given jobs in a single bundle, the data
+of all the jobs are retrieved with one query per table
+"""
+    jobIDs = [ int( jobID ) for jobID in jobIDs ]
+    result = self.jobDB.getAttributesForJobList( jobIDs )
+    if not result['OK']:
+      return result
+    jobAttrDict = result['Value']
+    result = self.logDB.getJobLoggingInfoBulk( jobIDs )
+    if not result['OK']:
+      return result
+    loggingDict = result['Value']
+    result = self.jobDB.getHeartBeatDataBulk( jobIDs )
+    if not result['OK']:
+      return result
+    heartBeatDict = result['Value']
+    result = self.jobDB.getJobParametersBulk( jobIDs, ['CPUNormalizationFactor'] )
+    if not result['OK']:
+      return result
+    parameterDict = result['Value']
+    result = self.jobDB.getJobJDLs( jobIDs, original = True )
+    if not result['OK']:
+      return result
+    jdlDict = result['Value']
+
+    accountedJobs = []
+    for jobID in jobIDs:
+      if jobID not in jobAttrDict:
+        continue
+      result = self.__getAccountingReport( jobID, jobAttrDict[jobID], loggingDict.get( jobID, [] ),
+                                           heartBeatDict.get( jobID, [] ), parameterDict.get( jobID, {} ),
+                                           jdlDict.get( jobID ) )
+      if not result['OK']:
+        self.log.error( result['Message'] )
+        continue
+      result = gDataStoreClient.addRegister( result['Value'] )
+      if not result['OK']:
+        self.log.error( 'Failed to add accounting report', 'Job: %d, Error: %s' % ( jobID, result['Message'] ) )
+        continue
+      accountedJobs.append( jobID )
+
+    if not accountedJobs:
+      return S_OK( 0 )
+    result = gDataStoreClient.commit()
+    if not result['OK']:
+      self.log.error( 'Failed to send accounting reports', 'Jobs: %d, Error: %s' % ( len( accountedJobs ),
+                                                                                   result['Message'] ) )
+      return result
+    result = self.jobDB.setJobAttributesBulk( dict.fromkeys( accountedJobs, { 'AccountedFlag' : 'True' } ) )
+    if not result['OK']:
+      return result
+    return S_OK( len( accountedJobs ) )
+
+  def __getAccountingReport( self, jobID, jobDict, logList, heartBeatList, parameters, jdl ):
+    """ Build the WMS accounting report of the given job
 """
     try:
       accountingReport = Job()
       endTime = 'Unknown'
       lastHeartBeatTime = 'Unknown'
 
-      result = self.jobDB.getJobAttributes( jobID )
-      if not result['OK']:
-        return result
-      jobDict = result['Value']
-
-      startTime, endTime = self.__checkLoggingInfo( jobID, jobDict )
-      lastCPUTime, lastWallTime, lastHeartBeatTime = self.__checkHeartBeat( jobID, jobDict )
+      startTime, endTime = self.__checkLoggingInfo( jobID, jobDict, logList )
+      lastCPUTime, lastWallTime, lastHeartBeatTime = self.__checkHeartBeat( jobID, jobDict, heartBeatList )
       lastHeartBeatTime = fromString( lastHeartBeatTime )
       if lastHeartBeatTime is not None and lastHeartBeatTime > endTime:
         endTime = lastHeartBeatTime
 
-      cpuNormalization = self.jobDB.getJobParameter( jobID, 'CPUNormalizationFactor' )
-      if not cpuNormalization['OK'] or not cpuNormalization['Value']:
+      cpuNormalization = parameters.get( 'CPUNormalizationFactor' )
+      if not cpuNormalization:
         cpuNormalization = 0.0
       else:
-        cpuNormalization = float( cpuNormalization['Value'] )
+        cpuNormalization = float( cpuNormalization )
     except Exception:
       self.log.exception( "Exception in __sendAccounting for job %s: endTime=%s, lastHBTime %s" % ( str( jobID ), str( endTime ), str( lastHeartBeatTime ) ), '' , False )
       return S_ERROR( "Exception" )
-    processingType = self.__getProcessingType( jobID )
+    processingType = self.__getProcessingType( jdl )
 
     accountingReport.setStartTime( startTime )
     accountingReport.setEndTime( endTime )
@@ -379,26 +370,19 @@ used to fail jobs due to the optimizer chain.
     self.log.verbose( 'Accounting Report is:' )
     self.log.verbose( acData )
     accountingReport.setValuesFromDict( acData )
+    return S_OK( accountingReport )
 
-    result = accountingReport.commit()
-    if result['OK']:
-      self.jobDB.setJobAttribute( jobID, 'AccountedFlag', 'True' )
-    else:
-      self.log.error( 'Failed to send accounting report', 'Job: %d, Error: %s' % ( int( jobID ), result['Message'] ) )
-    return result
-
-  def __checkHeartBeat( self, jobID, jobDict ):
+  def __checkHeartBeat( self, jobID, jobDict, heartBeatList ):
     """ Get info from HeartBeat
 """
-    result = self.jobDB.getHeartBeatData( jobID )
     lastCPUTime = 0
     lastWallTime = 0
     lastHeartBeatTime = jobDict['StartExecTime']
     if lastHeartBeatTime == "None":
       lastHeartBeatTime = 0
 
-    if result['OK']:
-      for name, value, heartBeatTime in result['Value']:
+    if heartBeatList:
+      for name, value, heartBeatTime in heartBeatList:
         if 'CPUConsumed' == name:
           try:
             value = int( float( value ) )
@@ -418,14 +402,9 @@ used to fail jobs due to the optimizer chain.
 
     return lastCPUTime, lastWallTime, lastHeartBeatTime
 
-  def __checkLoggingInfo( self, jobID, jobDict ):
+  def __checkLoggingInfo( self, jobID, jobDict, logList ):
     """ Get info from JobLogging
 """
-    logList = []
-    result = self.logDB.getJobLoggingInfo( jobID )
-    if result['OK']:
-      logList = result['Value']
-
     startTime = jobDict['StartExecTime']
     if not startTime or startTime == 'None':
       # status, minor, app, stime, source
@@ -511,20 +490,21 @@ used to fail jobs due to the optimizer chain.
       return S_OK()
 
     # Remove those with Minor Status "Pending Requests"
-    for jobID in jobIDs:
-      result = self.jobDB.getJobAttribute( jobID, 'MinorStatus' )
-      if not result['OK']:
-        self.log.error( result['Message'] )
-        continue
-      if result['Value'] == "Pending Requests":
-        continue
+    result = self.jobDB.getAttributesForJobList( jobIDs, ['MinorStatus'] )
+    if not result['OK']:
+      self.log.error( result['Message'] )
+      return result
+    failedJobs = dict( [ ( jobID, attrDict['MinorStatus'] ) for jobID, attrDict in result['Value'].items()
+                         if attrDict['MinorStatus'] != "Pending Requests" ] )
+    if not failedJobs:
+      return S_OK()
 
-      result = self.__updateJobStatus( jobID, 'Failed',
-                                       "Job died during finalization" )
-      result = self.__sendAccounting( jobID )
-      if not result['OK']:
-        self.log.error( result['Message'] )
-        continue
+    result = self.__updateJobsStatus( failedJobs, 'Failed', "Job died during finalization" )
+    if not result['OK']:
+      self.log.error( result['Message'] )
+    result = self.__sendAccounting( failedJobs.keys() )
+    if not result['OK']:
+      self.log.error( result['Message'] )
 
     return S_OK()
 
@@ -15,11 +15,17 @@ from DIRAC.Core.DISET.RPCClient                                     import RPCCl
 from DIRAC.DataManagementSystem.Client.ReplicaManager               import ReplicaManager
 from DIRAC.Resources.Storage.StorageElement                         import StorageElement
 from DIRAC.Core.Utilities.Os                                        import getDiskSpace
-from DIRAC                                                          import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities.Adler                                     import fileAdler, compareAdler
+from DIRAC.WorkloadManagementSystem.Client.InputDataCache           import InputDataCache
+from DIRAC                                                          import S_OK, S_ERROR, gLogger, gConfig
 
-import os, tempfile, random
+import os, tempfile, random, threading, Queue
 
 COMPONENT_NAME = 'DownloadInputData'
+# Default number of files downloaded in parallel
+DOWNLOAD_STREAMS = 4
+# Default maximum size of the node input data cache in GB
+CACHE_SIZE = 20
 
 class DownloadInputData:
   """
@@ -40,8 +46,16 @@ class DownloadInputData:
     if argumentsDict.has_key( 'InputDataDirectory' ):
       self.inputDataDirectory = argumentsDict['InputDataDirectory']
     self.jobID = None
-    self.replicaManager = ReplicaManager()
     self.counter = 1
+    self.tapeSEs = []
+    self.downloadResults = {}
+    self.downloadStreams = gConfig.getValue( '/LocalSite/InputDataDownloadStreams', DOWNLOAD_STREAMS )
+    # Node level cache shared by the jobs running on the worker node, disabled if no directory is defined
+    self.cache = None
+    cacheDirectory = gConfig.getValue( '/LocalSite/InputDataCache/Directory', '' )
+    if cacheDirectory:
+      cacheSize = gConfig.getValue( '/LocalSite/InputDataCache/MaxSize', CACHE_SIZE )
+      self.cache = InputDataCache( cacheDirectory, cacheSize * 1024 * 1024 * 1024 )
 
   #############################################################################
   def execute( self, dataToResolve = None ):
@@ -98,7 +112,8 @@ class DownloadInputData:
 
       size = reps['Size']
       guid = reps['GUID' ]
-      downloadReplicas[lfn] = {'SE':[], 'Size':size, 'GUID':guid}
+      downloadReplicas[lfn] = {'SE':[], 'Size':size, 'GUID':guid,
+                               'Checksum':reps.get( 'Checksum', '' ), 'ChecksumType':reps.get( 'ChecksumType', '' )}
       for seName in diskSEs:
         if seName in reps:
           downloadReplicas[lfn]['SE'].append( ( seName, reps[seName] ) )
@@ -148,64 +163,33 @@ class DownloadInputData:
       result['Successful'] = {}
       return result
 
+    self.tapeSEs = tapeSEs
+    downloadQueue = Queue.Queue()
+    for lfn in downloadReplicas.keys():
+      downloadQueue.put( lfn )
+    self.downloadResults = {}
+    threads = []
+    for _i in range( max( 1, min( self.downloadStreams, len( downloadReplicas ) ) ) ):
+      thread = threading.Thread( target = self.__downloadWorker, args = ( downloadQueue, downloadReplicas ) )
+      thread.setDaemon( True )
+      thread.start()
+      threads.append( thread )
+    for thread in threads:
+      thread.join()
+
     resolvedData = {}
     localSECount = 0
+    cacheCount = 0
     for lfn in downloadReplicas.keys():
-      pfn = downloadReplicas[lfn]['PFN']
-      seName = downloadReplicas[lfn]['SE']
-      guid = downloadReplicas[lfn]['GUID']
-      result = self.replicaManager.getStorageFileMetadata( [pfn], seName )
+      result, origin = self.downloadResults.get( lfn, ( S_ERROR( 'Not downloaded' ), None ) )
       if not result['OK']:
-        self.log.error( result['Message'] )
-        failedReplicas.append( lfn )
-        continue
-      if result['Value']['Failed']:
-        error = 'Could not get Storage Metadata from %s' % seName
-        self.log.error( error )
-        failedReplicas.append( lfn )
-        continue
-      metadata = result['Value']['Successful'][pfn]
-      if metadata['Lost']:
-        error = "PFN has been Lost by the StorageElement"
-        self.log.error( error , pfn )
-        failedReplicas.append( lfn )
-        continue
-      elif metadata['Unavailable']:
-        error = "PFN is declared Unavailable by the StorageElement"
-        self.log.error( error, pfn )
-        failedReplicas.append( lfn )
-        continue
-      elif seName in tapeSEs and not metadata['Cached']:
-        error = "PFN is no longer in StorageElement Cache"
-        self.log.error( error, pfn )
         failedReplicas.append( lfn )
         continue
-
-      self.log.info( 'Preliminary checks OK, download from LocalSE:', pfn )
-      result = self.__getPFN( pfn, seName, guid )
-      if not result['OK']:
-        self.log.warn( 'Download from localSE failed with message:\n%s' % ( result ) )
-        # if the replica was NOT on a Tape SE attempt a download from elsewhere
-        if seName not in tapeSEs:
-          self.log.info( 'Trying to download from any SE:', pfn )
-          result = self.__getLFN( lfn, pfn, seName, guid )
-          if not result['OK']:
-            self.log.warn( 'Download from any SE failed with message:\n%s' % ( result ) )
-            failedReplicas.append( lfn )
-        else:
-          failedReplicas.append( lfn )
-      else:
+      if origin == 'LocalSE':
         localSECount += 1
-      if result['OK']:
-        # Rename file if downloaded FileName does not match the LFN
-        lfnName = os.path.basename( lfn )
-        oldPath = result['Value']['path']
-        fileName = os.path.basename( oldPath )
-        if lfnName != fileName:
-          newPath = os.path.join( os.path.dirname( oldPath, lfnName ) )
-          os.rename( oldPath, newPath )
-          result['Value']['path'] = newPath
-        resolvedData[lfn] = result['Value']
+      elif origin == 'Cache':
+        cacheCount += 1
+      resolvedData[lfn] = result['Value']
 
     #Report datasets that could not be downloaded
     report = ''
@@ -221,6 +205,8 @@ class DownloadInputData:
         report += '%s\n' % ( lfn )
       totalLFNs = len( resolvedData.keys() )
       report += '\nDownloaded %s / %s files from local Storage Elements on first attempt.' % ( localSECount, totalLFNs )
+      if self.cache:
+        report += '\nObtained %s / %s files from the node input data cache.' % ( cacheCount, totalLFNs )
       self.__setJobParam( COMPONENT_NAME, report )
 
     result = S_OK()
@@ -228,6 +214,149 @@ class DownloadInputData:
     result['Failed'] = failedReplicas #lfn list to be passed to another resolution mechanism
     return result
 
+  #############################################################################
+  def __downloadWorker( self, downloadQueue, downloadReplicas ):
+    """ Downloads the LFNs from the queue until it is empty. Each of the
+        parallel workers uses its own ReplicaManager
+    """
+    replicaManager = ReplicaManager()
+    while True:
+      try:
+        lfn = downloadQueue.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        self.downloadResults[lfn] = self.__downloadLFN( lfn, downloadReplicas[lfn], replicaManager )
+      except Exception, x:
+        self.log.exception( 'Exception while downloading', lfn )
+        self.downloadResults[lfn] = ( S_ERROR( str( x ) ), None )
+
+  #############################################################################
+  def __downloadLFN( self, lfn, reps, replicaManager ):
+    """ Gets a local copy of the LFN from the node cache if possible, downloads
+        it and adds it to the cache otherwise. Returns ( result, origin ), origin
+        being 'Cache', 'LocalSE' or 'AnySE'
+    """
+    if not self.cache or not reps.get( 'Checksum' ):
+      return self.__downloadReplica( lfn, reps, replicaManager )
+
+    cacheKey = self.cache.getKey( lfn, reps['Checksum'] )
+    result = self.cache.lock( cacheKey )
+    if not result['OK']:
+      self.log.warn( 'Input data cache can not be used', result['Message'] )
+      return self.__downloadReplica( lfn, reps, replicaManager )
+    lockFile = result['Value']
+    try:
+      localPath = os.path.join( self.__getDownloadDir(), os.path.basename( lfn ) )
+      result = self.cache.getFile( cacheKey, localPath )
+      if result['OK']:
+        self.log.info( 'Input data found in the node cache:', lfn )
+        fileDict = { 'turl':'Cached', 'protocol':'Cached', 'se':reps['SE'], 'pfn':reps['PFN'],
+                     'guid':reps['GUID'], 'path':localPath }
+        return ( S_OK( fileDict ), 'Cache' )
+
+      result, origin = self.__downloadReplica( lfn, reps, replicaManager )
+      if result['OK']:
+        self.__addToCache( cacheKey, lfn, reps, result['Value']['path'] )
+      return ( result, origin )
+    finally:
+      self.cache.unlock( lockFile )
+
+  #############################################################################
+  def __addToCache( self, cacheKey, lfn, reps, localPath ):
+    """ Adds the downloaded file to the node cache if its checksum is verified
+    """
+    if reps['ChecksumType'] and reps['ChecksumType'].lower() not in ( 'adler32', 'ad', 'ad32' ):
+      self.log.verbose( 'Only files with Adler32 checksum are cached', lfn )
+      return
+    if not compareAdler( fileAdler( localPath ), reps['Checksum'] ):
+      self.log.warn( 'Checksum mismatch, file not added to the input data cache', lfn )
+      return
+    result = self.cache.addFile( cacheKey, localPath )
+    if not result['OK']:
+      self.log.warn( 'Failed to add file to the input data cache', result['Message'] )
+
+  #############################################################################
+  def __downloadReplica( self, lfn, reps, replicaManager ):
+    """ Downloads the replica from the local SE, from any SE if this fails and the
+        local SE is not a tape SE or if there is no local replica
+    """
+    pfn = reps['PFN']
+    seName = reps['SE']
+    guid = reps['GUID']
+    if not pfn:
+      self.log.info( 'Trying to download from any SE:', lfn )
+      result = self.__getLFN( lfn, pfn, seName, guid, replicaManager )
+      if not result['OK']:
+        self.log.warn( 'Download from any SE failed with message:\n%s' % ( result ) )
+      return ( self.__checkFileName( lfn, result ), 'AnySE' )
+
+    result = replicaManager.getStorageFileMetadata( [pfn], seName )
+    if not result['OK']:
+      self.log.error( result['Message'] )
+      return ( result, None )
+    if result['Value']['Failed']:
+      error = 'Could not get Storage Metadata from %s' % seName
+      self.log.error( error )
+      return ( S_ERROR( error ), None )
+    metadata = result['Value']['Successful'][pfn]
+    if metadata['Lost']:
+      error = "PFN has been Lost by the StorageElement"
+      self.log.error( error , pfn )
+      return ( S_ERROR( error ), None )
+    elif metadata['Unavailable']:
+      error = "PFN is declared Unavailable by the StorageElement"
+      self.log.error( error, pfn )
+      return ( S_ERROR( error ), None )
+    elif seName in self.tapeSEs and not metadata['Cached']:
+      error = "PFN is no longer in StorageElement Cache"
+      self.log.error( error, pfn )
+      return ( S_ERROR( error ), None )
+
+    self.log.info( 'Preliminary checks OK, download from LocalSE:', pfn )
+    result = self.__getPFN( pfn, seName, guid, replicaManager )
+    if result['OK']:
+      return ( self.__checkFileName( lfn, result ), 'LocalSE' )
+
+    self.log.warn( 'Download from localSE failed with message:\n%s' % ( result ) )
+    # if the replica was NOT on a Tape SE attempt a download from elsewhere
+    if seName in self.tapeSEs:
+      return ( result, None )
+    self.log.info( 'Trying to download from any SE:', pfn )
+    result = self.__getLFN( lfn, pfn, seName, guid, replicaManager )
+    if not result['OK']:
+      self.log.warn( 'Download from any SE failed with message:\n%s' % ( result ) )
+    return ( self.__checkFileName( lfn, result ), 'AnySE' )
+
+  #############################################################################
+  @staticmethod
+  def __checkFileName( lfn, result ):
+    """ Rename file if downloaded FileName does not match the LFN
+    """
+    if result['OK']:
+      lfnName = os.path.basename( lfn )
+      oldPath = result['Value']['path']
+      fileName = os.path.basename( oldPath )
+      if lfnName != fileName:
+        newPath = os.path.join( os.path.dirname( oldPath ), lfnName )
+        os.rename( oldPath, newPath )
+        result['Value']['path'] = newPath
+    return result
+
+  #############################################################################
+  def __getDownloadDir( self ):
+    """ Directory where the next input file is put
+    """
+    start = os.getcwd()
+    if self.inputDataDirectory == "PerFile":
+      downloadDir = tempfile.mkdtemp( prefix = 'InputData_%s' % ( self.counter ), dir = start )
+    elif self.inputDataDirectory == "CWD":
+      downloadDir = start
+    else:
+      downloadDir = self.inputDataDirectory
+    self.counter += 1
+    return downloadDir
+
   #############################################################################
   def __checkDiskSpace( self, totalSize ):
     """Compare available disk space to the file size reported from the catalog
@@ -248,23 +377,14 @@ class DownloadInputData:
       return S_ERROR( msg )
 
   #############################################################################
-  def __getLFN( self, lfn, pfn, seName, guid ):
+  def __getLFN( self, lfn, pfn, seName, guid, replicaManager ):
     """ Download a local copy of a single LFN from the specified Storage Element.
         This is used as a last resort to attempt to retrieve the file.  The Replica
         Manager will perform an LFC lookup to refresh the stored result.
     """
-    start = os.getcwd()
-    if self.inputDataDirectory == "PerFile":
-      downloadDir = tempfile.mkdtemp( prefix = 'InputData_%s' % ( self.counter ), dir = start )
-    elif self.inputDataDirectory == "CWD":
-      downloadDir = start
-    else:
-      downloadDir = self.inputDataDirectory
-    self.counter += 1
-    os.chdir( downloadDir )
+    downloadDir = self.__getDownloadDir()
     self.log.verbose( 'Attempting to ReplicaManager.getFile for %s in %s' % ( lfn, downloadDir ) )
-    result = self.replicaManager.getFile( lfn )
-    os.chdir( start )
+    result = replicaManager.getFile( lfn, destinationDir = downloadDir )
     if not result['OK']:
       return result
     self.log.verbose( result )
@@ -283,7 +403,7 @@ class DownloadInputData:
       return S_ERROR( 'OK download result but file missing in current directory' )
 
   #############################################################################
-  def __getPFN( self, pfn, seName, guid ):
+  def __getPFN( self, pfn, seName, guid, replicaManager ):
     """ Download a local copy of a single PFN from the specified Storage Element.
     """
     if not pfn:
@@ -300,16 +420,8 @@ class DownloadInputData:
                    'path': os.path.join( os.getcwd(), fileName )}
       return S_OK( fileDict )
 
-    start = os.getcwd()
-    if self.inputDataDirectory == "PerFile":
-      downloadDir = tempfile.mkdtemp( prefix = 'InputData_%s' % ( self.counter ), dir = start )
-    elif self.inputDataDirectory == "CWD":
-      downloadDir = start
-    else:
-      downloadDir = self.inputDataDirectory
-    self.counter += 1
-
-    result = self.replicaManager.getStorageFile( pfn, seName, localPath = downloadDir, singleFile = True )
+    downloadDir = self.__getDownloadDir()
+    result = replicaManager.getStorageFile( pfn, seName, localPath = downloadDir, singleFile = True )
     if not result['OK']:
       self.log.warn( 'Problem getting PFN %s:\n%s' % ( pfn, result ) )
       return result
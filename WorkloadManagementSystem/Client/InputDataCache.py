@@ -0,0 +1,164 @@
+########################################################################
+# $HeadURL$
+# File :    InputDataCache.py
+########################################################################
+
+""" The Input Data Cache is a node level, content addressed cache of input
+    data files shared by the jobs running on the same worker node.
+
+    Files are stored under <CacheDirectory>/<key[:2]>/<key>, the key being the
+    sha1 of the LFN and of its catalog checksum, so that a file modified in the
+    catalog is never served from the cache. The cached files are read-only and
+    are hard linked (copied if linking is not possible) into the job directories.
+    The modification time of the cached files is refreshed when they are used and
+    the least recently used ones are evicted when the cache exceeds its maximum size.
+    Concurrent jobs serialize on a per key lock file, so that a file requested by
+    several jobs at the same time is downloaded only once.
+"""
+
+__RCSID__ = "$Id$"
+
+from DIRAC                                                          import S_OK, S_ERROR, gLogger
+
+import os, shutil, fcntl, stat, errno
+
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import sha as sha1
+
+class InputDataCache:
+  """
+   node level LRU cache of input data files keyed by LFN and checksum
+  """
+
+  #############################################################################
+  def __init__( self, cacheDirectory, maxSize ):
+    """ Standard constructor, maxSize is given in bytes
+    """
+    self.log = gLogger.getSubLogger( 'InputDataCache' )
+    self.cacheDirectory = cacheDirectory
+    self.maxSize = maxSize
+
+  #############################################################################
+  @staticmethod
+  def getKey( lfn, checksum ):
+    """ Cache key of the LFN with the given checksum
+    """
+    return sha1( '%s\n%s' % ( lfn, str( checksum ).lower() ) ).hexdigest()
+
+  #############################################################################
+  def __getPath( self, key ):
+    """ Path of the cached file for the key
+    """
+    return os.path.join( self.cacheDirectory, key[:2], key )
+
+  #############################################################################
+  def lock( self, key ):
+    """ Blocks until the lock of the key is acquired, returns the lock to be released
+        with unlock
+    """
+    try:
+      lockDirectory = os.path.dirname( self.__getPath( key ) )
+      if not os.path.isdir( lockDirectory ):
+        os.makedirs( lockDirectory )
+    except OSError, x:
+      if x.errno != errno.EEXIST:
+        return S_ERROR( 'Can not create the cache directory: %s' % str( x ) )
+    try:
+      lockFile = open( self.__getPath( key ) + '.lock', 'a' )
+      fcntl.flock( lockFile.fileno(), fcntl.LOCK_EX )
+    except IOError, x:
+      return S_ERROR( 'Can not lock the cache entry: %s' % str( x ) )
+    return S_OK( lockFile )
+
+  #############################################################################
+  def unlock( self, lockFile ):
+    """ Releases a lock obtained with lock
+    """
+    try:
+      fcntl.flock( lockFile.fileno(), fcntl.LOCK_UN )
+      lockFile.close()
+    except IOError, x:
+      self.log.warn( 'Failed to release the cache lock', str( x ) )
+
+  #############################################################################
+  def getFile( self, key, localPath ):
+    """ Makes the cached file available as localPath, S_ERROR if not cached
+    """
+    cachePath = self.__getPath( key )
+    if not os.path.exists( cachePath ):
+      return S_ERROR( 'File not in cache' )
+    try:
+      self.__linkOrCopy( cachePath, localPath )
+      # The modification time is used for the LRU eviction
+      os.utime( cachePath, None )
+    except ( IOError, OSError ), x:
+      return S_ERROR( 'Can not get the file from the cache: %s' % str( x ) )
+    return S_OK( localPath )
+
+  #############################################################################
+  def addFile( self, key, localPath ):
+    """ Adds the local file to the cache and evicts the least recently used files
+        if the cache gets bigger than its maximum size
+    """
+    cachePath = self.__getPath( key )
+    tmpPath = '%s.%s.tmp' % ( cachePath, os.getpid() )
+    try:
+      if os.path.exists( tmpPath ):
+        os.remove( tmpPath )
+      self.__linkOrCopy( localPath, tmpPath )
+      os.chmod( tmpPath, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH )
+      os.rename( tmpPath, cachePath )
+    except ( IOError, OSError ), x:
+      return S_ERROR( 'Can not add the file to the cache: %s' % str( x ) )
+    try:
+      self.__evict()
+    except OSError, x:
+      self.log.warn( 'Failed to evict files from the input data cache', str( x ) )
+    return S_OK( cachePath )
+
+  #############################################################################
+  @staticmethod
+  def __linkOrCopy( source, destination ):
+    """ Hard links source to destination, copies it if a link is not possible
+        (different file systems or files owned by other users)
+    """
+    try:
+      os.link( source, destination )
+    except OSError:
+      shutil.copy( source, destination )
+
+  #############################################################################
+  def __evict( self ):
+    """ Removes the least recently used files until the cache size is below its maximum
+    """
+    cachedFiles = []
+    totalSize = 0
+    for subDirectory in os.listdir( self.cacheDirectory ):
+      directory = os.path.join( self.cacheDirectory, subDirectory )
+      if not os.path.isdir( directory ):
+        continue
+      for fileName in os.listdir( directory ):
+        if fileName.endswith( '.lock' ) or fileName.endswith( '.tmp' ):
+          continue
+        filePath = os.path.join( directory, fileName )
+        try:
+          fileStat = os.stat( filePath )
+        except OSError:
+          continue
+        cachedFiles.append( ( fileStat.st_mtime, fileStat.st_size, filePath ) )
+        totalSize += fileStat.st_size
+
+    cachedFiles.sort()
+    while cachedFiles and totalSize > self.maxSize:
+      _mtime, size, filePath = cachedFiles.pop( 0 )
+      try:
+        # Jobs using the file keep their own hard link or copy
+        os.remove( filePath )
+        totalSize -= size
+        self.log.verbose( 'Evicted from the input data cache', filePath )
+      except OSError:
+        pass
+
+#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#
@@ -60,7 +60,12 @@ class CachedJobState( object ):
     changes = {}
     for k in self.__dirtyKeys:
       changes[ k ] = self.__cache[ k ]
-    result = self.__jobState.commitCache( self.__initState, changes, self.__jobLog )
+    manifestJDL = None
+    if self.__manifest and self.__manifest.isDirty():
+      manifestJDL = self.__manifest.dumpAsJDL()
+    #Attributes, parameters, logging records, manifest and TQ insertion in one go
+    result = self.__jobState.commitChanges( self.__initState, changes, self.__jobLog,
+                                            manifestJDL, self.__insertIntoTQ )
     try:
       result.pop( 'rpcStub' )
     except KeyError:
@@ -74,26 +79,9 @@ class CachedJobState( object ):
     newState = result[ 'Value' ]
     self.__jobLog = []
     self.__dirtyKeys.clear()
-    #Save manifest
-    if self.__manifest and self.__manifest.isDirty():
-      result = self.__jobState.setManifest( self.__manifest )
-      if not result[ 'OK' ]:
-        self.cleanState()
-        for i in range( 5 ):
-          if self.__jobState.rescheduleJob()[ 'OK' ]:
-            break
-        return result
+    if manifestJDL:
       self.__manifest.clearDirty()
-    #Insert into TQ
-    if self.__insertIntoTQ:
-      result = self.__jobState.insertIntoTQ()
-      if not result[ 'OK' ]:
-        self.cleanState()
-        for i in range( 5 ):
-          if self.__jobState.rescheduleJob()[ 'OK' ]:
-            break
-        return result
-      self.__insertIntoTQ = False
+    self.__insertIntoTQ = False
 
     self.__initState = newState
     self.__lastValidState = time.time()
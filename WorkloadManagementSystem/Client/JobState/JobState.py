@@ -200,6 +200,63 @@ class JobState( object ):
     gLogger.info( "Job %s: Ended trace execution" % self.__jid )
     #We return a new initial state
     return self.getAttributes( initialState.keys() )
+
+  right_commitChanges = RIGHT_CHANGE_STATUS
+  @RemoteMethod
+  def commitChanges( self, initialState, cache, jobLog, manifestJDL = None, insertIntoTQ = False ):
+    """ Commit in one call the changes cached by a CachedJobState. The JobDB changes are
+        applied in one transaction only if the job is still in initialState. Then the
+        logging records are added and the job is inserted in the TQ if requested
+    """
+    try:
+      self.__checkType( initialState , types.DictType )
+      self.__checkType( cache , types.DictType )
+      self.__checkType( jobLog , ( types.ListType, types.TupleType ) )
+      self.__checkType( manifestJDL , ( types.StringType, types.NoneType ) )
+      self.__checkType( insertIntoTQ , types.BooleanType )
+    except TypeError, excp:
+      return S_ERROR( str( excp ) )
+
+    data = { 'att': [], 'jobp': [], 'optp': [] }
+    for key in cache:
+      for dk in data:
+        if key.find( "%s." % dk ) == 0:
+          data[ dk ].append( ( key[ len( dk ) + 1:], cache[ key ] ) )
+
+    gLogger.verbose( "Job %s: About to commit changes. Current state %s" % ( self.__jid, initialState ) )
+    result = JobState.__db.job.commitJobState( self.__jid, initialState, dict( data[ 'att' ] ),
+                                               data[ 'jobp' ], data[ 'optp' ], manifestJDL )
+    if not result[ 'OK' ] or not result[ 'Value' ]:
+      return result
+
+    if jobLog:
+      records = []
+      for record, updateTime, source in jobLog:
+        records.append( ( self.__jid, record.get( 'status', 'idem' ), record.get( 'minor', 'idem' ),
+                          record.get( 'application', 'idem' ), updateTime, source ) )
+      result = JobState.__db.log.addLoggingRecordsBulk( records )
+      if not result[ 'OK' ]:
+        gLogger.error( "Job %s: Cannot add logging records" % self.__jid, result[ 'Message' ] )
+
+    if insertIntoTQ:
+      if manifestJDL:
+        manifest = JobManifest()
+        result = manifest.loadJDL( manifestJDL )
+        if result[ 'OK' ]:
+          result = self.__insertIntoTQ( manifest )
+      else:
+        result = self.insertIntoTQ()
+      if not result[ 'OK' ]:
+        errMsg = result[ 'Message' ]
+        result = self.rescheduleJob( source = self.__source )
+        if not result[ 'OK' ]:
+          gLogger.error( "Job %s: Cannot reschedule" % self.__jid, result[ 'Message' ] )
+        return S_ERROR( errMsg )
+
+    gLogger.info( "Job %s: Committed changes" % self.__jid )
+    #We return a new initial state
+    return self.getAttributes( initialState.keys() )
+
 #
 # Status
 #
@@ -486,8 +543,9 @@ class JobState( object ):
     result = self.getManifest()
     if not result[ 'OK' ]:
       return result
-    manifest = result[ 'Value' ]
+    return self.__insertIntoTQ( result[ 'Value' ] )
 
+  def __insertIntoTQ( self, manifest ):
     reqSection = "JobRequirements"
 
     result = manifest.getSection( reqSection )
@@ -9,12 +9,14 @@ try:
 except:
   import md5
 import tempfile
+import threading
 import types
 import re
 from DIRAC.Core.DISET.TransferClient import TransferClient
 from DIRAC.Core.DISET.RPCClient import RPCClient
 from DIRAC.DataManagementSystem.Client.ReplicaManager import ReplicaManager
 from DIRAC.Core.Utilities.File import getGlobbedTotalSize
+from DIRAC.WorkloadManagementSystem.private.SandboxChunkStore import buildManifest, getManifestChunks
 from DIRAC import gLogger, S_OK, S_ERROR, gConfig
 
 class SandboxStoreClient:
@@ -95,6 +97,13 @@ class SandboxStoreClient:
     if errorFiles:
       return S_ERROR( "Failed to locate files: %s" % ", ".join( errorFiles ) )
 
+    # Only the content not already in the SandboxStore is sent, fall back
+    # to a tarball if the service does not support chunked sandboxes
+    result = self.__uploadChunkedSandbox( files2Upload, sizeLimit, assignTo )
+    if result[ 'OK' ]:
+      return result
+    gLogger.verbose( "Cannot upload chunked sandbox, sending it as a tarball", result[ 'Message' ] )
+
     try:
       fd, tmpFilePath = tempfile.mkstemp( prefix = "LDSB." )
       os.close( fd )
@@ -130,6 +139,65 @@ class SandboxStoreClient:
       pass
     return result
 
+  def __uploadChunkedSandbox( self, files2Upload, sizeLimit, assignTo ):
+    """ Send the manifest of the files, upload the chunks the SandboxStore does not
+        hold yet and register the sandbox
+    """
+    if sizeLimit > 0 and getGlobbedTotalSize( files2Upload ) > sizeLimit:
+      # The limit applies to the compressed tarball
+      return S_ERROR( "Sandbox files over the size limit" )
+    result = buildManifest( files2Upload )
+    if not result[ 'OK' ]:
+      return result
+    manifest, chunkLocations = result[ 'Value' ]
+
+    rpcClient = self.__getRPCClient()
+    result = rpcClient.getMissingChunks( getManifestChunks( manifest ) )
+    if not result[ 'OK' ]:
+      return result
+    missing = result[ 'Value' ]
+    gLogger.verbose( "Uploading %s of %s sandbox chunks" % ( len( missing ), len( chunkLocations ) ) )
+    if missing:
+      result = self.__sendChunks( missing, chunkLocations )
+      if not result[ 'OK' ]:
+        return result
+    return rpcClient.commitSandboxManifest( manifest, assignTo )
+
+  def __sendChunks( self, chunkList, chunkLocations ):
+    """ Stream the chunks of the list to the SandboxStore
+    """
+    rfd, wfd = os.pipe()
+    writer = threading.Thread( target = self.__writeChunks, args = ( wfd, chunkList, chunkLocations ) )
+    writer.setDaemon( True )
+    writer.start()
+    try:
+      transferClient = self.__getTransferClient()
+      return transferClient.sendFile( rfd, ( "Chunks", chunkList ) )
+    finally:
+      # Closing the read end stops the writer if the transfer failed
+      os.close( rfd )
+      writer.join()
+
+  def __writeChunks( self, wfd, chunkList, chunkLocations ):
+    """ Write the chunks of the list one after the other to the file descriptor
+    """
+    try:
+      try:
+        for chunkHash, _size in chunkList:
+          filePath, offset, size = chunkLocations[ chunkHash ]
+          fd = open( filePath, "rb" )
+          try:
+            fd.seek( offset )
+            data = fd.read( size )
+          finally:
+            fd.close()
+          while data:
+            data = data[ os.write( wfd, data ): ]
+      except ( IOError, OSError ), e:
+        gLogger.verbose( "Stopped writing sandbox chunks", str( e ) )
+    finally:
+      os.close( wfd )
+
   ##############
   # Download sandbox
 
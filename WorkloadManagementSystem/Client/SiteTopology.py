@@ -0,0 +1,165 @@
+########################################################################
+# $HeadURL$
+# File :   SiteTopology.py
+########################################################################
+""" Process wide snapshot of the site and SE topology used by the WMS executors:
+    SE -> sites and site -> SEs mappings, site tiers, SE disk/tape types and the
+    RSS usable sites and SE statuses.
+
+    The CS derived information is built once per CS version and the RSS derived
+    one once per RSS cache lifetime, so that the per job scheduling work is done
+    with in memory lookups. All the executors of the process share the same
+    SiteTopology object::
+
+      topology = SiteTopology()
+      result = topology.getSitesForSE( 'CERN-RAW' )
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import threading
+
+from DIRAC                                                  import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities.DIRACSingleton                    import DIRACSingleton
+from DIRAC.Core.Utilities.SiteSEMapping                     import getSiteSEMapping
+from DIRAC.ConfigurationSystem.Client.ConfigurationData     import gConfigurationData
+from DIRAC.ConfigurationSystem.Client.Helpers.Resources     import getSiteTier
+from DIRAC.ResourceStatusSystem.Client.SiteStatus           import SiteStatus
+from DIRAC.ResourceStatusSystem.Utilities.RssConfiguration  import RssConfiguration
+from DIRAC.Resources.Storage.StorageElement                 import StorageElement
+
+# Tier assumed for the sites without MoUTierLevel
+DEFAULT_TIER = 2
+
+class SiteTopology( object ):
+  """ Site and SE topology snapshot, refreshed when the CS version changes or the
+      RSS caches are renewed
+  """
+
+  __metaclass__ = DIRACSingleton
+
+  def __init__( self ):
+    """ c'tor
+    """
+    self.log = gLogger.getSubLogger( 'SiteTopology' )
+    self.__lock = threading.RLock()
+    self.__csVersion = None
+    self.__rssUpdate = 0
+    self.__rssLifeTime = 300
+    self.__siteSEs = {}
+    self.__seSites = {}
+    self.__siteTiers = {}
+    self.__seStatus = {}
+    self.__siteMask = False
+
+  def __refresh( self ):
+    """ Drop the outdated parts of the snapshot and build the mappings if needed,
+        must be called with the lock acquired
+    """
+    currentVersion = gConfigurationData.getVersion()
+    if currentVersion != self.__csVersion:
+      result = getSiteSEMapping()
+      if not result[ 'OK' ]:
+        return result
+      siteSEs = result[ 'Value' ]
+      seSites = {}
+      for siteName, seList in siteSEs.items():
+        for seName in seList:
+          seSites.setdefault( seName, [] ).append( siteName )
+      self.__siteSEs = siteSEs
+      self.__seSites = seSites
+      self.__siteTiers = {}
+      self.__seStatus = {}
+      self.__rssLifeTime = int( RssConfiguration().getConfigCache() )
+      self.__csVersion = currentVersion
+      self.log.verbose( "Topology built for CS version %s: %d sites, %d SEs" % ( currentVersion,
+                                                                                 len( siteSEs ),
+                                                                                 len( seSites ) ) )
+    if time.time() - self.__rssUpdate > self.__rssLifeTime:
+      self.__seStatus = {}
+      self.__siteMask = False
+      self.__rssUpdate = time.time()
+    return S_OK()
+
+  def __call( self, method, *args ):
+    """ Execute method with the snapshot up to date and locked
+    """
+    self.__lock.acquire()
+    try:
+      result = self.__refresh()
+      if not result[ 'OK' ]:
+        return result
+      return method( *args )
+    finally:
+      self.__lock.release()
+
+  def getSitesForSE( self, seName ):
+    """ Sites having seName as a local SE
+    """
+    return self.__call( lambda: S_OK( list( self.__seSites.get( seName, [] ) ) ) )
+
+  def getSEsForSite( self, siteName ):
+    """ Local SEs of siteName
+    """
+    return self.__call( lambda: S_OK( list( self.__siteSEs.get( siteName, [] ) ) ) )
+
+  def getSiteTiers( self, siteList ):
+    """ { site : tier } for the sites in siteList
+    """
+    return self.__call( self.__getSiteTiers, siteList )
+
+  def __getSiteTiers( self, siteList ):
+    siteTiers = {}
+    for siteName in siteList:
+      if siteName not in self.__siteTiers:
+        result = getSiteTier( siteName )
+        try:
+          self.__siteTiers[ siteName ] = int( result[ 'Value' ] )
+        except ( KeyError, TypeError, ValueError ):
+          self.log.warn( "Cannot get tier for site %s, using %s" % ( siteName, DEFAULT_TIER ) )
+          self.__siteTiers[ siteName ] = DEFAULT_TIER
+      siteTiers[ siteName ] = self.__siteTiers[ siteName ]
+    return S_OK( siteTiers )
+
+  def getSEStatus( self, seName ):
+    """ Status of the SE as returned by StorageElement.getStatus: Read, Write... access
+        from the RSS and DiskSE, TapeSE types from the CS
+    """
+    return self.__call( self.__getSEStatus, seName )
+
+  def __getSEStatus( self, seName ):
+    if seName not in self.__seStatus:
+      result = StorageElement( seName ).getStatus()
+      if not result[ 'OK' ]:
+        return result
+      self.__seStatus[ seName ] = result[ 'Value' ]
+    return S_OK( dict( self.__seStatus[ seName ] ) )
+
+  def getSiteMask( self ):
+    """ ( usable sites, unusable sites ) for ComputingAccess according to the RSS
+    """
+    return self.__call( self.__getSiteMask )
+
+  def __getSiteMask( self ):
+    if not self.__siteMask:
+      siteStatus = SiteStatus()
+      result = siteStatus.getUsableSites( 'ComputingAccess' )
+      if not result[ 'OK' ]:
+        return S_ERROR( "Cannot retrieve usable sites: %s" % result[ 'Message' ] )
+      usableSites = result[ 'Value' ]
+      result = siteStatus.getUnusableSites( 'ComputingAccess' )
+      if not result[ 'OK' ]:
+        return S_ERROR( "Cannot retrieve unusable sites: %s" % result[ 'Message' ] )
+      self.__siteMask = ( frozenset( usableSites ), frozenset( result[ 'Value' ] ) )
+    return S_OK( self.__siteMask )
+
+  def reset( self ):
+    """ Force a full rebuild at the next access
+    """
+    self.__lock.acquire()
+    try:
+      self.__csVersion = None
+      self.__rssUpdate = 0
+    finally:
+      self.__lock.release()
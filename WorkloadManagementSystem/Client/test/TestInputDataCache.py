@@ -0,0 +1,54 @@
+########################################################################
+# $HeadURL$
+# File  : TestInputDataCache.py
+########################################################################
+""" Unit tests of the node level InputDataCache
+"""
+
+import unittest, tempfile, shutil, os
+
+from DIRAC.WorkloadManagementSystem.Client.InputDataCache import InputDataCache
+
+class InputDataCacheCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.cache = InputDataCache( os.path.join( self.workDir, 'cache' ), 25 )
+
+  def tearDown( self ):
+    shutil.rmtree( self.workDir )
+
+  def __addFile( self, lfn, checksum = 'abc' ):
+    key = self.cache.getKey( lfn, checksum )
+    lockFile = self.cache.lock( key )['Value']
+    localPath = os.path.join( self.workDir, os.path.basename( lfn ) )
+    fopen = open( localPath, 'w' )
+    fopen.write( 'x' * 10 )
+    fopen.close()
+    result = self.cache.addFile( key, localPath )
+    self.cache.unlock( lockFile )
+    return result
+
+  def test_getKey( self ):
+    self.assertEqual( self.cache.getKey( '/a/b', 'ABC' ), self.cache.getKey( '/a/b', 'abc' ) )
+    self.assertNotEqual( self.cache.getKey( '/a/b', 'abc' ), self.cache.getKey( '/a/b', 'abd' ) )
+
+  def test_addGet( self ):
+    key = self.cache.getKey( '/a/b', 'abc' )
+    localPath = os.path.join( self.workDir, 'copy' )
+    self.failIf( self.cache.getFile( key, localPath )['OK'] )
+    self.assert_( self.__addFile( '/a/b' )['OK'] )
+    self.assert_( self.cache.getFile( key, localPath )['OK'] )
+    self.assertEqual( open( localPath ).read(), 'x' * 10 )
+
+  def test_evict( self ):
+    for i in range( 4 ):
+      self.assert_( self.__addFile( '/a/%s' % i )['OK'] )
+    # Only the two most recently added files fit in 25 bytes
+    cached = [ self.cache.getFile( self.cache.getKey( '/a/%s' % i, 'abc' ),
+                                   os.path.join( self.workDir, 'copy%s' % i ) )['OK'] for i in range( 4 ) ]
+    self.assertEqual( cached, [ False, False, True, True ] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( InputDataCacheCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,80 @@
+########################################################################
+# $HeadURL$
+# File  : TestSiteTopology.py
+########################################################################
+""" Unit tests of the process wide SiteTopology snapshot
+"""
+
+import unittest
+import mock
+
+from DIRAC import S_OK
+import DIRAC.WorkloadManagementSystem.Client.SiteTopology as sut
+
+MAPPING = { 'LCG.CERN.ch' : [ 'CERN-RAW', 'CERN-DST' ],
+            'LCG.CNAF.it' : [ 'CNAF-DST' ],
+            'LCG.Shared.ch' : [ 'CERN-DST' ] }
+
+class SiteTopologyCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.csVersion = '1'
+    self.mapping = mock.Mock( return_value = S_OK( dict( MAPPING ) ) )
+    configurationData = mock.Mock()
+    configurationData.getVersion = lambda: self.csVersion
+    self.seStatus = mock.Mock()
+    self.seStatus.return_value.getStatus.return_value = S_OK( { 'Read' : True, 'DiskSE' : True, 'TapeSE' : False } )
+    self.siteStatus = mock.Mock()
+    self.siteStatus.return_value.getUsableSites.return_value = S_OK( [ 'LCG.CERN.ch' ] )
+    self.siteStatus.return_value.getUnusableSites.return_value = S_OK( [ 'LCG.CNAF.it' ] )
+    rssConfiguration = mock.Mock()
+    rssConfiguration.return_value.getConfigCache.return_value = 300
+    tiers = { 'LCG.CERN.ch' : S_OK( '0' ), 'LCG.CNAF.it' : S_OK( None ) }
+    for name, value in ( ( 'getSiteSEMapping', self.mapping ),
+                         ( 'gConfigurationData', configurationData ),
+                         ( 'StorageElement', self.seStatus ),
+                         ( 'SiteStatus', self.siteStatus ),
+                         ( 'RssConfiguration', rssConfiguration ),
+                         ( 'getSiteTier', lambda site: tiers[ site ] ) ):
+      patcher = mock.patch( 'DIRAC.WorkloadManagementSystem.Client.SiteTopology.%s' % name, value )
+      patcher.start()
+    self.topology = sut.SiteTopology()
+    self.topology.reset()
+
+  def tearDown( self ):
+    mock.patch.stopall()
+
+  def test_mappings( self ):
+    self.assertEqual( sorted( self.topology.getSitesForSE( 'CERN-DST' )['Value'] ), [ 'LCG.CERN.ch', 'LCG.Shared.ch' ] )
+    self.assertEqual( self.topology.getSitesForSE( 'Unknown-SE' )['Value'], [] )
+    self.assertEqual( self.topology.getSEsForSite( 'LCG.CNAF.it' )['Value'], [ 'CNAF-DST' ] )
+    self.assertEqual( self.mapping.call_count, 1 )
+
+  def test_csVersion( self ):
+    self.topology.getSitesForSE( 'CERN-DST' )
+    self.topology.getSEsForSite( 'LCG.CERN.ch' )
+    self.assertEqual( self.mapping.call_count, 1 )
+    self.csVersion = '2'
+    self.topology.getSitesForSE( 'CERN-DST' )
+    self.assertEqual( self.mapping.call_count, 2 )
+
+  def test_siteTiers( self ):
+    result = self.topology.getSiteTiers( [ 'LCG.CERN.ch', 'LCG.CNAF.it' ] )
+    self.assertEqual( result['Value'], { 'LCG.CERN.ch' : 0, 'LCG.CNAF.it' : sut.DEFAULT_TIER } )
+
+  def test_seStatus( self ):
+    for _i in range( 3 ):
+      result = self.topology.getSEStatus( 'CERN-RAW' )
+      self.assertTrue( result['Value']['DiskSE'] )
+    self.assertEqual( self.seStatus.call_count, 1 )
+
+  def test_siteMask( self ):
+    usable, unusable = self.topology.getSiteMask()['Value']
+    self.assertTrue( 'LCG.CERN.ch' in usable )
+    self.assertTrue( 'LCG.CNAF.it' in unusable )
+    self.topology.getSiteMask()
+    self.assertEqual( self.siteStatus.return_value.getUsableSites.call_count, 1 )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( SiteTopologyCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -26,6 +26,7 @@
 
     setJobAttribute()
     setJobAttributes()
+    setJobAttributesBulk()
     setJobParameter()
     setJobParameters()
     setJobJDL()
@@ -33,6 +34,7 @@
     setInputData()
 
     insertNewJobIntoDB()
+    insertParametricJobsIntoDB()
     removeJobFromDB()
 
     rescheduleJob()
@@ -49,7 +51,10 @@
 __RCSID__ = "$Id$"
 
 import sys
+import time
+import uuid
 import operator
+from hashlib import md5
 
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight                   import ClassAd
 from DIRAC                                                       import S_OK, S_ERROR
@@ -69,6 +74,17 @@ JOB_FINAL_STATES = ['Done', 'Completed', 'Failed']
 
 JOB_DEPRECATED_ATTRIBUTES = [ 'UserPriority', 'SystemPriority' ]
 
+# Max number of jobs written with a single multi-row insert
+BULK_INSERT_SIZE = 1000
+# Max number of jobs removed with a single DELETE statement
+REMOVE_CHUNK_SIZE = 500
+# Placeholders used in the parametric job templates
+PARAMETRIC_JOBID = '__ParametricJobID__'
+PARAMETRIC_PARAMETER = '__ParametricParameter__'
+PARAMETRIC_NUMBER = '__ParametricNumber__'
+# Job attributes the JobsSummary counters are kept for
+SUMMARY_FIELDS = [ 'Site', 'Owner', 'OwnerGroup', 'JobGroup', 'Status', 'MinorStatus' ]
+
 JOB_STATIC_ATTRIBUTES = [ 'JobID', 'JobType', 'DIRACSetup', 'JobGroup', 'JobSplitType', 'MasterJobID',
                           'JobName', 'Owner', 'OwnerDN', 'OwnerGroup', 'SubmissionTime', 'VerifiedFlag' ]
 
@@ -151,6 +167,17 @@ class JobDB( DB ):
                                         },
                               'PrimaryKey' : [ 'JobID' ]
                              }
+  # JobParsedJDLs table, serialized ClassAd of the current job JDL, JDLHash being
+  # the md5 of the JDL it was parsed from
+  _tablesDict[ 'JobParsedJDLs' ] = {
+                                    'Fields' :
+                                              {
+                                               'JobID'     : 'INTEGER NOT NULL',
+                                               'JDLHash'   : 'CHAR(32) NOT NULL',
+                                               'ParsedJDL' : 'MEDIUMBLOB NOT NULL'
+                                              },
+                                    'PrimaryKey' : [ 'JobID' ]
+                                   }
   # SubJobs table
   _tablesDict[ 'SubJobs' ] = {
                               'Fields' : 
@@ -276,7 +303,24 @@ class JobDB( DB ):
                                             },
                                   'Indexes' : { 'JobID' : [ 'JobID' ] }
                                  }
-  
+  # JobsSummary table, number of jobs per combination of SUMMARY_FIELDS values,
+  # SummaryKey being the md5 of the combination
+  _tablesDict[ 'JobsSummary' ] = {
+                                  'Fields' :
+                                            {
+                                             'SummaryKey'  : 'CHAR(32) NOT NULL',
+                                             'Site'        : 'VARCHAR(100) NOT NULL',
+                                             'Owner'       : 'VARCHAR(32) NOT NULL',
+                                             'OwnerGroup'  : 'VARCHAR(128) NOT NULL',
+                                             'JobGroup'    : 'VARCHAR(32) NOT NULL',
+                                             'Status'      : 'VARCHAR(32) NOT NULL',
+                                             'MinorStatus' : 'VARCHAR(128) NOT NULL',
+                                             'JobCount'    : 'INTEGER NOT NULL DEFAULT 0'
+                                            },
+                                  'Indexes' : { 'Site' : [ 'Site' ], 'Status' : [ 'Status' ] },
+                                  'PrimaryKey' : [ 'SummaryKey' ]
+                                 }
+
 
   def __init__( self, maxQueueSize = 10 ):
     """ Standard Constructor
@@ -285,6 +329,11 @@ class JobDB( DB ):
     DB.__init__( self, 'JobDB', 'WorkloadManagement/JobDB', maxQueueSize, debug = DEBUG )
 
     self.maxRescheduling = gConfig.getValue( self.cs_path + '/MaxRescheduling', 3 )
+    # Keep the JobsSummary counters up to date and use them for the job counters
+    self.useJobsSummary = gConfig.getValue( self.cs_path + '/UseJobsSummary', True )
+    self.jobsSummaryChecked = False
+    # Keep the parsed form of the job JDLs to save parsing them again on every read
+    self.useParsedJDL = gConfig.getValue( self.cs_path + '/UseParsedJDL', True )
 
     self.jobAttributeNames = []
     self.nJobAttributeNames = 0
@@ -298,6 +347,8 @@ class JobDB( DB ):
       return
 
     self.log.info( "MaxReschedule:  %s" % self.maxRescheduling )
+    self.log.info( "UseJobsSummary: %s" % self.useJobsSummary )
+    self.log.info( "UseParsedJDL:   %s" % self.useParsedJDL )
     self.log.info( "==================================================" )
 
     if DEBUG:
@@ -501,6 +552,35 @@ class JobDB( DB ):
 
         return S_OK( resultDict )
 
+#############################################################################
+  def getJobParametersBulk( self, jobIDs, paramList ):
+    """ Get the paramList parameters of all the jobs in jobIDs with a single query.
+        Returns S_OK( { jobID : { name : value } } ), jobs without any of the parameters
+        are not in the result
+    """
+    resultDict = {}
+    if not jobIDs or not paramList:
+      return S_OK( resultDict )
+
+    ret = self._escapeValues( paramList )
+    if not ret['OK']:
+      return ret
+    paramNames = ','.join( ret['Value'] )
+
+    cmd = "SELECT JobID, Name, Value from JobParameters WHERE JobID in (%s) and Name in (%s)" % \
+          ( ','.join( [ str( int( jobID ) ) for jobID in jobIDs ] ), paramNames )
+    result = self._query( cmd )
+    if not result['OK']:
+      return S_ERROR( 'JobDB.getJobParametersBulk: failed to retrieve parameters' )
+    for jobID, name, value in result['Value']:
+      try:
+        value = value.tostring()
+      except Exception:
+        pass
+      resultDict.setdefault( int( jobID ), {} )[name] = value
+
+    return S_OK( resultDict )
+
 #############################################################################
   def getAtticJobParameters( self, jobID, paramList = None, rescheduleCounter = -1 ):
     """ Get Attic Job Parameters defined for a job with jobID.
@@ -892,6 +972,8 @@ class JobDB( DB ):
         The LastUpdate time stamp is refreshed if explicitly requested
     """
 
+    summaryKeys = self.__selectSummaryKeys( [ jobID ], [ attrName ] )
+
     ret = self._escapeString( jobID )
     if not ret['OK']:
       return ret
@@ -914,6 +996,8 @@ class JobDB( DB ):
 
     res = self._update( cmd )
     if res['OK']:
+      if res['Value'] and summaryKeys:
+        self.__moveSummaryCounters( summaryKeys, dict( [ ( key, { attrName : attrValue } ) for key in summaryKeys ] ) )
       return res
     else:
       return S_ERROR( 'JobDB.setAttribute: failed to set attribute' )
@@ -924,14 +1008,16 @@ class JobDB( DB ):
         The LastUpdate time stamp is refreshed if explicitely requested
     """
 
+    if len( attrNames ) != len( attrValues ):
+      return S_ERROR( 'JobDB.setAttributes: incompatible Argument length' )
+
+    summaryKeys = self.__selectSummaryKeys( [ jobID ], attrNames )
+
     ret = self._escapeString( jobID )
     if not ret['OK']:
       return ret
     jobID = ret['Value']
 
-    if len( attrNames ) != len( attrValues ):
-      return S_ERROR( 'JobDB.setAttributes: incompatible Argument length' )
-
     # FIXME: Need to check the validity of attrNames
     attr = []
     for i in range( len( attrNames ) ):
@@ -952,10 +1038,50 @@ class JobDB( DB ):
 
     res = self._update( cmd )
     if res['OK']:
+      if res['Value'] and summaryKeys:
+        attrDict = dict( zip( attrNames, attrValues ) )
+        self.__moveSummaryCounters( summaryKeys, dict( [ ( key, attrDict ) for key in summaryKeys ] ) )
       return res
     else:
       return S_ERROR( 'JobDB.setAttributes: failed to set attribute' )
 
+#############################################################################
+  def setJobAttributesBulk( self, jobAttrDict, update = False ):
+    """ Set attributes of many jobs, jobAttrDict being { jobID : { attrName : attrValue } }.
+        Jobs setting the same attributes are updated together with one UPDATE ... CASE
+        statement per BULK_INSERT_SIZE jobs. The LastUpdate time stamp is refreshed
+        if explicitely requested
+    """
+    jobAttrDict = dict( [ ( int( jobID ), attrDict ) for jobID, attrDict in jobAttrDict.items() ] )
+    groups = {}
+    for jobID, attrDict in jobAttrDict.items():
+      if attrDict or update:
+        groups.setdefault( tuple( sorted( attrDict ) ), [] ).append( jobID )
+
+    for attrNames, jobIDs in groups.items():
+      jobIDs.sort()
+      for start in range( 0, len( jobIDs ), BULK_INSERT_SIZE ):
+        chunk = jobIDs[start:start + BULK_INSERT_SIZE]
+        summaryKeys = self.__selectSummaryKeys( chunk, attrNames )
+        attr = []
+        for attrName in attrNames:
+          ret = self._escapeValues( [ jobAttrDict[jobID][attrName] for jobID in chunk ] )
+          if not ret['OK']:
+            return ret
+          cases = [ 'WHEN %d THEN %s' % ( jobID, value ) for jobID, value in zip( chunk, ret['Value'] ) ]
+          attr.append( '%s=CASE JobID %s END' % ( attrName, ' '.join( cases ) ) )
+        if update:
+          attr.append( 'LastUpdateTime=UTC_TIMESTAMP()' )
+        cmd = 'UPDATE Jobs SET %s WHERE JobID IN (%s)' % ( ', '.join( attr ),
+                                                          ','.join( [ str( jobID ) for jobID in chunk ] ) )
+        result = self._update( cmd )
+        if not result['OK']:
+          return S_ERROR( 'JobDB.setJobAttributesBulk: failed to set attributes' )
+        if summaryKeys:
+          self.__moveSummaryCounters( summaryKeys, jobAttrDict )
+
+    return S_OK()
+
 #############################################################################
   def setJobStatus( self, jobID, status = '', minor = '', application = '', appCounter = None ):
     """ Set status of the job specified by its jobID
@@ -1029,6 +1155,44 @@ class JobDB( DB ):
     result = self._update( req )
     return result
 
+#############################################################################
+  def setEndExecTimeBulk( self, dateDict ):
+    """ Set EndExecTime time stamp of many jobs, dateDict being { jobID : endDate },
+        current time is used for jobs with no endDate
+    """
+    return self.__setExecTimeBulk( 'EndExecTime', dateDict )
+
+#############################################################################
+  def setStartExecTimeBulk( self, dateDict ):
+    """ Set StartExecTime time stamp of many jobs, dateDict being { jobID : startDate },
+        current time is used for jobs with no startDate
+    """
+    return self.__setExecTimeBulk( 'StartExecTime', dateDict )
+
+  def __setExecTimeBulk( self, timeStamp, dateDict ):
+    """ Set the not yet defined timeStamp of many jobs with UPDATE ... CASE statements
+    """
+    jobIDs = sorted( dateDict )
+    for start in range( 0, len( jobIDs ), BULK_INSERT_SIZE ):
+      cases = []
+      for jobID in jobIDs[start:start + BULK_INSERT_SIZE]:
+        date = dateDict[jobID]
+        if date:
+          ret = self._escapeString( date )
+          if not ret['OK']:
+            return ret
+          date = ret['Value']
+        else:
+          date = 'UTC_TIMESTAMP()'
+        cases.append( 'WHEN %d THEN %s' % ( int( jobID ), date ) )
+      req = "UPDATE Jobs SET %s=CASE JobID %s END WHERE JobID IN (%s) AND %s IS NULL" % \
+            ( timeStamp, ' '.join( cases ),
+              ','.join( [ str( int( jobID ) ) for jobID in jobIDs[start:start + BULK_INSERT_SIZE] ] ), timeStamp )
+      result = self._update( req )
+      if not result['OK']:
+        return result
+    return S_OK()
+
 #############################################################################
   def setJobParameter( self, jobID, key, value ):
     """ Set a parameter specified by name,value pair for the job JobID
@@ -1173,6 +1337,7 @@ class JobDB( DB ):
   def setJobJDL( self, jobID, jdl = None, originalJDL = None ):
     """ Insert JDL's for job specified by jobID
     """
+    intJobID = int( jobID )
     ret = self._escapeString( jobID )
     if not ret['OK']:
       return ret
@@ -1204,6 +1369,7 @@ class JobDB( DB ):
       result = self._update( cmd )
       if not result['OK']:
         return result
+      self.__storeParsedJDL( intJobID, jdl )
     if originalJDL:
       if updateFlag:
         cmd = "UPDATE JobJDLs Set OriginalJDL=%s WHERE JobID=%s" % ( e_originalJDL, jobID )
@@ -1214,6 +1380,160 @@ class JobDB( DB ):
 
     return result
 
+#############################################################################
+  def commitJobState( self, jobID, initialState, attrDict, parameters, optParameters, jdl = None ):
+    """ Apply in one transaction the attributes, job parameters, optimizer parameters and
+        JDL changed for the job if its attributes are still the ones in initialState.
+        The job row is locked while checking it, so concurrent commits are serialized.
+        Returns S_OK( False ) without changing anything if the job was modified meanwhile
+    """
+    jobID = int( jobID )
+
+    condList = []
+    for attrName, attrValue in initialState.items():
+      if attrValue == 'None':
+        condList.append( "`%s` IS NULL" % attrName )
+        continue
+      ret = self._escapeString( attrValue )
+      if not ret['OK']:
+        return ret
+      condList.append( "`%s`=%s" % ( attrName, ret['Value'] ) )
+    if not condList:
+      condList.append( "1=1" )
+
+    cmdList = []
+    if attrDict:
+      attr = []
+      for attrName, attrValue in attrDict.items():
+        ret = self._escapeString( attrValue )
+        if not ret['OK']:
+          return ret
+        attr.append( "`%s`=%s" % ( attrName, ret['Value'] ) )
+      attr.append( "LastUpdateTime=UTC_TIMESTAMP()" )
+      cmdList.append( "UPDATE Jobs SET %s WHERE JobID=%d" % ( ', '.join( attr ), jobID ) )
+    for tableName, pList in ( ( 'JobParameters', parameters ), ( 'OptimizerParameters', optParameters ) ):
+      if not pList:
+        continue
+      insertValueList = []
+      for name, value in pList:
+        ret = self._escapeValues( [ name, value ] )
+        if not ret['OK']:
+          return ret
+        insertValueList.append( "(%d,%s,%s)" % ( jobID, ret['Value'][0], ret['Value'][1] ) )
+      cmdList.append( "REPLACE %s (JobID,Name,Value) VALUES %s" % ( tableName, ', '.join( insertValueList ) ) )
+    if jdl:
+      ret = self._escapeString( jdl )
+      if not ret['OK']:
+        return ret
+      cmdList.append( "UPDATE JobJDLs SET JDL=%s WHERE JobID=%d" % ( ret['Value'], jobID ) )
+      result = self.__getParsedJDLCmd( jobID, jdl )
+      if result['OK'] and result['Value']:
+        cmdList.append( result['Value'] )
+
+    result = self._getConnection()
+    if not result['OK']:
+      return result
+    connection = result['Value']
+    cursor = connection.cursor()
+    try:
+      cursor.execute( "START TRANSACTION" )
+      cmd = "SELECT JobID FROM Jobs WHERE JobID=%d AND %s FOR UPDATE" % ( jobID, " AND ".join( condList ) )
+      if not cursor.execute( cmd ):
+        connection.rollback()
+        return S_OK( False )
+      summaryKeys = self.__selectSummaryKeys( [ jobID ], attrDict.keys() )
+      for cmd in cmdList:
+        cursor.execute( cmd )
+      connection.commit()
+    except Exception, x:
+      try:
+        connection.rollback()
+      except Exception:
+        pass
+      return self._except( 'commitJobState', x, 'JobDB.commitJobState: failed to commit job %s' % jobID )
+    finally:
+      cursor.close()
+
+    if summaryKeys:
+      self.__moveSummaryCounters( summaryKeys, { jobID : attrDict } )
+    return S_OK( True )
+
+#############################################################################
+  def __getParsedJDLCmd( self, jobID, jdl, classAd = None ):
+    """ Get the statement storing the parsed form of the jdl of the job, an empty
+        string if the parsed JDLs are not used
+    """
+    if not self.useParsedJDL:
+      return S_OK( '' )
+    jdl = str( jdl )
+    if classAd is None:
+      if jdl.strip()[:1] != '[':
+        jdl = '[%s]' % jdl
+      try:
+        classAd = ClassAd( jdl )
+      except Exception, x:
+        return S_ERROR( 'Can not parse the JDL: %s' % str( x ) )
+    if not classAd.isOK():
+      return S_ERROR( 'Illegal JDL' )
+    ret = self._escapeValues( [ md5( jdl ).hexdigest(), classAd.serialize() ] )
+    if not ret['OK']:
+      return ret
+    return S_OK( "REPLACE JobParsedJDLs (JobID,JDLHash,ParsedJDL) VALUES (%d,%s,%s)" % ( int( jobID ),
+                                                                                    ret['Value'][0],
+                                                                                    ret['Value'][1] ) )
+
+  def __storeParsedJDL( self, jobID, jdl, classAd = None ):
+    """ Store the parsed form of the jdl of the job, failures are not fatal as the
+        JDL is parsed again when its parsed form is missing or outdated
+    """
+    result = self.__getParsedJDLCmd( jobID, jdl, classAd )
+    if result['OK'] and result['Value']:
+      result = self._update( result['Value'] )
+    if not result['OK']:
+      self.log.verbose( 'Failed to store the parsed JDL of job %s:' % jobID, result['Message'] )
+    return result
+
+#############################################################################
+  def getJobClassAd( self, jobID ):
+    """ Get the current JDL of the job as a ClassAd. The parsed form stored for the
+        job is used if it was made from the same JDL, otherwise the JDL is parsed and
+        its parsed form stored for the next time. The JDL is also returned, as stored,
+        in the 'JDL' key
+    """
+    jobID = int( jobID )
+    if not self.useParsedJDL:
+      cmd = "SELECT JDL, NULL, NULL FROM JobJDLs WHERE JobID=%d" % jobID
+    else:
+      cmd = "SELECT J.JDL, P.JDLHash, P.ParsedJDL FROM JobJDLs J LEFT JOIN JobParsedJDLs P " \
+            "ON J.JobID=P.JobID WHERE J.JobID=%d" % jobID
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    if not result['Value']:
+      return S_ERROR( 'JobDB.getJobClassAd: no JDL for job %s' % jobID )
+    jdl, jdlHash, parsedJDL = result['Value'][0]
+    if not jdl:
+      return S_ERROR( 'JobDB.getJobClassAd: empty JDL for job %s' % jobID )
+    jdl = str( jdl )
+    # The parsed form is made from, and keyed by, the [ ] enclosed JDL
+    classAdJDL = jdl
+    if classAdJDL.strip()[:1] != '[':
+      classAdJDL = '[%s]' % classAdJDL
+
+    if parsedJDL and jdlHash == md5( classAdJDL ).hexdigest():
+      classAd = ClassAd.fromSerialized( str( parsedJDL ) )
+    else:
+      classAd = None
+    if classAd is None:
+      classAd = ClassAd( classAdJDL )
+      if not classAd.isOK():
+        return S_ERROR( 'JobDB.getJobClassAd: illegal JDL for job %s' % jobID )
+      if self.useParsedJDL:
+        self.__storeParsedJDL( jobID, classAdJDL, classAd )
+    result = S_OK( classAd )
+    result['JDL'] = jdl
+    return result
+
 #############################################################################
   def __insertNewJDL( self, jdl ):
     """Insert a new JDL in the system, this produces a new JobID
@@ -1270,6 +1590,24 @@ class JobDB( DB ):
     else:
       return result
 
+#############################################################################
+  def getJobJDLs( self, jobIDs, original = False ):
+    """ Get JDLs of the jobs in jobIDs with a single query as { jobID : jdl }.
+        If 'original' argument is True, original JDLs are returned
+    """
+    if not jobIDs:
+      return S_OK( {} )
+
+    jdlColumn = 'JDL'
+    if original:
+      jdlColumn = 'OriginalJDL'
+    cmd = "SELECT JobID, %s FROM JobJDLs WHERE JobID IN (%s)" % \
+          ( jdlColumn, ','.join( [ str( int( jobID ) ) for jobID in jobIDs ] ) )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    return S_OK( dict( [ ( int( jobID ), jdl ) for jobID, jdl in result['Value'] ] ) )
+
 #############################################################################
   def insertNewJobIntoDB( self, jdl, owner, ownerDN, ownerGroup, diracSetup ):
     """ Insert the initial JDL into the Job database,
@@ -1338,6 +1676,7 @@ class JobDB( DB ):
       result = self.insertFields( 'Jobs', jobAttrNames, jobAttrValues )
       if not result['OK']:
         return result
+      self.__countSummaryJobs( self.__selectSummaryKeys( [ jobID ], SUMMARY_FIELDS ), 1 )
 
       retVal['Status'] = 'Failed'
       retVal['MinorStatus'] = 'Error in JDL syntax'
@@ -1426,17 +1765,230 @@ class JobDB( DB ):
     result = self.insertFields( 'Jobs', jobAttrNames, jobAttrValues )
     if not result['OK']:
       return result
+    self.__countSummaryJobs( self.__selectSummaryKeys( [ jobID ], SUMMARY_FIELDS ), 1 )
 
     retVal['Status'] = 'Received'
     retVal['MinorStatus'] = 'Job accepted'
 
     return retVal
 
+#############################################################################
+  @staticmethod
+  def getParametricJobDescriptions( jdl, parameterList ):
+    """ Expand parametric job JDL into the list of JDLs, one per parameter value
+    """
+    jobDescList = []
+    nParam = len( parameterList ) - 1
+    for n, p in enumerate( parameterList ):
+      newJobDesc = jdl.replace( '%s', str( p ) ).replace( '%n', str( n ).zfill( len( str( nParam ) ) ) )
+      newClassAd = ClassAd( newJobDesc )
+      for attr in ['Parameters', 'ParameterStep', 'ParameterFactor']:
+        newClassAd.deleteAttribute( attr )
+      if type( p ) == type ( ' ' ) and p.startswith( '{' ):
+        newClassAd.insertAttributeInt( 'Parameter', str( p ) )
+      else:
+        newClassAd.insertAttributeString( 'Parameter', str( p ) )
+      newClassAd.insertAttributeInt( 'ParameterNumber', n )
+      jobDescList.append( newClassAd.asJDL() )
+    return jobDescList
+
+#############################################################################
+  def insertParametricJobsIntoDB( self, jdl, parameterList, owner, ownerDN, ownerGroup, diracSetup ):
+    """ Insert all the jobs of the parametric job JDL, one per value in parameterList.
+
+        The JDL template is checked and prepared only once, JDLs and attributes of
+        the jobs are derived from it by replacing the parameter placeholders. JobIDs
+        are reserved for a bulk of jobs and JDLs, attributes and input data are written
+        with multi-row inserts in a single transaction per bulk. If the template can't
+        be prepared on its own (i.e. placeholders in numerical fields) jobs are inserted
+        one by one.
+
+        Returns S_OK( [ ( jobID, status, minorStatus ), ... ] )
+    """
+    result = self.__prepareParametricTemplate( jdl, owner, ownerDN, ownerGroup, diracSetup )
+    if not result['OK']:
+      self.log.info( 'Parametric jobs to be inserted one by one:', result['Message'] )
+      jobList = []
+      for jobDescription in self.getParametricJobDescriptions( jdl, parameterList ):
+        result = self.insertNewJobIntoDB( jobDescription, owner, ownerDN, ownerGroup, diracSetup )
+        if not result['OK']:
+          return result
+        jobList.append( ( result['JobID'], result['Status'], result['MinorStatus'] ) )
+      return S_OK( jobList )
+    template = result['Value']
+
+    nParam = len( parameterList ) - 1
+    jobList = []
+    for start in range( 0, len( parameterList ), BULK_INSERT_SIZE ):
+      parameters = list( enumerate( parameterList ) )[start:start + BULK_INSERT_SIZE]
+      result = self.__reserveJobIDs( len( parameters ) )
+      if not result['OK']:
+        return result
+      jobIDs = result['Value']
+
+      jdlValues = []
+      jobValues = []
+      inputDataValues = []
+      for jobID, ( n, p ) in zip( jobIDs, parameters ):
+        number = str( n ).zfill( len( str( nParam ) ) )
+        if type( p ) == type( ' ' ) and p.startswith( '{' ):
+          parameter = str( p )
+        else:
+          parameter = '"%s"' % str( p )
+
+        def substitute( value ):
+          """ replace the placeholders of the template """
+          return str( value ).replace( '%s', str( p ) ).replace( '%n', number )
+
+        originalJDL = substitute( template['OriginalJDL'] ).replace( '"%s"' % PARAMETRIC_PARAMETER, parameter )
+        originalJDL = originalJDL.replace( PARAMETRIC_NUMBER, str( n ) )
+        jobJDL = substitute( template['JDL'] ).replace( '"%s"' % PARAMETRIC_PARAMETER, parameter )
+        jobJDL = jobJDL.replace( '"%s"' % PARAMETRIC_NUMBER, str( n ) ).replace( PARAMETRIC_NUMBER, str( n ) )
+        jobJDL = jobJDL.replace( PARAMETRIC_JOBID, str( jobID ) ).replace( '%j', str( jobID ) )
+
+        values = [ jobJDL, originalJDL ]
+        for name, value in template['Attributes']:
+          if name == 'JobID':
+            value = jobID
+          elif name in template['Substituted']:
+            value = substitute( value )
+            if name == 'Site' and value.find( ',' ) != -1:
+              value = 'Multiple'
+          values.append( value )
+        result = self._escapeValues( values )
+        if not result['OK']:
+          return result
+        values = result['Value']
+        jdlValues.append( '(%d, %s, \'\', %s)' % ( jobID, values[0], values[1] ) )
+        jobValues.append( '(%s)' % ', '.join( values[2:] ) )
+
+        for lfn in template['InputData']:
+          lfn = substitute( lfn ).strip()
+          # some jobs are setting empty string as InputData
+          if not lfn:
+            continue
+          ret = self._escapeString( lfn )
+          if not ret['OK']:
+            return ret
+          inputDataValues.append( '(%d, %s)' % ( jobID, ret['Value'] ) )
+
+      cmdList = [ 'INSERT INTO JobJDLs (JobID, JDL, JobRequirements, OriginalJDL) VALUES %s ' \
+                  'ON DUPLICATE KEY UPDATE JDL=VALUES(JDL), OriginalJDL=VALUES(OriginalJDL)' % ', '.join( jdlValues ),
+                  'INSERT INTO Jobs (%s) VALUES %s' % ( ', '.join( [ name for name, _value in template['Attributes'] ] ),
+                                                        ', '.join( jobValues ) ) ]
+      if inputDataValues:
+        cmdList.append( 'INSERT INTO InputData (JobID, LFN) VALUES %s' % ', '.join( inputDataValues ) )
+      result = self._transaction( cmdList )
+      if not result['OK']:
+        self._update( 'DELETE FROM JobJDLs WHERE JobID IN (%s)' % ', '.join( [ str( jobID ) for jobID in jobIDs ] ) )
+        return S_ERROR( 'Failed to insert parametric jobs: %s' % result['Message'] )
+      self.log.info( 'JobDB: %d parametric jobs inserted (%s-%s)' % ( len( jobIDs ), jobIDs[0], jobIDs[-1] ) )
+      self.__countSummaryJobs( self.__selectSummaryKeys( jobIDs, SUMMARY_FIELDS ), 1 )
+      jobList += [ ( jobID, 'Received', 'Job accepted' ) for jobID in jobIDs ]
+
+    return S_OK( jobList )
+
+  def __reserveJobIDs( self, nJobs ):
+    """ Get nJobs new JobIDs inserting empty JDLs tagged with a unique token
+    """
+    ret = self._escapeString( 'Reserved %s' % uuid.uuid4() )
+    if not ret['OK']:
+      return ret
+    e_token = ret['Value']
+
+    cmd = 'INSERT INTO JobJDLs (JDL, JobRequirements, OriginalJDL) VALUES %s' % \
+          ', '.join( [ "('', '', %s)" % e_token ] * nJobs )
+    result = self._update( cmd )
+    if not result['OK']:
+      return result
+    if not 'lastRowId' in result:
+      return S_ERROR( 'JobDB.__reserveJobIDs: Failed to retrieve new Ids' )
+
+    # JobIDs are not necessarily consecutive, select them by the token
+    cmd = 'SELECT JobID FROM JobJDLs WHERE JobID >= %d AND OriginalJDL = %s ORDER BY JobID' % \
+          ( int( result['lastRowId'] ), e_token )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    jobIDs = [ int( row[0] ) for row in result['Value'] ]
+    if len( jobIDs ) != nJobs:
+      return S_ERROR( 'JobDB.__reserveJobIDs: %d Ids reserved instead of %d' % ( len( jobIDs ), nJobs ) )
+
+    self.log.info( 'JobDB: %d new JobIDs served (%s-%s)' % ( nJobs, jobIDs[0], jobIDs[-1] ) )
+    return S_OK( jobIDs )
+
+  def __prepareParametricTemplate( self, jdl, owner, ownerDN, ownerGroup, diracSetup ):
+    """ Check and prepare the parametric job JDL once for all the jobs. Job specific values
+        are left as placeholders in the returned JDLs and attributes
+    """
+    classAd = ClassAd( jdl )
+    for attr in ['Parameters', 'ParameterStep', 'ParameterFactor']:
+      classAd.deleteAttribute( attr )
+    classAd.insertAttributeString( 'Parameter', PARAMETRIC_PARAMETER )
+    classAd.insertAttributeInt( 'ParameterNumber', PARAMETRIC_NUMBER )
+    originalJDL = classAd.asJDL()
+
+    jobManifest = JobManifest()
+    result = jobManifest.load( originalJDL )
+    if not result['OK']:
+      return result
+    jobManifest.setOptionsFromDict( { 'OwnerName' : owner,
+                                      'OwnerDN' : ownerDN,
+                                      'OwnerGroup' : ownerGroup,
+                                      'DIRACSetup' : diracSetup } )
+    result = jobManifest.check()
+    if not result['OK']:
+      return result
+    jobManifest.setOption( 'JobID', PARAMETRIC_JOBID )
+
+    classAdJob = ClassAd( jobManifest.dumpAsJDL() )
+    classAdReq = ClassAd( '[]' )
+    if not classAdJob.isOK():
+      return S_ERROR( 'Error in JDL syntax' )
+    classAdJob.insertAttributeInt( 'JobID', PARAMETRIC_JOBID )
+    result = self.__checkAndPrepareJob( PARAMETRIC_JOBID, classAdJob, classAdReq,
+                                        owner, ownerDN,
+                                        ownerGroup, diracSetup,
+                                        [], [], setFailed = False )
+    if not result['OK']:
+      return result
+
+    now = Time.toString()
+    attributes = [ ( 'JobID', PARAMETRIC_JOBID ),
+                   ( 'LastUpdateTime', now ),
+                   ( 'SubmissionTime', now ),
+                   ( 'Owner', owner ),
+                   ( 'OwnerDN', ownerDN ),
+                   ( 'OwnerGroup', ownerGroup ),
+                   ( 'DIRACSetup', diracSetup ),
+                   ( 'UserPriority', classAdJob.getAttributeInt( 'Priority' ) ) ]
+    for jdlName in 'JobName', 'JobType', 'JobGroup', 'Site':
+      # Defaults are set by the DB.
+      jdlValue = classAdJob.getAttributeString( jdlName )
+      if jdlValue:
+        attributes.append( ( jdlName, jdlValue ) )
+    attributes += [ ( 'VerifiedFlag', 'True' ),
+                    ( 'Status', 'Received' ),
+                    ( 'MinorStatus', 'Job accepted' ) ]
+
+    classAdJob.insertAttributeInt( 'JobRequirements', classAdReq.asJDL() )
+
+    inputData = []
+    if classAdJob.lookupAttribute( 'InputData' ):
+      inputData = classAdJob.getListFromExpression( 'InputData' )
+
+    return S_OK( { 'OriginalJDL' : originalJDL,
+                   'JDL' : classAdJob.asJDL(),
+                   'Attributes' : attributes,
+                   'Substituted' : [ 'JobName', 'JobType', 'JobGroup', 'Site' ],
+                   'InputData' : inputData } )
+
   def __checkAndPrepareJob( self, jobID, classAdJob, classAdReq, owner, ownerDN,
-                            ownerGroup, diracSetup, jobAttrNames, jobAttrValues ):
+                            ownerGroup, diracSetup, jobAttrNames, jobAttrValues, setFailed = True ):
     """
       Check Consistency of Submitted JDL and set some defaults
       Prepare subJDL with Job Requirements
+      If setFailed, the job is set Failed in the DB when the check fails
     """
     error = ''
     vo = getVOForGroup( ownerGroup )
@@ -1530,9 +2082,10 @@ class JobDB( DB ):
 
       jobAttrNames.append( 'MinorStatus' )
       jobAttrValues.append( error )
-      resultInsert = self.setJobAttributes( jobID, jobAttrNames, jobAttrValues )
-      if not resultInsert['OK']:
-        retVal['MinorStatus'] += '; %s' % resultInsert['Message']
+      if setFailed:
+        resultInsert = self.setJobAttributes( jobID, jobAttrNames, jobAttrValues )
+        if not resultInsert['OK']:
+          retVal['MinorStatus'] += '; %s' % resultInsert['Message']
 
       return retVal
 
@@ -1544,37 +2097,36 @@ class JobDB( DB ):
     """Remove job from DB
 
        Remove job from the Job DB and clean up all the job related data
-       in various tables
+       in various tables. Subjobs of master jobs are resolved with one query
+       per level and removed as well. Rows are deleted in chunks of
+       REMOVE_CHUNK_SIZE jobs in increasing JobID order to keep table locks short.
+       Returns S_OK( { table : { 'Rows' : n, 'Time' : seconds } } )
     """
 
-    #ret = self._escapeString(jobID)
-    #if not ret['OK']:
-    #  return ret
-    #e_jobID = ret['Value']
-
     if type( jobIDs ) != type( [] ):
       jobIDList = [jobIDs]
     else:
       jobIDList = jobIDs
+    jobIDList = [ int( jobID ) for jobID in jobIDList ]
 
     # If this is a master job delete the children first
     failedSubjobList = []
-    for jobID in jobIDList:
-      result = self.getJobAttribute( jobID, 'JobSplitType' )
-      if result['OK']:
-        if result['Value'] == "Master":
-          result = self.getSubjobs( jobID )
-          if result['OK']:
-            subjobs = result['Value']
-            if subjobs:
-              result = self.removeJobFromDB( subjobs )
-              if not result['OK']:
-                failedSubjobList += subjobs
-                self.log.error( "Failed to delete subjobs " + str( subjobs ) + " from JobDB" )
+    result = self.__getSubjobsBulk( jobIDList )
+    if not result['OK']:
+      self.log.error( "Failed to get subjobs from JobDB", result['Message'] )
+    elif result['Value']:
+      subjobs = result['Value']
+      result = self.removeJobFromDB( subjobs )
+      if not result['OK']:
+        failedSubjobList += subjobs
+        self.log.error( "Failed to delete subjobs " + str( subjobs ) + " from JobDB" )
 
     failedTablesList = []
-    jobIDString = ','.join( [str( j ) for j in jobIDList] )
+    statsDict = {}
+    jobIDList = sorted( set( jobIDList ) )
+    summaryKeys = self.__selectSummaryKeys( jobIDList, SUMMARY_FIELDS )
     for table in ( 'JobJDLs',
+                   'JobParsedJDLs',
                    'InputData',
                    'JobParameters',
                    'AtticJobParameters',
@@ -1583,12 +2135,25 @@ class JobDB( DB ):
                    'Jobs'
                    ):
 
-      cmd = 'DELETE FROM %s WHERE JobID in (%s)' % ( table, jobIDString )
-      result = self._update( cmd )
-      if not result['OK']:
-        failedTablesList.append( table )
+      start = time.time()
+      rows = 0
+      for i in range( 0, len( jobIDList ), REMOVE_CHUNK_SIZE ):
+        jobIDString = ','.join( [ str( j ) for j in jobIDList[i:i + REMOVE_CHUNK_SIZE] ] )
+        cmd = 'DELETE FROM %s WHERE JobID in (%s)' % ( table, jobIDString )
+        result = self._update( cmd )
+        if not result['OK']:
+          failedTablesList.append( table )
+          break
+        rows += result['Value']
+      deleteTime = time.time() - start
+      statsDict[table] = { 'Rows' : rows, 'Time' : deleteTime }
+      self.log.verbose( 'Deleted %d rows from %s in %.2f s (%.0f rows/s)' %
+                        ( rows, table, deleteTime, rows / max( deleteTime, 1e-6 ) ) )
 
-    result = S_OK()
+    if 'Jobs' not in failedTablesList:
+      self.__countSummaryJobs( summaryKeys, -1 )
+
+    result = S_OK( statsDict )
     if failedSubjobList:
       result = S_ERROR( 'Errors while job removal' )
       result['FailedSubjobs'] = failedSubjobList
@@ -1598,6 +2163,31 @@ class JobDB( DB ):
 
     return result
 
+  def __getSubjobsBulk( self, jobIDList ):
+    """ Get the subjobs of the master jobs in jobIDList with a single query
+    """
+    subjobs = []
+    for i in range( 0, len( jobIDList ), REMOVE_CHUNK_SIZE ):
+      cmd = "SELECT s.SubJobID FROM SubJobs s, Jobs j WHERE s.JobID = j.JobID AND j.JobSplitType = 'Master' " \
+            "AND s.JobID IN (%s)" % ','.join( [ str( j ) for j in jobIDList[i:i + REMOVE_CHUNK_SIZE] ] )
+      result = self._query( cmd )
+      if not result['OK']:
+        return result
+      subjobs += [ int( row[0] ) for row in result['Value'] ]
+    return S_OK( subjobs )
+
+  def getRowLockTime( self ):
+    """ InnoDB row lock wait time accumulated on the whole server in seconds, all
+        databases and clients included
+    """
+    result = self._query( "SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_time'" )
+    if not result['OK'] or not result['Value']:
+      return 0.
+    try:
+      return float( result['Value'][0][1] ) / 1000.
+    except ( ValueError, IndexError ):
+      return 0.
+
 #################################################################
   def getSubjobs( self, jobID ):
     """ Get subjobs of the given job
@@ -1806,45 +2396,26 @@ class JobDB( DB ):
     """ Get the summary of jobs in a given status on all the sites
     """
 
-    waitingList = ['"Submitted"', '"Assigned"', '"Waiting"', '"Matched"']
-    waitingString = ','.join( waitingList )
+    waitingList = ['Submitted', 'Assigned', 'Waiting', 'Matched']
 
-    result = self.getDistinctJobAttributes( 'Site' )
+    result = self.getCounters( 'Jobs', ['Site', 'Status'], {} )
     if not result['OK']:
-      return result
+      return S_ERROR( 'Failed to get Site data from the JobDB' )
 
-    siteList = result['Value']
     siteDict = {}
     totalDict = {'Waiting':0, 'Running':0, 'Stalled':0, 'Done':0, 'Failed':0}
 
-    for site in siteList:
+    for attrDict, count in result['Value']:
+      site = attrDict['Site']
       if site == "ANY":
         continue
-      # Waiting
-      siteDict[site] = {}
-      ret = self._escapeString( site )
-      if not ret['OK']:
-        return ret
-      e_site = ret['Value']
-
-      req = "SELECT COUNT(JobID) FROM Jobs WHERE Status IN (%s) AND Site=%s" % ( waitingString, e_site )
-      result = self._query( req )
-      if result['OK']:
-        count = result['Value'][0][0]
-      else:
-        return S_ERROR( 'Failed to get Site data from the JobDB' )
-      siteDict[site]['Waiting'] = count
-      totalDict['Waiting'] += count
-      # Running,Stalled,Done,Failed
-      for status in ['"Running"', '"Stalled"', '"Done"', '"Failed"']:
-        req = "SELECT COUNT(JobID) FROM Jobs WHERE Status=%s AND Site=%s" % ( status, e_site )
-        result = self._query( req )
-        if result['OK']:
-          count = result['Value'][0][0]
-        else:
-          return S_ERROR( 'Failed to get Site data from the JobDB' )
-        siteDict[site][status.replace( '"', '' )] = count
-        totalDict[status.replace( '"', '' )] += count
+      siteDict.setdefault( site, {'Waiting':0, 'Running':0, 'Stalled':0, 'Done':0, 'Failed':0} )
+      status = attrDict['Status']
+      if status in waitingList:
+        status = 'Waiting'
+      if status in totalDict:
+        siteDict[site][status] += count
+        totalDict[status] += count
 
     siteDict['Total'] = totalDict
     return S_OK( siteDict )
@@ -2117,10 +2688,12 @@ class JobDB( DB ):
       return ret
     e_jobID = ret['Value']
 
+    summaryKeys = self.__selectSummaryKeys( [ jobID ], [ 'Status' ] )
     req = "UPDATE Jobs SET HeartBeatTime=UTC_TIMESTAMP(), Status='Running' WHERE JobID=%s" % e_jobID
     result = self._update( req )
     if not result['OK']:
       return S_ERROR( 'Failed to set the heart beat time: ' + result['Message'] )
+    self.__moveSummaryCounters( summaryKeys, dict( [ ( key, { 'Status' : 'Running' } ) for key in summaryKeys ] ) )
 
     ok = True
     # FIXME: It is rather not optimal to use parameters to store the heartbeat info, must find a proper solution
@@ -2163,6 +2736,79 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'Failed to store some or all the parameters' )
 
+#####################################################################################
+  def setHeartBeatDataBulk( self, heartBeatDict ):
+    """ Add the heart beat data of many jobs to the database with multi-row statements.
+
+        heartBeatDict is { jobID : ( heartBeatTime, staticDataDict, dynamicDataDict ) },
+        heartBeatTime being the time the last heart beat of the job was received
+    """
+    if not heartBeatDict:
+      return S_OK()
+
+    jobIDs = sorted( heartBeatDict )
+    ok = True
+    for start in range( 0, len( jobIDs ), BULK_INSERT_SIZE ):
+      chunk = jobIDs[start:start + BULK_INSERT_SIZE]
+      caseList = []
+      parameterList = []
+      valueList = []
+      for jobID in chunk:
+        heartBeatTime, staticDataDict, dynamicDataDict = heartBeatDict[jobID]
+        jobID = int( jobID )
+        ret = self._escapeString( heartBeatTime )
+        if not ret['OK']:
+          return ret
+        e_time = ret['Value']
+        caseList.append( 'WHEN %d THEN %s' % ( jobID, e_time ) )
+
+        # FIXME: It is rather not optimal to use parameters to store the heartbeat info, must find a proper solution
+        for key, value in staticDataDict.items():
+          ret = self._escapeValues( [ key, value ] )
+          if not ret['OK']:
+            self.log.warn( 'Failed to escape static data', key )
+            continue
+          parameterList.append( '(%d,%s,%s)' % ( jobID, ret['Value'][0], ret['Value'][1] ) )
+
+        for key, value in dynamicDataDict.items():
+          ret = self._escapeValues( [ key, value ] )
+          if not ret['OK']:
+            self.log.warn( 'Failed to escape dynamic data', key )
+            continue
+          valueList.append( '(%d,%s,%s,%s)' % ( jobID, ret['Value'][0], ret['Value'][1], e_time ) )
+
+      # Heart beats are buffered by the service and may come after the job reached a final
+      # state, such jobs are not set back to Running nor moved in the summary
+      summaryKeys = self.__selectSummaryKeys( chunk, [ 'Status' ] )
+      statusIndex = SUMMARY_FIELDS.index( 'Status' )
+      summaryKeys = dict( [ ( jobID, key ) for jobID, key in summaryKeys.items()
+                            if key[statusIndex] not in JOB_FINAL_STATES ] )
+      req = "UPDATE Jobs SET HeartBeatTime=CASE JobID %s END, Status='Running' WHERE JobID IN (%s) " \
+            "AND Status NOT IN (%s)" % ( ' '.join( caseList ), ','.join( [ str( int( jobID ) ) for jobID in chunk ] ),
+                                         ','.join( [ "'%s'" % status for status in JOB_FINAL_STATES ] ) )
+      result = self._update( req )
+      if not result['OK']:
+        return S_ERROR( 'Failed to set the heart beat time: ' + result['Message'] )
+      self.__moveSummaryCounters( summaryKeys, dict( [ ( key, { 'Status' : 'Running' } ) for key in summaryKeys ] ) )
+
+      if parameterList:
+        result = self._update( 'REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ', '.join( parameterList ) )
+        if not result['OK']:
+          ok = False
+          self.log.warn( result['Message'] )
+
+      if valueList:
+        req = "INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES %s" % ', '.join( valueList )
+        result = self._update( req )
+        if not result['OK']:
+          ok = False
+          self.log.warn( result['Message'] )
+
+    if ok:
+      return S_OK()
+    else:
+      return S_ERROR( 'Failed to store some or all the parameters' )
+
 #####################################################################################
   def getHeartBeatData( self, jobID ):
     """ Retrieve the job's heart beat data
@@ -2187,6 +2833,49 @@ class JobDB( DB ):
 
     return S_OK( result )
 
+#####################################################################################
+  def getHeartBeatDataBulk( self, jobIDs ):
+    """ Retrieve the heart beat data of the jobs in jobIDs with a single query
+        as { jobID : [ ( name, value, heartBeatTime ) ] }
+    """
+    resultDict = {}
+    if not jobIDs:
+      return S_OK( resultDict )
+
+    cmd = 'SELECT JobID,Name,Value,HeartBeatTime from HeartBeatLoggingInfo WHERE JobID IN (%s)' % \
+          ','.join( [ str( int( jobID ) ) for jobID in jobIDs ] )
+    res = self._query( cmd )
+    if not res['OK']:
+      return res
+
+    for jobID, name, value, heartBeatTime in res['Value']:
+      try:
+        value = '%.01f' % ( float( value.replace( '"', '' ) ) )
+      except ValueError:
+        value = str( value )
+      resultDict.setdefault( int( jobID ), [] ).append( ( str( name ), value, str( heartBeatTime ) ) )
+
+    return S_OK( resultDict )
+
+#####################################################################################
+  def getJobsWithoutUpdate( self, status, seconds ):
+    """ Select the jobs in the given status whose most recent of HeartBeatTime and
+        LastUpdateTime is older than seconds, jobs without any of the time stamps
+        are ignored. Returns S_OK( { jobID : minorStatus } )
+    """
+    ret = self._escapeString( status )
+    if not ret['OK']:
+      return ret
+    e_status = ret['Value']
+
+    cmd = "SELECT JobID, MinorStatus FROM Jobs WHERE Status=%s AND " \
+          "GREATEST( IFNULL( HeartBeatTime, LastUpdateTime ), IFNULL( LastUpdateTime, HeartBeatTime ) ) < " \
+          "DATE_SUB( UTC_TIMESTAMP(), INTERVAL %d SECOND )" % ( e_status, int( seconds ) )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    return S_OK( dict( [ ( int( jobID ), minorStatus ) for jobID, minorStatus in result['Value'] ] ) )
+
 #####################################################################################
   def setJobCommand( self, jobID, command, arguments = None ):
     """ Store a command to be passed to the job together with the
@@ -2243,6 +2932,51 @@ class JobDB( DB ):
 
     return S_OK( resultDict )
 
+#####################################################################################
+  def getJobCommands( self, status = 'Received' ):
+    """ Get the commands in a given status for all the jobs as
+        { jobID : { command : arguments } }
+    """
+    ret = self._escapeString( status )
+    if not ret['OK']:
+      return ret
+    status = ret['Value']
+
+    req = "SELECT JobID, Command, Arguments FROM JobCommands WHERE Status=%s" % status
+    result = self._query( req )
+    if not result['OK']:
+      return result
+
+    resultDict = {}
+    for jobID, command, arguments in result['Value']:
+      resultDict.setdefault( int( jobID ), {} )[command] = arguments
+
+    return S_OK( resultDict )
+
+#####################################################################################
+  def setJobCommandsStatus( self, jobCommandList, status, oldStatus = 'Received' ):
+    """ Set the status of the ( jobID, command ) pairs in jobCommandList
+        which are still in oldStatus
+    """
+    if not jobCommandList:
+      return S_OK()
+
+    ret = self._escapeValues( [ status, oldStatus ] )
+    if not ret['OK']:
+      return ret
+    e_status, e_oldStatus = ret['Value']
+
+    pairList = []
+    for jobID, command in jobCommandList:
+      ret = self._escapeString( command )
+      if not ret['OK']:
+        return ret
+      pairList.append( '(%d,%s)' % ( int( jobID ), ret['Value'] ) )
+
+    req = "UPDATE JobCommands SET Status=%s WHERE Status=%s AND (JobID,Command) IN (%s)" % \
+          ( e_status, e_oldStatus, ','.join( pairList ) )
+    return self._update( req )
+
 #####################################################################################
   def setJobCommandStatus( self, jobID, command, status ):
     """ Set the command status
@@ -2282,3 +3016,168 @@ class JobDB( DB ):
     if not result[ 'OK' ]:
       return result
     return S_OK( ( ( defFields + valueFields ), result[ 'Value' ] ) )
+
+#####################################################################################
+  def getCounters( self, table, attrList, condDict, older = None, newer = None, timeStamp = None,
+                   connection = False, greater = None, smaller = None ):
+    """ Count the jobs on each distinct combination of attrList. Counters of the Jobs table
+        without time stamp selection and involving only SUMMARY_FIELDS are served from
+        the JobsSummary table, all the others are evaluated on the table itself
+    """
+    if table == 'Jobs' and self.useJobsSummary and not older and not newer:
+      fields = list( attrList )
+      for condName in ( condDict or {} ).keys():
+        # Conditions can be set on tuples of attributes
+        if type( condName ) == type( () ):
+          fields += list( condName )
+        else:
+          fields.append( condName )
+      if attrList and not [ field for field in fields if field not in SUMMARY_FIELDS ]:
+        result = self.__getSummaryCounters( attrList, condDict )
+        if result['OK']:
+          return result
+        self.log.warn( 'Failed to get counters from JobsSummary', result['Message'] )
+    return DB.getCounters( self, table, attrList, condDict, older = older, newer = newer, timeStamp = timeStamp,
+                           connection = connection, greater = greater, smaller = smaller )
+
+  def __getSummaryCounters( self, attrList, condDict ):
+    """ Sum the JobsSummary counters on each distinct combination of attrList
+    """
+    if not self.jobsSummaryChecked:
+      result = self._query( 'SELECT COUNT(*) FROM JobsSummary' )
+      if not result['OK']:
+        return result
+      # The counters were never built, e.g. right after the table creation
+      if not result['Value'][0][0]:
+        result = self.reconcileJobsSummary()
+        if not result['OK']:
+          return result
+      self.jobsSummaryChecked = True
+
+    try:
+      cond = self.buildCondition( condDict = condDict )
+    except Exception, x:
+      return S_ERROR( x )
+    attrNames = ', '.join( attrList )
+    cmd = 'SELECT %s, SUM(JobCount) FROM JobsSummary %s GROUP BY %s HAVING SUM(JobCount) > 0 ORDER BY %s' % \
+          ( attrNames, cond, attrNames, attrNames )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    return S_OK( [ ( dict( zip( attrList, row[:-1] ) ), int( row[-1] ) ) for row in result['Value'] ] )
+
+  @staticmethod
+  def __getSummaryKey( values ):
+    """ JobsSummary primary key of a combination of SUMMARY_FIELDS values
+    """
+    strValues = []
+    for value in values:
+      if type( value ) == type( u'' ):
+        value = value.encode( 'utf-8' )
+      strValues.append( str( value ) )
+    return md5( '\n'.join( strValues ) ).hexdigest()
+
+  def __getSummaryKeys( self, jobIDs ):
+    """ Get the SUMMARY_FIELDS values of the given jobs as { jobID : tuple }
+    """
+    summaryKeys = {}
+    jobIDs = [ int( jobID ) for jobID in jobIDs ]
+    for i in range( 0, len( jobIDs ), BULK_INSERT_SIZE ):
+      cmd = 'SELECT JobID, %s FROM Jobs WHERE JobID IN (%s)' % \
+            ( ', '.join( SUMMARY_FIELDS ), ','.join( [ str( jobID ) for jobID in jobIDs[i:i + BULK_INSERT_SIZE] ] ) )
+      result = self._query( cmd )
+      if not result['OK']:
+        return result
+      for row in result['Value']:
+        summaryKeys[int( row[0] )] = tuple( row[1:] )
+    return S_OK( summaryKeys )
+
+  def __selectSummaryKeys( self, jobIDs, attrNames ):
+    """ Get the SUMMARY_FIELDS values of the jobs as { jobID : tuple } if any of
+        attrNames is a summary field, { } otherwise or if the values can not be read
+    """
+    if not self.useJobsSummary or not [ attrName for attrName in attrNames if attrName in SUMMARY_FIELDS ]:
+      return {}
+    try:
+      result = self.__getSummaryKeys( jobIDs )
+    except ValueError:
+      return {}
+    if not result['OK']:
+      self.log.warn( 'Failed to get the job summary values', result['Message'] )
+      return {}
+    return result['Value']
+
+  def __moveSummaryCounters( self, summaryKeys, jobAttrDict ):
+    """ Move the jobs from their old summary values summaryKeys { jobID : tuple } to the ones
+        obtained setting the attributes of jobAttrDict { jobID : { attrName : attrValue } }
+    """
+    deltaDict = {}
+    for jobID, oldKey in summaryKeys.items():
+      attrDict = jobAttrDict.get( jobID, {} )
+      newKey = tuple( [ attrDict.get( field, value ) for field, value in zip( SUMMARY_FIELDS, oldKey ) ] )
+      if newKey != oldKey:
+        deltaDict[oldKey] = deltaDict.get( oldKey, 0 ) - 1
+        deltaDict[newKey] = deltaDict.get( newKey, 0 ) + 1
+    self.__updateSummary( deltaDict )
+
+  def __countSummaryJobs( self, summaryKeys, delta ):
+    """ Add delta to the JobsSummary counters of the jobs in summaryKeys { jobID : tuple }
+    """
+    deltaDict = {}
+    for key in summaryKeys.values():
+      deltaDict[key] = deltaDict.get( key, 0 ) + delta
+    return self.__updateSummary( deltaDict )
+
+  def __updateSummary( self, deltaDict ):
+    """ Add the job count changes of deltaDict { SUMMARY_FIELDS values tuple : delta }
+        to the JobsSummary counters
+    """
+    if not self.useJobsSummary:
+      return S_OK()
+    values = []
+    for key, delta in deltaDict.items():
+      if not delta:
+        continue
+      ret = self._escapeValues( list( key ) )
+      if not ret['OK']:
+        return ret
+      values.append( "('%s', %s, %d)" % ( self.__getSummaryKey( key ), ', '.join( ret['Value'] ), delta ) )
+
+    for i in range( 0, len( values ), BULK_INSERT_SIZE ):
+      cmd = 'INSERT INTO JobsSummary (SummaryKey, %s, JobCount) VALUES %s ' \
+            'ON DUPLICATE KEY UPDATE JobCount = JobCount + VALUES(JobCount)' % \
+            ( ', '.join( SUMMARY_FIELDS ), ', '.join( values[i:i + BULK_INSERT_SIZE] ) )
+      result = self._update( cmd )
+      if not result['OK']:
+        self.log.warn( 'Failed to update the JobsSummary counters', result['Message'] )
+        return result
+    return S_OK()
+
+  def reconcileJobsSummary( self ):
+    """ Rebuild the JobsSummary counters from the Jobs table. This fixes the drifts
+        left by concurrent modifications of the same jobs and drops the empty counters
+    """
+    start = time.time()
+    fieldString = ', '.join( SUMMARY_FIELDS )
+    result = self._query( 'SELECT %s, COUNT(*) FROM Jobs GROUP BY %s' % ( fieldString, fieldString ) )
+    if not result['OK']:
+      return result
+
+    values = []
+    for row in result['Value']:
+      ret = self._escapeValues( list( row[:-1] ) )
+      if not ret['OK']:
+        return ret
+      values.append( "('%s', %s, %d)" % ( self.__getSummaryKey( row[:-1] ), ', '.join( ret['Value'] ), row[-1] ) )
+
+    # Identical keys may come from values differing only for the collation
+    cmdList = [ 'DELETE FROM JobsSummary' ]
+    for i in range( 0, len( values ), BULK_INSERT_SIZE ):
+      cmdList.append( 'INSERT INTO JobsSummary (SummaryKey, %s, JobCount) VALUES %s '
+                      'ON DUPLICATE KEY UPDATE JobCount = JobCount + VALUES(JobCount)' %
+                      ( fieldString, ', '.join( values[i:i + BULK_INSERT_SIZE] ) ) )
+    result = self._transaction( cmdList )
+    if not result['OK']:
+      return result
+    self.log.info( 'JobsSummary rebuilt with %d counters in %.2f s' % ( len( values ), time.time() - start ) )
+    return S_OK( len( values ) )
@@ -2,7 +2,10 @@
     The following methods are provided
 
     addLoggingRecord()
+    addLoggingRecords()
+    addLoggingRecordsBulk()
     getJobLoggingInfo()
+    getJobLoggingInfoBulk()
     getWMSTimeStamps()
 """
 
@@ -18,6 +21,11 @@ gLogger.initialize( 'WMS', '/Databases/JobLoggingDB/Test' )
 
 MAGIC_EPOC_NUMBER = 1270000000
 
+# Max number of rows in a single multi-row insert
+BULK_INSERT_SIZE = 1000
+# Max number of jobs removed with a single DELETE statement
+REMOVE_CHUNK_SIZE = 500
+
 #############################################################################
 class JobLoggingDB( DB ):
 
@@ -108,6 +116,78 @@ class JobLoggingDB( DB ):
     event = 'status/minor/app=%s/%s/%s' % ( status, minor, application )
     self.gLogger.info( "Adding record for job " + str( jobID ) + ": '" + event + "' from " + source )
 
+    _date, time_order = self.__getDateAndOrder( date )
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
+           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
+
+    return self._update( cmd )
+
+#############################################################################
+  def addLoggingRecords( self,
+                         jobIDs,
+                         status = 'idem',
+                         minor = 'idem',
+                         application = 'idem',
+                         date = '',
+                         source = 'Unknown' ):
+    """ Add the same logging record for all the jobs in jobIDs list,
+        records are written with multi-row inserts
+    """
+
+    event = 'status/minor/app=%s/%s/%s' % ( status, minor, application )
+    self.gLogger.info( "Adding record for %d jobs: '%s' from %s" % ( len( jobIDs ), event, source ) )
+
+    _date, time_order = self.__getDateAndOrder( date )
+
+    result = self._escapeValues( [ status, minor, application, source ] )
+    if not result['OK']:
+      return result
+    e_status, e_minor, e_application, e_source = result['Value']
+    record = "%s,%s,%s,'%s',%f,%s)" % ( e_status, e_minor, e_application, str( _date ), time_order, e_source )
+    for i in range( 0, len( jobIDs ), BULK_INSERT_SIZE ):
+      values = [ "(%d,%s" % ( int( jobID ), record ) for jobID in jobIDs[i:i + BULK_INSERT_SIZE] ]
+      cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+            "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ','.join( values )
+      result = self._update( cmd )
+      if not result['OK']:
+        return result
+
+    return S_OK( len( jobIDs ) )
+
+#############################################################################
+  def addLoggingRecordsBulk( self, recordList ):
+    """ Add logging records of many jobs with multi-row inserts. recordList is a list of
+        ( jobID, status, minor, application, date, source ) tuples, date as in addLoggingRecord
+    """
+
+    self.gLogger.info( "Adding %d logging records" % len( recordList ) )
+
+    values = []
+    for jobID, status, minor, application, date, source in recordList:
+      _date, time_order = self.__getDateAndOrder( date )
+      result = self._escapeValues( [ status, minor, application, source ] )
+      if not result['OK']:
+        return result
+      e_status, e_minor, e_application, e_source = result['Value']
+      values.append( "(%d,%s,%s,%s,'%s',%f,%s)" % ( int( jobID ), e_status, e_minor, e_application,
+                                                   str( _date ), time_order, e_source ) )
+    for i in range( 0, len( values ), BULK_INSERT_SIZE ):
+      cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+            "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ','.join( values[i:i + BULK_INSERT_SIZE] )
+      result = self._update( cmd )
+      if not result['OK']:
+        return result
+
+    return S_OK( len( values ) )
+
+#############################################################################
+  def __getDateAndOrder( self, date ):
+    """ Get UTC datetime and time order of a logging record from
+        date string, datetime.datetime object or current time if not set
+    """
+
     if not date:
       # Make the UTC datetime string and float
       _date = Time.dateTime()
@@ -135,11 +215,7 @@ class JobLoggingDB( DB ):
         epoc = time.mktime( _date.timetuple() ) - MAGIC_EPOC_NUMBER
         time_order = round( epoc, 3 )
 
-    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
-          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
-           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
-
-    return self._update( cmd )
+    return _date, time_order
 
 #############################################################################
   def getJobLoggingInfo( self, jobID ):
@@ -156,11 +232,42 @@ class JobLoggingDB( DB ):
     if result['OK'] and not result['Value']:
       return S_ERROR( 'No Logging information for job %d' % int( jobID ) )
 
+    return S_OK( self.__resolveIdem( result['Value'] ) )
+
+#############################################################################
+  def getJobLoggingInfoBulk( self, jobIDs ):
+    """ Returns the logging records as in getJobLoggingInfo for all the jobs
+        in jobIDs with a single query, as { jobID : [ records ] }
+    """
+
+    resultDict = {}
+    if not jobIDs:
+      return S_OK( resultDict )
+
+    cmd = 'SELECT JobId,Status,MinorStatus,ApplicationStatus,StatusTime,StatusSource FROM' \
+          ' LoggingInfo WHERE JobId IN (%s) ORDER BY JobId,StatusTimeOrder,StatusTime' % \
+          ','.join( [ str( int( jobID ) ) for jobID in jobIDs ] )
+
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+
+    rowDict = {}
+    for row in result['Value']:
+      rowDict.setdefault( int( row[0] ), [] ).append( row[1:] )
+    for jobID, rows in rowDict.items():
+      resultDict[jobID] = self.__resolveIdem( rows )
+
+    return S_OK( resultDict )
+
+  def __resolveIdem( self, rows ):
+    """ Replace the 'idem' values of the records with the previous ones
+    """
     return_value = []
-    status, minor, app = result['Value'][0][:3]
+    status, minor, app = rows[0][:3]
     if app == "idem":
       app = "Unknown"
-    for row in result['Value']:
+    for row in rows:
       if row[0] != "idem":
         status = row[0];
       if row[1] != "idem":
@@ -168,8 +275,7 @@ class JobLoggingDB( DB ):
       if row[2] != "idem":
         app = row[2];
       return_value.append( ( status, minor, app, str( row[3] ), row[4] ) )
-
-    return S_OK( return_value )
+    return return_value
 
 #############################################################################
   def deleteJob( self, jobID ):
@@ -184,10 +290,15 @@ class JobLoggingDB( DB ):
     else:
       jobList = list( jobID )
 
-    jobString = ','.join( jobList )
-    req = "DELETE FROM LoggingInfo WHERE JobID IN (%s)" % jobString
-    result = self._update( req )
-    return result
+    deleted = 0
+    for i in range( 0, len( jobList ), REMOVE_CHUNK_SIZE ):
+      jobString = ','.join( [ str( job ) for job in jobList[i:i + REMOVE_CHUNK_SIZE] ] )
+      req = "DELETE FROM LoggingInfo WHERE JobID IN (%s)" % jobString
+      result = self._update( req )
+      if not result['OK']:
+        return result
+      deleted += result['Value']
+    return S_OK( deleted )
 
 #############################################################################
   def getWMSTimeStamps( self, jobID ):
@@ -10,6 +10,8 @@
 
     addPilotTQReference()
     setPilotStatus()
+    setPilotStatusBulk()
+    selectPilotsInfo()
     deletePilot()
     clearPilots()
     getPilotOwner()
@@ -43,6 +45,8 @@ from DIRAC.ResourceStatusSystem.Client.SiteStatus      import SiteStatus
 
 
 DEBUG = 1
+# Maximum number of pilots updated by a single statement
+BULK_UPDATE_SIZE = 1000
 
 #############################################################################
 class PilotAgentsDB( DB ):
@@ -241,6 +245,56 @@ class PilotAgentsDB( DB ):
 
     return S_OK()
 
+##########################################################################################
+  def setPilotStatusBulk( self, pilotStatusDict, statusReason = None, conn = False ):
+    """ Set the status of many pilots at once. pilotStatusDict is { pilotRef : status } or
+        { pilotRef : { 'Status' : status, ... } } with any of the optional keys DestinationSite,
+        StatusReason, GridSite, Queue and LastUpdateTime. The pilots getting the same new
+        values are updated together by one statement per BULK_UPDATE_SIZE pilots.
+        Returns the number of pilots updated
+    """
+    if not statusReason:
+      statusReason = "Not given"
+    ceSites = {}
+    pilotGroups = {}
+    for pilotRef, values in pilotStatusDict.items():
+      if type( values ) in StringTypes:
+        values = { 'Status' : values }
+      values = dict( values )
+      values.setdefault( 'StatusReason', statusReason )
+      destination = values.get( 'DestinationSite' )
+      if destination and not values.get( 'GridSite' ):
+        if destination not in ceSites:
+          result = getSiteForCE( destination )
+          ceSites[ destination ] = result['OK'] and result['Value'] or None
+        if ceSites[ destination ]:
+          values[ 'GridSite' ] = ceSites[ destination ]
+      setList = []
+      for name in ( 'Status', 'StatusReason', 'DestinationSite', 'GridSite', 'Queue', 'LastUpdateTime' ):
+        if not values.get( name ):
+          continue
+        result = self._escapeString( values[ name ] )
+        if not result['OK']:
+          return result
+        setList.append( "%s=%s" % ( name, result['Value'] ) )
+      if not values.get( 'LastUpdateTime' ):
+        setList.append( "LastUpdateTime=UTC_TIMESTAMP()" )
+      pilotGroups.setdefault( ','.join( setList ), [] ).append( pilotRef )
+
+    updated = 0
+    for setString, pilotRefs in pilotGroups.items():
+      for i in range( 0, len( pilotRefs ), BULK_UPDATE_SIZE ):
+        result = self._escapeValues( pilotRefs[ i:i + BULK_UPDATE_SIZE ] )
+        if not result['OK']:
+          return result
+        req = "UPDATE PilotAgents SET %s WHERE PilotJobReference IN (%s)" % ( setString, ','.join( result['Value'] ) )
+        result = self._update( req, conn = conn )
+        if not result['OK']:
+          return result
+        updated += result['Value']
+
+    return S_OK( updated )
+
 ##########################################################################################
   def selectPilots( self, condDict, older = None, newer = None, timeStamp = 'SubmissionTime',
                         orderAttribute = None, limit = None ):
@@ -276,6 +330,15 @@ class PilotAgentsDB( DB ):
     return S_OK( pilotList )
 
 
+##########################################################################################
+  def selectPilotsInfo( self, condDict, older = None, newer = None, timeStamp = 'SubmissionTime', paramNames = [] ):
+    """ Get the information of the pilots selected according to the provided criteria
+        with a single query, as getPilotInfo( selectPilots( condDict ) ) does. "newer" and
+        "older" specify the time interval in minutes
+    """
+    condition = self.buildCondition( condDict, older, newer, timeStamp )
+    return self.__getPilotInfoDict( condition, paramNames )
+
 ##########################################################################################
   def countPilots( self, condDict, older = None, newer = None, timeStamp = 'SubmissionTime' ):
     """ Select pilot references according to the provided criteria. "newer" and "older"
@@ -369,14 +432,6 @@ class PilotAgentsDB( DB ):
     """ Get all the information for the pilot job reference or reference list
     """
 
-    parameters = ['PilotJobReference', 'OwnerDN', 'OwnerGroup', 'GridType', 'Broker',
-                  'Status', 'DestinationSite', 'BenchMark', 'ParentID', 'OutputReady', 'AccountingSent',
-                  'SubmissionTime', 'PilotID', 'LastUpdateTime', 'TaskQueueID', 'GridSite', 'PilotStamp',
-                  'Queue' ]
-    if paramNames:
-      parameters = paramNames
-
-    cmd = "SELECT %s FROM PilotAgents" % ", ".join( parameters )
     condSQL = []
     if pilotRef:
       if type( pilotRef ) == ListType:
@@ -393,10 +448,11 @@ class PilotAgentsDB( DB ):
         condSQL.append( "ParentID IN (%s)" % ",".join( [ '%s' % x for x in parentId ] ) )
       else:
         condSQL.append( "ParentID = %s" % parentId )
+    condition = ''
     if condSQL:
-      cmd = "%s WHERE %s" % ( cmd, " AND ".join( condSQL ) )
+      condition = "WHERE %s" % " AND ".join( condSQL )
 
-    result = self._query( cmd, conn = conn )
+    result = self.__getPilotInfoDict( condition, paramNames, conn )
     if not result['OK']:
       return result
     if not result['Value']:
@@ -406,6 +462,24 @@ class PilotAgentsDB( DB ):
       if parentId:
         msg += " with parent id: %s" % parentId
       return S_ERROR( msg )
+    return result
+
+  def __getPilotInfoDict( self, condition, paramNames = [], conn = False ):
+    """ Get { pilotRef : pilotInfo } for the pilots matching the SQL condition
+    """
+    parameters = ['PilotJobReference', 'OwnerDN', 'OwnerGroup', 'GridType', 'Broker',
+                  'Status', 'DestinationSite', 'BenchMark', 'ParentID', 'OutputReady', 'AccountingSent',
+                  'SubmissionTime', 'PilotID', 'LastUpdateTime', 'TaskQueueID', 'GridSite', 'PilotStamp',
+                  'Queue' ]
+    if paramNames:
+      parameters = paramNames
+
+    cmd = "SELECT %s FROM PilotAgents %s" % ( ", ".join( parameters ), condition )
+    result = self._query( cmd, conn = conn )
+    if not result['OK']:
+      return result
+    if not result['Value']:
+      return S_OK( {} )
 
     resDict = {}
     pilotIDs = []
@@ -459,12 +533,23 @@ class PilotAgentsDB( DB ):
 
 ##########################################################################################
   def setAccountingFlag( self, pilotRef, mark = 'True' ):
-    """ Set the pilot AccountingSent flag
+    """ Set the AccountingSent flag of the pilot reference or reference list
     """
 
-    req = "UPDATE PilotAgents SET AccountingSent='%s' WHERE PilotJobReference='%s'" % ( mark, pilotRef )
-    result = self._update( req )
-    return result
+    if type( pilotRef ) != ListType:
+      req = "UPDATE PilotAgents SET AccountingSent='%s' WHERE PilotJobReference='%s'" % ( mark, pilotRef )
+      return self._update( req )
+
+    for i in range( 0, len( pilotRef ), BULK_UPDATE_SIZE ):
+      result = self._escapeValues( pilotRef[ i:i + BULK_UPDATE_SIZE ] )
+      if not result['OK']:
+        return result
+      req = "UPDATE PilotAgents SET AccountingSent='%s' WHERE PilotJobReference IN (%s)" % ( mark,
+                                                                                       ','.join( result['Value'] ) )
+      result = self._update( req )
+      if not result['OK']:
+        return result
+    return S_OK()
 
 ##########################################################################################
   def setPilotRequirements( self, pilotRef, requirements ):
@@ -765,6 +765,38 @@ class TaskQueueDB( DB ):
     self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
     return S_OK( True )
 
+  def deleteJobs( self, jobIDs, connObj = False ):
+    """
+    Delete many jobs from the task queues with one query and one delete
+    per chunk of 500 jobs
+    Return S_OK( number of deleted jobs ) / S_ERROR
+    """
+    if not connObj:
+      retVal = self._getConnection()
+      if not retVal[ 'OK' ]:
+        return S_ERROR( "Can't delete jobs: %s" % retVal[ 'Message' ] )
+      connObj = retVal[ 'Value' ]
+    jobIDs = sorted( [ int( jobId ) for jobId in jobIDs ] )
+    deleted = 0
+    tqDict = {}
+    for i in range( 0, len( jobIDs ), 500 ):
+      jobString = ",".join( [ str( jobId ) for jobId in jobIDs[i:i + 500] ] )
+      retVal = self._query( "SELECT DISTINCT t.TQId, t.OwnerDN, t.OwnerGroup FROM `tq_TaskQueues` t, `tq_Jobs` j WHERE j.JobId IN ( %s ) AND t.TQId = j.TQId" % jobString, conn = connObj )
+      if not retVal[ 'OK' ]:
+        return S_ERROR( "Could not get jobs from task queue: %s" % retVal[ 'Message' ] )
+      if not retVal[ 'Value' ]:
+        continue
+      for tqId, tqOwnerDN, tqOwnerGroup in retVal[ 'Value' ]:
+        tqDict[ tqId ] = ( tqId, tqOwnerDN, tqOwnerGroup )
+      retVal = self._update( "DELETE FROM `tq_Jobs` WHERE JobId IN ( %s )" % jobString, conn = connObj )
+      if not retVal[ 'OK' ]:
+        return S_ERROR( "Could not delete jobs from task queue: %s" % retVal[ 'Message' ] )
+      deleted += retVal[ 'Value' ]
+    self.log.info( "Deleted %s jobs from %s task queues" % ( deleted, len( tqDict ) ) )
+    for tqId in tqDict:
+      self.__deleteTQWithDelay.add( tqId, 300, tqDict[ tqId ] )
+    return S_OK( deleted )
+
   def getTaskQueueForJob( self, jobId, connObj = False ):
     """
     Return TaskQueue for a given Job
@@ -161,6 +161,33 @@ class TaskQueueCase(JobDBTestCase):
     result = self.jobDB.deleteJobFromQueue(jobID)
     self.assert_( result['OK'],'Status after deleteJobFromQueue')     
 
+class ParametricJobsCase(JobDBTestCase):
+
+  jdl = '[ Executable = "/bin/echo"; Arguments = "%s %n"; JobName = "Param_%n"; Parameters = { "a", "b", "c" }; ]'
+
+  def test_getParametricJobDescriptions(self):
+
+    jdls = self.jobDB.getParametricJobDescriptions(self.jdl,['a','b','c'])
+    self.assertEqual(len(jdls),3)
+    self.assert_( jdls[1].find('"b 1"') != -1,'Parameter substituted')
+    self.assert_( jdls[2].find('Parameters') == -1,'Parameters removed')
+
+  def test_insertParametricJobsIntoDB(self):
+
+    parameters = [ 'p%d' % i for i in range(25) ]
+    result = self.jobDB.insertParametricJobsIntoDB(self.jdl,parameters,'owner','/DN=owner','group','Test')
+    self.assert_( result['OK'],'Status after insertParametricJobsIntoDB')
+    jobs = result['Value']
+    self.assertEqual(len(jobs),25)
+    for n,( jobID,status,minorStatus ) in enumerate(jobs):
+      self.assertEqual(status,'Received')
+      result = self.jobDB.getJobAttribute(jobID,'JobName')
+      self.assert_( result['OK'],'Status after getJobAttribute')
+      self.assertEqual(result['Value'],'Param_%02d' % n)
+      result = self.jobDB.getJobJDL(jobID)
+      self.assert_( result['OK'],'Status after getJobJDL')
+      self.assert_( result['Value'].find('"p%d %02d"' % (n,n)) != -1,'Parameter in the JDL')
+
 class CountJobsCase(JobDBTestCase):
 
   def test_getCounters(self):
@@ -168,6 +195,34 @@ class CountJobsCase(JobDBTestCase):
     result = self.jobDB.getCounters(['Status','MinorStatus'],{},'2007-04-22 00:00:00')
     self.assert_( result['OK'],'Status after getCounters') 
        
+
+class JobsSummaryCase(JobDBTestCase):
+
+  def getCounters(self,attrList):
+    result = self.jobDB.getCounters('Jobs',attrList,{})
+    self.assert_( result['OK'],'Status after getCounters')
+    return sorted( [ ( sorted(attrDict.items()),count ) for attrDict,count in result['Value'] ] )
+
+  def test_summaryCounters(self):
+
+    jdl = '[ Executable = "/bin/echo"; Arguments = "%s"; Parameters = { "a", "b", "c" }; ]'
+    result = self.jobDB.insertParametricJobsIntoDB(jdl,['a','b','c'],'owner','/DN=owner','group','Test')
+    self.assert_( result['OK'],'Status after insertParametricJobsIntoDB')
+    jobIDs = [ jobID for jobID,status,minorStatus in result['Value'] ]
+    result = self.jobDB.setJobStatus(jobIDs[0],'Running','Application')
+    self.assert_( result['OK'],'Status after setJobStatus')
+    result = self.jobDB.setJobAttributesBulk({jobIDs[1]:{'Status':'Done','Site':'DIRAC.cern.ch'}})
+    self.assert_( result['OK'],'Status after setJobAttributesBulk')
+    result = self.jobDB.removeJobFromDB(jobIDs[2])
+    self.assert_( result['OK'],'Status after removeJobFromDB')
+
+    summaryCounters = self.getCounters(['Site','Status','MinorStatus'])
+    self.jobDB.useJobsSummary = False
+    self.assertEqual(summaryCounters,self.getCounters(['Site','Status','MinorStatus']))
+    self.jobDB.useJobsSummary = True
+    result = self.jobDB.reconcileJobsSummary()
+    self.assert_( result['OK'],'Status after reconcileJobsSummary')
+    self.assertEqual(summaryCounters,self.getCounters(['Site','Status','MinorStatus']))
       
 if __name__ == '__main__':
 
@@ -177,6 +232,8 @@ if __name__ == '__main__':
   suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(JobParametersCase))
   suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(SiteMaskCase))
   suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TaskQueueCase))
+  suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(ParametricJobsCase))
   suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(CountJobsCase))
+  suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(JobsSummaryCase))
   
   testResult = unittest.TextTestRunner(verbosity=2).run(suite)
@@ -43,7 +43,8 @@ class OptimizerExecutor( ExecutorModule ):
     if opName.find( "Agent" ) == len( opName ) - 5:
       opName = opName[ :-5]
     cls.__optimizerName = opName
-    maxTasks = cls.ex_getOption( 'Tasks', 1 )
+    #Jobs received and optimized together in each batch
+    cls.ex_setOption( 'MaxTasks', max( 1, cls.ex_getOption( 'Tasks', 10 ) ) )
     cls.__jobData = threading.local()
 
     cls.__jobData.jobState = None
@@ -68,28 +69,61 @@ class OptimizerExecutor( ExecutorModule ):
     return S_OK()
 
   def processTask( self, jid, jobState ):
-    self.__jobData.jobState = jobState
-    self.__jobData.jobLog = self.JobLog( self.log, jid )
-    try:
-      self.jobLog.info( "Processing" )
-      optResult = self.optimizeJob( jid, jobState )
-      # If the manifest is dirty, update it!
-      result = jobState.getManifest()
-      if not result[ 'OK' ]:
-        return result
-      manifest = result[ 'Value' ]
-      if manifest.isDirty():
-        jobState.setManifest( manifest )
-      # Did it go as expected? If not Failed!
-      if not optResult[ 'OK' ]:
-        self.jobLog.info( "Set to Failed/%s" % optResult[ 'Message' ] )
-        minorStatus = "%s optimizer" % self.ex_optimizerName()
-        return jobState.setStatus( "Failed", optResult[ 'Message' ], source = self.ex_optimizerName() )
+    result = self.processTasks( [ ( jid, jobState ) ] )
+    if not result[ 'OK' ]:
+      return result
+    return result[ 'Value' ][ jid ]
 
-      return S_OK()
-    finally:
-      self.__jobData.jobState = None
-      self.__jobData.jobLog = None
+  def processTasks( self, jobList ):
+    result = self.optimizeJobs( jobList )
+    if not result[ 'OK' ]:
+      return result
+    optResults = result[ 'Value' ]
+    results = {}
+    for jid, jobState in jobList:
+      self.__jobData.jobState = jobState
+      self.__jobData.jobLog = self.JobLog( self.log, jid )
+      try:
+        results[ jid ] = self.__finishJob( jid, jobState, optResults[ jid ] )
+      finally:
+        self.__jobData.jobState = None
+        self.__jobData.jobLog = None
+    return S_OK( results )
+
+  def __finishJob( self, jid, jobState, optResult ):
+    # If the manifest is dirty, update it!
+    result = jobState.getManifest()
+    if not result[ 'OK' ]:
+      return result
+    manifest = result[ 'Value' ]
+    if manifest.isDirty():
+      jobState.setManifest( manifest )
+    # Did it go as expected? If not Failed!
+    if not optResult[ 'OK' ]:
+      self.jobLog.info( "Set to Failed/%s" % optResult[ 'Message' ] )
+      minorStatus = "%s optimizer" % self.ex_optimizerName()
+      return jobState.setStatus( "Failed", optResult[ 'Message' ], source = self.ex_optimizerName() )
+
+    return S_OK()
+
+  def optimizeJobs( self, jobList ):
+    """ Optimize a batch of ( jid, jobState ), returns S_OK( { jid : optimizeJob result } ).
+        Overwrite it to do the lookups shared by the jobs once per batch and then
+        call this one to optimize each job
+    """
+    results = {}
+    for jid, jobState in jobList:
+      self.setCurrentTask( jid )
+      self.__jobData.jobState = jobState
+      self.__jobData.jobLog = self.JobLog( self.log, jid )
+      try:
+        self.jobLog.info( "Processing" )
+        results[ jid ] = self.optimizeJob( jid, jobState )
+      finally:
+        self.__jobData.jobState = None
+        self.__jobData.jobLog = None
+        self.setCurrentTask( None )
+    return S_OK( results )
 
   def optimizeJob( self, jid, jobState ):
     raise Exception( "You need to overwrite this method to optimize the job!" )
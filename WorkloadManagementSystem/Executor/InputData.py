@@ -12,8 +12,7 @@ __RCSID__ = "$Id$"
 import time
 import pprint
 from DIRAC.WorkloadManagementSystem.Executor.Base.OptimizerExecutor  import OptimizerExecutor
-from DIRAC.Resources.Storage.StorageElement                          import StorageElement
-from DIRAC.Core.Utilities.SiteSEMapping                              import getSitesForSE
+from DIRAC.WorkloadManagementSystem.Client.SiteTopology             import SiteTopology
 from DIRAC.Core.Utilities.List                                       import uniqueElements
 from DIRAC                                                           import S_OK, S_ERROR
 from DIRAC.DataManagementSystem.Client.ReplicaManager                import ReplicaManager
@@ -47,12 +46,76 @@ class InputData( OptimizerExecutor ):
       cls.log.exception( msg )
       return S_ERROR( msg + str( e ) )
 
-    cls.__SEToSiteMap = {}
-    cls.__lastCacheUpdate = 0
-    cls.__cacheLifeTime = 600
+    #Site and SE topology shared by all the executors
+    cls.__topology = SiteTopology()
+    #Replicas and metadata of the batch being optimized
+    cls.__batchReplicas = False
+    cls.__batchMetadata = False
 
     return S_OK()
 
+  def optimizeJobs( self, jobList ):
+    """ Look up the replicas and metadata of the input data of the whole batch
+        with one catalog query for the distinct LFNs
+    """
+    lfns = set()
+    for jid, jobState in jobList:
+      result = jobState.getInputData()
+      if not result[ 'OK' ] or not result[ 'Value' ]:
+        continue
+      inputData = result[ 'Value' ]
+      #Already resolved in a previous pass
+      result = jobState.getOptParameter( self.ex_getProperty( 'optimizerName' ) )
+      if result[ 'OK' ] and result[ 'Value' ]:
+        continue
+      lfns.update( self.__getLFNs( inputData ) )
+
+    if lfns:
+      lfns = list( lfns )
+      startTime = time.time()
+      result = self.__replicaMan.getActiveReplicas( lfns )
+      if not result[ 'OK' ]:
+        self.log.warn( "Bulk replicas lookup failed, falling back to per job lookups", result[ 'Message' ] )
+      else:
+        self.__batchReplicas = result[ 'Value' ]
+        if self.ex_getOption( 'CheckFileMetadata', True ):
+          result = self.__replicaMan.getCatalogFileMetadata( lfns )
+          if not result[ 'OK' ]:
+            self.log.warn( "Bulk metadata lookup failed, falling back to per job lookups", result[ 'Message' ] )
+          else:
+            self.__batchMetadata = result[ 'Value' ]
+      self.log.info( "Catalog lookup of %d distinct LFNs for %d jobs took %.2f seconds" % ( len( lfns ), len( jobList ),
+                                                                                            time.time() - startTime ) )
+    try:
+      return OptimizerExecutor.optimizeJobs( self, jobList )
+    finally:
+      self.__batchReplicas = False
+      self.__batchMetadata = False
+
+  def __getLFNs( self, inputData ):
+    lfns = []
+    for lfn in inputData:
+      if lfn[:4].lower() == "lfn:":
+        lfns.append( lfn[4:] )
+      else:
+        lfns.append( lfn )
+    return lfns
+
+  def __fromBatch( self, batchResult, lfns ):
+    """ Bulk result restricted to lfns if the batch lookup covered all of them
+    """
+    if not batchResult:
+      return False
+    subset = { 'Successful' : {}, 'Failed' : {} }
+    for lfn in lfns:
+      if lfn in batchResult[ 'Successful' ]:
+        subset[ 'Successful' ][ lfn ] = dict( batchResult[ 'Successful' ][ lfn ] )
+      elif lfn in batchResult[ 'Failed' ]:
+        subset[ 'Failed' ][ lfn ] = batchResult[ 'Failed' ][ lfn ]
+      else:
+        return False
+    return S_OK( subset )
+
   def optimizeJob( self, jid, jobState ):
     result = jobState.getInputData()
     if not result[ 'OK' ]:
@@ -90,19 +153,15 @@ class InputData( OptimizerExecutor ):
   def __resolveInputData( self, jobState, inputData ):
     """This method checks the file catalog for replica information.
     """
-    lfns = []
-    for lfn in inputData:
-      if lfn[:4].lower() == "lfn:":
-        lfns.append( lfn[4:] )
-      else:
-        lfns.append( lfn )
-
+    lfns = self.__getLFNs( inputData )
 
     startTime = time.time()
 
     print "LFNS", lfns
 
-    result = self.__replicaMan.getActiveReplicas( lfns )  # This will return already active replicas, excluding banned SEs
+    result = self.__fromBatch( self.__batchReplicas, lfns )
+    if not result:
+      result = self.__replicaMan.getActiveReplicas( lfns )  # This will return already active replicas, excluding banned SEs
     self.jobLog.info( 'Catalog replicas lookup time: %.2f seconds ' % ( time.time() - startTime ) )
     if not result['OK']:
       self.log.warn( result['Message'] )
@@ -121,7 +180,9 @@ class InputData( OptimizerExecutor ):
 
     if self.ex_getOption( 'CheckFileMetadata', True ):
       start = time.time()
-      guidDict = self.__replicaMan.getCatalogFileMetadata( lfns )
+      guidDict = self.__fromBatch( self.__batchMetadata, lfns )
+      if not guidDict:
+        guidDict = self.__replicaMan.getCatalogFileMetadata( lfns )
       self.jobLog.info( 'Catalog Metadata Lookup Time: %.2f seconds ' % ( time.time() - startTime ) )
 
       if not guidDict['OK']:
@@ -214,26 +275,6 @@ class InputData( OptimizerExecutor ):
     return S_OK( resolvedData )
 
 
-  #############################################################################
-  def __getSitesForSE( self, seName ):
-    """ Returns a list of sites having the given SE as a local one.
-        Uses the local cache of the site-se information
-    """
-
-    # Empty the cache if too old
-    now = time.time()
-    if ( now - self.__lastCacheUpdate ) > self.__cacheLifeTime:
-      self.log.verbose( 'Resetting the SE to site mapping cache' )
-      self.__SEToSiteMap = {}
-      self.__lastCacheUpdate = now
-
-    if seName not in self.__SEToSiteMap:
-      result = getSitesForSE( seName )
-      if not result['OK']:
-        return result
-      self.__SEToSiteMap[ seName ] = list( result['Value'] )
-    return S_OK( self.__SEToSiteMap[ seName ] )
-
   #############################################################################
   def __getSiteCandidates( self, okReplicas ):
     """This method returns a list of possible site candidates based on the
@@ -246,7 +287,7 @@ class InputData( OptimizerExecutor ):
       replicas = okReplicas[ lfn ]
       siteSet = set()
       for seName in replicas:
-        result = self.__getSitesForSE( seName )
+        result = self.__topology.getSitesForSE( seName )
         if result['OK']:
           siteSet.update( result['Value'] )
       lfnSEs[ lfn ] = siteSet
@@ -274,13 +315,12 @@ class InputData( OptimizerExecutor ):
       for seName in replicas:
         #If not already "loaded" the add it to the dict
         if seName not in seDict:
-          result = self.__getSitesForSE( seName )
+          result = self.__topology.getSitesForSE( seName )
           if not result['OK']:
             self.jobLog.warn( "Could not get sites for SE %s: %s" % ( seName, result[ 'Message' ] ) )
             continue
           siteList = result[ 'Value' ]
-          seObj = StorageElement( seName )
-          result = seObj.getStatus()
+          result = self.__topology.getSEStatus( seName )
           if not result[ 'OK' ]:
             self.jobLog.error( "Could not retrieve status for SE %s: %s" % ( seName, result[ 'Message' ] ) )
             continue
@@ -12,12 +12,9 @@ __RCSID__ = "$Id$"
 import time
 import random
 from DIRAC.WorkloadManagementSystem.Executor.Base.OptimizerExecutor  import OptimizerExecutor
-from DIRAC.Resources.Storage.StorageElement                          import StorageElement
-from DIRAC.Core.Utilities.SiteSEMapping                              import getSitesForSE, getSEsForSite
-from DIRAC.Core.Utilities                                            import DictCache
+from DIRAC.WorkloadManagementSystem.Client.SiteTopology             import SiteTopology
 from DIRAC.Core.Security                                             import Properties
 from DIRAC.ConfigurationSystem.Client.Helpers                        import Registry
-from DIRAC.ResourceStatusSystem.Client.SiteStatus                    import SiteStatus
 from DIRAC.StorageManagementSystem.Client.StorageManagerClient       import StorageManagerClient
 from DIRAC                                                           import S_OK, S_ERROR
 
@@ -34,8 +31,8 @@ class InputDataValidation( OptimizerExecutor ):
     """ Initialization of the Agent.
     """
     random.seed()
-    cls.__SEStatus = DictCache.DictCache()
-    cls.__sitesForSE = DictCache.DictCache()
+    #Site and SE topology shared by all the executors
+    cls.__topology = SiteTopology()
     try:
       from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
     except ImportError, excp :
@@ -46,7 +43,6 @@ class InputDataValidation( OptimizerExecutor ):
     except RuntimeError:
       return S_ERROR( "Cannot connect to JobDB" )
 
-    cls.__siteStatus = SiteStatus()
 
     cls.ex_setOption( "FailedStatus", "Input Data Not Available" )
     return S_OK()
@@ -134,7 +130,7 @@ class InputDataValidation( OptimizerExecutor ):
           self.jobLog.info( "Ignoring replica in %s (not in TargetSEs)" % seName )
           replicas.pop( seName )
           continue
-        result = self.__getSEStatus( seName )
+        result = self.__topology.getSEStatus( seName )
         if not result[ 'OK' ]:
           self.jobLog.error( "Can't retrieve status for SE %s" % seName )
           replicas.pop( seName )
@@ -161,7 +157,7 @@ class InputDataValidation( OptimizerExecutor ):
       replicas = lfnData[ lfn ][ 'Replicas' ]
       lfnSite[ lfn ] = set()
       for seName in replicas:
-        result = self.__getSitesForSE( seName )
+        result = self.__topology.getSitesForSE( seName )
         if not result[ 'OK' ]:
           return result
         sites = result[ 'Value' ]
@@ -213,9 +209,9 @@ class InputDataValidation( OptimizerExecutor ):
 
     self.jobLog.info( "Sites %s need to stage %d files" % ( ",".join( tapeCandidates ), minStage ) )
 
-    result = self.__siteStatus.getUnusableSites( 'ComputingAccess' )
+    result = self.__topology.getSiteMask()
     if result[ 'OK' ]:
-      for site in result[ 'Value' ]:
+      for site in result[ 'Value' ][1]:
         tapeCandidates.discard( site )
       if not tapeCandidates:
         raise OptimizerExecutor.FreezeTask( "All stageable sites are banned" )
@@ -230,30 +226,11 @@ class InputDataValidation( OptimizerExecutor ):
     return S_OK( ( finalCandidates, set( tapelfn ) ) )
 
 
-  def __getSitesForSE( self, seName ):
-    result = self.__sitesForSE.get( seName )
-    if result == False:
-      result = getSitesForSE( seName )
-      if not result['OK']:
-        return result
-      self.__sitesForSE.add( seName, 600, result )
-    return result
-
-  def __getSEStatus( self, seName ):
-    result = self.__SEStatus.get( seName )
-    if result == False:
-      seObj = StorageElement( seName )
-      result = seObj.getStatus()
-      if not result[ 'OK' ]:
-        return result
-      self.__SEStatus.add( seName, 600, result )
-    return result
-
   def requestStage( self, jobState, candidates, lfnData ):
     #Any site is as good as any so random time!
     stageSite = random.sample( candidates, 1 )[0]
     self.jobLog.info( "Site selected %s for staging" % stageSite )
-    result = getSEsForSite( stageSite )
+    result = self.__topology.getSEsForSite( stageSite )
     if not result['OK']:
       return S_ERROR( 'Could not determine SEs for site %s' % stageSite )
     siteSEs = result['Value']
@@ -261,7 +238,7 @@ class InputDataValidation( OptimizerExecutor ):
     tapeSEs = []
     diskSEs = []
     for seName in siteSEs:
-      result = self.__getSEStatus( seName )
+      result = self.__topology.getSEStatus( seName )
       if not result[ 'OK' ]:
         self.jobLog.error( "Cannot retrieve SE %s status: %s" % ( seName, result[ 'Message' ] ) )
         return S_ERROR( "Cannot retrieve SE status" )
@@ -342,7 +319,7 @@ class InputDataValidation( OptimizerExecutor ):
 
     stageCandidates = []
     for seName in stageLFNs:
-      result = self.__getSitesForSE( seName )
+      result = self.__topology.getSitesForSE( seName )
       if result[ 'OK' ]:
         stageCandidates.append( result[ 'Value' ] )
 
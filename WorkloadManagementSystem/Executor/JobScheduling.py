@@ -12,15 +12,12 @@
 import random
 
 from DIRAC                                                          import S_OK, S_ERROR
-from DIRAC.Core.Utilities.SiteSEMapping                             import getSEsForSite
 from DIRAC.Core.Utilities.Time                                      import fromString, toEpoch
 from DIRAC.Core.Security                                            import Properties
-from DIRAC.ConfigurationSystem.Client.Helpers.Resources             import getSiteTier
 from DIRAC.ConfigurationSystem.Client.Helpers                       import Registry
-from DIRAC.Resources.Storage.StorageElement                         import StorageElement
 from DIRAC.StorageManagementSystem.Client.StorageManagerClient      import StorageManagerClient
 from DIRAC.WorkloadManagementSystem.Executor.Base.OptimizerExecutor import OptimizerExecutor
-from DIRAC.ResourceStatusSystem.Client.SiteStatus                   import SiteStatus  
+from DIRAC.WorkloadManagementSystem.Client.SiteTopology             import SiteTopology
 
 
 class JobScheduling( OptimizerExecutor ):
@@ -44,8 +41,33 @@ class JobScheduling( OptimizerExecutor ):
       cls.__jobDB = JobDB()
     except RuntimeError:
       return S_ERROR( "Cannot connect to JobDB" )
+    #Site and SE topology shared by all the executors
+    cls.__topology = SiteTopology()
+    #Site mask of the batch being optimized
+    cls.__siteMask = False
     return S_OK()
 
+  def optimizeJobs( self, jobList ):
+    """ The site mask is retrieved once for the whole batch
+    """
+    result = self.__getSiteMask()
+    if result[ 'OK' ]:
+      self.__siteMask = result
+    try:
+      return OptimizerExecutor.optimizeJobs( self, jobList )
+    finally:
+      self.__siteMask = False
+
+  def __getSiteMask( self ):
+    """ Active and banned sites from DIRAC
+    """
+    if self.__siteMask:
+      return self.__siteMask
+    result = self.__topology.getSiteMask()
+    if not result[ 'OK' ]:
+      return S_ERROR( "Cannot retrieve active and banned sites: %s" % result[ 'Message' ] )
+    return result
+
 
   def optimizeJob( self, jid, jobState ):
     # Reschedule delay
@@ -71,15 +93,10 @@ class JobScheduling( OptimizerExecutor ):
     userSites, userBannedSites = result[ 'Value' ]
 
     # Get active and banned sites from DIRAC
-    siteStatus = SiteStatus()
-    result = siteStatus.getUsableSites( 'ComputingAccess' )
-    if not result[ 'OK' ]:
-      return S_ERROR( "Cannot retrieve active sites from JobDB" )
-    usableSites = result[ 'Value' ]
-    result = siteStatus.getUnusableSites( 'ComputingAccess' )
+    result = self.__getSiteMask()
     if not result[ 'OK' ]:
-      return S_ERROR( "Cannot retrieve banned sites from JobDB" )
-    unusableSites = result[ 'Value' ]
+      return result
+    usableSites, unusableSites = result[ 'Value' ]
 
     # If the user has selected any site, filter them and hold the job if not able to run
     if userSites:
@@ -307,7 +324,7 @@ class JobScheduling( OptimizerExecutor ):
     return ( True, bestSites )
 
   def __requestStaging( self, jobState, stageSite, opData ):
-    result = getSEsForSite( stageSite )
+    result = self.__topology.getSEsForSite( stageSite )
     if not result['OK']:
       return S_ERROR( 'Could not determine SEs for site %s' % stageSite )
     siteSEs = result['Value']
@@ -315,8 +332,7 @@ class JobScheduling( OptimizerExecutor ):
     tapeSEs = []
     diskSEs = []
     for seName in siteSEs:
-      se = StorageElement( seName )
-      result = se.getStatus()
+      result = self.__topology.getSEStatus( seName )
       if not result[ 'OK' ]:
         self.jobLog.error( "Cannot retrieve SE %s status: %s" % ( seName, result[ 'Message' ] ) )
         return S_ERROR( "Cannot retrieve SE status" )
@@ -403,28 +419,22 @@ class JobScheduling( OptimizerExecutor ):
   def _updateSharedSESites( self, stageSite, stagedLFNs, opData ):
     siteCandidates = opData[ 'SiteCandidates' ]
 
-    seStatus = {}
     for siteName in siteCandidates:
       if siteName == stageSite:
         continue
       self.jobLog.verbose( "Checking %s for shared SEs" % siteName )
       siteData = siteCandidates[ siteName ]
-      result = getSEsForSite( siteName )
+      result = self.__topology.getSEsForSite( siteName )
       if not result[ 'OK' ]:
         continue
       closeSEs = result[ 'Value' ]
       diskSEs = []
       for seName in closeSEs:
-        # If we don't have the SE status get it and store it
-        if seName not in seStatus:
-          seObj = StorageElement( seName )
-          result = seObj.getStatus()
-          if not result['OK' ]:
-            self.jobLog.error( "Cannot retrieve SE %s status: %s" % ( seName, result[ 'Message' ] ) )
-            continue
-          seStatus[ seName ] = result[ 'Value' ]
-        # get the SE status from mem and add it if its disk
-        status = seStatus[ seName ]
+        result = self.__topology.getSEStatus( seName )
+        if not result['OK' ]:
+          self.jobLog.error( "Cannot retrieve SE %s status: %s" % ( seName, result[ 'Message' ] ) )
+          continue
+        status = result[ 'Value' ]
         if status['Read'] and status['DiskSE']:
           diskSEs.append( seName )
       self.jobLog.verbose( "Disk SEs for %s are %s" % ( siteName, ", ".join( diskSEs ) ) )
@@ -490,17 +500,11 @@ class JobScheduling( OptimizerExecutor ):
   def _getSiteTiers( self, siteList ):
     """ retun dict {'Site':Tier}
     """
-    siteTierDict = {}
-    for siteName in siteList:
-      result = getSiteTier( siteName )
-      if not result[ 'OK' ]:
-        self.jobLog.error( "Cannot get tier for site %s" % ( siteName ) )
-        siteTier = 2
-      else:
-        siteTier = int( result[ 'Value' ] )
-      siteTierDict.setdefault( siteName, siteTier )
-
-    return siteTierDict
+    result = self.__topology.getSiteTiers( siteList )
+    if not result[ 'OK' ]:
+      self.jobLog.error( "Cannot get tiers for sites %s: %s" % ( ", ".join( siteList ), result[ 'Message' ] ) )
+      return dict( [ ( siteName, 2 ) for siteName in siteList ] )
+    return result[ 'Value' ]
 
 
   def __checkStageAllowed( self, jobState ):
@@ -106,6 +106,7 @@ class JobWrapper:
     self.defaultOutputSE = gConfig.getValue( '/Resources/StorageElementGroups/SE-USER', [] )
     self.defaultCatalog = gConfig.getValue( self.section + '/DefaultCatalog', [] )
     self.defaultFailoverSE = gConfig.getValue( '/Resources/StorageElementGroups/Tier1-Failover', [] )
+    self.uploadStreams = gConfig.getValue( self.section + '/OutputDataUploadStreams', 4 )
     self.defaultOutputPath = ''
     self.rm = ReplicaManager()
     self.log.verbose( '===========================================================================' )
@@ -164,6 +165,7 @@ class JobWrapper:
     self.jobArgs = {}
     self.optArgs = {}
     self.ceArgs = {}
+    self.prefetchedSandbox = ''
 
   #############################################################################
   def initialize( self, arguments ):
@@ -180,6 +182,8 @@ class JobWrapper:
       self.optArgs = arguments['Optimizer']
     else:
       self.optArgs = {}
+    # Input sandbox downloaded by the JobAgent while the previous job was finishing
+    self.prefetchedSandbox = arguments.get( 'PrefetchedSandbox', '' )
     # Fill some parameters for the accounting report
     if self.jobArgs.has_key( 'Owner' ):
       self.owner = self.jobArgs['Owner']
@@ -863,6 +867,7 @@ class JobWrapper:
     # Instantiate the failover transfer client
     failoverTransfer = FailoverTransfer()
 
+    fileList = []
     for outputFile in outputData:
       ( lfn, localfile ) = self.__getLFNfromOutputFile( outputFile, outputPath )
       if not os.path.exists( localfile ):
@@ -890,24 +895,40 @@ class JobWrapper:
                        "Checksum": cksm,
                        "GUID" : fileGUID }
 
-      outputSEList = self.__getSortedSEList( outputSE )
-      upload = failoverTransfer.transferAndRegisterFile( localfile,
-                                                         outputFilePath,
-                                                         lfn,
-                                                         outputSEList,
-                                                         fileMetaDict,
-                                                         self.defaultCatalog )
-      if upload['OK']:
-        self.log.info( '"%s" successfully uploaded to "%s" as "LFN:%s"' % ( localfile,
-                                                                            upload['Value']['uploadedSE'],
-                                                                            lfn ) )
+      fileList.append( { 'FileName' : localfile,
+                         'LocalPath' : outputFilePath,
+                         'LFN' : lfn,
+                         'OutputFile' : outputFile,
+                         'SEList' : self.__getSortedSEList( outputSE ),
+                         'FileMetaDict' : fileMetaDict } )
+
+    # Parallel upload of all the files, registered with a single bulk catalog call
+    successful = {}
+    if fileList:
+      result = failoverTransfer.transferAndRegisterFiles( fileList, self.defaultCatalog, self.uploadStreams )
+      if result['OK']:
+        successful = result['Value']['Successful']
+      else:
+        self.log.error( 'Could not upload output data files', result['Message'] )
+    uploadTimes = []
+    for fileDict in fileList:
+      lfn = fileDict['LFN']
+      localfile = fileDict['FileName']
+      if lfn in successful:
+        metadata = successful[lfn]
+        self.log.info( '"%s" successfully uploaded to "%s" as "LFN:%s"' % ( localfile, metadata['uploadedSE'], lfn ) )
+        uploadTimes.append( '%s: %.1f s to %s' % ( lfn, metadata['PutTime'], metadata['uploadedSE'] ) )
         uploaded.append( lfn )
         continue
 
+      # Only the files which could not be uploaded are sent to the failover storage
+      outputFile = fileDict['OutputFile']
+      outputSEList = fileDict['SEList']
+      fileMetaDict = fileDict['FileMetaDict']
       self.log.error( 'Could not putAndRegister file',
                       '%s with LFN %s to %s with GUID %s trying failover storage' % ( localfile, lfn,
                                                                                       ', '.join( outputSEList ),
-                                                                                      fileGUID ) )
+                                                                                      fileMetaDict['GUID'] ) )
       if not self.defaultFailoverSE:
         self.log.info( 'No failover SEs defined for JobWrapper,',
                        'cannot try to upload output file %s anywhere else.' % outputFile )
@@ -916,8 +937,9 @@ class JobWrapper:
 
       failoverSEs = self.__getSortedSEList( self.defaultFailoverSE )
       targetSE = outputSEList[0]
+      startTime = time.time()
       result = failoverTransfer.transferAndRegisterFileFailover( localfile,
-                                                                 outputFilePath,
+                                                                 fileDict['LocalPath'],
                                                                  lfn,
                                                                  targetSE,
                                                                  failoverSEs,
@@ -928,8 +950,11 @@ class JobWrapper:
         missing.append( outputFile )
       else:
         self.log.info( 'File %s successfully uploaded to failover storage element' % lfn )
+        uploadTimes.append( '%s: %.1f s to failover' % ( lfn, time.time() - startTime ) )
         uploaded.append( lfn )
 
+    if uploadTimes:
+      self.__setJobParam( 'OutputDataUploadTimes', '\n'.join( uploadTimes ) )
 
     # For files correctly uploaded must report LFNs to job parameters
     if uploaded:
@@ -1050,6 +1075,13 @@ class JobWrapper:
           shutil.copy( self.root + '/inputsandbox/' + inputFile, inputFile )
       result = S_OK( sandboxFiles )
     else:
+      if registeredISB and self.prefetchedSandbox:
+        result = self.__getPrefetchedSandbox()
+        if result['OK']:
+          self.inputSandboxSize += result['Value']
+          registeredISB = []
+        else:
+          self.log.warn( 'Can not use the prefetched InputSandbox, downloading it', result['Message'] )
       if registeredISB:
         for isb in registeredISB:
           self.log.info( "Downloading Input SandBox %s" % isb )
@@ -1097,6 +1129,24 @@ class JobWrapper:
 
     return S_OK( 'InputSandbox downloaded' )
 
+  #############################################################################
+  def __getPrefetchedSandbox( self ):
+    """Moves the input sandbox prefetched by the JobAgent to the job directory,
+       returns its size
+    """
+    if not os.path.isdir( self.prefetchedSandbox ):
+      return S_ERROR( 'Prefetched InputSandbox directory %s not found' % self.prefetchedSandbox )
+    self.log.info( 'Using the InputSandbox prefetched in %s' % self.prefetchedSandbox )
+    try:
+      entries = os.listdir( self.prefetchedSandbox )
+      size = getGlobbedTotalSize( [ os.path.join( self.prefetchedSandbox, entry ) for entry in entries ] )
+      for entry in entries:
+        shutil.move( os.path.join( self.prefetchedSandbox, entry ), os.path.join( os.getcwd(), entry ) )
+      os.rmdir( self.prefetchedSandbox )
+    except ( IOError, OSError ), x:
+      return S_ERROR( 'Could not move the prefetched InputSandbox: %s' % str( x ) )
+    return S_OK( size )
+
   #############################################################################
   def finalize( self, arguments ):
     """Perform any final actions to clean up after job execution.
@@ -117,6 +117,13 @@ def execute ( arguments ):
       job.sendFailoverRequest( 'Failed', 'Exception During Execution' )
       return 1
 
+  if arguments.has_key( 'PrefetchSignal' ):
+    # The JobAgent prepares the next job while the outputs are uploaded
+    try:
+      open( arguments['PrefetchSignal'], 'w' ).close()
+    except IOError, x:
+      gLogger.warn( 'Could not signal the end of the payload', str( x ) )
+
   if arguments['Job'].has_key( 'OutputSandbox' ) or arguments['Job'].has_key( 'OutputData' ):
     try:
       result = job.processJobOutputs( arguments )
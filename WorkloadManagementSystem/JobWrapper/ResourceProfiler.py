@@ -0,0 +1,207 @@
+########################################################################
+# $HeadURL$
+# File  : ResourceProfiler.py
+########################################################################
+
+"""  The ResourceProfiler is used by the Watchdog in high resolution profiling
+     mode. At each sample it reads the CPU, resident memory and storage I/O of
+     all the processes of the job from /proc and keeps the job totals in a fixed
+     size ring buffer, so that memory use does not grow with the job duration.
+
+     The peaks, rates and memory growth are tracked over the whole job, also for
+     the samples already dropped from the ring buffer. At the end of the job the
+     derived metrics are reported as job parameters together with the compressed
+     profile, downsampled to fit in a job parameter value.
+"""
+
+__RCSID__ = "$Id$"
+
+from DIRAC                                              import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities                               import DEncode
+
+import array, base64, time, zlib
+
+# Fields of each ring buffer record
+PROFILE_FIELDS = [ 'Time', 'CPU(s)', 'RSS(kB)', 'MaxProcessRSS(kB)', 'ReadBytes', 'WriteBytes', 'Processes' ]
+# Maximum length of the compressed profile, JobParameters values are 64 kB BLOBs
+MAX_PROFILE_LENGTH = 60000
+
+class ResourceProfiler:
+
+  #############################################################################
+  def __init__( self, processMonitor, pid, size = 8640 ):
+    """ Constructor, takes the ProcessMonitor used for the samples, the PID of the
+        job wrapper and the number of samples kept in the ring buffer
+    """
+    self.log = gLogger.getSubLogger( "ResourceProfiler" )
+    self.processMonitor = processMonitor
+    self.pid = pid
+    self.size = max( 1, size )
+    self.nFields = len( PROFILE_FIELDS )
+    self.buffer = array.array( 'd', [ 0. ] ) * ( self.size * self.nFields )
+    self.count = 0
+    # Last read and written bytes of each process, including the terminated ones
+    # whose parent is not tracked any more, and the parent PID of each process
+    self.ioCounters = {}
+    self.ioParents = {}
+    self.startTime = 0.
+    self.peakRSS = 0.
+    self.peakProcessRSS = 0.
+    self.peakReadRate = 0.
+    self.peakWriteRate = 0.
+    # Sums of the least squares fit of the memory over all the samples:
+    # n, sum( t ), sum( m ), sum( t*t ), sum( t*m ), t relative to startTime
+    self.memoryFit = [ 0, 0., 0., 0., 0. ]
+
+  #############################################################################
+  def sample( self ):
+    """ Reads the job processes from /proc and adds a record to the ring buffer
+    """
+    result = self.processMonitor.getJobProcessesLinux( self.pid )
+    if not result['OK']:
+      return result
+    processes = result['Value']
+
+    sampleTime = time.time()
+    cpu = 0.
+    rss = 0.
+    maxProcessRSS = 0.
+    for pid, procDict in processes.items():
+      cpu += procDict['CPU']
+      rss += procDict['RSS']
+      maxProcessRSS = max( maxProcessRSS, procDict['RSS'] )
+      ioCounters = self.__getIOCounters( pid )
+      if ioCounters:
+        self.ioCounters[pid] = ioCounters
+        self.ioParents[pid] = procDict['PPID']
+    # The I/O of a reaped process is added to the counters of its parent,
+    # keep its last counters only if the parent is not among the job processes
+    for pid in self.ioCounters.keys():
+      if pid not in processes and self.ioParents[pid] in processes:
+        del self.ioCounters[pid]
+        del self.ioParents[pid]
+    readBytes = float( sum( [ counters[0] for counters in self.ioCounters.values() ] ) )
+    writeBytes = float( sum( [ counters[1] for counters in self.ioCounters.values() ] ) )
+
+    if self.count:
+      last = self.__getRecord( self.count - 1 )
+      interval = sampleTime - last[0]
+      if interval > 0:
+        self.peakReadRate = max( self.peakReadRate, ( readBytes - last[4] ) / interval )
+        self.peakWriteRate = max( self.peakWriteRate, ( writeBytes - last[5] ) / interval )
+    else:
+      self.startTime = sampleTime
+    self.peakRSS = max( self.peakRSS, rss )
+    self.peakProcessRSS = max( self.peakProcessRSS, maxProcessRSS )
+    relTime = sampleTime - self.startTime
+    for i, value in enumerate( ( 1, relTime, rss, relTime * relTime, relTime * rss ) ):
+      self.memoryFit[i] += value
+
+    position = ( self.count % self.size ) * self.nFields
+    self.buffer[position:position + self.nFields] = array.array( 'd', [ sampleTime, cpu, rss, maxProcessRSS,
+                                                                        readBytes, writeBytes, len( processes ) ] )
+    self.count += 1
+    return S_OK()
+
+  #############################################################################
+  def __getIOCounters( self, pid ):
+    """ Returns the ( read_bytes, write_bytes ) storage I/O of the process from
+        /proc/<pid>/io, None if not readable
+    """
+    try:
+      fopen = open( '/proc/%s/io' % pid, 'r' )
+      lines = fopen.readlines()
+      fopen.close()
+    except IOError:
+      return None
+    ioDict = {}
+    for line in lines:
+      fields = line.split( ':' )
+      if len( fields ) == 2:
+        ioDict[fields[0].strip()] = fields[1].strip()
+    try:
+      return ( int( ioDict['read_bytes'] ), int( ioDict['write_bytes'] ) )
+    except ( KeyError, ValueError ):
+      return None
+
+  #############################################################################
+  def __getRecord( self, index ):
+    """ Returns the record with the given absolute sample index
+    """
+    position = ( index % self.size ) * self.nFields
+    return self.buffer[position:position + self.nFields].tolist()
+
+  #############################################################################
+  def getRecords( self ):
+    """ Returns the records still in the ring buffer, oldest first
+    """
+    return [ self.__getRecord( index ) for index in range( max( 0, self.count - self.size ), self.count ) ]
+
+  #############################################################################
+  def getSummary( self ):
+    """ Returns the metrics derived from the profile: memory peaks of the job and of
+        its largest process, mean and peak I/O rates and memory growth rate
+    """
+    if not self.count:
+      return S_ERROR( 'No profile sample available' )
+
+    summary = { 'ProfileSamples' : self.count,
+                'PeakMemory(kB)' : self.peakRSS,
+                'PeakProcessMemory(kB)' : self.peakProcessRSS,
+                'PeakReadRate(kB/s)' : self.peakReadRate / 1024,
+                'PeakWriteRate(kB/s)' : self.peakWriteRate / 1024 }
+    last = self.__getRecord( self.count - 1 )
+    duration = last[0] - self.startTime
+    if duration > 0:
+      summary['MeanReadRate(kB/s)'] = last[4] / 1024 / duration
+      summary['MeanWriteRate(kB/s)'] = last[5] / 1024 / duration
+
+    # Least squares slope of the memory over all the samples of the job
+    n, sumTime, sumMemory, sumTime2, sumTimeMemory = self.memoryFit
+    if n > 1:
+      variance = n * sumTime2 - sumTime * sumTime
+      if variance > 0:
+        slope = ( n * sumTimeMemory - sumTime * sumMemory ) / variance
+        summary['MemoryGrowth(kB/h)'] = slope * 3600
+
+    return S_OK( summary )
+
+  #############################################################################
+  def getCompressedProfile( self, maxLength = MAX_PROFILE_LENGTH ):
+    """ Returns the profile as base64 encoded, zlib compressed DEncode string of
+        { 'Fields' : PROFILE_FIELDS, 'Records' : [ record ] }. Times are given relative
+        to the StartTime of the job profile, the values are rounded to integers.
+        If the string is longer than maxLength, only one record every Step records,
+        the last one included, is kept
+    """
+    records = []
+    for record in self.getRecords():
+      records.append( [ int( round( record[0] - self.startTime ) ) ] + [ int( round( value ) ) for value in record[1:] ] )
+    step = 1
+    while True:
+      kept = records[::-1][::step][::-1]
+      profile = { 'Fields' : PROFILE_FIELDS,
+                  'StartTime' : int( self.startTime ),
+                  'Samples' : self.count,
+                  'Step' : step,
+                  'Records' : kept }
+      profileString = base64.b64encode( zlib.compress( DEncode.encode( profile ), 9 ) )
+      if len( profileString ) <= maxLength or len( kept ) <= 1:
+        break
+      # Aim at the maximum length in one go, the compression ratio being about the same
+      step = max( step + 1, int( step * len( profileString ) * 1.1 / maxLength ) + 1 )
+    if step > 1:
+      self.log.verbose( 'Profile downsampled to one record every %d, %d bytes' % ( step, len( profileString ) ) )
+    return S_OK( profileString )
+
+  #############################################################################
+  @staticmethod
+  def decodeProfile( profileString ):
+    """ Returns the profile dictionary from the string made by getCompressedProfile
+    """
+    try:
+      return S_OK( DEncode.decode( zlib.decompress( base64.b64decode( profileString ) ) )[0] )
+    except Exception, x:
+      return S_ERROR( 'Can not decode the resource profile: %s' % str( x ) )
+
+#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#
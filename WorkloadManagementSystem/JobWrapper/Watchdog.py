@@ -25,6 +25,7 @@ from DIRAC.Core.DISET.RPCClient                         import RPCClient
 from DIRAC.ConfigurationSystem.Client.Config            import gConfig
 from DIRAC.ConfigurationSystem.Client.PathFinder        import getSystemInstance
 from DIRAC.Core.Utilities.ProcessMonitor                import ProcessMonitor
+from DIRAC.WorkloadManagementSystem.JobWrapper.ResourceProfiler import ResourceProfiler
 from DIRAC                                              import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities.TimeLeft.TimeLeft             import TimeLeft
 
@@ -53,6 +54,8 @@ class Watchdog:
     self.currentStats = {}
     self.initialized = False
     self.count = 0
+    self.profiler = None
+    self.lastProfileTime = 0
 
 
   #############################################################################
@@ -95,6 +98,8 @@ class Watchdog:
     self.jobCPUMargin = gConfig.getValue( self.section + '/JobCPULimitMargin', 20 ) # %age buffer before killing job
     self.minCPUWallClockRatio = gConfig.getValue( self.section + '/MinCPUWallClockRatio', 5 ) #ratio %age
     self.nullCPULimit = gConfig.getValue( self.section + '/NullCPUCountLimit', 5 ) #After 5 sample times return null CPU consumption kill job
+    self.profileInterval = gConfig.getValue( self.section + '/ProfileInterval', 0 ) # seconds, 0 to disable the profiler
+    self.profileSize = gConfig.getValue( self.section + '/ProfileSize', 8640 ) # samples kept in the profile
     self.checkCount = 0
     self.nullCPUCount = 0
     if self.checkingTime < self.minCheckingTime:
@@ -110,6 +115,13 @@ class Watchdog:
     self.timeLeftUtil = TimeLeft()
     self.timeLeft = 0
     self.littleTimeLeft = False
+
+    if self.profileInterval > 0:
+      if self.profileInterval < self.pollingTime:
+        self.log.info( 'Requested ProfileInterval of %s limited to the PollingTime of %s seconds' % ( self.profileInterval,
+                                                                                                    self.pollingTime ) )
+      self.log.info( 'Resource profiling enabled every %s seconds' % max( self.profileInterval, self.pollingTime ) )
+      self.profiler = ResourceProfiler( self.processMonitor, self.wrapperPID, self.profileSize )
     return S_OK()
 
   def run( self ):
@@ -145,6 +157,12 @@ class Watchdog:
   def execute( self ):
     """ The main agent execution method of the Watchdog.
     """
+    if self.profiler and time.time() - self.lastProfileTime >= self.profileInterval:
+      self.lastProfileTime = time.time()
+      result = self.profiler.sample()
+      if not result['OK']:
+        self.log.verbose( 'Resource profile sample failed', result['Message'] )
+
     if not self.exeThread.isAlive():
       #print self.parameters
       self.__getUsageSummary()
@@ -690,6 +708,15 @@ class Watchdog:
     wallClock = result['Value']
     summary['WallClockTime(s)'] = wallClock
 
+    #Resource profile
+    if self.profiler:
+      result = self.profiler.getSummary()
+      if result['OK']:
+        summary.update( result['Value'] )
+        result = self.profiler.getCompressedProfile()
+        if result['OK']:
+          self.__setJobParamList( [ ( 'ResourceProfile', result['Value'] ) ] )
+
     self.__reportParameters( summary, 'UsageSummary', True )
     self.currentStats = summary
 
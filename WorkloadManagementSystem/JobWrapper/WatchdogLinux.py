@@ -8,17 +8,17 @@
      the system CPU and memory consumed.  The Watchdog can determine if
      a running job is stalled and indicate this to the Job Wrapper.
 
-     This is the Unix / Linux compatible Watchdog subclass.
+     This is the Unix / Linux compatible Watchdog subclass. The system
+     information is read from /proc and os.statvfs without forking commands.
 """
 
 __RCSID__ = "$Id$"
 
 from DIRAC.WorkloadManagementSystem.JobWrapper.Watchdog  import Watchdog
-from DIRAC.Core.Utilities.Subprocess                     import shellCall
 from DIRAC                                               import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Os import getDiskSpace
 
-import string,re,socket
+import string,re,socket,os,pwd
 
 class WatchdogLinux(Watchdog):
 
@@ -49,9 +49,10 @@ class WatchdogLinux(Watchdog):
       file.close()
       result["Memory(kB)"] =  string.replace(string.replace(string.split(info[3],":")[1]," ",""),"\n","")
       account = 'Unknown'
-      localID = shellCall(10,'whoami')
-      if localID['OK']:
-        account = localID['Value'][1].strip()
+      try:
+        account = pwd.getpwuid(os.getuid())[0]
+      except KeyError:
+        pass
       result["LocalAccount"] = account
     except Exception, x:
       self.log.fatal('Watchdog failed to obtain node information with Exception:')
@@ -64,15 +65,15 @@ class WatchdogLinux(Watchdog):
 
   ############################################################################
   def getLoadAverage(self):
-    """Obtains the load average.
+    """Obtains the load average reading /proc/loadavg.
     """
     result = S_OK()
-    comm = '/bin/cat /proc/loadavg'
-    loadAvgDict = shellCall(5,comm)
-    if loadAvgDict['OK']:
-      la = float(string.split(loadAvgDict['Value'][1])[0])
+    try:
+      file = open("/proc/loadavg","r")
+      la = float(file.read().split()[0])
+      file.close()
       result['Value'] = la
-    else:
+    except Exception:
       result = S_ERROR('Could not obtain load average')
       self.log.warn('Could not obtain load average')
       result['Value'] = 0
@@ -81,15 +82,19 @@ class WatchdogLinux(Watchdog):
 
   #############################################################################
   def getMemoryUsed(self):
-    """Obtains the memory used.
+    """Obtains the memory used (total - free, as reported by free) reading /proc/meminfo.
     """
     result = S_OK()
-    comm = '/usr/bin/free'
-    memDict = shellCall(5,comm)
-    if memDict['OK']:
-      mem = string.split(memDict['Value'][1]) [8]
-      result['Value'] = float(mem)
-    else:
+    try:
+      memDict = {}
+      file = open("/proc/meminfo","r")
+      for line in file.readlines():
+        fields = line.split()
+        if len(fields) > 1:
+          memDict[fields[0].rstrip(':')] = float(fields[1])
+      file.close()
+      result['Value'] = memDict['MemTotal'] - memDict['MemFree']
+    except Exception:
       result = S_ERROR('Could not obtain memory used')
       self.log.warn('Could not obtain memory used')
       result['Value'] = 0
@@ -97,10 +102,19 @@ class WatchdogLinux(Watchdog):
 
  #############################################################################
   def getDiskSpace(self):
-    """Obtains the disk space used.
+    """Obtains the disk space available in MB, with os.statvfs unless the working
+       directory is on AFS where the quota has to be checked.
     """
     result = S_OK()
-    diskSpace = getDiskSpace()
+    cwd = os.getcwd()
+    if cwd.startswith('/afs'):
+      diskSpace = getDiskSpace()
+    else:
+      try:
+        stats = os.statvfs(cwd)
+        diskSpace = stats.f_bavail * stats.f_frsize / 1024 / 1024
+      except OSError:
+        diskSpace = -1
 
     if diskSpace == -1:
       result = S_ERROR('Could not obtain disk usage')
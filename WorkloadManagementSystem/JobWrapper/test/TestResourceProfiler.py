@@ -0,0 +1,126 @@
+########################################################################
+# $HeadURL$
+# File  : TestResourceProfiler.py
+########################################################################
+""" Unit tests of the ResourceProfiler ring buffer and derived metrics
+"""
+
+import unittest, random, array
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.JobWrapper.ResourceProfiler import ResourceProfiler, PROFILE_FIELDS, \
+                                                                       MAX_PROFILE_LENGTH
+
+class FakeProcessMonitor:
+  """ Returns a job of two processes, the memory of the first one growing at each sample
+  """
+
+  def __init__( self ):
+    self.samples = 0
+
+  def getJobProcessesLinux( self, pid ):
+    self.samples += 1
+    return S_OK( { 1 : { 'PPID' : 0, 'PGRP' : 1, 'Name' : 'wrapper', 'CPU' : 1. * self.samples, 'RSS' : 1000. * self.samples },
+                   2 : { 'PPID' : 1, 'PGRP' : 1, 'Name' : 'payload', 'CPU' : 0.5, 'RSS' : 500. } } )
+
+class FakeIOProcessMonitor:
+  """ Returns a job whose processes are given by the test, with their I/O counters
+  """
+
+  def __init__( self ):
+    self.processes = {}
+    self.ioCounters = {}
+
+  def getJobProcessesLinux( self, pid ):
+    return S_OK( dict( [ ( childPID, { 'PPID' : ppid, 'PGRP' : 1, 'Name' : 'process', 'CPU' : 0., 'RSS' : 0. } )
+                         for childPID, ppid in self.processes.items() ] ) )
+
+class ResourceProfilerCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.profiler = ResourceProfiler( FakeProcessMonitor(), 1, size = 5 )
+
+  def test_ringBuffer( self ):
+    for _i in range( 12 ):
+      self.assert_( self.profiler.sample()['OK'] )
+    records = self.profiler.getRecords()
+    self.assertEqual( len( records ), 5 )
+    self.assertEqual( len( records[0] ), len( PROFILE_FIELDS ) )
+    # Oldest first, only the last 5 samples are kept
+    self.assertEqual( [ record[2] for record in records ], [ 1000. * i + 500. for i in range( 8, 13 ) ] )
+    self.assertEqual( records[-1][6], 2 )
+
+  def test_summary( self ):
+    self.failIf( self.profiler.getSummary()['OK'] )
+    for _i in range( 12 ):
+      self.profiler.sample()
+    summary = self.profiler.getSummary()['Value']
+    # Peaks are kept for samples dropped from the buffer too
+    self.assertEqual( summary['PeakMemory(kB)'], 12500. )
+    self.assertEqual( summary['PeakProcessMemory(kB)'], 12000. )
+    self.assertEqual( summary['ProfileSamples'], 12 )
+
+  def test_compressedProfile( self ):
+    for _i in range( 3 ):
+      self.profiler.sample()
+    result = self.profiler.getCompressedProfile()
+    self.assert_( result['OK'] )
+    profile = ResourceProfiler.decodeProfile( result['Value'] )['Value']
+    self.assertEqual( profile['Fields'], PROFILE_FIELDS )
+    self.assertEqual( len( profile['Records'] ), 3 )
+    self.assertEqual( profile['Records'][-1][2], 3500 )
+
+  def test_profileLength( self ):
+    # A full profile with the default settings fits in a JobParameters value
+    profiler = ResourceProfiler( FakeProcessMonitor(), 1 )
+    random.seed( 0 )
+    startTime = 1.e9
+    for i in range( profiler.size + 10 ):
+      record = [ startTime + 10. * i, 2.5 * i, random.uniform( 1.e5, 2.e6 ), random.uniform( 1.e5, 1.e6 ),
+                 random.uniform( 0, 1.e12 ), random.uniform( 0, 1.e12 ), random.randint( 1, 20 ) ]
+      position = ( i % profiler.size ) * profiler.nFields
+      profiler.buffer[position:position + profiler.nFields] = array.array( 'd', record )
+    profiler.count = profiler.size + 10
+    profiler.startTime = startTime
+    profileString = profiler.getCompressedProfile()['Value']
+    self.assert_( len( profileString ) <= MAX_PROFILE_LENGTH )
+    profile = ResourceProfiler.decodeProfile( profileString )['Value']
+    self.assert_( profile['Step'] > 1 )
+    # The last sample is always kept
+    self.assertEqual( profile['Records'][-1][0], 10 * ( profiler.size + 9 ) )
+
+  def test_memoryGrowth( self ):
+    for _i in range( 12 ):
+      self.profiler.sample()
+    # Growth over the whole job, not only the samples in the buffer
+    n, sumTime, _sumMemory, sumTime2, _sumTimeMemory = self.profiler.memoryFit
+    self.assertEqual( n, 12 )
+    if n * sumTime2 - sumTime * sumTime > 0:
+      self.assert_( self.profiler.getSummary()['Value']['MemoryGrowth(kB/h)'] > 0 )
+
+  def test_reapedProcessIO( self ):
+    monitor = FakeIOProcessMonitor()
+    profiler = ResourceProfiler( monitor, 1 )
+    profiler._ResourceProfiler__getIOCounters = lambda pid: monitor.ioCounters.get( pid )
+    megaBytes = 1024 * 1024
+    # Wrapper 1 runs 2, which writes 20 MB in its child 3 and in the child 5 of 4
+    monitor.processes = { 1 : 0, 2 : 1, 3 : 2, 4 : 2, 5 : 4 }
+    monitor.ioCounters = { 1 : ( 0, 0 ), 2 : ( 0, 0 ), 3 : ( 0, 20 * megaBytes ), 4 : ( 0, 0 ), 5 : ( 0, 0 ) }
+    profiler.sample()
+    self.assertEqual( profiler.getRecords()[-1][5], 20. * megaBytes )
+    # 3 is reaped, its I/O is accounted to 2
+    del monitor.processes[3]
+    monitor.ioCounters[2] = ( 0, 20 * megaBytes )
+    profiler.sample()
+    self.assertEqual( profiler.getRecords()[-1][5], 20. * megaBytes )
+    # 5 writes 10 MB and exits after 4, its parent is not tracked any more
+    monitor.ioCounters[5] = ( 0, 10 * megaBytes )
+    profiler.sample()
+    del monitor.processes[4]
+    del monitor.processes[5]
+    profiler.sample()
+    self.assertEqual( profiler.getRecords()[-1][5], 30. * megaBytes )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ResourceProfilerCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
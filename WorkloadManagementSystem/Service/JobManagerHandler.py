@@ -166,35 +166,25 @@ class JobManagerHandler( RequestHandler ):
       if len( parameterList ) > self.maxParametricJobs:
         return S_ERROR( 'The number of parametric jobs exceeded the limit of %d' % self.maxParametricJobs )
 
-      jobDescList = []
-      nParam = len( parameterList ) - 1
-      for n, p in enumerate( parameterList ):
-        newJobDesc = jobDesc.replace( '%s', str( p ) ).replace( '%n', str( n ).zfill( len( str( nParam ) ) ) )
-        newClassAd = ClassAd( newJobDesc )
-        for attr in ['Parameters', 'ParameterStep', 'ParameterFactor']:
-          newClassAd.deleteAttribute( attr )
-        if type( p ) == type ( ' ' ) and p.startswith( '{' ):
-          newClassAd.insertAttributeInt( 'Parameter', str( p ) )
-        else:
-          newClassAd.insertAttributeString( 'Parameter', str( p ) )
-        newClassAd.insertAttributeInt( 'ParameterNumber', n )
-        newJDL = newClassAd.asJDL()
-        jobDescList.append( newJDL )
+      result = gJobDB.insertParametricJobsIntoDB( jobDesc, parameterList, self.owner, self.ownerDN,
+                                                  self.ownerGroup, self.diracSetup )
+      if not result['OK']:
+        return result
+      jobList = result['Value']
     else:
-      jobDescList = [ jobDesc ]
-
-    jobIDList = []
-    for jobDescription in jobDescList:
-      result = gJobDB.insertNewJobIntoDB( jobDescription, self.owner, self.ownerDN, self.ownerGroup, self.diracSetup )
+      result = gJobDB.insertNewJobIntoDB( jobDesc, self.owner, self.ownerDN, self.ownerGroup, self.diracSetup )
       if not result['OK']:
         return result
+      jobList = [ ( result['JobID'], result['Status'], result['MinorStatus'] ) ]
 
-      jobID = result['JobID']
-      gLogger.info( 'Job %s added to the JobDB for %s/%s' % ( jobID, self.ownerDN, self.ownerGroup ) )
-
-      gJobLoggingDB.addLoggingRecord( jobID, result['Status'], result['MinorStatus'], source = 'JobManager' )
-
+    jobIDList = []
+    loggingDict = {}
+    for jobID, status, minorStatus in jobList:
+      loggingDict.setdefault( ( status, minorStatus ), [] ).append( jobID )
       jobIDList.append( jobID )
+    gLogger.info( '%d job(s) added to the JobDB for %s/%s' % ( len( jobIDList ), self.ownerDN, self.ownerGroup ) )
+    for ( status, minorStatus ), jobIDs in loggingDict.items():
+      gJobLoggingDB.addLoggingRecords( jobIDs, status, minorStatus, source = 'JobManager' )
 
     #Set persistency flag
     retVal = gProxyManager.getUserPersistence( self.ownerDN, self.ownerGroup )
@@ -15,11 +15,13 @@ __RCSID__ = "$Id$"
 
 from types import IntType, LongType, ListType, DictType, StringTypes, StringType
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
-from DIRAC import S_OK, S_ERROR
+from DIRAC import S_OK, S_ERROR, gConfig
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 from DIRAC.WorkloadManagementSystem.Service.JobPolicy import JobPolicy, RIGHT_GET_INFO
+from DIRAC.WorkloadManagementSystem.Service.WMSUtilities import getCachedSummary
 import DIRAC.Core.Utilities.Time as Time
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 
@@ -34,12 +36,24 @@ SUMMARY = []
 PRIMARY_SUMMARY = []
 FINAL_STATES = ['Done', 'Completed', 'Stalled', 'Failed', 'Killed']
 
+# Validity in seconds of the cached job counters
+SUMMARY_CACHE_TIME = 30
+# Period in seconds of the JobsSummary rebuild
+SUMMARY_RECONCILE_PERIOD = 3600
+gSummaryCacheTime = SUMMARY_CACHE_TIME
+
 def initializeJobMonitoringHandler( serviceInfo ):
 
-  global gJobDB, gJobLoggingDB, gTaskQueueDB
+  global gJobDB, gJobLoggingDB, gTaskQueueDB, gSummaryCacheTime
   gJobDB = JobDB()
   gJobLoggingDB = JobLoggingDB()
   gTaskQueueDB = TaskQueueDB()
+  gSummaryCacheTime = gConfig.getValue( '%s/SummaryCacheTime' % serviceInfo['serviceSectionPath'],
+                                        SUMMARY_CACHE_TIME )
+  reconcilePeriod = gConfig.getValue( '%s/SummaryReconcilePeriod' % serviceInfo['serviceSectionPath'],
+                                      SUMMARY_RECONCILE_PERIOD )
+  if gJobDB.useJobsSummary and reconcilePeriod > 0:
+    gThreadScheduler.addPeriodicTask( reconcilePeriod, gJobDB.reconcileJobsSummary )
   return S_OK()
 
 class JobMonitoringHandler( RequestHandler ):
@@ -179,7 +193,8 @@ class JobMonitoringHandler( RequestHandler ):
     if not attrDict:
       attrDict = {}
 
-    return gJobDB.getCounters( 'Jobs', attrList, attrDict, newer = cutDate, timeStamp = 'LastUpdateTime' )
+    return getCachedSummary( gSummaryCacheTime, gJobDB.getCounters, 'Jobs', attrList, attrDict,
+                             None, cutDate, 'LastUpdateTime' )
 
 ##############################################################################
   types_getCurrentJobCounters = [ ]
@@ -334,10 +349,8 @@ class JobMonitoringHandler( RequestHandler ):
       orderAttribute = None
 
     statusDict = {}
-    result = gJobDB.getCounters( 'Jobs', ['Status'], selectDict,
-                               newer = startDate,
-                               older = endDate,
-                               timeStamp = 'LastUpdateTime' )
+    result = getCachedSummary( gSummaryCacheTime, gJobDB.getCounters, 'Jobs', ['Status'], selectDict,
+                               endDate, startDate, 'LastUpdateTime' )
 
     nJobs = 0
     if result['OK']:
@@ -425,10 +438,8 @@ class JobMonitoringHandler( RequestHandler ):
     if endDate:
       del selectDict['ToDate']
 
-    result = gJobDB.getCounters( 'Jobs', [attribute], selectDict,
-                               newer = startDate,
-                               older = endDate,
-                               timeStamp = 'LastUpdateTime' )
+    result = getCachedSummary( gSummaryCacheTime, gJobDB.getCounters, 'Jobs', [attribute], selectDict,
+                               endDate, startDate, 'LastUpdateTime' )
     resultDict = {}
     if result['OK']:
       for cDict, count in result['Value']:
@@ -472,7 +483,7 @@ class JobMonitoringHandler( RequestHandler ):
   types_getSiteSummary = [ ]
   @staticmethod
   def export_getSiteSummary():
-    return gJobDB.getSiteSummary()
+    return getCachedSummary( gSummaryCacheTime, gJobDB.getSiteSummary )
 
 ##############################################################################
   types_getJobHeartBeatData = [ IntType ]
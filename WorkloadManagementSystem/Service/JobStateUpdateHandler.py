@@ -8,31 +8,140 @@
     The following methods are available in the Service interface
 
     setJobStatus()
-
+    setJobsStatus()
+    setJobStatusBulk()
+    setJobsStatusBulk()
+
+    Heart beats are acknowledged immediately and buffered in memory, only the
+    last heart beat of each job is kept and the buffer is written to the JobDB
+    every HeartBeatFlushPeriod seconds (option of the service, 0 to disable
+    buffering). Pending job commands are cached and refreshed at each flush.
 """
 
 __RCSID__ = "$Id$"
 
+import threading
 from types import *
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
-from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC import gLogger, gConfig, S_OK, S_ERROR
+from DIRAC.Core.Utilities import Time
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 
 # This is a global instance of the JobDB class
 jobDB = False
 logDB = False
+heartBeatBuffer = False
 
 JOB_FINAL_STATES = ['Done', 'Completed', 'Failed']
 
+HEARTBEAT_FLUSH_PERIOD = 10
+
 def initializeJobStateUpdateHandler( serviceInfo ):
 
   global jobDB
   global logDB
+  global heartBeatBuffer
   jobDB = JobDB()
   logDB = JobLoggingDB()
+  flushPeriod = gConfig.getValue( '%s/HeartBeatFlushPeriod' % serviceInfo['serviceSectionPath'],
+                                  HEARTBEAT_FLUSH_PERIOD )
+  if flushPeriod > 0:
+    heartBeatBuffer = HeartBeatBuffer( jobDB )
+    heartBeatBuffer.flush()
+    gThreadScheduler.addPeriodicTask( flushPeriod, heartBeatBuffer.flush )
   return S_OK()
 
+class HeartBeatBuffer( object ):
+  """ Coalescing buffer of the job heart beats
+
+      For each job only the time of the last heart beat, the static data (merged)
+      and the dynamic data of the last heart beat are kept until the next flush
+  """
+
+  def __init__( self, jobDB ):
+    self.jobDB = jobDB
+    self.log = gLogger.getSubLogger( 'HeartBeatBuffer' )
+    self.__lock = threading.Lock()
+    self.__flushLock = threading.Lock()
+    # jobID : ( heartBeatTime, staticDataDict, dynamicDataDict )
+    self.__heartBeats = {}
+    # jobID : { command : arguments } for the commands in Received status
+    self.__commands = {}
+    # ( jobID, command ) delivered to the jobs but not yet flagged as Sent
+    self.__sentCommands = []
+
+  def addHeartBeat( self, jobID, staticData, dynamicData ):
+    """ Buffer the heart beat of jobID and return the pending commands of the job
+    """
+    self.__lock.acquire()
+    try:
+      heartBeat = self.__heartBeats.get( jobID )
+      if heartBeat:
+        heartBeat[1].update( staticData )
+        if dynamicData:
+          heartBeat = ( Time.toString(), heartBeat[1], dict( dynamicData ) )
+        else:
+          heartBeat = ( Time.toString(), heartBeat[1], heartBeat[2] )
+      else:
+        heartBeat = ( Time.toString(), dict( staticData ), dict( dynamicData ) )
+      self.__heartBeats[jobID] = heartBeat
+
+      jobCommands = self.__commands.pop( jobID, {} )
+      self.__sentCommands += [ ( jobID, command ) for command in jobCommands ]
+      return jobCommands
+    finally:
+      self.__lock.release()
+
+  def flush( self ):
+    """ Write the buffered heart beats and the delivered commands to the JobDB,
+        then refresh the cache of the pending commands
+    """
+    if not self.__flushLock.acquire( False ):
+      return S_OK()
+    try:
+      self.__lock.acquire()
+      try:
+        heartBeats = self.__heartBeats
+        sentCommands = self.__sentCommands
+        self.__heartBeats = {}
+        self.__sentCommands = []
+      finally:
+        self.__lock.release()
+
+      if heartBeats:
+        result = self.jobDB.setHeartBeatDataBulk( heartBeats )
+        if not result['OK']:
+          self.log.error( 'Failed to store the heart beats of %d jobs:' % len( heartBeats ), result['Message'] )
+        else:
+          self.log.verbose( 'Heart beats of %d jobs stored' % len( heartBeats ) )
+
+      if sentCommands:
+        result = self.jobDB.setJobCommandsStatus( sentCommands, 'Sent' )
+        if not result['OK']:
+          self.log.error( 'Failed to set the status of the sent job commands:', result['Message'] )
+
+      result = self.jobDB.getJobCommands()
+      if not result['OK']:
+        self.log.error( 'Failed to get the job commands:', result['Message'] )
+        return result
+      commands = result['Value']
+      self.__lock.acquire()
+      try:
+        # Commands delivered since the heart beats were swapped are not Sent yet in the DB
+        for jobID, command in self.__sentCommands:
+          if command in commands.get( jobID, {} ):
+            del commands[jobID][command]
+            if not commands[jobID]:
+              del commands[jobID]
+        self.__commands = commands
+      finally:
+        self.__lock.release()
+      return S_OK()
+    finally:
+      self.__flushLock.release()
+
 class JobStateUpdateHandler( RequestHandler ):
 
   ###########################################################################
@@ -80,8 +189,41 @@ class JobStateUpdateHandler( RequestHandler ):
         Set optionally the status date and source component which sends the
         status information.
     """
-    for jobID in jobIDs:
-      self.__setJobStatus( int( jobID ), status, minorStatus, source, datetime )
+    jobIDs = [ int( jobID ) for jobID in jobIDs ]
+    attrDict = {}
+    if status:
+      attrDict['Status'] = status
+    if minorStatus:
+      attrDict['MinorStatus'] = minorStatus
+    if attrDict:
+      # Do not update the LastUpdate time stamp if setting the Stalled status
+      result = jobDB.setJobAttributesBulk( dict( [ ( jobID, attrDict ) for jobID in jobIDs ] ),
+                                           update = status != 'Stalled' )
+      if not result['OK']:
+        return result
+
+    if status in JOB_FINAL_STATES:
+      result = jobDB.setEndExecTimeBulk( dict.fromkeys( jobIDs ) )
+      if not result['OK']:
+        return result
+    if status == 'Running' and minorStatus == 'Application':
+      result = jobDB.setStartExecTimeBulk( dict.fromkeys( jobIDs ) )
+      if not result['OK']:
+        return result
+
+    result = jobDB.getAttributesForJobList( jobIDs, ['Status', 'MinorStatus'] )
+    if not result['OK']:
+      return result
+    attrsDict = result['Value']
+    recordList = [ ( jobID, attrs['Status'], attrs['MinorStatus'], 'idem', datetime, source )
+                   for jobID, attrs in attrsDict.items() ]
+    result = logDB.addLoggingRecordsBulk( recordList )
+    if not result['OK']:
+      return result
+
+    missing = [ jobID for jobID in jobIDs if jobID not in attrsDict ]
+    if missing:
+      return S_ERROR( 'Jobs %s do not exist' % ', '.join( [ str( jobID ) for jobID in sorted( missing ) ] ) )
     return S_OK()
 
   def __setJobStatus( self, jobID, status, minorStatus, source, datetime ):
@@ -118,7 +260,28 @@ class JobStateUpdateHandler( RequestHandler ):
         logging information in the JobLoggingDB. The statusDict has datetime
         as a key and status information dictionary as values
     """
+    result = self.__setJobsStatusBulk( { int( jobID ) : statusDict } )
+    if not result['OK']:
+      return result
+    if result['Value']['Failed']:
+      return S_ERROR( result['Value']['Failed'].values()[0] )
+    return S_OK()
+
+  ###########################################################################
+  types_setJobsStatusBulk = [DictType]
+  def export_setJobsStatusBulk( self, jobStatusDict ):
+    """ Bulk version of setJobStatusBulk for many jobs, jobStatusDict being
+        { jobID : { datetime : statusDict } }.
+        Returns S_OK( { 'Successful' : [ jobID ], 'Failed' : { jobID : reason } } )
+    """
+    return self.__setJobsStatusBulk( dict( [ ( int( jobID ), statusDict )
+                                             for jobID, statusDict in jobStatusDict.items() ] ) )
 
+  @staticmethod
+  def __getJobStatusUpdate( statusDict, currentStatus ):
+    """ Get the final attributes, start and end execution dates and the logging
+        records of a job from its statusDict
+    """
     dates = statusDict.keys()
     dates.sort()
     status = ""
@@ -129,16 +292,7 @@ class JobStateUpdateHandler( RequestHandler ):
     startDate = ''
     startFlag = ''
 
-    result = jobDB.getJobAttributes( int( jobID ), ['Status'] )
-    if not result['OK']:
-      return result
-
-    if not result['Value']:
-      # if there is no matching Job it returns an empty dictionary
-      return S_ERROR( 'No Matching Job' )
-
-    new_status = result['Value']['Status']
-    if new_status == "Stalled":
+    if currentStatus == "Stalled":
       status = 'Running'
 
     # Get the last status values
@@ -157,32 +311,19 @@ class JobStateUpdateHandler( RequestHandler ):
         application = statusDict[date]['ApplicationStatus']
       if 'ApplicationCounter' in statusDict[date] and statusDict[date]['ApplicationCounter']:
         appCounter = statusDict[date]['ApplicationCounter']
-    attrNames = []
-    attrValues = []
+    attrDict = {}
     if status:
-      attrNames.append( 'Status' )
-      attrValues.append( status )
+      attrDict['Status'] = status
     if minor:
-      attrNames.append( 'MinorStatus' )
-      attrValues.append( minor )
+      attrDict['MinorStatus'] = minor
     if application:
-      attrNames.append( 'ApplicationStatus' )
-      attrValues.append( application )
+      attrDict['ApplicationStatus'] = application
     if appCounter:
-      attrNames.append( 'ApplicationCounter' )
-      attrValues.append( appCounter )
-    result = jobDB.setJobAttributes( int( jobID ), attrNames, attrValues, update = True )
-    if not result['OK']:
-      return result
-
-    if endDate:
-      result = jobDB.setEndExecTime( int( jobID ), endDate )
-    if startDate:
-      result = jobDB.setStartExecTime( int( jobID ), startDate )
-
-    # Update the JobLoggingDB records
-    for date, sDict in statusDict.items():
+      attrDict['ApplicationNumStatus'] = appCounter
 
+    records = []
+    for date in dates:
+      sDict = statusDict[date]
       status = sDict['Status']
       if not status:
         status = 'idem'
@@ -195,12 +336,59 @@ class JobStateUpdateHandler( RequestHandler ):
       else:
         status = "Running"
         minor = "Application"
-      source = sDict['Source']
-      result = logDB.addLoggingRecord( int( jobID ), status, minor, application, date, source )
+      records.append( ( status, minor, application, date, sDict['Source'] ) )
+
+    return attrDict, startDate, endDate, records
+
+  def __setJobsStatusBulk( self, jobStatusDict ):
+    """ Apply the status updates of many jobs: the final attributes of all the jobs
+        are computed first, then written with grouped UPDATE ... CASE statements and
+        all the logging records are written with multi-row inserts
+    """
+    jobIDs = jobStatusDict.keys()
+    result = jobDB.getAttributesForJobList( jobIDs, ['Status'] )
+    if not result['OK']:
+      return result
+    currentDict = result['Value']
+
+    failed = {}
+    jobAttrDict = {}
+    startDict = {}
+    endDict = {}
+    recordList = []
+    for jobID in jobIDs:
+      if jobID not in currentDict:
+        # no matching job
+        failed[jobID] = 'No Matching Job'
+        continue
+      attrDict, startDate, endDate, records = self.__getJobStatusUpdate( jobStatusDict[jobID],
+                                                                         currentDict[jobID]['Status'] )
+      jobAttrDict[jobID] = attrDict
+      if startDate:
+        startDict[jobID] = startDate
+      if endDate:
+        endDict[jobID] = endDate
+      recordList += [ ( jobID, ) + record for record in records ]
+
+    result = jobDB.setJobAttributesBulk( jobAttrDict, update = True )
+    if not result['OK']:
+      return result
+
+    if endDict:
+      result = jobDB.setEndExecTimeBulk( endDict )
+      if not result['OK']:
+        return result
+    if startDict:
+      result = jobDB.setStartExecTimeBulk( startDict )
       if not result['OK']:
         return result
 
-    return S_OK()
+    # Update the JobLoggingDB records
+    result = logDB.addLoggingRecordsBulk( recordList )
+    if not result['OK']:
+      return result
+
+    return S_OK( { 'Successful' : sorted( jobAttrDict ), 'Failed' : failed } )
 
   ###########################################################################
   types_setJobSite = [[StringType, IntType, LongType], StringType]
@@ -293,6 +481,9 @@ class JobStateUpdateHandler( RequestHandler ):
     """ Send a heart beat sign of life for a job jobID
     """
 
+    if heartBeatBuffer:
+      return S_OK( heartBeatBuffer.addHeartBeat( int( jobID ), staticData, dynamicData ) )
+
     result = jobDB.setHeartBeatData( int( jobID ), staticData, dynamicData )
     if not result['OK']:
       gLogger.warn( 'Failed to set the heart beat data for job %d ' % int( jobID ) )
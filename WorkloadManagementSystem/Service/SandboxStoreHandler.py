@@ -22,6 +22,10 @@ from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.Client.File import File
 from DIRAC.Resources.Storage.StorageElement import StorageElement
 from DIRAC.Core.Security import Properties
+from DIRAC.Core.Utilities import DEncode
+from DIRAC.WorkloadManagementSystem.private.SandboxChunkStore import SandboxChunkStore, checkChunkList, \
+                                                                     checkManifest, getManifestChunks, \
+                                                                     getManifestHash, getManifestSize
 # from DIRAC.Core.Utilities import List
 
 sandboxDB = False
@@ -50,6 +54,11 @@ class SandboxStoreHandler( RequestHandler ):
       self.__useLocalStorage = False
       self.__externalSEName = self.__backend
       self.__seNameToUse = self.__backend
+    # Content addressed chunks of the sandboxes uploaded with a manifest
+    self.__chunkStore = False
+    if self.__useLocalStorage:
+      chunksPath = self.getCSOption( "ChunksPath", self.__sbToHDPath( "Chunks" ) )
+      self.__chunkStore = SandboxChunkStore( chunksPath )
     # Execute the purge once every 100 calls
     SandboxStoreHandler.__purgeCount += 1
     if SandboxStoreHandler.__purgeCount > self.getCSOption( "QueriesBeforePurge", 1000 ):
@@ -81,6 +90,8 @@ class SandboxStoreHandler( RequestHandler ):
       return S_ERROR( "Sandbox is too big. Please upload it to a grid storage element" )
 
     if type( fileId ) in ( types.ListType, types.TupleType ):
+      if len( fileId ) > 1 and fileId[0] == "Chunks":
+        return self.__receiveChunks( fileId[1], fileHelper )
       if len( fileId ) > 1:
         assignTo = fileId[1]
         fileId = fileId[0]
@@ -156,6 +167,106 @@ class SandboxStoreHandler( RequestHandler ):
       return result
     return S_OK( sbURL )
 
+  ##################
+  # Chunked sandboxes
+
+  types_getMissingChunks = [ ( types.ListType, types.TupleType ) ]
+  def export_getMissingChunks( self, chunkList ):
+    """
+    Get the chunks of the list ( [ ( sha1, size ), ... ] ) which are not stored yet
+    """
+    if not self.__chunkStore:
+      return S_ERROR( "Chunked sandboxes are only supported with the local backend" )
+    result = checkChunkList( chunkList )
+    if not result[ 'OK' ]:
+      return result
+    missing = self.__chunkStore.getMissingChunks( chunkList )
+    missingBytes = sum( [ size for _chunkHash, size in missing ] )
+    if self.__maxUploadBytes and missingBytes > self.__maxUploadBytes:
+      return S_ERROR( "Sandbox is too big. Please upload it to a grid storage element" )
+    return S_OK( missing )
+
+  def __receiveChunks( self, chunkList, fileHelper ):
+    """
+    Receive the chunks of the list sent one after the other
+    """
+    result = checkChunkList( chunkList )
+    if result[ 'OK' ] and not self.__chunkStore:
+      result = S_ERROR( "Chunked sandboxes are only supported with the local backend" )
+    if not result[ 'OK' ]:
+      fileHelper.markAsTransferred()
+      return result
+    totalBytes = sum( [ size for _chunkHash, size in chunkList ] )
+    if self.__maxUploadBytes and totalBytes > self.__maxUploadBytes:
+      fileHelper.markAsTransferred()
+      return S_ERROR( "Sandbox is too big. Please upload it to a grid storage element" )
+    gLogger.info( "Receiving %s sandbox chunks (%s bytes)" % ( len( chunkList ), totalBytes ) )
+    chunkSink = self.__chunkStore.getChunkSink( chunkList )
+    # The sink refuses any data beyond the declared chunks
+    result = fileHelper.networkToDataSink( chunkSink )
+    closeResult = chunkSink.close()
+    if not result[ 'OK' ]:
+      gLogger.error( "Error while receiving chunks: %s" % result[ 'Message' ] )
+      return result
+    return closeResult
+
+  types_commitSandboxManifest = [ types.DictType, types.DictType ]
+  def export_commitSandboxManifest( self, manifest, assignTo ):
+    """
+    Register a sandbox described by a manifest whose chunks have all been uploaded
+    and assign it to the entities, returns the sandbox URL
+    """
+    if not self.__chunkStore:
+      return S_ERROR( "Chunked sandboxes are only supported with the local backend" )
+    result = checkManifest( manifest )
+    if not result[ 'OK' ]:
+      return result
+    missing = self.__chunkStore.getMissingChunks( getManifestChunks( manifest ) )
+    if missing:
+      return S_ERROR( "%s chunks of the sandbox are missing" % len( missing ) )
+
+    credDict = self.getRemoteCredentials()
+    sbPath = self.__getSandboxPath( "%s.manifest" % getManifestHash( manifest ) )
+    sbURL = "SB:%s|%s" % ( self.__localSEName, sbPath )
+    result = sandboxDB.getSandboxId( self.__localSEName, sbPath, credDict[ 'username' ], credDict[ 'group' ] )
+    if result[ 'OK' ]:
+      gLogger.info( "Sandbox already exists", sbURL )
+    else:
+      hdPath = self.__sbToHDPath( sbPath )
+      try:
+        if not os.path.isdir( os.path.dirname( hdPath ) ):
+          os.makedirs( os.path.dirname( hdPath ) )
+        fd = open( hdPath, "wb" )
+        fd.write( DEncode.encode( manifest ) )
+        fd.close()
+      except Exception, e:
+        return S_ERROR( "Cannot write sandbox manifest: %s" % str( e ) )
+      gLogger.info( "Registering sandbox in the DB with", sbURL )
+      result = sandboxDB.registerAndGetSandbox( credDict[ 'username' ], credDict[ 'DN' ], credDict[ 'group' ],
+                                                self.__localSEName, sbPath, getManifestSize( manifest ) )
+      if not result[ 'OK' ]:
+        self.__secureUnlinkFile( hdPath )
+        return result
+
+    assignTo = dict( [ ( key, [ ( sbURL, assignTo[ key ] ) ] ) for key in assignTo ] )
+    result = self.export_assignSandboxesToEntities( assignTo )
+    if not result[ 'OK' ]:
+      return result
+    return S_OK( sbURL )
+
+  def __readManifest( self, hdPath ):
+    """
+    Read a manifest stored in the local backend
+    """
+    try:
+      fd = open( hdPath, "rb" )
+      try:
+        return S_OK( DEncode.decode( fd.read() )[0] )
+      finally:
+        fd.close()
+    except Exception, e:
+      return S_ERROR( "Cannot read sandbox manifest %s: %s" % ( hdPath, str( e ) ) )
+
   def transfer_bulkFromClient( self, fileId, token, fileSize, fileHelper ):
     """ Receive files packed into a tar archive by the fileHelper logic.
         token is used for access rights confirmation.
@@ -375,6 +486,14 @@ class SandboxStoreHandler( RequestHandler ):
     hdPath = self.__sbToHDPath( fileID )
     if not os.path.isfile( hdPath ):
       return S_ERROR( "Sandbox does not exist" )
+    if fileID.endswith( ".manifest" ):
+      # Chunked sandbox, the tar archive is assembled while it is sent
+      if not self.__chunkStore:
+        return S_ERROR( "Chunked sandboxes are only supported with the local backend" )
+      result = self.__readManifest( hdPath )
+      if not result[ 'OK' ]:
+        return result
+      return fileHelper.DataSourceToNetwork( self.__chunkStore.getTarSource( result[ 'Value' ] ) )
     result = fileHelper.getFileDescriptor( hdPath, 'rb' )
     if not result[ 'OK' ]:
       return S_ERROR( 'Failed to get file descriptor: %s' % result[ 'Message' ] )
@@ -410,9 +529,38 @@ class SandboxStoreHandler( RequestHandler ):
     for sbId, SEName, SEPFN in sbList:
       self.__purgeSandbox( sbId, SEName, SEPFN )
 
+    if self.__chunkStore:
+      self.__purgeChunks()
+
     SandboxStoreHandler.__purgeWorking = False
     return S_OK()
 
+  def __purgeChunks( self ):
+    """
+    Delete the chunks which are not referenced by any manifest any more
+    """
+    referencedChunks = set()
+    basePath = self.__sbToHDPath( "" )
+    chunksPath = os.path.realpath( self.__chunkStore.chunksPath )
+    for dirPath, dirNames, fileNames in os.walk( basePath ):
+      if os.path.realpath( dirPath ) == chunksPath:
+        del dirNames[:]
+        continue
+      for fileName in fileNames:
+        if not fileName.endswith( ".manifest" ):
+          continue
+        result = self.__readManifest( os.path.join( dirPath, fileName ) )
+        if not result[ 'OK' ]:
+          # Do not risk deleting chunks of a sandbox that can not be read
+          gLogger.error( "Skipping chunk purge", result[ 'Message' ] )
+          return result
+        referencedChunks.update( [ chunkHash for chunkHash, _size in getManifestChunks( result[ 'Value' ] ) ] )
+    graceTime = self.getCSOption( "ChunksGraceTime", 86400 )
+    result = self.__chunkStore.purgeChunks( referencedChunks, graceTime )
+    if result[ 'OK' ]:
+      gLogger.info( "Purged %s unreferenced sandbox chunks" % result[ 'Value' ] )
+    return result
+
   def __purgeSandbox( self, sbId, SEName, SEPFN ):
     result = self.__deleteSandboxFromBackend( SEName, SEPFN )
     if not result[ 'OK' ]:
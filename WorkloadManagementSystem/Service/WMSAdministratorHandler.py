@@ -19,12 +19,12 @@ __RCSID__ = "$Id$"
 from types import DictType, ListType, IntType, LongType, StringTypes, FloatType
 
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
-from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC import gLogger, gConfig, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient       import gProxyManager
 from DIRAC.WorkloadManagementSystem.DB.PilotAgentsDB import PilotAgentsDB
 from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB
-from DIRAC.WorkloadManagementSystem.Service.WMSUtilities import getPilotLoggingInfo, getPilotOutput
+from DIRAC.WorkloadManagementSystem.Service.WMSUtilities import getPilotLoggingInfo, getPilotOutput, getCachedSummary
 from DIRAC.Resources.Computing.ComputingElementFactory import ComputingElementFactory
 import DIRAC.Core.Utilities.Time as Time
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getGroupOption
@@ -37,6 +37,10 @@ taskQueueDB = False
 
 FINAL_STATES = ['Done','Aborted','Cleared','Deleted','Stalled']
 
+# Validity in seconds of the cached site and user summaries
+SUMMARY_CACHE_TIME = 30
+summaryCacheTime = SUMMARY_CACHE_TIME
+
 def initializeWMSAdministratorHandler( serviceInfo ):
   """  WMS AdministratorService initialization
   """
@@ -44,10 +48,13 @@ def initializeWMSAdministratorHandler( serviceInfo ):
   global jobDB
   global pilotDB
   global taskQueueDB
+  global summaryCacheTime
 
   jobDB = JobDB()
   pilotDB = PilotAgentsDB()
   taskQueueDB = TaskQueueDB()
+  summaryCacheTime = gConfig.getValue( '%s/SummaryCacheTime' % serviceInfo['serviceSectionPath'],
+                                       SUMMARY_CACHE_TIME )
   return S_OK()
 
 class WMSAdministratorHandler(RequestHandler):
@@ -315,7 +322,7 @@ class WMSAdministratorHandler(RequestHandler):
         pilot monitor in a generic format
     """
 
-    result = jobDB.getUserSummaryWeb(selectDict, sortList, startItem, maxItems)
+    result = getCachedSummary( summaryCacheTime, jobDB.getUserSummaryWeb, selectDict, sortList, startItem, maxItems )
     return result
 
   ##############################################################################
@@ -324,7 +331,7 @@ class WMSAdministratorHandler(RequestHandler):
     """ Get the summary of the jobs running on sites in a generic format
     """
 
-    result = jobDB.getSiteSummaryWeb(selectDict, sortList, startItem, maxItems)
+    result = getCachedSummary( summaryCacheTime, jobDB.getSiteSummaryWeb, selectDict, sortList, startItem, maxItems )
     return result
 
   ##############################################################################
@@ -480,7 +487,7 @@ class WMSAdministratorHandler(RequestHandler):
     return result
 
   ##########################################################################################
-  types_setAccountingFlag = [StringTypes]
+  types_setAccountingFlag = [ list(StringTypes)+[ListType] ]
   def export_setAccountingFlag(self,pilotRef,mark='True'):
     """ Set the pilot AccountingSent flag
     """
@@ -497,6 +504,22 @@ class WMSAdministratorHandler(RequestHandler):
                                     statusReason=reason,gridSite=gridSite,queue=queue)
     return result
 
+  ##########################################################################################
+  types_setPilotStatusBulk = [ DictType ]
+  def export_setPilotStatusBulk(self,pilotStatusDict,reason=None):
+    """ Set the status of many pilots given as { pilotRef : status or values dict }
+    """
+
+    return pilotDB.setPilotStatusBulk(pilotStatusDict,statusReason=reason)
+
+  ##########################################################################################
+  types_selectPilotsInfo = [ DictType ]
+  def export_selectPilotsInfo(self,condDict, older=None, newer=None, timeStamp='SubmissionTime'):
+    """ Get the info of the pilots matching the selection conditions
+    """
+
+    return pilotDB.selectPilotsInfo(condDict, older, newer, timeStamp )
+
   ##########################################################################################
   types_countPilots = [ DictType ]
   def export_countPilots(self,condDict, older=None, newer=None, timeStamp='SubmissionTime'):
@@ -9,7 +9,9 @@ __RCSID__ = "$Id$"
 
 from tempfile import mkdtemp
 import shutil, os
+from types import DictType, ListType, TupleType
 from DIRAC.Core.Utilities.Grid import executeGridCommand
+from DIRAC.Core.Utilities.DictCache import DictCache
 from DIRAC.Resources.Computing.ComputingElementFactory     import ComputingElementFactory
 
 from DIRAC import S_OK, S_ERROR, gConfig
@@ -19,8 +21,39 @@ from DIRAC import S_OK, S_ERROR, gConfig
 outputSandboxFiles = [ 'StdOut', 'StdErr', 'std.out', 'std.err' ]
 
 COMMAND_TIMEOUT = 60
+
+# Results of the job summary queries done by the monitoring services
+gSummaryCache = DictCache()
 ###########################################################################
 
+def _getCacheKey( value ):
+  """ Hashable representation of the arguments of a cached call
+  """
+  if type( value ) == DictType:
+    return tuple( [ ( _getCacheKey( key ), _getCacheKey( item ) ) for key, item in sorted( value.items() ) ] )
+  if type( value ) in ( ListType, TupleType ):
+    return tuple( [ _getCacheKey( item ) for item in value ] )
+  return value
+
+def getCachedSummary( cacheTime, method, *args ):
+  """ Get the result of method( *args ) from the summary cache if it was evaluated less
+      than cacheTime seconds ago, evaluate it and cache it if successful otherwise.
+      The expired entries are purged on each miss, the keys including the selection
+      arguments. The cached results are shared, they must not be modified by the callers
+  """
+  if cacheTime <= 0:
+    return method( *args )
+  cacheKey = ( method.__name__, _getCacheKey( args ) )
+  result = gSummaryCache.get( cacheKey )
+  if result:
+    return result
+  gSummaryCache.purgeExpired()
+  result = method( *args )
+  if result['OK']:
+    gSummaryCache.add( cacheKey, cacheTime, result )
+  return result
+
+
 def getGridEnv():
 
   gridEnv = ''
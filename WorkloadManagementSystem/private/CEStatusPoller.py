@@ -0,0 +1,189 @@
+########################################################################
+# $HeadURL$
+# File :    CEStatusPoller.py
+########################################################################
+""" Concurrent polling of Computing Elements with a time budget per CE and a
+    circuit breaker for the unresponsive ones.
+
+    Each CE is polled by calling its task in one of maxThreads worker threads.
+    A task running for more than timeBudget seconds is given up: its result is
+    reported as a timeout and its thread replaced, so that a hung CE does not hold
+    the other ones. A CE whose task failed or timed out failureThreshold times in
+    a row is not polled for coolDown seconds, nor while its last task is still
+    running. After the cool down a single poll is tried again, its success
+    closing the circuit::
+
+      poller = CEStatusPoller( maxThreads = 10, timeBudget = 120 )
+      results = poller.poll( { ceName : ( function, args ) } )
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import threading
+import Queue
+
+from DIRAC import S_ERROR, gLogger
+
+class CEStatusPoller( object ):
+  """ Thread based poller of CEs keeping the circuit breaker state between polls
+  """
+
+  def __init__( self, maxThreads = 10, timeBudget = 120, failureThreshold = 3, coolDown = 600 ):
+    """ c'tor
+
+    :param int maxThreads: number of CEs polled at the same time
+    :param float timeBudget: seconds a CE task can run before being given up
+    :param int failureThreshold: consecutive failures opening the circuit of a CE
+    :param float coolDown: seconds a CE is not polled once its circuit is open
+    """
+    self.log = gLogger.getSubLogger( 'CEStatusPoller' )
+    self.maxThreads = max( 1, int( maxThreads ) )
+    self.timeBudget = timeBudget
+    self.failureThreshold = max( 1, int( failureThreshold ) )
+    self.coolDown = coolDown
+    self.__condition = threading.Condition()
+    # ceName -> [ consecutive failures, time until the circuit is open ]
+    self.__breakers = {}
+    # CEs with a task still running, possibly from a previous poll
+    self.__busy = set()
+
+  def isAvailable( self, ceName ):
+    """ Whether ceName can be polled: its circuit is closed or its cool down is over,
+        and it is not still busy with a previous task
+    """
+    self.__condition.acquire()
+    try:
+      return self.__isAvailable( ceName, time.time() )
+    finally:
+      self.__condition.release()
+
+  def __isAvailable( self, ceName, now ):
+    if ceName in self.__busy:
+      return False
+    _failures, openUntil = self.__breakers.get( ceName, ( 0, 0 ) )
+    return openUntil <= now
+
+  def getOpenCircuits( self ):
+    """ { ceName : seconds before it is polled again } for the CEs not being polled
+    """
+    self.__condition.acquire()
+    try:
+      now = time.time()
+      return dict( [ ( ceName, openUntil - now ) for ceName, ( _failures, openUntil ) in self.__breakers.items()
+                     if openUntil > now ] )
+    finally:
+      self.__condition.release()
+
+  def __recordResult( self, ceName, ok ):
+    """ Update the circuit breaker of the CE, must be called with the lock acquired
+    """
+    if ok:
+      self.__breakers.pop( ceName, None )
+      return
+    failures = self.__breakers.get( ceName, ( 0, 0 ) )[0] + 1
+    openUntil = 0
+    if failures >= self.failureThreshold:
+      openUntil = time.time() + self.coolDown
+      self.log.warn( "CE %s failed %d times in a row, not polled for %s seconds" % ( ceName, failures,
+                                                                                     self.coolDown ) )
+    self.__breakers[ ceName ] = ( failures, openUntil )
+
+  def poll( self, ceTasks ):
+    """ Run the tasks of the CEs concurrently
+
+    :param dict ceTasks: { ceName : ( function, args ) }, function returning S_OK/S_ERROR
+    :return: { ceName : result } for every CE, S_ERROR for the CEs skipped or timed out
+    """
+    results = {}
+    pending = Queue.Queue()
+    now = time.time()
+    self.__condition.acquire()
+    try:
+      for ceName in ceTasks:
+        if self.__isAvailable( ceName, now ):
+          pending.put( ceName )
+        elif ceName in self.__busy:
+          results[ ceName ] = S_ERROR( "CE %s is still busy with its previous poll" % ceName )
+        else:
+          results[ ceName ] = S_ERROR( "CE %s is not polled after %d failures" % ( ceName,
+                                                                                  self.__breakers[ ceName ][0] ) )
+    finally:
+      self.__condition.release()
+
+    toPoll = pending.qsize()
+    if not toPoll:
+      return results
+    started = {}
+    timedOut = set()
+    workers = [ 0 ]
+
+    def worker():
+      while True:
+        try:
+          ceName = pending.get_nowait()
+        except Queue.Empty:
+          break
+        self.__condition.acquire()
+        self.__busy.add( ceName )
+        started[ ceName ] = time.time()
+        self.__condition.release()
+
+        function, args = ceTasks[ ceName ]
+        try:
+          result = function( *args )
+        except Exception, x:
+          self.log.exception( "Exception while polling CE %s" % ceName, lException = x )
+          result = S_ERROR( "Exception while polling CE %s: %s" % ( ceName, str( x ) ) )
+
+        self.__condition.acquire()
+        try:
+          self.__busy.discard( ceName )
+          started.pop( ceName, None )
+          if ceName in timedOut:
+            # This thread was replaced, its late result is dropped
+            self.log.verbose( "CE %s answered after its time budget" % ceName )
+            return
+          results[ ceName ] = result
+          self.__recordResult( ceName, result[ 'OK' ] )
+          self.__condition.notify()
+        finally:
+          self.__condition.release()
+      self.__condition.acquire()
+      workers[0] -= 1
+      self.__condition.notify()
+      self.__condition.release()
+
+    def startWorkers():
+      while workers[0] < min( self.maxThreads, pending.qsize() ):
+        workers[0] += 1
+        thread = threading.Thread( target = worker )
+        thread.setDaemon( True )
+        thread.start()
+
+    self.__condition.acquire()
+    try:
+      startWorkers()
+      while len( results ) < len( ceTasks ):
+        now = time.time()
+        for ceName, startTime in started.items():
+          if now - startTime > self.timeBudget:
+            self.log.warn( "CE %s did not answer within %s seconds" % ( ceName, self.timeBudget ) )
+            started.pop( ceName )
+            timedOut.add( ceName )
+            results[ ceName ] = S_ERROR( "Timeout polling CE %s" % ceName )
+            self.__recordResult( ceName, False )
+            # The thread is lost while the CE hangs, another one takes its place
+            workers[0] -= 1
+        startWorkers()
+        if len( results ) < len( ceTasks ):
+          if started:
+            wait = max( 0.01, min( started.values() ) + self.timeBudget - now )
+          else:
+            wait = 1
+          self.__condition.wait( min( wait, 1 ) )
+    finally:
+      self.__condition.release()
+
+    self.log.verbose( "%d CEs polled, %d timed out" % ( toPoll, len( timedOut ) ) )
+    return results
@@ -0,0 +1,346 @@
+########################################################################
+# $HeadURL$
+# File :    SandboxChunkStore.py
+########################################################################
+""" Content addressed storage of sandbox chunks.
+
+    Instead of a tarball, a chunked sandbox is described by a manifest listing
+    the files it contains, each file being split in chunks of at most ChunkSize
+    bytes identified by the sha1 of their content::
+
+      { 'ChunkSize' : 4194304,
+        'Files' : [ { 'Name' : 'lib/libFoo.so', 'Type' : 'File', 'Mode' : 0755, 'MTime' : 1380000000,
+                      'Size' : 5000000, 'Chunks' : [ ( sha1, 4194304 ), ( sha1, 805696 ) ] },
+                    { 'Name' : 'lib', 'Type' : 'Dir', 'Mode' : 0755, 'MTime' : 1380000000 } ] }
+
+    The client builds the manifest with buildManifest, asks the SandboxStore which
+    chunks it does not hold yet and only uploads those. The SandboxChunkStore keeps
+    the chunks under <ChunksPath>/<sha1[:2]>/<sha1> and assembles the tar archive
+    of a manifest on the fly when the sandbox is downloaded.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import re
+import time
+import tarfile
+
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import sha as sha1
+
+from DIRAC import S_OK, S_ERROR, gLogger
+
+# Default maximum size of a chunk
+CHUNK_SIZE = 4 * 1048576
+
+_chunkHashRE = re.compile( "^[0-9a-f]{40}$" )
+
+def buildManifest( fileList, chunkSize = CHUNK_SIZE ):
+  """ Builds the manifest of the files and directories (recursively) of the list,
+      entries are named relative to the parent directory of each element as when
+      adding them to a tar archive. Returns S_OK( ( manifest, chunkLocations ) ) with
+      chunkLocations = { sha1 : ( localPath, offset, size ) } used to upload the chunks.
+      Symbolic links in the list keep their own name, their target being read
+  """
+  entries = []
+  chunkLocations = {}
+  try:
+    for topPath in fileList:
+      topName = os.path.basename( os.path.normpath( topPath ) )
+      topPath = os.path.realpath( topPath )
+      if not os.path.isdir( topPath ):
+        entries.append( _fileEntry( topPath, topName, chunkSize, chunkLocations ) )
+        continue
+      entries.append( _dirEntry( topPath, topName ) )
+      for dirPath, dirNames, fileNames in os.walk( topPath ):
+        dirNames.sort()
+        relPath = os.path.join( topName, os.path.relpath( dirPath, topPath ) )
+        for dirName in dirNames:
+          entries.append( _dirEntry( os.path.join( dirPath, dirName ),
+                                     os.path.normpath( os.path.join( relPath, dirName ) ) ) )
+        for fileName in sorted( fileNames ):
+          filePath = os.path.join( dirPath, fileName )
+          if os.path.isfile( filePath ):
+            entries.append( _fileEntry( filePath, os.path.normpath( os.path.join( relPath, fileName ) ),
+                                        chunkSize, chunkLocations ) )
+  except ( IOError, OSError ), x:
+    return S_ERROR( 'Cannot build the sandbox manifest: %s' % str( x ) )
+  return S_OK( ( { 'ChunkSize' : chunkSize, 'Files' : entries }, chunkLocations ) )
+
+def _dirEntry( path, name ):
+  """ Manifest entry of a directory
+  """
+  dirStat = os.stat( path )
+  return { 'Name' : name, 'Type' : 'Dir', 'Mode' : dirStat.st_mode & 07777, 'MTime' : int( dirStat.st_mtime ) }
+
+def _fileEntry( path, name, chunkSize, chunkLocations ):
+  """ Manifest entry of a file, the chunk locations are added to chunkLocations
+  """
+  fileStat = os.stat( path )
+  chunks = []
+  offset = 0
+  fd = open( path, 'rb' )
+  try:
+    data = fd.read( chunkSize )
+    while data:
+      chunkHash = sha1( data ).hexdigest()
+      chunks.append( ( chunkHash, len( data ) ) )
+      chunkLocations.setdefault( chunkHash, ( path, offset, len( data ) ) )
+      offset += len( data )
+      data = fd.read( chunkSize )
+  finally:
+    fd.close()
+  return { 'Name' : name, 'Type' : 'File', 'Mode' : fileStat.st_mode & 07777, 'MTime' : int( fileStat.st_mtime ),
+           'Size' : offset, 'Chunks' : chunks }
+
+def checkChunkList( chunkList ):
+  """ Checks a list of ( sha1, size ) received from a client, the hashes being used as file names
+  """
+  try:
+    for chunkHash, size in chunkList:
+      if not _chunkHashRE.match( chunkHash ) or int( size ) < 0:
+        return S_ERROR( 'Invalid chunk %s' % chunkHash )
+  except ( TypeError, ValueError ), x:
+    return S_ERROR( 'Malformed chunk list: %s' % str( x ) )
+  return S_OK()
+
+def getManifestChunks( manifest ):
+  """ Returns the list of ( sha1, size ) of the chunks of the manifest, without duplicates
+  """
+  chunks = []
+  seen = set()
+  for entry in manifest[ 'Files' ]:
+    for chunkHash, size in entry.get( 'Chunks', [] ):
+      if chunkHash not in seen:
+        seen.add( chunkHash )
+        chunks.append( ( chunkHash, size ) )
+  return chunks
+
+def getManifestHash( manifest ):
+  """ Content hash of the manifest, independent of the encoding of the dictionaries
+  """
+  oHash = sha1()
+  for entry in manifest[ 'Files' ]:
+    oHash.update( '%s\0%s\0%o\0%s\0' % ( entry[ 'Name' ], entry[ 'Type' ], entry[ 'Mode' ], entry[ 'MTime' ] ) )
+    for chunkHash, size in entry.get( 'Chunks', [] ):
+      oHash.update( '%s:%s\0' % ( chunkHash, size ) )
+  return oHash.hexdigest()
+
+def getManifestSize( manifest ):
+  """ Total size of the files of the manifest
+  """
+  return sum( [ entry.get( 'Size', 0 ) for entry in manifest[ 'Files' ] ] )
+
+def checkManifest( manifest ):
+  """ Checks the structure of a manifest received from a client and that its
+      names stay within the sandbox
+  """
+  try:
+    for entry in manifest[ 'Files' ]:
+      name = entry[ 'Name' ]
+      if not name or os.path.isabs( name ) or os.path.normpath( name ).split( os.sep )[0] == '..':
+        return S_ERROR( 'Invalid name in the sandbox manifest: %s' % name )
+      if entry[ 'Type' ] not in ( 'File', 'Dir' ):
+        return S_ERROR( 'Invalid entry type in the sandbox manifest: %s' % entry[ 'Type' ] )
+      int( entry[ 'Mode' ] )
+      int( entry[ 'MTime' ] )
+      if entry[ 'Type' ] == 'File':
+        result = checkChunkList( entry[ 'Chunks' ] )
+        if not result[ 'OK' ]:
+          return result
+        if sum( [ int( size ) for _chunkHash, size in entry[ 'Chunks' ] ] ) != entry[ 'Size' ]:
+          return S_ERROR( 'Inconsistent size in the sandbox manifest for %s' % name )
+  except ( KeyError, TypeError, ValueError ), x:
+    return S_ERROR( 'Malformed sandbox manifest: %s' % str( x ) )
+  return S_OK()
+
+class SandboxChunkStore:
+  """
+   Local directory holding the chunks of the sandboxes
+  """
+
+  def __init__( self, chunksPath ):
+    self.chunksPath = chunksPath
+    self.log = gLogger.getSubLogger( 'SandboxChunkStore' )
+
+  def getChunkPath( self, chunkHash ):
+    """ Path of the chunk in the store
+    """
+    return os.path.join( self.chunksPath, chunkHash[:2], chunkHash )
+
+  def getMissingChunks( self, chunkList ):
+    """ Returns the ( sha1, size ) of the list that are not in the store. The chunks
+        already stored are touched so that they are not purged before being used
+    """
+    missing = []
+    for chunkHash, size in chunkList:
+      chunkPath = self.getChunkPath( chunkHash )
+      try:
+        os.utime( chunkPath, None )
+      except OSError:
+        missing.append( ( chunkHash, size ) )
+    return missing
+
+  def getChunkSink( self, chunkList ):
+    """ Returns a data sink storing the chunks of the list, sent one after the other
+    """
+    return ChunkSink( self, chunkList )
+
+  def getTarSource( self, manifest ):
+    """ Returns a data source reading the tar archive of the manifest
+    """
+    return ManifestTarSource( self, manifest )
+
+  def purgeChunks( self, referencedChunks, graceTime = 86400 ):
+    """ Removes the chunks not referenced by any manifest and not used in the last graceTime seconds
+    """
+    if not os.path.isdir( self.chunksPath ):
+      return S_OK( 0 )
+    limit = time.time() - graceTime
+    purged = 0
+    for subDir in os.listdir( self.chunksPath ):
+      dirPath = os.path.join( self.chunksPath, subDir )
+      if not os.path.isdir( dirPath ):
+        continue
+      for chunkName in os.listdir( dirPath ):
+        if chunkName in referencedChunks:
+          continue
+        chunkPath = os.path.join( dirPath, chunkName )
+        try:
+          if os.stat( chunkPath ).st_mtime < limit:
+            os.unlink( chunkPath )
+            purged += 1
+        except OSError, x:
+          self.log.warn( 'Cannot purge chunk', '%s: %s' % ( chunkPath, str( x ) ) )
+    return S_OK( purged )
+
+class ChunkSink:
+  """
+   Data sink splitting the received stream in chunks, checking and storing them
+  """
+
+  def __init__( self, chunkStore, chunkList ):
+    self.chunkStore = chunkStore
+    self.chunkList = list( chunkList )
+    self.current = None
+    self.errors = []
+
+  def __openChunk( self ):
+    chunkHash, size = self.chunkList.pop( 0 )
+    chunkPath = self.chunkStore.getChunkPath( chunkHash )
+    chunkDir = os.path.dirname( chunkPath )
+    if not os.path.isdir( chunkDir ):
+      try:
+        os.makedirs( chunkDir )
+      except OSError:
+        pass
+    tmpPath = '%s.%s.tmp' % ( chunkPath, os.getpid() )
+    self.current = { 'Hash' : chunkHash, 'Left' : size, 'Path' : chunkPath, 'TmpPath' : tmpPath,
+                     'File' : open( tmpPath, 'wb' ), 'Sha1' : sha1() }
+
+  def __closeChunk( self ):
+    current = self.current
+    self.current = None
+    current[ 'File' ].close()
+    if current[ 'Sha1' ].hexdigest() != current[ 'Hash' ]:
+      self.errors.append( current[ 'Hash' ] )
+      os.unlink( current[ 'TmpPath' ] )
+    else:
+      os.rename( current[ 'TmpPath' ], current[ 'Path' ] )
+
+  def write( self, data ):
+    """ Stores the data in the current chunk(s)
+    """
+    while data:
+      if not self.current:
+        if not self.chunkList:
+          raise IOError( 'More data received than declared chunks' )
+        self.__openChunk()
+      piece = data[:self.current[ 'Left' ]]
+      data = data[len( piece ):]
+      self.current[ 'File' ].write( piece )
+      self.current[ 'Sha1' ].update( piece )
+      self.current[ 'Left' ] -= len( piece )
+      if not self.current[ 'Left' ]:
+        self.__closeChunk()
+
+  def close( self ):
+    """ Finishes the reception, S_ERROR if not all the chunks were received correctly
+    """
+    if self.current:
+      self.current[ 'File' ].close()
+      os.unlink( self.current[ 'TmpPath' ] )
+      self.errors.append( self.current[ 'Hash' ] )
+      self.current = None
+    self.errors.extend( [ chunkHash for chunkHash, _size in self.chunkList ] )
+    self.chunkList = []
+    if self.errors:
+      return S_ERROR( '%s chunks were not received correctly' % len( self.errors ) )
+    return S_OK()
+
+class ManifestTarSource:
+  """
+   Data source generating the tar archive of a manifest from the stored chunks
+  """
+
+  def __init__( self, chunkStore, manifest ):
+    self.chunkStore = chunkStore
+    self.manifest = manifest
+    self.__generator = self.__generateTar()
+    self.__buffer = ''
+
+  def __generateTar( self ):
+    """ Yields the blocks of the tar archive
+    """
+    written = 0
+    for entry in self.manifest[ 'Files' ]:
+      tarInfo = tarfile.TarInfo( str( entry[ 'Name' ] ) )
+      tarInfo.mode = entry[ 'Mode' ]
+      tarInfo.mtime = entry[ 'MTime' ]
+      if entry[ 'Type' ] == 'Dir':
+        tarInfo.type = tarfile.DIRTYPE
+        tarInfo.size = 0
+      else:
+        tarInfo.type = tarfile.REGTYPE
+        tarInfo.size = entry[ 'Size' ]
+      header = tarInfo.tobuf( tarfile.GNU_FORMAT )
+      written += len( header )
+      yield header
+      if entry[ 'Type' ] != 'File':
+        continue
+      for chunkHash, _size in entry[ 'Chunks' ]:
+        fd = open( self.chunkStore.getChunkPath( chunkHash ), 'rb' )
+        try:
+          data = fd.read()
+        finally:
+          fd.close()
+        written += len( data )
+        yield data
+      remainder = entry[ 'Size' ] % tarfile.BLOCKSIZE
+      if remainder:
+        written += tarfile.BLOCKSIZE - remainder
+        yield tarfile.NUL * ( tarfile.BLOCKSIZE - remainder )
+    # End of archive, padded to a full record
+    end = tarfile.NUL * ( 2 * tarfile.BLOCKSIZE )
+    written += len( end )
+    remainder = written % tarfile.RECORDSIZE
+    if remainder:
+      end += tarfile.NUL * ( tarfile.RECORDSIZE - remainder )
+    yield end
+
+  def read( self, size ):
+    """ Returns up to size bytes of the archive, an empty string at the end
+    """
+    while len( self.__buffer ) < size:
+      try:
+        self.__buffer += self.__generator.next()
+      except StopIteration:
+        break
+    data = self.__buffer[:size]
+    self.__buffer = self.__buffer[size:]
+    return data
+
+#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#
@@ -0,0 +1,89 @@
+########################################################################
+# $HeadURL $
+# File: CEStatusPollerBenchmark.py
+########################################################################
+""" :mod: CEStatusPollerBenchmark
+    =============================
+
+    .. module: CEStatusPollerBenchmark
+    :synopsis: pilot status polling of mock CEs with injected latency
+
+    Polls nCEs mock CEs answering getJobStatus after a random delay of up to
+    maxLatency seconds, one in every tenth of them hanging, as the SiteDirector does
+    in each cycle. The CEs are polled serially, as before, and with the
+    CEStatusPoller for three cycles, the hung CEs being given up after their time
+    budget and then skipped once their circuit is open::
+
+      python CEStatusPollerBenchmark.py [nCEs [maxLatency [nThreads [timeBudget]]]]
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import sys
+import time
+import random
+import threading
+## SUT
+from DIRAC import S_OK, gLogger
+from DIRAC.WorkloadManagementSystem.private.CEStatusPoller import CEStatusPoller
+
+class MockCE( object ):
+  """ CE answering after a fixed latency, or never if hung """
+
+  def __init__( self, latency, hung = False, release = None ):
+    self.latency = latency
+    self.hung = hung
+    self.release = release
+
+  def getJobStatus( self, pilotRefs ):
+    if self.hung:
+      self.release.wait( 3600 )
+    else:
+      time.sleep( self.latency )
+    return S_OK( dict( [ ( pRef, 'Running' ) for pRef in pilotRefs ] ) )
+
+def timeIt( name, method, *args ):
+  """ print wall time of :method: """
+  start = time.time()
+  result = method( *args )
+  print "%-40s %8.2f s" % ( name, time.time() - start )
+  return result
+
+if __name__ == "__main__":
+  nCEs = int( sys.argv[1] ) if len( sys.argv ) > 1 else 200
+  maxLatency = float( sys.argv[2] ) if len( sys.argv ) > 2 else 0.5
+  nThreads = int( sys.argv[3] ) if len( sys.argv ) > 3 else 20
+  timeBudget = float( sys.argv[4] ) if len( sys.argv ) > 4 else 2 * maxLatency
+  gLogger.setLevel( "ERROR" )
+
+  random.seed( 0 )
+  release = threading.Event()
+  ces = dict( [ ( "ce%03d.example.org" % i, MockCE( random.uniform( 0, maxLatency ), i % 10 == 9, release ) )
+                for i in range( nCEs ) ] )
+  pilotRefs = [ "https://pilot/%d" % i for i in range( 10 ) ]
+  print "%d CEs with up to %.2f s latency, %d hung, %d threads, %.2f s budget" % ( nCEs, maxLatency,
+                                                                                   nCEs / 10, nThreads, timeBudget )
+
+  def serialPoll():
+    # The hung CEs would block the serial loop forever, they are left out
+    for ce in ces.values():
+      if not ce.hung:
+        ce.getJobStatus( pilotRefs )
+
+  poller = CEStatusPoller( maxThreads = nThreads, timeBudget = timeBudget, failureThreshold = 2, coolDown = 600 )
+  tasks = dict( [ ( ceName, ( ce.getJobStatus, ( pilotRefs, ) ) ) for ceName, ce in ces.items() ] )
+
+  timeIt( "serial poll (without the hung CEs)", serialPoll )
+  for cycle in range( 3 ):
+    results = timeIt( "concurrent poll, cycle %d" % cycle, poller.poll, tasks )
+    print "  %d CEs answered, %d failed, %d circuits open" % ( len( [ r for r in results.values() if r['OK'] ] ),
+                                                              len( [ r for r in results.values() if not r['OK'] ] ),
+                                                              len( poller.getOpenCircuits() ) )
+    if cycle == 0:
+      # Let the hung CEs recover so that their circuit can open on the next failure
+      release.set()
+      time.sleep( 0.1 )
+      for ce in ces.values():
+        if ce.hung:
+          ce.release = threading.Event()
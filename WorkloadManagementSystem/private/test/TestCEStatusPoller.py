@@ -0,0 +1,75 @@
+########################################################################
+# $HeadURL$
+# File  : TestCEStatusPoller.py
+########################################################################
+""" Unit tests of the concurrent CE poller and its circuit breaker
+"""
+
+import unittest, time, threading
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.private.CEStatusPoller import CEStatusPoller
+
+class CEStatusPollerCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.poller = CEStatusPoller( maxThreads = 4, timeBudget = 0.5, failureThreshold = 2, coolDown = 60 )
+    self.release = threading.Event()
+
+  def tearDown( self ):
+    self.release.set()
+
+  def __answer( self, delay, ok = True ):
+    time.sleep( delay )
+    if ok:
+      return S_OK( delay )
+    return S_ERROR( 'CE error' )
+
+  def __hang( self ):
+    self.release.wait( 10 )
+    return S_OK()
+
+  def test_concurrent( self ):
+    tasks = dict( [ ( 'ce%s' % i, ( self.__answer, ( 0.2, ) ) ) for i in range( 8 ) ] )
+    start = time.time()
+    results = self.poller.poll( tasks )
+    self.assert_( time.time() - start < 1.2 )
+    self.assertEqual( sorted( results ), sorted( tasks ) )
+    self.assert_( all( [ result['OK'] for result in results.values() ] ) )
+
+  def test_timeout( self ):
+    tasks = { 'hung' : ( self.__hang, () ) }
+    tasks.update( [ ( 'ce%s' % i, ( self.__answer, ( 0.1, ) ) ) for i in range( 6 ) ] )
+    start = time.time()
+    results = self.poller.poll( tasks )
+    self.assert_( time.time() - start < 1.5 )
+    self.failIf( results['hung']['OK'] )
+    self.assertEqual( len( [ result for result in results.values() if result['OK'] ] ), 6 )
+    # Still running, it is not polled again
+    self.failIf( self.poller.isAvailable( 'hung' ) )
+    results = self.poller.poll( { 'hung' : ( self.__answer, ( 0, ) ) } )
+    self.failIf( results['hung']['OK'] )
+    self.release.set()
+    time.sleep( 0.1 )
+    self.assert_( self.poller.isAvailable( 'hung' ) )
+
+  def test_circuitBreaker( self ):
+    tasks = { 'bad' : ( self.__answer, ( 0, False ) ), 'good' : ( self.__answer, ( 0, ) ) }
+    self.poller.poll( tasks )
+    self.assert_( self.poller.isAvailable( 'bad' ) )
+    self.poller.poll( tasks )
+    self.failIf( self.poller.isAvailable( 'bad' ) )
+    self.assert_( self.poller.isAvailable( 'good' ) )
+    self.assert_( 'bad' in self.poller.getOpenCircuits() )
+    calls = []
+    results = self.poller.poll( { 'bad' : ( calls.append, ( 1, ) ) } )
+    self.failIf( results['bad']['OK'] )
+    self.failIf( calls )
+
+  def test_exception( self ):
+    results = self.poller.poll( { 'ce' : ( lambda: 1 / 0, () ) } )
+    self.failIf( results['ce']['OK'] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( CEStatusPollerCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
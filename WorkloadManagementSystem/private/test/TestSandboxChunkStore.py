@@ -0,0 +1,108 @@
+########################################################################
+# $HeadURL$
+# File  : TestSandboxChunkStore.py
+########################################################################
+""" Unit tests of the content addressed sandbox chunk store
+"""
+
+import unittest, tempfile, shutil, os, tarfile, cStringIO
+
+from DIRAC.WorkloadManagementSystem.private.SandboxChunkStore import SandboxChunkStore, buildManifest, \
+                                                                     getManifestChunks, getManifestHash, \
+                                                                     checkManifest
+
+class SandboxChunkStoreCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.store = SandboxChunkStore( os.path.join( self.workDir, 'chunks' ) )
+    self.sbDir = os.path.join( self.workDir, 'sb' )
+    os.makedirs( os.path.join( self.sbDir, 'lib', 'empty' ) )
+    self.__writeFile( os.path.join( self.sbDir, 'lib', 'libA.so' ), 'A' * 2500 )
+    self.__writeFile( os.path.join( self.sbDir, 'lib', 'libB.so' ), 'A' * 1000 + 'B' * 10 )
+    self.__writeFile( os.path.join( self.workDir, 'script.sh' ), 'echo hello\n' )
+    self.fileList = [ os.path.join( self.sbDir, 'lib' ), os.path.join( self.workDir, 'script.sh' ) ]
+
+  def tearDown( self ):
+    shutil.rmtree( self.workDir )
+
+  def __writeFile( self, path, data ):
+    fd = open( path, 'wb' )
+    fd.write( data )
+    fd.close()
+
+  def __upload( self, manifest, chunkLocations ):
+    missing = self.store.getMissingChunks( getManifestChunks( manifest ) )
+    sink = self.store.getChunkSink( missing )
+    for chunkHash, _size in missing:
+      path, offset, size = chunkLocations[ chunkHash ]
+      fd = open( path, 'rb' )
+      fd.seek( offset )
+      sink.write( fd.read( size ) )
+      fd.close()
+    return sink.close(), missing
+
+  def test_manifest( self ):
+    manifest, chunkLocations = buildManifest( self.fileList, chunkSize = 1000 )[ 'Value' ]
+    self.assert_( checkManifest( manifest )[ 'OK' ] )
+    names = [ entry[ 'Name' ] for entry in manifest[ 'Files' ] ]
+    self.assertEqual( names, [ 'lib', 'lib/empty', 'lib/libA.so', 'lib/libB.so', 'script.sh' ] )
+    # The 1000 'A' chunk is shared by both libraries
+    self.assertEqual( len( getManifestChunks( manifest ) ), 4 )
+    self.assertEqual( len( chunkLocations ), 4 )
+    self.assertEqual( getManifestHash( manifest ), getManifestHash( buildManifest( self.fileList, 1000 )[ 'Value' ][0] ) )
+    self.failIf( checkManifest( { 'Files' : [ { 'Name' : '../etc', 'Type' : 'Dir', 'Mode' : 0, 'MTime' : 0 } ] } )[ 'OK' ] )
+
+  def test_symlink( self ):
+    # A link in the list is named as the link, as in the tar archive, with the target content
+    linkPath = os.path.join( self.workDir, 'link.out' )
+    os.symlink( os.path.join( self.workDir, 'script.sh' ), linkPath )
+    manifest = buildManifest( [ linkPath ], chunkSize = 1000 )[ 'Value' ][0]
+    self.assertEqual( [ entry[ 'Name' ] for entry in manifest[ 'Files' ] ], [ 'link.out' ] )
+    self.assertEqual( manifest[ 'Files' ][0][ 'Size' ], len( 'echo hello\n' ) )
+
+  def test_dedup( self ):
+    manifest, chunkLocations = buildManifest( self.fileList, chunkSize = 1000 )[ 'Value' ]
+    result, missing = self.__upload( manifest, chunkLocations )
+    self.assert_( result[ 'OK' ] )
+    self.assertEqual( len( missing ), 4 )
+    # Only the modified file chunk is missing for the second sandbox
+    self.__writeFile( os.path.join( self.workDir, 'script.sh' ), 'echo bye\n' )
+    manifest, chunkLocations = buildManifest( self.fileList, chunkSize = 1000 )[ 'Value' ]
+    result, missing = self.__upload( manifest, chunkLocations )
+    self.assert_( result[ 'OK' ] )
+    self.assertEqual( len( missing ), 1 )
+
+  def test_corruptedChunk( self ):
+    manifest = buildManifest( self.fileList, chunkSize = 1000 )[ 'Value' ][0]
+    missing = self.store.getMissingChunks( getManifestChunks( manifest ) )
+    sink = self.store.getChunkSink( missing[:1] )
+    sink.write( 'X' * missing[0][1] )
+    self.failIf( sink.close()[ 'OK' ] )
+    self.assertEqual( len( self.store.getMissingChunks( missing ) ), len( missing ) )
+
+  def test_tarSource( self ):
+    manifest, chunkLocations = buildManifest( self.fileList, chunkSize = 1000 )[ 'Value' ]
+    self.__upload( manifest, chunkLocations )
+    source = self.store.getTarSource( manifest )
+    data = ''
+    block = source.read( 777 )
+    while block:
+      data += block
+      block = source.read( 777 )
+    tf = tarfile.open( fileobj = cStringIO.StringIO( data ), mode = 'r' )
+    self.assertEqual( tf.getnames(), [ 'lib', 'lib/empty', 'lib/libA.so', 'lib/libB.so', 'script.sh' ] )
+    self.assertEqual( tf.extractfile( 'lib/libB.so' ).read(), 'A' * 1000 + 'B' * 10 )
+    self.assert_( tf.getmember( 'lib/empty' ).isdir() )
+
+  def test_purge( self ):
+    manifest, chunkLocations = buildManifest( self.fileList, chunkSize = 1000 )[ 'Value' ]
+    self.__upload( manifest, chunkLocations )
+    chunks = getManifestChunks( manifest )
+    referenced = set( [ chunkHash for chunkHash, _size in chunks[1:] ] )
+    self.assertEqual( self.store.purgeChunks( referenced, graceTime = 0 )[ 'Value' ], 1 )
+    self.assertEqual( self.store.getMissingChunks( chunks ), chunks[:1] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( SandboxChunkStoreCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )